@@ -93,6 +93,35 @@ GOOGLE_SHEET_RANGE_ICBC = "ICBC!A:F"
 # Gemini AI
 GEMINI_API_KEY = os.getenv('GEMINI_API_KEY')
 MANUAL_DRIVE_FILE_ID = os.getenv('MANUAL_DRIVE_FILE_ID')
+# Cada cuántos minutos se revisa si el manual cambió en Drive (0 desactiva el refresco) y
+# carpeta de la copia local que se usa al arrancar (default: 10 min, data/manual)
+try:
+    MANUAL_REFRESH_MIN = int(os.getenv('MANUAL_REFRESH_MIN', '10'))
+except ValueError:
+    print("MANUAL_REFRESH_MIN no es un entero válido; usando 10 min por defecto.")
+    MANUAL_REFRESH_MIN = 10
+MANUAL_SNAPSHOT_DIR = os.getenv('MANUAL_SNAPSHOT_DIR', 'data/manual')
+# Tamaño de cada sección del manual y cuántas secciones se envían a Gemini por pregunta (default: 1500 caracteres, 5)
+try:
+    MANUAL_CHUNK_CHARS = int(os.getenv('MANUAL_CHUNK_CHARS', '1500'))
+    MANUAL_TOP_K = int(os.getenv('MANUAL_TOP_K', '5'))
+except ValueError:
+    print("MANUAL_CHUNK_CHARS/MANUAL_TOP_K no son enteros válidos; usando 1500 caracteres y 5 secciones.")
+    MANUAL_CHUNK_CHARS = 1500
+    MANUAL_TOP_K = 5
+# Timeout y concurrencia de las llamadas a Gemini, y caché de respuestas del manual
+# (default: 60 s, 4 a la vez, 24 h y 256 respuestas)
+try:
+    GEMINI_TIMEOUT_SEC = int(os.getenv('GEMINI_TIMEOUT_SEC', '60'))
+    GEMINI_MAX_CONCURRENCIA = int(os.getenv('GEMINI_MAX_CONCURRENCIA', '4'))
+    GEMINI_CACHE_TTL_SEC = int(os.getenv('GEMINI_CACHE_TTL_SEC', '86400'))
+    GEMINI_CACHE_MAX_RESPUESTAS = int(os.getenv('GEMINI_CACHE_MAX_RESPUESTAS', '256'))
+except ValueError:
+    print("GEMINI_TIMEOUT_SEC/GEMINI_MAX_CONCURRENCIA/GEMINI_CACHE_TTL_SEC/GEMINI_CACHE_MAX_RESPUESTAS no son enteros válidos; usando 60 s, 4, 24 h y 256.")
+    GEMINI_TIMEOUT_SEC = 60
+    GEMINI_MAX_CONCURRENCIA = 4
+    GEMINI_CACHE_TTL_SEC = 86400
+    GEMINI_CACHE_MAX_RESPUESTAS = 256
 
 # --- Intervalos ---
 # Intervalo de chequeo en minutos (default: 240)
@@ -102,6 +131,146 @@ except ValueError:
     print("ERROR_CHECK_INTERVAL_MIN no es un entero válido; usando 240 min por defecto.")
     ERROR_CHECK_INTERVAL_MIN = 240
 
+# Vigencia de la caché en memoria de hojas de casos, en segundos (default: 120)
+try:
+    SHEET_CACHE_TTL_SEC = int(os.getenv('SHEET_CACHE_TTL_SEC', '120'))
+except ValueError:
+    print("SHEET_CACHE_TTL_SEC no es un entero válido; usando 120 s por defecto.")
+    SHEET_CACHE_TTL_SEC = 120
+
+# Pool de hilos para las llamadas a Google y timeouts por llamada, en segundos
+try:
+    GOOGLE_API_MAX_WORKERS = int(os.getenv('GOOGLE_API_MAX_WORKERS', '8'))
+    GOOGLE_API_TIMEOUT_SEC = int(os.getenv('GOOGLE_API_TIMEOUT_SEC', '30'))
+    GOOGLE_API_UPLOAD_TIMEOUT_SEC = int(os.getenv('GOOGLE_API_UPLOAD_TIMEOUT_SEC', '300'))
+except ValueError:
+    print("GOOGLE_API_MAX_WORKERS/GOOGLE_API_TIMEOUT_SEC/GOOGLE_API_UPLOAD_TIMEOUT_SEC no son enteros válidos; usando 8 hilos, 30 s y 300 s.")
+    GOOGLE_API_MAX_WORKERS = 8
+    GOOGLE_API_TIMEOUT_SEC = 30
+    GOOGLE_API_UPLOAD_TIMEOUT_SEC = 300
+
+# Escaneo incremental de errores: filas recientes a releer en cada ciclo y
+# cada cuántos ciclos se relee la hoja completa (default: 300 filas, cada 12 ciclos).
+# Las filas anteriores a la ventana no esperan la lectura completa: en cada ciclo se
+# leen sus columnas ERROR y ErrorEnvioCheck y se notifica cualquier ERROR nuevo.
+try:
+    ERROR_SCAN_RELEER_FILAS = int(os.getenv('ERROR_SCAN_RELEER_FILAS', '300'))
+    ERROR_SCAN_COMPLETO_CADA = int(os.getenv('ERROR_SCAN_COMPLETO_CADA', '12'))
+except ValueError:
+    print("ERROR_SCAN_RELEER_FILAS/ERROR_SCAN_COMPLETO_CADA no son enteros válidos; usando 300 filas y 12 ciclos.")
+    ERROR_SCAN_RELEER_FILAS = 300
+    ERROR_SCAN_COMPLETO_CADA = 12
+# Vigencia de los handles de gspread (planillas y pestañas) en google_client_manager, en segundos (default: 1800)
+try:
+    GOOGLE_HANDLE_TTL_SEC = int(os.getenv('GOOGLE_HANDLE_TTL_SEC', '1800'))
+except ValueError:
+    print("GOOGLE_HANDLE_TTL_SEC no es un entero válido; usando 1800 s por defecto.")
+    GOOGLE_HANDLE_TTL_SEC = 1800
+# Cuota de las APIs de Google por proyecto, en pedidos por minuto (utils/quota_governor.py).
+# Sheets permite 60 lecturas y 60 escrituras por minuto por usuario (la cuenta de servicio).
+try:
+    GOOGLE_SHEETS_LECTURAS_POR_MIN = int(os.getenv('GOOGLE_SHEETS_LECTURAS_POR_MIN', '60'))
+    GOOGLE_SHEETS_ESCRITURAS_POR_MIN = int(os.getenv('GOOGLE_SHEETS_ESCRITURAS_POR_MIN', '60'))
+    GOOGLE_DRIVE_LECTURAS_POR_MIN = int(os.getenv('GOOGLE_DRIVE_LECTURAS_POR_MIN', '600'))
+    GOOGLE_DRIVE_ESCRITURAS_POR_MIN = int(os.getenv('GOOGLE_DRIVE_ESCRITURAS_POR_MIN', '600'))
+    GOOGLE_QUOTA_REINTENTOS = int(os.getenv('GOOGLE_QUOTA_REINTENTOS', '3'))
+except ValueError:
+    print("Los límites de cuota de Google no son enteros válidos; usando 60/60 (Sheets), 600/600 (Drive) y 3 reintentos.")
+    GOOGLE_SHEETS_LECTURAS_POR_MIN = 60
+    GOOGLE_SHEETS_ESCRITURAS_POR_MIN = 60
+    GOOGLE_DRIVE_LECTURAS_POR_MIN = 600
+    GOOGLE_DRIVE_ESCRITURAS_POR_MIN = 600
+    GOOGLE_QUOTA_REINTENTOS = 3
+# Cuánto se recuerda el resultado de un envío de modal para no repetirlo (utils/idempotency.py), en segundos (default: 120)
+try:
+    IDEMPOTENCIA_TTL_SEC = int(os.getenv('IDEMPOTENCIA_TTL_SEC', '120'))
+except ValueError:
+    print("IDEMPOTENCIA_TTL_SEC no es un entero válido; usando 120 s por defecto.")
+    IDEMPOTENCIA_TTL_SEC = 120
+ERROR_SCAN_STATE_PATH = os.getenv('ERROR_SCAN_STATE_PATH', 'data/error_scan_state.json')
+# Base SQLite (modo WAL) con estados de flujo, tareas activas y vínculos de mensajes
+SQLITE_DB_PATH = os.getenv('SQLITE_DB_PATH', 'data/bot.db')
+
+# Copia local de la hoja "Tareas Activas": cada cuántos segundos se vuelve a leer
+# de Google Sheets si no hay escrituras pendientes (default: 900)
+try:
+    TAREAS_MIRROR_TTL_SEC = int(os.getenv('TAREAS_MIRROR_TTL_SEC', '900'))
+except ValueError:
+    print("TAREAS_MIRROR_TTL_SEC no es un entero válido; usando 900 s por defecto.")
+    TAREAS_MIRROR_TTL_SEC = 900
+
+# Cola de escritura de filas: se agrupan los append_row de cada pestaña en un append_rows
+# cada APPEND_BATCH_DELAY_MS milisegundos o al juntar APPEND_BATCH_MAX_ROWS filas
+try:
+    APPEND_BATCH_DELAY_MS = int(os.getenv('APPEND_BATCH_DELAY_MS', '500'))
+    APPEND_BATCH_MAX_ROWS = int(os.getenv('APPEND_BATCH_MAX_ROWS', '50'))
+except ValueError:
+    print("APPEND_BATCH_DELAY_MS/APPEND_BATCH_MAX_ROWS no son enteros válidos; usando 500 ms y 50 filas.")
+    APPEND_BATCH_DELAY_MS = 500
+    APPEND_BATCH_MAX_ROWS = 50
+
+# Cliente HTTP de Andreani: conexiones del pool, timeouts de conexión/lectura (segundos),
+# intentos por consulta y vigencia de la caché de trackings (default: 10, 5 s, 15 s, 3, 300 s)
+try:
+    ANDREANI_MAX_CONEXIONES = int(os.getenv('ANDREANI_MAX_CONEXIONES', '10'))
+    ANDREANI_TIMEOUT_CONEXION_SEC = int(os.getenv('ANDREANI_TIMEOUT_CONEXION_SEC', '5'))
+    ANDREANI_TIMEOUT_LECTURA_SEC = int(os.getenv('ANDREANI_TIMEOUT_LECTURA_SEC', '15'))
+    ANDREANI_MAX_INTENTOS = int(os.getenv('ANDREANI_MAX_INTENTOS', '3'))
+    ANDREANI_CACHE_TTL_SEC = int(os.getenv('ANDREANI_CACHE_TTL_SEC', '300'))
+except ValueError:
+    print("Las variables ANDREANI_* no son enteros válidos; usando 10 conexiones, 5 s, 15 s, 3 intentos y 300 s.")
+    ANDREANI_MAX_CONEXIONES = 10
+    ANDREANI_TIMEOUT_CONEXION_SEC = 5
+    ANDREANI_TIMEOUT_LECTURA_SEC = 15
+    ANDREANI_MAX_INTENTOS = 3
+    ANDREANI_CACHE_TTL_SEC = 300
+
+# /tracking-masivo: consultas simultáneas a Andreani, máximo de números por comando y
+# columna donde se escribe el estado al actualizar la hoja (default: 5, 200, "ESTADO ANDREANI")
+try:
+    TRACKING_MASIVO_CONCURRENCIA = int(os.getenv('TRACKING_MASIVO_CONCURRENCIA', '5'))
+    TRACKING_MASIVO_MAX_NUMEROS = int(os.getenv('TRACKING_MASIVO_MAX_NUMEROS', '200'))
+except ValueError:
+    print("TRACKING_MASIVO_CONCURRENCIA/TRACKING_MASIVO_MAX_NUMEROS no son enteros válidos; usando 5 y 200.")
+    TRACKING_MASIVO_CONCURRENCIA = 5
+    TRACKING_MASIVO_MAX_NUMEROS = 200
+TRACKING_MASIVO_COLUMNA_ESTADO = os.getenv('TRACKING_MASIVO_COLUMNA_ESTADO', 'ESTADO ANDREANI')
+
+# Seguimiento automático de envíos abiertos (tasks/tracking_watcher.py), en minutos salvo el presupuesto:
+# cada cuánto corre el ciclo, cada cuánto se relee la hoja de envíos, intervalo entre consultas
+# de un envío cercano a la entrega, intervalo base (se duplica mientras no haya cambios) y máximo,
+# y consultas a Andreani permitidas por hora (0 desactiva el seguimiento)
+try:
+    TRACKING_WATCHER_TICK_MIN = int(os.getenv('TRACKING_WATCHER_TICK_MIN', '5'))
+    TRACKING_WATCHER_REFRESCO_HOJA_MIN = int(os.getenv('TRACKING_WATCHER_REFRESCO_HOJA_MIN', '30'))
+    TRACKING_WATCHER_INTERVALO_MIN = int(os.getenv('TRACKING_WATCHER_INTERVALO_MIN', '30'))
+    TRACKING_WATCHER_INTERVALO_BASE_MIN = int(os.getenv('TRACKING_WATCHER_INTERVALO_BASE_MIN', '120'))
+    TRACKING_WATCHER_INTERVALO_MAX_MIN = int(os.getenv('TRACKING_WATCHER_INTERVALO_MAX_MIN', '1440'))
+    TRACKING_WATCHER_REQUESTS_POR_HORA = int(os.getenv('TRACKING_WATCHER_REQUESTS_POR_HORA', '60'))
+except ValueError:
+    print("Las variables TRACKING_WATCHER_* no son enteros válidos; usando 5, 30, 30, 120 y 1440 min y 60 consultas por hora.")
+    TRACKING_WATCHER_TICK_MIN = 5
+    TRACKING_WATCHER_REFRESCO_HOJA_MIN = 30
+    TRACKING_WATCHER_INTERVALO_MIN = 30
+    TRACKING_WATCHER_INTERVALO_BASE_MIN = 120
+    TRACKING_WATCHER_INTERVALO_MAX_MIN = 1440
+    TRACKING_WATCHER_REQUESTS_POR_HORA = 60
+
+# Subida de adjuntos a Drive: tamaño de cada parte de la subida reanudable, en KB
+# (múltiplo de 256; default: 1024). Es la memoria máxima que ocupa cada archivo en vuelo.
+try:
+    DRIVE_UPLOAD_CHUNK_KB = max(256, int(os.getenv('DRIVE_UPLOAD_CHUNK_KB', '1024')) // 256 * 256)
+except ValueError:
+    print("DRIVE_UPLOAD_CHUNK_KB no es un entero válido; usando 1024 KB por defecto.")
+    DRIVE_UPLOAD_CHUNK_KB = 1024
+
+# Adjuntos que se suben a Drive al mismo tiempo por mensaje (default: 4)
+try:
+    DRIVE_UPLOAD_CONCURRENCIA = int(os.getenv('DRIVE_UPLOAD_CONCURRENCIA', '4'))
+except ValueError:
+    print("DRIVE_UPLOAD_CONCURRENCIA no es un entero válido; usando 4 por defecto.")
+    DRIVE_UPLOAD_CONCURRENCIA = 4
+
 # Validaciones básicas
 if not TOKEN:
     print("⚠️ Advertencia: La variable de entorno DISCORD_TOKEN no está configurada.")
@@ -1,8 +1,13 @@
 import discord
 from discord.ext import commands
 from utils.state_manager import get_user_state, delete_user_state, cleanup_expired_states
-from utils.google_drive import find_or_create_drive_folder, upload_file_to_drive
+from utils.google_async import (
+    ejecutar_google, abrir_spreadsheet, obtener_worksheet, actualizar_celda, buscar_o_crear_carpeta, subir_archivos
+)
 from utils.google_client_manager import get_drive_client, get_sheets_client
+from googleapiclient.errors import HttpError
+from utils.google_drive import olvidar_carpeta_drive
+from utils.sheet_schema import mapa_de_hoja
 import config
 from datetime import datetime
 import pytz
@@ -59,7 +64,7 @@ class SolicitudCargadaButton(discord.ui.Button):
             
             # Actualizar Google Sheets
             client = get_sheets_client()
-            spreadsheet = client.open_by_key(config.SPREADSHEET_ID_FAC_A)
+            spreadsheet = await abrir_spreadsheet(client, config.SPREADSHEET_ID_FAC_A)
             sheet_range = getattr(config, 'SHEET_RANGE_FAC_A', 'A:E')
             
             # Determinar la hoja
@@ -76,20 +81,20 @@ class SolicitudCargadaButton(discord.ui.Button):
                 sheet_range_puro = sheet_range
             
             if hoja_nombre:
-                sheet = spreadsheet.worksheet(hoja_nombre)
+                sheet = await obtener_worksheet(spreadsheet, hoja_nombre)
             else:
-                sheet = spreadsheet.sheet1
+                sheet = await obtener_worksheet(spreadsheet)
             
             # Buscar la fila del pedido
-            rows = sheet.get(sheet_range_puro)
+            rows = await ejecutar_google(sheet.get, sheet_range_puro)
             if not rows or len(rows) <= 1:
                 await interaction.response.send_message('❌ No se encontró la solicitud en Google Sheets.', ephemeral=True)
                 return
             
             header_row = rows[0]
-            from utils.google_sheets import get_col_index
-            pedido_col = get_col_index(header_row, 'Número de Pedido')
-            check_bo_col = get_col_index(header_row, 'Check BO Carga')
+            columnas = mapa_de_hoja(sheet, header_row)
+            pedido_col = columnas.indice('pedido')
+            check_bo_col = columnas.indice('Check BO Carga')
             
             if pedido_col is None:
                 await interaction.response.send_message('❌ No se encontró la columna "Número de Pedido" en la hoja.', ephemeral=True)
@@ -107,7 +112,7 @@ class SolicitudCargadaButton(discord.ui.Button):
                     tz = pytz.timezone('America/Argentina/Buenos_Aires')
                     now = datetime.now(tz)
                     fecha_hora = now.strftime('%d-%m-%Y %H:%M:%S')
-                    sheet.update_cell(i, check_bo_col + 1, fecha_hora)
+                    await actualizar_celda(sheet, i, check_bo_col + 1, fecha_hora)
                     pedido_found = True
                     break
             
@@ -194,42 +199,40 @@ class AttachmentHandler(commands.Cog):
                 print(f"🔍 DEBUG - Nombre de carpeta a crear: '{folder_name}'")
                 print(f"🔍 DEBUG - Llamando find_or_create_drive_folder con parent_id: '{parent_folder_id}'")
                 
-                folder_id = find_or_create_drive_folder(drive_service, parent_folder_id or "", folder_name)
+                folder_id = await buscar_o_crear_carpeta(drive_service, parent_folder_id or "", folder_name)
                 print(f"🔍 DEBUG - ID de carpeta retornado: '{folder_id}'")
                 
                 # Opción 2: Usar directamente la carpeta "Adjuntos solicitudes" (comentado por ahora)
                 # folder_id = parent_folder_id
                 # print(f"🔍 DEBUG - Usando carpeta padre directamente: '{folder_id}'")
                 
-                # Subir cada adjunto
-                uploaded_files = []
+                # Subir los adjuntos en paralelo, informando el progreso en un único mensaje
+                total = len(message.attachments)
+                progreso = await message.reply(f'⏳ Subiendo archivos a Drive... (0/{total})')
+
+                async def informar_progreso(completados, total):
+                    await progreso.edit(content=f'⏳ Subiendo archivos a Drive... ({completados}/{total})')
+
+                resultados = await subir_archivos(drive_service, folder_id, message.attachments, informar_progreso)
+                uploaded_files = [r for _, r in resultados if not isinstance(r, Exception)]
+                fallidos = [(a, r) for a, r in resultados if isinstance(r, Exception)]
                 
-                for attachment in message.attachments:
-                    try:
-                        uploaded = upload_file_to_drive(drive_service, folder_id, attachment)
-                        uploaded_files.append(uploaded)
-                        
-                        # Delay adicional entre archivos para mayor seguridad
-                        import asyncio
-                        await asyncio.sleep(0.5)
-                            
-                    except Exception as upload_error:
-                        # Mostrar error detallado en Discord
-                        error_details = f"❌ **Error al subir {attachment.filename}:**\n{str(upload_error)}"
-                        
-                        # Agregar debug info si está disponible
-                        if hasattr(upload_file_to_drive, 'debug_info') and upload_file_to_drive.debug_info:
-                            error_details = f"{upload_file_to_drive.debug_info}\n\n{error_details}"
-                            upload_file_to_drive.debug_info = ""
-                        
-                        await message.reply(error_details)
-                        return
+                if fallidos:
+                    if any(isinstance(e, HttpError) and e.resp.status == 404 for _, e in fallidos):
+                        # La carpeta guardada en caché ya no existe: el próximo intento la vuelve a crear
+                        olvidar_carpeta_drive(parent_folder_id or "", folder_name)
+                    # Mostrar error detallado en Discord
+                    error_details = '\n'.join(f"❌ **Error al subir {a.filename}:**\n{str(e)}" for a, e in fallidos)
+                    if uploaded_files:
+                        error_details += f"\n\n✅ Subidos: {', '.join(f['name'] for f in uploaded_files)}"
+                    await progreso.edit(content=error_details[:2000])
+                    return
                 
                 # Confirmar al usuario
                 file_names = ', '.join([f["name"] for f in uploaded_files])
                 success_message = f'✅ **Archivos subidos exitosamente**\n\n📁 **Pedido:** {pedido}\n📎 **Archivos:** {file_names}'
                 
-                await message.reply(success_message)
+                await progreso.edit(content=success_message)
                 
                 # Solo enviar embed con botón de confirmación para Factura A
                 # Buscar información del caso en Google Sheets para crear el embed
@@ -239,7 +242,7 @@ class AttachmentHandler(commands.Cog):
                     fecha_carga = "N/A"
                 else:
                     client = get_sheets_client()
-                    spreadsheet = client.open_by_key(config.SPREADSHEET_ID_FAC_A)
+                    spreadsheet = await abrir_spreadsheet(client, config.SPREADSHEET_ID_FAC_A)
                     sheet_range = getattr(config, 'SHEET_RANGE_FAC_A', 'A:E')
                     
                     # Determinar la hoja
@@ -256,32 +259,22 @@ class AttachmentHandler(commands.Cog):
                         sheet_range_puro = sheet_range
                     
                     if hoja_nombre:
-                        sheet = spreadsheet.worksheet(hoja_nombre)
+                        sheet = await obtener_worksheet(spreadsheet, hoja_nombre)
                     else:
-                        sheet = spreadsheet.sheet1
+                        sheet = await obtener_worksheet(spreadsheet)
                     
                     # Buscar la fila del pedido para obtener información completa
-                    rows = sheet.get(sheet_range_puro)
+                    rows = await ejecutar_google(sheet.get, sheet_range_puro)
                     caso_info = "N/A"
                     fecha_carga = "N/A"
                     
-                    def normaliza_columna(nombre):
-                        return str(nombre).strip().replace(' ', '').replace('/', '').replace('-', '').lower()
-                    
                     if rows and len(rows) > 1:
                         header_row = rows[0]
                         # Buscar columnas robustamente
-                        pedido_col = None
-                        caso_col = None
-                        fecha_col = None
-                        for idx, col_name in enumerate(header_row):
-                            norm = normaliza_columna(col_name)
-                            if norm == normaliza_columna('Número de pedido'):
-                                pedido_col = idx
-                            if norm == normaliza_columna('Caso'):
-                                caso_col = idx
-                            if norm == normaliza_columna('Fecha/Hora'):
-                                fecha_col = idx
+                        columnas = mapa_de_hoja(sheet, header_row)
+                        pedido_col = columnas.indice('pedido')
+                        caso_col = columnas.indice('Caso')
+                        fecha_col = columnas.indice('Fecha/Hora')
                         if pedido_col is not None:
                             for row in rows[1:]:
                                 if len(row) > pedido_col and str(row[pedido_col]).strip() == pedido:
@@ -405,7 +398,7 @@ class NotaCreditoCargadaButton(discord.ui.Button):
             
             # Actualizar Google Sheets
             client = get_sheets_client()
-            spreadsheet = client.open_by_key(config.SPREADSHEET_ID_FAC_A)
+            spreadsheet = await abrir_spreadsheet(client, config.SPREADSHEET_ID_FAC_A)
             sheet_range = getattr(config, 'SHEET_RANGE_NC', 'NC!A:G')
             
             # Determinar la hoja
@@ -422,20 +415,20 @@ class NotaCreditoCargadaButton(discord.ui.Button):
                 sheet_range_puro = sheet_range
             
             if hoja_nombre:
-                sheet = spreadsheet.worksheet(hoja_nombre)
+                sheet = await obtener_worksheet(spreadsheet, hoja_nombre)
             else:
-                sheet = spreadsheet.sheet1
+                sheet = await obtener_worksheet(spreadsheet)
             
             # Buscar la fila del pedido
-            rows = sheet.get(sheet_range_puro)
+            rows = await ejecutar_google(sheet.get, sheet_range_puro)
             if not rows or len(rows) <= 1:
                 await interaction.response.send_message('❌ No se encontró la solicitud en Google Sheets.', ephemeral=True)
                 return
             
             header_row = rows[0]
-            from utils.google_sheets import get_col_index
-            pedido_col = get_col_index(header_row, 'Número de Pedido')
-            check_bo_col = get_col_index(header_row, 'Check BO Carga')
+            columnas = mapa_de_hoja(sheet, header_row)
+            pedido_col = columnas.indice('pedido')
+            check_bo_col = columnas.indice('Check BO Carga')
             
             if pedido_col is None:
                 await interaction.response.send_message('❌ No se encontró la columna "Número de Pedido" en la hoja.', ephemeral=True)
@@ -457,7 +450,7 @@ class NotaCreditoCargadaButton(discord.ui.Button):
                     
                     # Actualizar la celda específica
                     cell_address = f'{chr(65 + check_bo_col)}{i}'  # Convertir índice a letra de columna
-                    sheet.update(cell_address,  [[fecha_hora_confirmacion]])
+                    await ejecutar_google(sheet.update, cell_address, [[fecha_hora_confirmacion]])
                     break
             
             if not pedido_found:
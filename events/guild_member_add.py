@@ -1,14 +1,33 @@
 import discord
 from discord.ext import commands
 import config
+from utils import member_index
 
 class GuildMemberAdd(commands.Cog):
     def __init__(self, bot):
         self.bot = bot
 
+    @commands.Cog.listener()
+    async def on_ready(self):
+        # Construir el índice de miembros desde la caché del gateway
+        for guild in self.bot.guilds:
+            member_index.construir_indice(guild)
+
+    @commands.Cog.listener()
+    async def on_member_update(self, before: discord.Member, after: discord.Member):
+        member_index.registrar_miembro(after)
+
+    @commands.Cog.listener()
+    async def on_member_remove(self, member: discord.Member):
+        member_index.quitar_miembro(member)
+
+    @commands.Cog.listener()
+    async def on_user_update(self, before: discord.User, after: discord.User):
+        member_index.refrescar_usuario(after.id, self.bot.guilds)
+
     @commands.Cog.listener()
     async def on_member_join(self, member: discord.Member):
-        pass
+        member_index.registrar_miembro(member)
         """
         print(f"Nuevo miembro unido: {member} (ID: {member.id}) al servidor {member.guild.name} (ID: {member.guild.id}).")
 
@@ -2,9 +2,12 @@ import discord
 from discord import app_commands
 from discord.ext import commands
 import config
-from utils.andreani import get_andreani_tracking
+from utils.andreani import consultar_tracking, eventos_timeline, limpiar_html
 from utils.google_client_manager import get_sheets_client
+from utils.manual_processor import get_manual_text
+from utils.qa_service import get_answer_from_manual
 from interactions.modals import FacturaAModal, PiezaFaltanteModal
+import io
 import re
 from datetime import datetime
 
@@ -156,7 +159,7 @@ class InteractionCommands(commands.Cog):
             await interaction.followup.send('❌ Error: La API de Andreani no está configurada correctamente.', ephemeral=True)
             return
         try:
-            tracking_data = get_andreani_tracking(tracking_number, config.ANDREANI_AUTH_HEADER)
+            tracking_data = await consultar_tracking(tracking_number, config.ANDREANI_AUTH_HEADER)
             if tracking_data:
                 info = tracking_data
                 # Estado actual y fecha
@@ -170,24 +173,11 @@ class InteractionCommands(commands.Cog):
                 tracking_info += f"🔗 **Ver en Andreani:** {andreani_link}\n\n"
                 
                 # Historial
-                timelines = info.get('timelines', [])
-                if timelines:
+                eventos = eventos_timeline(info)
+                if eventos:
                     tracking_info += "Historial:\n"
-                    # Ordenar por fecha descendente
-                    eventos = []
-                    for tl in sorted(timelines, key=lambda x: x.get('orden', 0), reverse=True):
-                        for traduccion in tl.get('traducciones', []):
-                            fecha_iso = traduccion.get('fechaEvento', '')
-                            # Formatear fecha a dd/mm/yyyy HH:MM
-                            try:
-                                dt = datetime.fromisoformat(fecha_iso)
-                                fecha_fmt = dt.strftime('%d/%m/%Y, %H:%M')
-                            except Exception:
-                                fecha_fmt = fecha_iso
-                            desc = clean_html(traduccion.get('traduccion', ''))
-                            suc = traduccion.get('sucursal', {}).get('nombre', '')
-                            eventos.append(f"{fecha_fmt}: {desc} ({suc})")
-                    tracking_info += '\n'.join(eventos)
+                    # Ordenados por fecha descendente
+                    tracking_info += '\n'.join(f"{fecha}: {desc} ({suc})" for fecha, desc, suc in eventos)
                 else:
                     tracking_info += "Historial: No disponible\n"
             else:
@@ -203,6 +193,99 @@ class InteractionCommands(commands.Cog):
             tracking_info = f"❌ Hubo un error al consultar el estado del tracking para **{tracking_number}**. Detalles: {error}"
         await interaction.followup.send(tracking_info, ephemeral=False)
 
+    @maybe_guild_decorator()
+    @app_commands.command(name="tracking-masivo", description="Consulta varios envíos de Andreani a la vez")
+    @app_commands.describe(
+        numeros="Números de seguimiento separados por coma, espacio o salto de línea",
+        rango="Rango de la hoja con una columna ANDREANI (por defecto, la hoja de envíos)",
+        formato="Tabla en el mensaje o archivo CSV",
+        actualizar_hoja="Escribir el estado actual en la hoja (solo Back Office, requiere rango)"
+    )
+    @app_commands.choices(
+        formato=[
+            app_commands.Choice(name="tabla", value="tabla"),
+            app_commands.Choice(name="csv", value="csv")
+        ]
+    )
+    async def tracking_masivo(self, interaction: discord.Interaction, numeros: str = "", rango: str = "",
+                              formato: str = "tabla", actualizar_hoja: bool = False):
+        target_cat = get_target_category_id()
+        if target_cat and getattr(interaction.channel, 'category_id', None) != target_cat:
+            await interaction.response.send_message(
+                f"Este comando solo puede ser usado en la categoría <#{target_cat}>.", ephemeral=True)
+            return
+        # Restricción de canal
+        if hasattr(config, 'TARGET_CHANNEL_ID_ENVIOS') and str(interaction.channel_id) != str(config.TARGET_CHANNEL_ID_ENVIOS):
+            await interaction.response.send_message(
+                f"Este comando solo puede ser usado en el canal <#{config.TARGET_CHANNEL_ID_ENVIOS}>.", ephemeral=True)
+            return
+        if actualizar_hoja and not check_back_office_permissions(interaction):
+            await interaction.response.send_message("❌ Solo Back Office puede actualizar la hoja.", ephemeral=True)
+            return
+        if not config.ANDREANI_AUTH_HEADER:
+            await interaction.response.send_message('❌ Error: La API de Andreani no está configurada correctamente.', ephemeral=True)
+            return
+        await interaction.response.defer(thinking=True)
+        from utils import tracking_masivo
+        from utils.error_scanner import separar_rango, rango_citado
+        from utils.google_async import abrir_spreadsheet, ejecutar_google
+        from utils.sheet_schema import compilar
+        try:
+            spreadsheet = None
+            filas = []
+            idx_estado = None
+            hoja_nombre = None
+            lista = tracking_masivo.extraer_numeros(numeros)
+            if not lista:
+                # Sin lista: se leen los números de la columna ANDREANI del rango
+                rango = rango.strip() or config.GOOGLE_SHEET_RANGE_ENVIOS
+                hoja_nombre, rango_puro = separar_rango(rango)
+                client = get_sheets_client()
+                spreadsheet = await abrir_spreadsheet(client, config.SPREADSHEET_ID_CASOS)
+                respuesta = await ejecutar_google(spreadsheet.values_get, rango_citado(hoja_nombre, rango_puro))
+                rows = respuesta.get('values', [])
+                idx_tracking, filas = tracking_masivo.numeros_de_filas(rows, tracking_masivo.fila_inicial(rango_puro) + 1)
+                if idx_tracking is None:
+                    await interaction.followup.send(f'❌ No se encontró la columna "{tracking_masivo.COLUMNA_TRACKING}" en {rango}.', ephemeral=True)
+                    return
+                idx_estado = compilar(rows[0]).indice(config.TRACKING_MASIVO_COLUMNA_ESTADO)
+                lista = list(dict.fromkeys(numero for _, numero in filas))
+            if not lista:
+                await interaction.followup.send('❌ No hay números de seguimiento para consultar.', ephemeral=True)
+                return
+            if len(lista) > config.TRACKING_MASIVO_MAX_NUMEROS:
+                await interaction.followup.send(
+                    f'❌ Se pueden consultar hasta {config.TRACKING_MASIVO_MAX_NUMEROS} números por vez ({len(lista)} recibidos).', ephemeral=True)
+                return
+
+            resultados = await tracking_masivo.consultar_varios(lista, config.ANDREANI_AUTH_HEADER)
+            errores = sum(1 for r in resultados if r['error'])
+            mensaje = f"📦 **Tracking masivo:** {len(resultados)} envíos consultados"
+            if errores:
+                mensaje += f" ({errores} con error)"
+
+            if actualizar_hoja:
+                if spreadsheet is None:
+                    mensaje += "\n⚠️ Para actualizar la hoja hay que consultar un rango, no una lista de números."
+                elif idx_estado is None:
+                    mensaje += f'\n⚠️ No se actualizó la hoja: falta la columna "{config.TRACKING_MASIVO_COLUMNA_ESTADO}" en el rango.'
+                else:
+                    actualizaciones = tracking_masivo.actualizaciones_estado(hoja_nombre, idx_estado, filas, resultados)
+                    if actualizaciones:
+                        body = {'valueInputOption': 'USER_ENTERED', 'data': actualizaciones}
+                        await ejecutar_google(spreadsheet.values_batch_update, body)
+                    mensaje += f"\n✅ Estado actualizado en {len(actualizaciones)} filas."
+
+            tabla = tracking_masivo.tabla_resumen(resultados) if formato != 'csv' else None
+            if tabla and len(mensaje) + len(tabla) < tracking_masivo.LIMITE_MENSAJE:
+                await interaction.followup.send(f"{mensaje}\n{tabla}", ephemeral=False)
+            else:
+                archivo = discord.File(io.BytesIO(tracking_masivo.generar_csv(resultados)), filename='tracking_masivo.csv')
+                await interaction.followup.send(mensaje, file=archivo, ephemeral=False)
+        except Exception as error:
+            print('Error en tracking masivo:', error)
+            await interaction.followup.send(f'❌ Hubo un error en la consulta masiva de tracking. Detalles: {error}', ephemeral=True)
+
     @maybe_guild_decorator()
     @app_commands.command(name="cambios-devoluciones", description="Inicia el registro de un nuevo caso de Cambios/Devoluciones")
     async def cambios_devoluciones(self, interaction: discord.Interaction):
@@ -254,7 +337,8 @@ class InteractionCommands(commands.Cog):
         if not hasattr(config, 'SPREADSHEET_ID_BUSCAR_CASO') or not hasattr(config, 'SHEETS_TO_SEARCH') or not config.SHEETS_TO_SEARCH:
             await interaction.followup.send('❌ Error de configuración del bot: La búsqueda de casos no está configurada correctamente.', ephemeral=True)
             return
-        from utils.google_sheets import initialize_google_sheets
+        from utils.case_search import responder_busqueda_caso
+        from utils.google_async import abrir_spreadsheet
         try:
             # Verificar credenciales
             if not config.GOOGLE_CREDENTIALS_JSON:
@@ -266,49 +350,8 @@ class InteractionCommands(commands.Cog):
             # Obtener cliente de Google Sheets
             from utils.google_client_manager import get_sheets_client
             client = get_sheets_client()
-            spreadsheet = client.open_by_key(config.SPREADSHEET_ID_BUSCAR_CASO)
-            found_rows = []
-            search_summary = f"Resultados de la búsqueda para el pedido **{pedido}**:\n\n"
-            for sheet_name in config.SHEETS_TO_SEARCH:
-                try:
-                    sheet = spreadsheet.worksheet(sheet_name)
-                    rows = sheet.get('A:Z')
-                except Exception as sheet_error:
-                    search_summary += f"⚠️ Error al leer la pestaña \"{sheet_name}\".\n"
-                    continue
-                if not rows or len(rows) <= 1:
-                    continue
-                header_row = rows[0]
-                try:
-                    pedido_column_index = next(i for i, h in enumerate(header_row) if h and str(h).strip().lower() == 'número de pedido')
-                except StopIteration:
-                    search_summary += f"⚠️ No se encontró la columna \"Número de pedido\" en la pestaña \"{sheet_name}\".\n"
-                    continue
-                for i, row in enumerate(rows[1:], start=2):
-                    if len(row) <= pedido_column_index:
-                        continue
-                    row_pedido_value = str(row[pedido_column_index]).strip() if row[pedido_column_index] else ''
-                    if row_pedido_value.lower() == pedido.lower():
-                        found_rows.append({
-                            'sheet': sheet_name,
-                            'row_number': i,
-                            'data': row
-                        })
-            if found_rows:
-                search_summary += f"✅ Se encontraron **{len(found_rows)}** coincidencias:\n\n"
-                detailed_results = ''
-                for found in found_rows:
-                    detailed_results += f"**Pestaña:** \"{found['sheet']}\", **Fila:** {found['row_number']}\n"
-                    display_columns = ' | '.join(found['data'][:6])
-                    detailed_results += f"`{display_columns}`\n\n"
-                full_message = search_summary + detailed_results
-                if len(full_message) > 2000:
-                    await interaction.followup.send(search_summary + "Los resultados completos son demasiado largos para mostrar aquí. Por favor, revisa la hoja de Google Sheets directamente.", ephemeral=False)
-                else:
-                    await interaction.followup.send(full_message, ephemeral=False)
-            else:
-                search_summary += '😕 No se encontraron coincidencias en las pestañas configuradas.'
-                await interaction.followup.send(search_summary, ephemeral=False)
+            spreadsheet = await abrir_spreadsheet(client, config.SPREADSHEET_ID_BUSCAR_CASO)
+            await responder_busqueda_caso(interaction, spreadsheet, pedido)
         except Exception as error:
             print('Error general durante la búsqueda de casos en Google Sheets:', error)
             await interaction.followup.send('❌ Hubo un error al realizar la búsqueda de casos. Por favor, inténtalo de nuevo o contacta a un administrador.', ephemeral=False)
@@ -343,6 +386,25 @@ class InteractionCommands(commands.Cog):
                 'Hubo un error al iniciar el formulario de Solicitudes de Envíos. Por favor, inténtalo de nuevo.', ephemeral=True)
             delete_user_state(str(interaction.user.id), "solicitudes_envios")
 
+    @maybe_guild_decorator()
+    @app_commands.command(name="manual", description="Consulta el manual de procedimientos con IA")
+    @app_commands.describe(pregunta="Tu pregunta sobre el manual")
+    async def manual(self, interaction: discord.Interaction, pregunta: str):
+        manual_text = get_manual_text()
+        if not manual_text or not config.GEMINI_API_KEY:
+            await interaction.response.send_message(
+                '❌ El manual no está disponible en este momento. Avisale a un administrador.', ephemeral=True)
+            return
+        await interaction.response.defer(thinking=True)
+        try:
+            respuesta = await get_answer_from_manual(manual_text, pregunta, config.GEMINI_API_KEY)
+        except Exception as error:
+            print('Error al responder la consulta del manual:', error)
+            await interaction.followup.send(f'❌ {error}', ephemeral=True)
+            return
+        texto = f"❓ **{pregunta}**\n\n{respuesta}"
+        await interaction.followup.send(texto[:2000])
+
     @maybe_guild_decorator()
     @app_commands.command(name="testping", description="Verifica si el bot está activo.")
     @app_commands.dm_only()
@@ -363,9 +425,10 @@ class InteractionCommands(commands.Cog):
                 f"Este comando solo puede ser usado en el canal <#{getattr(config, 'TARGET_CHANNEL_ID_CASOS_CANCELACION', '')}>.", ephemeral=True)
             return
         from interactions.modals import CancelacionModal
-        from utils.state_manager import set_user_state, delete_user_state
+        from utils.state_manager import set_user_state, delete_user_state, generar_solicitud_id
         try:
-            set_user_state(str(interaction.user.id), {"type": "cancelaciones", "paso": 1}, "cancelaciones")
+            user_id = str(interaction.user.id)
+            set_user_state(user_id, {"type": "cancelaciones", "paso": 1, "solicitud_id": generar_solicitud_id(user_id)}, "cancelaciones")
             modal = CancelacionModal()
             await interaction.response.send_modal(modal)
             print(f"Usuario {interaction.user} puesto en estado pendiente (cancelaciones, paso 1). Modal mostrado.")
@@ -473,6 +536,7 @@ class InteractionCommands(commands.Cog):
             # Importar las funciones necesarias
             import config
             from utils.google_sheets import initialize_google_sheets, check_sheet_for_errors
+            from utils.google_async import abrir_spreadsheet, obtener_worksheet
             
             # Verificar configuración
             if not config.GOOGLE_CREDENTIALS_JSON:
@@ -487,7 +551,7 @@ class InteractionCommands(commands.Cog):
             
             # Inicializar Google Sheets
             client = get_sheets_client()
-            spreadsheet = client.open_by_key(config.SPREADSHEET_ID_CASOS)
+            spreadsheet = await abrir_spreadsheet(client, config.SPREADSHEET_ID_CASOS)
             
             # Contador de errores encontrados
             total_errores = 0
@@ -507,10 +571,7 @@ class InteractionCommands(commands.Cog):
                             hoja_nombre = partes[0].strip("'")
                             sheet_range_puro = partes[1]
                     
-                    if hoja_nombre:
-                        sheet = spreadsheet.worksheet(hoja_nombre)
-                    else:
-                        sheet = spreadsheet.sheet1
+                    sheet = await obtener_worksheet(spreadsheet, hoja_nombre)
                     
                     # Ejecutar verificación de errores
                     await check_sheet_for_errors(
@@ -540,9 +601,7 @@ class InteractionCommands(commands.Cog):
         except Exception as error:
             await interaction.followup.send(f"❌ Error general en la verificación manual: {error}", ephemeral=True)
 
-def clean_html(raw_html):
-    cleanr = re.compile('<.*?>')
-    return re.sub(cleanr, '', raw_html).replace('&nbsp;', ' ').replace('&aacute;', 'á').replace('&eacute;', 'é').replace('&iacute;', 'í').replace('&oacute;', 'ó').replace('&uacute;', 'ú').replace('&ntilde;', 'ñ')
+clean_html = limpiar_html
 
 async def setup(bot):
     await bot.add_cog(InteractionCommands(bot)) 
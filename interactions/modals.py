@@ -7,9 +7,14 @@ from discord.ext import commands
 from datetime import datetime
 from utils.google_sheets import check_if_pedido_exists
 from utils.google_sheets import initialize_google_sheets, check_if_pedido_exists
+from utils.google_async import ejecutar_google, abrir_spreadsheet, obtener_worksheet
+from utils.case_search import responder_busqueda_caso
 from utils.google_client_manager import get_sheets_client
 from utils.state_manager import generar_solicitud_id, cleanup_expired_states, get_user_state
 import utils.state_manager as state_manager
+from utils import persistence
+from utils.submit_pipeline import EnvioCaso, ErrorEnvio
+from utils.idempotency import clave_envio, ejecutar_una_vez
 
 class FacturaAModal(discord.ui.Modal, title='Registrar Solicitud Factura A'):
     def __init__(self):
@@ -85,44 +90,11 @@ class FacturaAModal(discord.ui.Modal, title='Registrar Solicitud Factura A'):
             # Mostrar mensaje de "procesando" mientras se trabaja con Google Sheets
             await interaction.response.defer(thinking=True)
             
+            envio = EnvioCaso('FacturaAModal', config.SPREADSHEET_ID_FAC_A, getattr(config, 'SHEET_RANGE_FAC_A', 'A:E'))
             try:
-                spreadsheet = client.open_by_key(config.SPREADSHEET_ID_FAC_A)
-            except Exception as e:
-                await interaction.followup.send(f'❌ Error al abrir la hoja de Google Sheets: {str(e)}', ephemeral=True)
-                return
-                
-            sheet_range = getattr(config, 'SHEET_RANGE_FAC_A', 'A:E')
-            hoja_nombre = None
-            if '!' in sheet_range:
-                partes = sheet_range.split('!')
-                if len(partes) == 2:
-                    hoja_nombre = partes[0].strip("'")
-                    sheet_range_puro = partes[1]
-                else:
-                    hoja_nombre = None
-                    sheet_range_puro = sheet_range
-            else:
-                sheet_range_puro = sheet_range
-                
-            try:
-                if hoja_nombre:
-                    sheet = spreadsheet.worksheet(hoja_nombre)
-                else:
-                    sheet = spreadsheet.sheet1
-            except Exception as e:
-                await interaction.followup.send(f'❌ Error al acceder a la hoja: {str(e)}', ephemeral=True)
-                return
-                
-            try:
-                rows = sheet.get(sheet_range_puro)
-            except Exception as e:
-                await interaction.followup.send(f'❌ Error al leer datos de la hoja: {str(e)}', ephemeral=True)
-                return
-                
-            try:
-                is_duplicate = check_if_pedido_exists(sheet, sheet_range_puro, pedido)
-            except Exception as e:
-                await interaction.followup.send(f'❌ Error al verificar duplicados: {str(e)}', ephemeral=True)
+                is_duplicate = await envio.preparar(client, pedido)
+            except ErrorEnvio as e:
+                await interaction.followup.send(f'❌ {e}', ephemeral=True)
                 return
                 
             if is_duplicate:
@@ -132,23 +104,17 @@ class FacturaAModal(discord.ui.Modal, title='Registrar Solicitud Factura A'):
             tz = pytz.timezone('America/Argentina/Buenos_Aires')
             now = datetime.now(tz)
             fecha_hora = now.strftime('%d-%m-%Y %H:%M:%S')
-            header = rows[0] if rows else []
             
-            # Normalizar nombres de columnas
-            def normaliza_columna(nombre):
-                if not nombre:
-                    return ''
-                return str(nombre).strip().replace('\u200b', '').replace('\ufeff', '').lower()
-                
             # Buscar índices de columnas por nombre
-            pedido_col = next((i for i, h in enumerate(header) if normaliza_columna(h) == 'número de pedido'), 0)
-            fecha_col = next((i for i, h in enumerate(header) if normaliza_columna(h) == 'fecha/hora'), 1)
-            caso_col = next((i for i, h in enumerate(header) if normaliza_columna(h) == 'caso'), 2)
-            email_col = next((i for i, h in enumerate(header) if normaliza_columna(h) == 'email'), 3)
-            desc_col = next((i for i, h in enumerate(header) if 'observaciones' in normaliza_columna(h)), 4)
+            columnas = envio.columnas
+            pedido_col = columnas.indice('pedido', 0)
+            fecha_col = columnas.indice('Fecha/Hora', 1)
+            caso_col = columnas.indice('Caso', 2)
+            email_col = columnas.indice('Email', 3)
+            desc_col = columnas.indice_que_contiene('observaciones', 4)
             
             # Crear fila con datos en las posiciones correctas
-            row_data = [''] * len(header)
+            row_data = envio.fila_vacia()
             row_data[pedido_col] = pedido
             row_data[fecha_col] = fecha_hora
             row_data[caso_col] = f'#{caso}'
@@ -156,9 +122,9 @@ class FacturaAModal(discord.ui.Modal, title='Registrar Solicitud Factura A'):
             row_data[desc_col] = descripcion
             
             try:
-                sheet.append_row(row_data)
-            except Exception as e:
-                await interaction.followup.send(f'❌ Error al agregar datos a la hoja: {str(e)}', ephemeral=True)
+                await envio.agregar(row_data)
+            except ErrorEnvio as e:
+                await interaction.followup.send(f'❌ {e}', ephemeral=True)
                 return
                 
             parent_folder_id = getattr(config, 'PARENT_DRIVE_FOLDER_ID', None)
@@ -246,54 +212,34 @@ class FacturaBModal(discord.ui.Modal, title='Registrar Solicitud Factura B'):
                 await interaction.response.send_message('❌ Error: El ID de la hoja de Factura B no está configurado.', ephemeral=True)
                 return
             
+            # Responder antes de los 3 s de Discord: envio.agregar espera a que se escriba el lote
+            await interaction.response.defer(ephemeral=True)
             client = get_sheets_client()
-            spreadsheet = client.open_by_key(config.SPREADSHEET_ID_FAC_A)
-            sheet_range = getattr(config, 'SHEET_RANGE_FAC_B', 'FacB!A:G')
-            hoja_nombre = None
-            if '!' in sheet_range:
-                partes = sheet_range.split('!')
-                if len(partes) == 2:
-                    hoja_nombre = partes[0].strip("'")
-                    sheet_range_puro = partes[1]
-                else:
-                    hoja_nombre = None
-                    sheet_range_puro = sheet_range
-            else:
-                sheet_range_puro = sheet_range
-            if hoja_nombre:
-                sheet = spreadsheet.worksheet(hoja_nombre)
-            else:
-                sheet = spreadsheet.sheet1
-            rows = sheet.get(sheet_range_puro)
-            is_duplicate = check_if_pedido_exists(sheet, sheet_range_puro, pedido)
+            envio = EnvioCaso('FacturaBModal', config.SPREADSHEET_ID_FAC_A, getattr(config, 'SHEET_RANGE_FAC_B', 'FacB!A:G'))
+            is_duplicate = await envio.preparar(client, pedido)
             if is_duplicate:
-                await interaction.response.send_message(f'❌ El número de pedido **{pedido}** ya se encuentra registrado en la hoja de Factura B.', ephemeral=True)
+                await interaction.followup.send(f'❌ El número de pedido **{pedido}** ya se encuentra registrado en la hoja de Factura B.', ephemeral=True)
                 return
             tz = pytz.timezone('America/Argentina/Buenos_Aires')
             now = datetime.now(tz)
             fecha_hora = now.strftime('%d-%m-%Y %H:%M:%S')
-            header = rows[0] if rows else []
-            # Normalizar nombres de columnas
-            def normaliza_columna(nombre):
-                if not nombre:
-                    return ''
-                return str(nombre).strip().replace('\u200b', '').replace('\ufeff', '').lower()
             # Buscar índices de columnas por nombre
-            fecha_col = next((i for i, h in enumerate(header) if normaliza_columna(h) == 'fecha de carga'), 0)
-            asesor_col = next((i for i, h in enumerate(header) if normaliza_columna(h) == 'asesor que carga'), 1)
-            pedido_col = next((i for i, h in enumerate(header) if normaliza_columna(h) == 'número de pedido'), 2)
-            caso_col = next((i for i, h in enumerate(header) if normaliza_columna(h) == 'id caso wise'), 3)
-            canal_col = next((i for i, h in enumerate(header) if normaliza_columna(h) == 'canal de compra'), 4)
-            email_col = next((i for i, h in enumerate(header) if normaliza_columna(h) == 'correo electronico'), 5)
+            columnas = envio.columnas
+            fecha_col = columnas.indice('Fecha de carga', 0)
+            asesor_col = columnas.indice('Asesor que carga', 1)
+            pedido_col = columnas.indice('pedido', 2)
+            caso_col = columnas.indice('ID Caso Wise', 3)
+            canal_col = columnas.indice('Canal de compra', 4)
+            email_col = columnas.indice('Correo electronico', 5)
             # Crear fila con datos en las posiciones correctas
-            row_data = [''] * len(header)
+            row_data = envio.fila_vacia()
             row_data[fecha_col] = fecha_hora
             row_data[asesor_col] = interaction.user.display_name
             row_data[pedido_col] = pedido
             row_data[caso_col] = caso
             row_data[canal_col] = canal_compra
             row_data[email_col] = email
-            sheet.append_row(row_data)
+            await envio.agregar(row_data)
             
             # Crear embed con los datos de la solicitud
             embed = discord.Embed(
@@ -341,9 +287,12 @@ class FacturaBModal(discord.ui.Modal, title='Registrar Solicitud Factura B'):
             
             embed.set_footer(text=f'Solicitud cargada por {interaction.user.display_name}')
             
-            await interaction.response.send_message(embed=embed)
+            await interaction.followup.send(embed=embed)
         except Exception as error:
-            await interaction.response.send_message(f'❌ Hubo un error al procesar tu solicitud de Factura B. Detalles: {error}', ephemeral=True)
+            if not interaction.response.is_done():
+                await interaction.response.send_message(f'❌ Hubo un error al procesar tu solicitud de Factura B. Detalles: {error}', ephemeral=True)
+            else:
+                await interaction.followup.send(f'❌ Hubo un error al procesar tu solicitud de Factura B. Detalles: {error}', ephemeral=True)
         if not interaction.response.is_done():
             await interaction.response.send_message('✅ Tarea finalizada.', ephemeral=True)
 
@@ -411,28 +360,13 @@ class CasoModal(discord.ui.Modal, title='Detalles del Caso'):
                 await interaction.response.send_message('❌ Error: El ID de la hoja de Casos no está configurado.', ephemeral=True)
                 state_manager.delete_user_state(user_id, "cambios_devoluciones")
                 return
+            # Responder antes de los 3 s de Discord: envio.agregar espera a que se escriba el lote
+            await interaction.response.defer(ephemeral=True)
             client = get_sheets_client()
-            spreadsheet = client.open_by_key(config.SPREADSHEET_ID_CASOS)
-            sheet_range = getattr(config, 'SHEET_RANGE_CASOS_READ', 'A:K')
-            hoja_nombre = None
-            if '!' in sheet_range:
-                partes = sheet_range.split('!')
-                if len(partes) == 2:
-                    hoja_nombre = partes[0].strip("'")
-                    sheet_range_puro = partes[1]
-                else:
-                    hoja_nombre = None
-                    sheet_range_puro = sheet_range
-            else:
-                sheet_range_puro = sheet_range
-            if hoja_nombre:
-                sheet = spreadsheet.worksheet(hoja_nombre)
-            else:
-                sheet = spreadsheet.sheet1
-            rows = sheet.get(sheet_range_puro)
-            is_duplicate = check_if_pedido_exists(sheet, sheet_range_puro, pedido)
+            envio = EnvioCaso('CasoModal', config.SPREADSHEET_ID_CASOS, getattr(config, 'SHEET_RANGE_CASOS_READ', 'A:K'))
+            is_duplicate = await envio.preparar(client, pedido)
             if is_duplicate:
-                await interaction.response.send_message(f'❌ El número de pedido **{pedido}** ya se encuentra registrado en la hoja de Casos.', ephemeral=True)
+                await interaction.followup.send(f'❌ El número de pedido **{pedido}** ya se encuentra registrado en la hoja de Casos.', ephemeral=True)
                 state_manager.delete_user_state(user_id, "cambios_devoluciones")
                 return
             tz = pytz.timezone('America/Argentina/Buenos_Aires')
@@ -451,36 +385,26 @@ class CasoModal(discord.ui.Modal, title='Detalles del Caso'):
                 '',               # I - Error
                 ''                # J - Notificado
             ]
-            # Ajustar la cantidad de columnas al header
-            header = rows[0] if rows else []
             # Buscar índices de 'Agente Back' y 'Resuelto'
-            def normaliza_columna(nombre):
-                return str(nombre).strip().replace(' ', '').replace('/', '').replace('-', '').lower()
-            idx_agente_back = None
-            idx_resuelto = None
-            for idx, col_name in enumerate(header):
-                norm = normaliza_columna(col_name)
-                if norm == normaliza_columna('Agente Back'):
-                    idx_agente_back = idx
-                if norm == normaliza_columna('Resuelto'):
-                    idx_resuelto = idx
+            idx_agente_back = envio.columnas.indice('Agente Back')
+            idx_resuelto = envio.columnas.indice('Resuelto')
             # Ajustar row_data al header
-            if len(row_data) < len(header):
-                row_data += [''] * (len(header) - len(row_data))
-            elif len(row_data) > len(header):
-                row_data = row_data[:len(header)]
+            row_data = envio.ajustar_al_encabezado(row_data)
             # Cargar valores por defecto en las columnas especiales
             if idx_agente_back is not None:
                 row_data[idx_agente_back] = 'Nadie'
             if idx_resuelto is not None:
                 row_data[idx_resuelto] = 'No'
-            sheet.append_row(row_data)
+            await envio.agregar(row_data)
             confirmation_message = f"""✅ **Caso registrado exitosamente**\n\n📋 **Detalles del caso:**\n• **N° de Pedido:** {pedido}\n• **N° de Caso:** {numero_caso}\n• **Tipo de Solicitud:** {tipo_solicitud}\n• **Agente:** {agente_name}\n• **Fecha:** {fecha_hora}\n\nEl caso ha sido guardado en Google Sheets y será monitoreado automáticamente."""
-            await interaction.response.send_message(confirmation_message, ephemeral=True)
+            await interaction.followup.send(confirmation_message, ephemeral=True)
             state_manager.delete_user_state(user_id, "cambios_devoluciones")
         except Exception as error:
             print('Error general durante el procesamiento del modal de caso (on_submit):', error)
-            await interaction.response.send_message(f'❌ Hubo un error al procesar tu caso. Detalles: {error}', ephemeral=True)
+            if not interaction.response.is_done():
+                await interaction.response.send_message(f'❌ Hubo un error al procesar tu caso. Detalles: {error}', ephemeral=True)
+            else:
+                await interaction.followup.send(f'❌ Hubo un error al procesar tu caso. Detalles: {error}', ephemeral=True)
             state_manager.delete_user_state(str(interaction.user.id), "cambios_devoluciones")
         if not interaction.response.is_done():
             await interaction.response.send_message('✅ Tarea finalizada.', ephemeral=True)
@@ -501,7 +425,7 @@ class TrackingModal(discord.ui.Modal, title='Consulta de Tracking'):
         self.add_item(self.numero)
 
     async def on_submit(self, interaction: discord.Interaction):
-        from utils.andreani import get_andreani_tracking
+        from utils.andreani import consultar_tracking
         try:
             tracking_number = self.numero.value.strip()
             if not tracking_number:
@@ -516,8 +440,8 @@ class TrackingModal(discord.ui.Modal, title='Consulta de Tracking'):
             # Deferir la respuesta porque la consulta puede tomar tiempo
             await interaction.response.defer(thinking=True)
             
-            # Consultar tracking (función síncrona)
-            tracking_data = get_andreani_tracking(tracking_number, config.ANDREANI_AUTH_HEADER)
+            # Consultar tracking (cliente async con caché)
+            tracking_data = await consultar_tracking(tracking_number, config.ANDREANI_AUTH_HEADER)
             
             # Procesar respuesta igual que el comando original
             if tracking_data:
@@ -612,51 +536,8 @@ class BuscarCasoModal(discord.ui.Modal, title='Búsqueda de Caso'):
             
             # Inicializar cliente de Google Sheets
             client = get_sheets_client()
-            spreadsheet = client.open_by_key(config.SPREADSHEET_ID_BUSCAR_CASO)
-            found_rows = []
-            search_summary = f"Resultados de la búsqueda para el pedido **{pedido}**:\n\n"
-
-            for sheet_name in config.SHEETS_TO_SEARCH:
-                try:
-                    sheet = spreadsheet.worksheet(sheet_name)
-                    rows = sheet.get('A:Z')
-                except Exception as sheet_error:
-                    search_summary += f"⚠️ Error al leer la pestaña \"{sheet_name}\".\n"
-                    continue
-                if not rows or len(rows) <= 1:
-                    continue
-                header_row = rows[0]
-                try:
-                    pedido_column_index = next(i for i, h in enumerate(header_row) if h and str(h).strip().lower() == 'número de pedido')
-                except StopIteration:
-                    search_summary += f"⚠️ No se encontró la columna \"Número de pedido\" en la pestaña \"{sheet_name}\".\n"
-                    continue
-                for i, row in enumerate(rows[1:], start=2):
-                    if len(row) <= pedido_column_index:
-                        continue
-                    row_pedido_value = str(row[pedido_column_index]).strip() if row[pedido_column_index] else ''
-                    if row_pedido_value.lower() == pedido.lower():
-                        found_rows.append({
-                            'sheet': sheet_name,
-                            'row_number': i,
-                            'data': row
-                        })
-            
-            if found_rows:
-                search_summary += f"✅ Se encontraron **{len(found_rows)}** coincidencias:\n\n"
-                detailed_results = ''
-                for found in found_rows:
-                    detailed_results += f"**Pestaña:** \"{found['sheet']}\", **Fila:** {found['row_number']}\n"
-                    display_columns = ' | '.join(found['data'][:6])
-                    detailed_results += f"`{display_columns}`\n\n"
-                full_message = search_summary + detailed_results
-                if len(full_message) > 2000:
-                    await interaction.followup.send(search_summary + "Los resultados completos son demasiado largos para mostrar aquí. Por favor, revisa la hoja de Google Sheets directamente.", ephemeral=False)
-                else:
-                    await interaction.followup.send(full_message, ephemeral=False)
-            else:
-                search_summary += '😕 No se encontraron coincidencias en las pestañas configuradas.'
-                await interaction.followup.send(search_summary, ephemeral=False)
+            spreadsheet = await abrir_spreadsheet(client, config.SPREADSHEET_ID_BUSCAR_CASO)
+            await responder_busqueda_caso(interaction, spreadsheet, pedido)
             
         except Exception as error:
             print('Error general durante la búsqueda de casos en Google Sheets:', error)
@@ -694,11 +575,11 @@ class CantidadCasosModal(discord.ui.Modal, title='Finalizar Tarea'):
                 await interaction.followup.send('❌ Error: El ID de la hoja de tareas no está configurado.', ephemeral=True)
                 return
             client = get_sheets_client()
-            spreadsheet = client.open_by_key(config.GOOGLE_SHEET_ID_TAREAS)
-            sheet_activas = spreadsheet.worksheet('Tareas Activas')
-            sheet_historial = spreadsheet.worksheet('Historial')
-            from utils.google_sheets import obtener_tarea_por_id
-            datos_tarea = obtener_tarea_por_id(sheet_activas, self.tarea_id)
+            spreadsheet = await abrir_spreadsheet(client, config.GOOGLE_SHEET_ID_TAREAS)
+            sheet_activas = await obtener_worksheet(spreadsheet, 'Tareas Activas')
+            sheet_historial = await obtener_worksheet(spreadsheet, 'Historial')
+            from utils.tareas_mirror import obtener_tarea_por_id
+            datos_tarea = await ejecutar_google(obtener_tarea_por_id, sheet_activas, self.tarea_id)
             if not datos_tarea:
                 await interaction.followup.send('❌ No se encontró la tarea especificada.', ephemeral=True)
                 return
@@ -710,10 +591,11 @@ class CantidadCasosModal(discord.ui.Modal, title='Finalizar Tarea'):
             now = datetime.now(tz)
             fecha_finalizacion = now.strftime('%d/%m/%Y %H:%M:%S')
             max_intentos_sheet = 3
-            from utils.google_sheets import finalizar_tarea_por_id_con_cantidad
+            from utils.tareas_mirror import finalizar_tarea_por_id_con_cantidad
             for intento in range(max_intentos_sheet):
                 try:
-                    finalizar_tarea_por_id_con_cantidad(
+                    await ejecutar_google(
+                        finalizar_tarea_por_id_con_cantidad,
                         sheet_activas,
                         sheet_historial,
                         self.tarea_id,
@@ -742,6 +624,11 @@ class CantidadCasosModal(discord.ui.Modal, title='Finalizar Tarea'):
             estado = get_user_state(user_id, "tarea")
             message_id = estado.get('message_id') if estado else None
             channel_id = estado.get('channel_id') if estado else None
+            if not message_id:
+                vinculo = persistence.obtener_vinculo(user_id, 'tarea')
+                if vinculo:
+                    message_id, channel_id = vinculo.message_id, vinculo.channel_id
+            persistence.borrar_tarea(user_id)
             if message_id and channel_id:
                 try:
                     canal = interaction.guild.get_channel(int(channel_id))
@@ -761,6 +648,7 @@ class CantidadCasosModal(discord.ui.Modal, title='Finalizar Tarea'):
                 except:
                     pass
             delete_user_state(user_id, "tarea")
+            persistence.borrar_vinculo(user_id, 'tarea')
         except Exception as e:
             try:
                 await interaction.followup.send(
@@ -851,28 +739,13 @@ class SolicitudEnviosModal(discord.ui.Modal, title='Detalles de la Solicitud de
                 await interaction.response.send_message('❌ Error: La variable GOOGLE_SHEET_RANGE_ENVIOS no está configurada.', ephemeral=True)
                 state_manager.delete_user_state(user_id, "solicitudes_envios")
                 return
+            # Responder antes de los 3 s de Discord: envio.agregar espera a que se escriba el lote
+            await interaction.response.defer(ephemeral=True)
             client = get_sheets_client()
-            spreadsheet = client.open_by_key(config.SPREADSHEET_ID_CASOS)
-            sheet_range = getattr(config, 'GOOGLE_SHEET_RANGE_ENVIOS', 'CAMBIO DE DIRECCIÓN 2025!A:M')
-            hoja_nombre = None
-            if '!' in sheet_range:
-                partes = sheet_range.split('!')
-                if len(partes) == 2:
-                    hoja_nombre = partes[0].strip("'")
-                    sheet_range_puro = partes[1]
-                else:
-                    hoja_nombre = None
-                    sheet_range_puro = sheet_range
-            else:
-                sheet_range_puro = sheet_range
-            if hoja_nombre:
-                sheet = spreadsheet.worksheet(hoja_nombre)
-            else:
-                sheet = spreadsheet.sheet1
-            rows = sheet.get(sheet_range_puro)
-            is_duplicate = check_if_pedido_exists(sheet, sheet_range_puro, pedido)
+            envio = EnvioCaso('SolicitudEnviosModal', config.SPREADSHEET_ID_CASOS, getattr(config, 'GOOGLE_SHEET_RANGE_ENVIOS', 'CAMBIO DE DIRECCIÓN 2025!A:M'))
+            is_duplicate = await envio.preparar(client, pedido)
             if is_duplicate:
-                await interaction.response.send_message(f'❌ El número de pedido **{pedido}** ya se encuentra registrado en la hoja de Solicitudes de Envíos.', ephemeral=True)
+                await interaction.followup.send(f'❌ El número de pedido **{pedido}** ya se encuentra registrado en la hoja de Solicitudes de Envíos.', ephemeral=True)
                 state_manager.delete_user_state(user_id, "solicitudes_envios")
                 return
             tz = pytz.timezone('America/Argentina/Buenos_Aires')
@@ -898,33 +771,26 @@ class SolicitudEnviosModal(discord.ui.Modal, title='Detalles de la Solicitud de
             ]
             
             # Ajustar la cantidad de columnas al header (igual que CasoModal)
-            header = rows[0] if rows else []
-            if len(row_data) < len(header):
-                row_data.extend([''] * (len(header) - len(row_data)))
-            elif len(row_data) > len(header):
-                row_data = row_data[:len(header)]
-            
-            # Buscar columnas especiales por nombre (igual que CasoModal)
-            def normaliza_columna(nombre):
-                if not nombre:
-                    return ''
-                return str(nombre).strip().replace('\u200b', '').replace('\ufeff', '').lower()
-            
-            # Buscar índice de Agente Back si existe
-            idx_agente_back = next((i for i, h in enumerate(header) if 'agente back' in normaliza_columna(h)), None)
+            row_data = envio.ajustar_al_encabezado(row_data)
+            
+            # Buscar índice de Agente Back si existe (igual que CasoModal)
+            idx_agente_back = envio.columnas.indice_que_contiene('agente back')
             if idx_agente_back is not None and idx_agente_back < len(row_data):
                 row_data[idx_agente_back] = 'Nadie'
             
-            sheet.append_row(row_data)
+            await envio.agregar(row_data)
             confirmation_message = f"""✅ **Solicitud registrada exitosamente**\n\n📋 **Detalles de la solicitud:**\n• **N° de Pedido:** {pedido}\n• **N° de Caso:** {numero_caso}\n• **Tipo de Solicitud:** {tipo_solicitud}\n• **Agente:** {agente_name}\n• **Fecha:** {fecha_hora}\n• **Dirección y Teléfono:** {direccion_telefono}\n"""
             if observaciones:
                 confirmation_message += f"• **Observaciones:** {observaciones}\n"
             confirmation_message += "\nLa solicitud ha sido guardada en Google Sheets y será monitoreada automáticamente."
-            await interaction.response.send_message(confirmation_message, ephemeral=True)
+            await interaction.followup.send(confirmation_message, ephemeral=True)
             state_manager.delete_user_state(user_id, "solicitudes_envios")
         except Exception as error:
             print('Error general durante el procesamiento del modal de solicitud de envíos (on_submit):', error)
-            await interaction.response.send_message(f'❌ Hubo un error al procesar tu solicitud. Detalles: {error}', ephemeral=True)
+            if not interaction.response.is_done():
+                await interaction.response.send_message(f'❌ Hubo un error al procesar tu solicitud. Detalles: {error}', ephemeral=True)
+            else:
+                await interaction.followup.send(f'❌ Hubo un error al procesar tu solicitud. Detalles: {error}', ephemeral=True)
             state_manager.delete_user_state(str(interaction.user.id), "solicitudes_envios")
         if not interaction.response.is_done():
             await interaction.response.send_message('✅ Tarea finalizada.', ephemeral=True)
@@ -1020,63 +886,60 @@ class ReembolsoModal(discord.ui.Modal, title='Detalles del Reembolso'):
                 await interaction.response.send_message('❌ Error: La variable SHEET_RANGE_REEMBOLSOS no está configurada.', ephemeral=True)
                 state_manager.delete_user_state(user_id, "reembolsos")
                 return
-            client = get_sheets_client()
-            spreadsheet = client.open_by_key(config.SPREADSHEET_ID_CASOS)
-            sheet_range = getattr(config, 'SHEET_RANGE_REEMBOLSOS', 'REEMBOLSOS!A:L')
-            hoja_nombre = None
-            if '!' in sheet_range:
-                partes = sheet_range.split('!')
-                if len(partes) == 2:
-                    hoja_nombre = partes[0].strip("'")
-                    sheet_range_puro = partes[1]
-                else:
-                    hoja_nombre = None
-                    sheet_range_puro = sheet_range
-            else:
-                sheet_range_puro = sheet_range
-            if hoja_nombre:
-                sheet = spreadsheet.worksheet(hoja_nombre)
-            else:
-                sheet = spreadsheet.sheet1
-            rows = sheet.get(sheet_range_puro)
-            is_duplicate = check_if_pedido_exists(sheet, sheet_range_puro, pedido)
-            if is_duplicate:
-                await interaction.response.send_message(f'❌ El número de pedido **{pedido}** ya se encuentra registrado en la hoja de Reembolsos.', ephemeral=True)
-                state_manager.delete_user_state(user_id, "reembolsos")
-                return
             tz = pytz.timezone('America/Argentina/Buenos_Aires')
             now = datetime.now(tz)
             fecha_hora = now.strftime('%d-%m-%Y %H:%M:%S')
             agente_name = interaction.user.display_name
-            
-            # Construir diccionario de datos a guardar
-            datos = {
-                'Número de pedido': pedido,
-                'ZRE2 / ZRE4': zre,
-                'Tarjeta': tarjeta,
-                'Correo del cliente': correo,
-                'Motivo de reembolso': motivo_reembolso,
-                'Observación adicional': observacion,
-                'Agente (Front)': agente_name,
-                'Fecha de compra': fecha_hora,
-                'Agente (Back/TL)': 'Nadie',
-            }
-            # Armar la fila final según el header
-            header = rows[0] if rows else []
-            row_data = []
-            for col in header:
-                valor = datos.get(col, '')
-                row_data.append(valor)
-            sheet.append_row(row_data)
+
+            async def registrar():
+                client = get_sheets_client()
+                envio = EnvioCaso('ReembolsoModal', config.SPREADSHEET_ID_CASOS, getattr(config, 'SHEET_RANGE_REEMBOLSOS', 'REEMBOLSOS!A:L'))
+                if await envio.preparar(client, pedido):
+                    return 'duplicado'
+                # Construir diccionario de datos a guardar
+                datos = {
+                    'Número de pedido': pedido,
+                    'ZRE2 / ZRE4': zre,
+                    'Tarjeta': tarjeta,
+                    'Correo del cliente': correo,
+                    'Motivo de reembolso': motivo_reembolso,
+                    'Observación adicional': observacion,
+                    'Agente (Front)': agente_name,
+                    'Fecha de compra': fecha_hora,
+                    'Agente (Back/TL)': 'Nadie',
+                }
+                # Armar la fila final según el header
+                row_data = []
+                for col in envio.header:
+                    valor = datos.get(col, '')
+                    row_data.append(valor)
+                await envio.agregar(row_data)
+                return 'registrado'
+
+            # Responder antes de los 3 s de Discord: envio.agregar espera a que se escriba el lote
+            await interaction.response.defer(ephemeral=True)
+            # Un doble envío del mismo modal comparte una sola escritura
+            clave = clave_envio('reembolso', pending_data.get('solicitud_id') or user_id, pedido)
+            resultado, repetido = await ejecutar_una_vez(clave, registrar)
+            if resultado == 'duplicado':
+                await interaction.followup.send(f'❌ El número de pedido **{pedido}** ya se encuentra registrado en la hoja de Reembolsos.', ephemeral=True)
+                state_manager.delete_user_state(user_id, "reembolsos")
+                return
+            if repetido:
+                await interaction.followup.send(f'ℹ️ El reembolso del pedido **{pedido}** ya fue registrado con este envío.', ephemeral=True)
+                return
             confirmation_message = f"""✅ **Reembolso registrado exitosamente**\n\n📋 **Detalles del reembolso:**\n• **N° de Pedido:** {pedido}\n• **ZRE2/ZRE4:** {zre}\n• **Tarjeta:** {tarjeta}\n• **Correo:** {correo}\n• **Motivo:** {motivo_reembolso}\n• **Agente:** {agente_name}\n• **Fecha:** {fecha_hora}\n"""
             if observacion:
                 confirmation_message += f"• **Observación:** {observacion}\n"
             confirmation_message += "\nEl reembolso ha sido guardado en Google Sheets y será monitoreado automáticamente."
-            await interaction.response.send_message(confirmation_message, ephemeral=True)
+            await interaction.followup.send(confirmation_message, ephemeral=True)
             state_manager.delete_user_state(user_id, "reembolsos")
         except Exception as error:
             print('Error general durante el procesamiento del modal de reembolsos (on_submit):', error)
-            await interaction.response.send_message(f'❌ Hubo un error al procesar tu solicitud. Detalles: {error}', ephemeral=True)
+            if not interaction.response.is_done():
+                await interaction.response.send_message(f'❌ Hubo un error al procesar tu solicitud. Detalles: {error}', ephemeral=True)
+            else:
+                await interaction.followup.send(f'❌ Hubo un error al procesar tu solicitud. Detalles: {error}', ephemeral=True)
             state_manager.delete_user_state(str(interaction.user.id), "reembolsos")
         if not interaction.response.is_done():
             await interaction.response.send_message('✅ Tarea finalizada.', ephemeral=True)
@@ -1132,75 +995,73 @@ class CancelacionModal(discord.ui.Modal, title='Registrar Cancelación'):
             if not config.GOOGLE_CREDENTIALS_JSON or not config.SPREADSHEET_ID_CASOS or not config.GOOGLE_SHEET_RANGE_CANCELACIONES:
                 await interaction.response.send_message('❌ Error de configuración para Google Sheets.', ephemeral=True)
                 return
-            client = get_sheets_client()
-            spreadsheet = client.open_by_key(config.SPREADSHEET_ID_CASOS)
-            sheet_range = config.GOOGLE_SHEET_RANGE_CANCELACIONES
-            hoja_nombre = None
-            if '!' in sheet_range:
-                partes = sheet_range.split('!')
-                if len(partes) == 2:
-                    hoja_nombre = partes[0].strip("'")
-                    sheet_range_puro = partes[1]
-                else:
-                    hoja_nombre = None
-                    sheet_range_puro = sheet_range
-            else:
-                sheet_range_puro = sheet_range
-            if hoja_nombre:
-                sheet = spreadsheet.worksheet(hoja_nombre)
-            else:
-                sheet = spreadsheet.sheet1
-            rows = sheet.get(sheet_range_puro)
-            header = rows[0] if rows else []
-            def normaliza_columna(nombre):
-                return str(nombre).strip().replace(' ', '').replace('/', '').replace('-', '').lower()
-            # Buscar índices de columnas según la nueva estructura
-            idx_pedido = next((i for i, col in enumerate(header) if normaliza_columna(col) == normaliza_columna('Número de pedido')), None)
-            idx_agente = next((i for i, col in enumerate(header) if normaliza_columna(col) == normaliza_columna('Agente que carga')), None)
-            idx_fecha = next((i for i, col in enumerate(header) if normaliza_columna(col) == normaliza_columna('FECHA')), None)
-            idx_solicitud = next((i for i, col in enumerate(header) if normaliza_columna(col) == normaliza_columna('SOLICITUD')), None)
-            idx_motivo = next((i for i, col in enumerate(header) if normaliza_columna(col) == normaliza_columna('MOTIVO DE CANCELACIÓN')), None)
-            idx_frenado = next((i for i, col in enumerate(header) if normaliza_columna(col) == normaliza_columna('FRENADO')), None)
-            idx_reembolso = next((i for i, col in enumerate(header) if normaliza_columna(col) == normaliza_columna('REEMBOLSO')), None)
-            idx_codigo_sap = next((i for i, col in enumerate(header) if normaliza_columna(col) == normaliza_columna('CODIGO SAP (Gestión Back Office)')), None)
-            idx_agente_back = next((i for i, col in enumerate(header) if normaliza_columna(col) == normaliza_columna('AGENTE BACK')), None)
-            idx_observaciones = next((i for i, col in enumerate(header) if normaliza_columna(col) == normaliza_columna('OBSERVACIONES')), None)
-            idx_error = next((i for i, col in enumerate(header) if normaliza_columna(col) == normaliza_columna('ERROR')), None)
-            idx_error_envio = next((i for i, col in enumerate(header) if normaliza_columna(col) == normaliza_columna('ErrorEnvioCheck')), None)
-            
-            # Preparar la fila
-            row_data = [''] * len(header)
-            if idx_pedido is not None:
-                row_data[idx_pedido] = pedido
-            if idx_agente is not None:
-                row_data[idx_agente] = agente
-            if idx_fecha is not None:
-                row_data[idx_fecha] = fecha_hora
-            if idx_solicitud is not None:
-                row_data[idx_solicitud] = 'CANCELAR'
-            if idx_motivo is not None:
-                row_data[idx_motivo] = motivo
-            if idx_frenado is not None:
-                row_data[idx_frenado] = 'Pendiente'
-            if idx_reembolso is not None:
-                row_data[idx_reembolso] = 'Pendiente'
-            if idx_codigo_sap is not None:
-                row_data[idx_codigo_sap] = ''
-            if idx_agente_back is not None:
-                row_data[idx_agente_back] = 'Nadie'
-            if idx_observaciones is not None:
-                row_data[idx_observaciones] = observaciones
-            if idx_error is not None:
-                row_data[idx_error] = ''
-            if idx_error_envio is not None:
-                row_data[idx_error_envio] = ''
-            
-            sheet.append_row(row_data)
+
+            async def registrar():
+                client = get_sheets_client()
+                envio = EnvioCaso('CancelacionModal', config.SPREADSHEET_ID_CASOS, config.GOOGLE_SHEET_RANGE_CANCELACIONES)
+                await envio.preparar(client)
+                # Buscar índices de columnas según la nueva estructura
+                columnas = envio.columnas
+                idx_pedido = columnas.indice('pedido')
+                idx_agente = columnas.indice('Agente que carga')
+                idx_fecha = columnas.indice('FECHA')
+                idx_solicitud = columnas.indice('SOLICITUD')
+                idx_motivo = columnas.indice('MOTIVO DE CANCELACIÓN')
+                idx_frenado = columnas.indice('FRENADO')
+                idx_reembolso = columnas.indice('REEMBOLSO')
+                idx_codigo_sap = columnas.indice('CODIGO SAP (Gestión Back Office)')
+                idx_agente_back = columnas.indice('AGENTE BACK')
+                idx_observaciones = columnas.indice('OBSERVACIONES')
+                idx_error = columnas.indice('ERROR')
+                idx_error_envio = columnas.indice('ErrorEnvioCheck')
+
+                # Preparar la fila
+                row_data = envio.fila_vacia()
+                if idx_pedido is not None:
+                    row_data[idx_pedido] = pedido
+                if idx_agente is not None:
+                    row_data[idx_agente] = agente
+                if idx_fecha is not None:
+                    row_data[idx_fecha] = fecha_hora
+                if idx_solicitud is not None:
+                    row_data[idx_solicitud] = 'CANCELAR'
+                if idx_motivo is not None:
+                    row_data[idx_motivo] = motivo
+                if idx_frenado is not None:
+                    row_data[idx_frenado] = 'Pendiente'
+                if idx_reembolso is not None:
+                    row_data[idx_reembolso] = 'Pendiente'
+                if idx_codigo_sap is not None:
+                    row_data[idx_codigo_sap] = ''
+                if idx_agente_back is not None:
+                    row_data[idx_agente_back] = 'Nadie'
+                if idx_observaciones is not None:
+                    row_data[idx_observaciones] = observaciones
+                if idx_error is not None:
+                    row_data[idx_error] = ''
+                if idx_error_envio is not None:
+                    row_data[idx_error_envio] = ''
+
+                await envio.agregar(row_data)
+                return 'registrado'
+
+            # Responder antes de los 3 s de Discord: envio.agregar espera a que se escriba el lote
+            await interaction.response.defer(ephemeral=True)
+            # Un doble envío del mismo modal comparte una sola escritura
+            pending_data = state_manager.get_user_state(user_id, "cancelaciones") or {}
+            clave = clave_envio('cancelacion', pending_data.get('solicitud_id') or user_id, pedido)
+            _, repetido = await ejecutar_una_vez(clave, registrar)
+            if repetido:
+                await interaction.followup.send(f'ℹ️ La cancelación del pedido **{pedido}** ya fue registrada con este envío.', ephemeral=True)
+                return
             confirmation_message = f"✅ **Cancelación registrada exitosamente**\n\n📋 **Detalles:**\n• **N° de Pedido:** {pedido}\n• **Motivo:** {motivo}\n• **Agente:** {agente}\n• **Fecha:** {fecha_hora}\n\nLa cancelación ha sido guardada en Google Sheets."
-            await interaction.response.send_message(confirmation_message, ephemeral=True)
+            await interaction.followup.send(confirmation_message, ephemeral=True)
             state_manager.delete_user_state(user_id, "cancelaciones")
         except Exception as error:
-            await interaction.response.send_message(f'❌ Hubo un error al procesar tu cancelación. Detalles: {error}', ephemeral=True)
+            if not interaction.response.is_done():
+                await interaction.response.send_message(f'❌ Hubo un error al procesar tu cancelación. Detalles: {error}', ephemeral=True)
+            else:
+                await interaction.followup.send(f'❌ Hubo un error al procesar tu cancelación. Detalles: {error}', ephemeral=True)
             state_manager.delete_user_state(str(interaction.user.id), "cancelaciones")
 
 class ReclamosMLModal(discord.ui.Modal, title='Detalles del Reclamo ML'):
@@ -1264,35 +1125,19 @@ class ReclamosMLModal(discord.ui.Modal, title='Detalles del Reclamo ML'):
                 await interaction.response.send_message('❌ Error: La variable GOOGLE_SHEET_RANGE_RECLAMOS_ML no está configurada.', ephemeral=True)
                 state_manager.delete_user_state(user_id, "reclamos_ml")
                 return
+            # Responder antes de los 3 s de Discord: envio.agregar espera a que se escriba el lote
+            await interaction.response.defer(ephemeral=True)
             client = get_sheets_client()
-            spreadsheet = client.open_by_key(config.SPREADSHEET_ID_CASOS)
-            sheet_range = getattr(config, 'GOOGLE_SHEET_RANGE_RECLAMOS_ML', 'SOLICITUDES CON RECLAMO ABIERTO 2025 ML!A:L')
-            hoja_nombre = None
-            if '!' in sheet_range:
-                partes = sheet_range.split('!')
-                if len(partes) == 2:
-                    hoja_nombre = partes[0].strip("'")
-                    sheet_range_puro = partes[1]
-                else:
-                    hoja_nombre = None
-                    sheet_range_puro = sheet_range
-            else:
-                sheet_range_puro = sheet_range
-            if hoja_nombre:
-                sheet = spreadsheet.worksheet(hoja_nombre)
-            else:
-                sheet = spreadsheet.sheet1
-            rows = sheet.get(sheet_range_puro)
-            is_duplicate = check_if_pedido_exists(sheet, sheet_range_puro, pedido)
+            envio = EnvioCaso('ReclamosMLModal', config.SPREADSHEET_ID_CASOS, getattr(config, 'GOOGLE_SHEET_RANGE_RECLAMOS_ML', 'SOLICITUDES CON RECLAMO ABIERTO 2025 ML!A:L'))
+            is_duplicate = await envio.preparar(client, pedido)
             if is_duplicate:
-                await interaction.response.send_message(f'❌ El número de pedido **{pedido}** ya se encuentra registrado en la hoja de Reclamos ML.', ephemeral=True)
+                await interaction.followup.send(f'❌ El número de pedido **{pedido}** ya se encuentra registrado en la hoja de Reclamos ML.', ephemeral=True)
                 state_manager.delete_user_state(user_id, "reclamos_ml")
                 return
             tz = pytz.timezone('America/Argentina/Buenos_Aires')
             now = datetime.now(tz)
             fecha_hora = now.strftime('%d-%m-%Y %H:%M:%S')
             # Construir la fila según el header
-            header = rows[0] if rows else []
             row_data = [
                 pedido,           # A - Número de Pedido
                 fecha_hora,       # B - Fecha
@@ -1304,20 +1149,20 @@ class ReclamosMLModal(discord.ui.Modal, title='Detalles del Reclamo ML'):
                 observaciones     # H - Observaciones
             ]
             # Ajustar la cantidad de columnas al header
-            if len(row_data) < len(header):
-                row_data += [''] * (len(header) - len(row_data))
-            elif len(row_data) > len(header):
-                row_data = row_data[:len(header)]
-            sheet.append_row(row_data)
+            row_data = envio.ajustar_al_encabezado(row_data)
+            await envio.agregar(row_data)
             confirmation_message = f"""✅ **Reclamo ML registrado exitosamente**\n\n📋 **Detalles del reclamo:**\n• **N° de Pedido:** {pedido}\n• **Tipo de Reclamo:** {tipo_reclamo}\n• **Fecha:** {fecha_hora}\n• **Dirección/Datos:** {direccion_datos}\n"""
             if observaciones:
                 confirmation_message += f"• **Observaciones:** {observaciones}\n"
             confirmation_message += "\nEl reclamo ha sido guardado en Google Sheets y será monitoreado automáticamente."
-            await interaction.response.send_message(confirmation_message, ephemeral=True)
+            await interaction.followup.send(confirmation_message, ephemeral=True)
             state_manager.delete_user_state(user_id, "reclamos_ml")
         except Exception as error:
             print('Error general durante el procesamiento del modal de reclamos ML (on_submit):', error)
-            await interaction.response.send_message(f'❌ Hubo un error al procesar tu reclamo. Detalles: {error}', ephemeral=True)
+            if not interaction.response.is_done():
+                await interaction.response.send_message(f'❌ Hubo un error al procesar tu reclamo. Detalles: {error}', ephemeral=True)
+            else:
+                await interaction.followup.send(f'❌ Hubo un error al procesar tu reclamo. Detalles: {error}', ephemeral=True)
             state_manager.delete_user_state(str(interaction.user.id), "reclamos_ml")
         if not interaction.response.is_done():
             await interaction.response.send_message('✅ Tarea finalizada.', ephemeral=True)
@@ -1393,26 +1238,12 @@ class PiezaFaltanteModal(discord.ui.Modal, title='Registrar Pieza Faltante'):
             if not config.GOOGLE_SHEET_RANGE_PIEZA_FALTANTE:
                 await interaction.response.send_message('❌ Error: La variable GOOGLE_SHEET_RANGE_PIEZA_FALTANTE no está configurada.', ephemeral=True)
                 return
+            # Responder antes de los 3 s de Discord: envio.agregar espera a que se escriba el lote
+            await interaction.response.defer(ephemeral=True)
             client = get_sheets_client()
-            spreadsheet = client.open_by_key(config.SPREADSHEET_ID_CASOS)
-            sheet_range = config.GOOGLE_SHEET_RANGE_PIEZA_FALTANTE
-            hoja_nombre = None
-            if '!' in sheet_range:
-                partes = sheet_range.split('!')
-                if len(partes) == 2:
-                    hoja_nombre = partes[0].strip("'")
-                    sheet_range_puro = partes[1]
-                else:
-                    hoja_nombre = None
-                    sheet_range_puro = sheet_range
-            else:
-                sheet_range_puro = sheet_range
-            if hoja_nombre:
-                sheet = spreadsheet.worksheet(hoja_nombre)
-            else:
-                sheet = spreadsheet.sheet1
-            rows = sheet.get(sheet_range_puro)
+            envio = EnvioCaso('PiezaFaltanteModal', config.SPREADSHEET_ID_CASOS, config.GOOGLE_SHEET_RANGE_PIEZA_FALTANTE)
             # No se verifica duplicado porque puede haber varios casos por pedido
+            await envio.preparar(client)
             tz = pytz.timezone('America/Argentina/Buenos_Aires')
             now = datetime.now(tz)
             fecha_hora = now.strftime('%d-%m-%Y %H:%M:%S')
@@ -1431,20 +1262,19 @@ class PiezaFaltanteModal(discord.ui.Modal, title='Registrar Pieza Faltante'):
             ]
             
             # Ajustar la cantidad de columnas al header (igual que CasoModal)
-            header = rows[0] if rows else []
-            if len(row_data) < len(header):
-                row_data.extend([''] * (len(header) - len(row_data)))
-            elif len(row_data) > len(header):
-                row_data = row_data[:len(header)]
+            row_data = envio.ajustar_al_encabezado(row_data)
             
-            sheet.append_row(row_data)
+            await envio.agregar(row_data)
             confirmation_message = f"""✅ **Pieza faltante registrada exitosamente**\n\n📋 **Detalles:**\n• **N° de Pedido:** {pedido}\n• **ID Wise:** {id_wise}\n• **Pieza faltante:** {pieza}\n• **SKU:** {sku}\n• **Fecha:** {fecha_hora}\n"""
             if observaciones:
                 confirmation_message += f"• **Observaciones:** {observaciones}\n"
             confirmation_message += "\nEl caso ha sido guardado en Google Sheets y será monitoreado automáticamente."
-            await interaction.response.send_message(confirmation_message, ephemeral=True)
+            await interaction.followup.send(confirmation_message, ephemeral=True)
         except Exception as error:
-            await interaction.response.send_message(f'❌ Hubo un error al procesar tu caso. Detalles: {error}', ephemeral=True)
+            if not interaction.response.is_done():
+                await interaction.response.send_message(f'❌ Hubo un error al procesar tu caso. Detalles: {error}', ephemeral=True)
+            else:
+                await interaction.followup.send(f'❌ Hubo un error al procesar tu caso. Detalles: {error}', ephemeral=True)
         if not interaction.response.is_done():
             await interaction.response.send_message('✅ Tarea finalizada.', ephemeral=True)
 
@@ -1555,73 +1385,41 @@ class ICBCModal(discord.ui.Modal, title='Registrar Solicitud ICBC'):
                 await interaction.response.send_message('❌ Error: El ID de la hoja de ICBC no está configurado.', ephemeral=True)
                 return
                         
+            # Responder antes de los 3 s de Discord: envio.agregar espera a que se escriba el lote
+            await interaction.response.defer(ephemeral=True)
             client = get_sheets_client()
-            spreadsheet = client.open_by_key(config.SPREADSHEET_ID_ICBC)
-            sheet_range = getattr(config, 'GOOGLE_SHEET_RANGE_ICBC', 'ICBC!A:F')
-            hoja_nombre = None
-            
-            if '!' in sheet_range:
-                partes = sheet_range.split('!')
-                if len(partes) == 2:
-                    hoja_nombre = partes[0].strip("'")
-                    sheet_range_puro = partes[1]
-                else:
-                    hoja_nombre = None
-                    sheet_range_puro = sheet_range
-            else:
-                sheet_range_puro = sheet_range
-            
-            if hoja_nombre:
-                sheet = spreadsheet.worksheet(hoja_nombre)
-            else:
-                sheet = spreadsheet.sheet1
-            
-            rows = sheet.get(sheet_range_puro)
+            envio = EnvioCaso('ICBCModal', config.SPREADSHEET_ID_ICBC, getattr(config, 'GOOGLE_SHEET_RANGE_ICBC', 'ICBC!A:F'))
             
             # Verificar si el pedido ya existe
-            is_duplicate = check_if_pedido_exists(sheet, sheet_range_puro, numero_pedido)
+            is_duplicate = await envio.preparar(client, numero_pedido)
             if is_duplicate:
-                await interaction.response.send_message(f'❌ El número de pedido **{numero_pedido}** ya se encuentra registrado en la hoja de ICBC.', ephemeral=True)
+                await interaction.followup.send(f'❌ El número de pedido **{numero_pedido}** ya se encuentra registrado en la hoja de ICBC.', ephemeral=True)
                 return
             
             tz = pytz.timezone('America/Argentina/Buenos_Aires')
             now = datetime.now(tz)
             fecha_hora = now.strftime('%d-%m-%Y %H:%M:%S')
             
-            header = rows[0] if rows else []
-            
-            # Normalizar nombres de columnas
-            def normaliza_columna(nombre):
-                if not nombre:
-                    return ''
-                return str(nombre).strip().lower().replace(' ', '_').replace('á', 'a').replace('é', 'e').replace('í', 'i').replace('ó', 'o').replace('ú', 'u')
-            
-            # Crear diccionario de columnas normalizadas
-            columnas = {normaliza_columna(col): i for i, col in enumerate(header)}
+            # Resolver columnas por nombre (con o sin acentos)
+            columnas = envio.columnas
             
             # Obtener el tipo de ICBC del estado del usuario
             user_state = state_manager.get_user_state(user_id, "icbc")
             tipo_icbc = user_state.get('tipoICBC', 'Sin especificar') if user_state else 'Sin especificar'
             
             # Preparar datos para insertar
-            nueva_fila = [''] * len(header)
+            nueva_fila = envio.fila_vacia()
             
             # Mapear datos a las columnas correctas por nombre
-            if 'numero_de_hilo' in columnas:
-                nueva_fila[columnas['numero_de_hilo']] = numero_hilo
-            if 'numero_de_pedido' in columnas:
-                nueva_fila[columnas['numero_de_pedido']] = numero_pedido
-            if 'tipo' in columnas:
-                nueva_fila[columnas['tipo']] = tipo_icbc
-            if 'observaciones' in columnas:
-                nueva_fila[columnas['observaciones']] = observaciones
-            if 'fecha_y_hora' in columnas:
-                nueva_fila[columnas['fecha_y_hora']] = fecha_hora
-            if 'agente' in columnas:
-                nueva_fila[columnas['agente']] = str(interaction.user)
+            for nombre, valor in (('numero_hilo', numero_hilo), ('pedido', numero_pedido), ('Tipo', tipo_icbc),
+                                  ('Observaciones', observaciones), ('fecha_y_hora', fecha_hora),
+                                  ('Agente', str(interaction.user))):
+                idx = columnas.indice(nombre)
+                if idx is not None:
+                    nueva_fila[idx] = valor
             
             # Insertar la nueva fila
-            sheet.append_row(nueva_fila)
+            await envio.agregar(nueva_fila)
             
             # Limpiar el estado del usuario
             state_manager.delete_user_state(user_id, "icbc")
@@ -1645,13 +1443,16 @@ class ICBCModal(discord.ui.Modal, title='Registrar Solicitud ICBC'):
             
             embed.set_footer(text=f'Solicitud ID: {solicitud_id}')
             
-            await interaction.response.send_message(embed=embed, ephemeral=True)
+            await interaction.followup.send(embed=embed, ephemeral=True)
             
         except Exception as e:
             print(f'Error en ICBCModal: {e}')
             import traceback
             traceback.print_exc()
-            await interaction.response.send_message(f'❌ Error al registrar la solicitud ICBC: {str(e)}', ephemeral=True)
+            if not interaction.response.is_done():
+                await interaction.response.send_message(f'❌ Error al registrar la solicitud ICBC: {str(e)}', ephemeral=True)
+            else:
+                await interaction.followup.send(f'❌ Error al registrar la solicitud ICBC: {str(e)}', ephemeral=True)
 
 class NotaCreditoModal(discord.ui.Modal, title='Registrar Nota de Crédito'):
     def __init__(self):
@@ -1732,28 +1533,8 @@ class NotaCreditoModal(discord.ui.Modal, title='Registrar Nota de Crédito'):
                 return
                 
             client = get_sheets_client()
-            spreadsheet = client.open_by_key(config.SPREADSHEET_ID_FAC_A)
-            sheet_range = getattr(config, 'SHEET_RANGE_NC', 'NC!A:G')
-            hoja_nombre = None
-            
-            if '!' in sheet_range:
-                partes = sheet_range.split('!')
-                if len(partes) == 2:
-                    hoja_nombre = partes[0].strip("'")
-                    sheet_range_puro = partes[1]
-                else:
-                    hoja_nombre = None
-                    sheet_range_puro = sheet_range
-            else:
-                sheet_range_puro = sheet_range
-                
-            if hoja_nombre:
-                sheet = spreadsheet.worksheet(hoja_nombre)
-            else:
-                sheet = spreadsheet.sheet1
-                
-            rows = sheet.get(sheet_range_puro)
-            is_duplicate = check_if_pedido_exists(sheet, sheet_range_puro, pedido)
+            envio = EnvioCaso('NotaCreditoModal', config.SPREADSHEET_ID_FAC_A, getattr(config, 'SHEET_RANGE_NC', 'NC!A:G'))
+            is_duplicate = await envio.preparar(client, pedido)
             
             if is_duplicate:
                 await interaction.followup.send(f'❌ El número de pedido **{pedido}** ya se encuentra registrado en la hoja de Nota de Crédito.', ephemeral=True)
@@ -1762,25 +1543,19 @@ class NotaCreditoModal(discord.ui.Modal, title='Registrar Nota de Crédito'):
             tz = pytz.timezone('America/Argentina/Buenos_Aires')
             now = datetime.now(tz)
             fecha_hora = now.strftime('%d-%m-%Y %H:%M:%S')
-            header = rows[0] if rows else []
-            
-            # Normalizar nombres de columnas
-            def normaliza_columna(nombre):
-                if not nombre:
-                    return ''
-                return str(nombre).strip().replace('\u200b', '').replace('\ufeff', '').lower()
             
             # Buscar índices de columnas por nombre
-            pedido_col = next((i for i, h in enumerate(header) if normaliza_columna(h) == 'número de pedido'), 0)
-            asesor_col = next((i for i, h in enumerate(header) if normaliza_columna(h) == 'asesor que carga'), 1)
-            fecha_col = next((i for i, h in enumerate(header) if normaliza_columna(h) == 'fecha/hora'), 2)
-            caso_col = next((i for i, h in enumerate(header) if normaliza_columna(h) == 'caso'), 3)
-            email_col = next((i for i, h in enumerate(header) if normaliza_columna(h) == 'email'), 4)
-            obs_col = next((i for i, h in enumerate(header) if normaliza_columna(h) == 'observaciones'), 5)
-            check_col = next((i for i, h in enumerate(header) if normaliza_columna(h) == 'check bo carga'), 6)
+            columnas = envio.columnas
+            pedido_col = columnas.indice('pedido', 0)
+            asesor_col = columnas.indice('Asesor que carga', 1)
+            fecha_col = columnas.indice('Fecha/Hora', 2)
+            caso_col = columnas.indice('Caso', 3)
+            email_col = columnas.indice('Email', 4)
+            obs_col = columnas.indice('Observaciones', 5)
+            check_col = columnas.indice('Check BO Carga', 6)
             
             # Crear fila con datos en las posiciones correctas
-            row_data = [''] * len(header)
+            row_data = envio.fila_vacia()
             row_data[pedido_col] = pedido
             row_data[asesor_col] = str(interaction.user)
             row_data[fecha_col] = fecha_hora
@@ -1789,7 +1564,7 @@ class NotaCreditoModal(discord.ui.Modal, title='Registrar Nota de Crédito'):
             row_data[obs_col] = observaciones
             row_data[check_col] = ''  # Se llenará cuando se confirme
             
-            sheet.append_row(row_data)
+            await envio.agregar(row_data)
             
             # Crear embed de confirmación
             embed = discord.Embed(
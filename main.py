@@ -4,7 +4,10 @@ import asyncio
 import config
 import logging
 from utils.google_client_manager import initialize_google_clients, get_sheets_client, get_drive_client
-from utils.andreani import get_andreani_tracking
+from utils.google_async import ejecutar_google, abrir_spreadsheet
+from utils.quota_governor import prioridad, FONDO, resumen_metricas
+from utils.error_scanner import escanear_errores
+from utils.andreani import get_andreani_tracking, cerrar_sesion as cerrar_sesion_andreani
 from utils.discord_logger import setup_discord_logging, log_exception
 
 # Configuración del bot con intents
@@ -54,16 +57,30 @@ async def on_ready():
     # Cargar el manual en memoria
     if config.MANUAL_DRIVE_FILE_ID and drive_instance:
         try:
-            from utils.manual_processor import load_and_cache_manual
-            await load_and_cache_manual(drive_instance, config.MANUAL_DRIVE_FILE_ID)
+            from utils.manual_processor import load_and_cache_manual, cargar_snapshot
+            # La copia local se valida contra Drive en el primer ciclo de tasks.manual_refresher
+            if not cargar_snapshot(config.MANUAL_DRIVE_FILE_ID):
+                await load_and_cache_manual(drive_instance, config.MANUAL_DRIVE_FILE_ID)
             print("Manual cargado en memoria.")
         except Exception as error:
             print(f"Error al cargar el manual: {error}")
     else:
         print("No se cargará el manual porque falta MANUAL_DRIVE_FILE_ID o la instancia de Drive no está disponible.")
 
+    # Precargar en segundo plano la caché de las pestañas de casos
+    if sheets_instance:
+        from utils.google_sheets import precargar_cache_hojas
+        from utils.append_queue import reanudar_pendientes
+        from utils.tareas_mirror import reanudar_escrituras
+        with prioridad(FONDO):
+            asyncio.create_task(ejecutar_google(precargar_cache_hojas, sheets_instance, timeout=300))
+        # Reencolar las filas y escrituras del panel que quedaron sin escribir antes del último reinicio
+        # (solo actúan en el primer on_ready; tras una reconexión ya están en sus colas)
+        asyncio.create_task(ejecutar_google(reanudar_pendientes, sheets_instance, timeout=120))
+        asyncio.create_task(ejecutar_google(reanudar_escrituras, sheets_instance, timeout=120))
+
     print("Conectado a Discord.")
-    
+
     # Iniciar la verificación periódica de errores en la hoja
     if (config.SPREADSHEET_ID_BUSCAR_CASO and config.SHEET_RANGE_CASOS_READ and 
         config.TARGET_CHANNEL_ID_CASOS and config.GUILD_ID):
@@ -101,60 +118,27 @@ async def check_errors():
         print("⚠️ Verificación de errores omitida: bot no está listo")
         return
     
-    try:
-        if not config.SPREADSHEET_ID_CASOS:
-            print("Error: SPREADSHEET_ID_CASOS no está configurado")
-            return
-        if not config.GUILD_ID:
-            print("Error: GUILD_ID no está configurado")
-            return
-        
-        print(f"🔍 Iniciando verificación de errores en {len(config.MAPA_RANGOS_ERRORES)} rangos...")
-        spreadsheet = sheets_instance.open_by_key(config.SPREADSHEET_ID_CASOS)
+    # El escaneo cede la cuota de Google a las acciones de los usuarios
+    with prioridad(FONDO):
+        try:
+            if not config.SPREADSHEET_ID_CASOS:
+                print("Error: SPREADSHEET_ID_CASOS no está configurado")
+                return
+            if not config.GUILD_ID:
+                print("Error: GUILD_ID no está configurado")
+                return
         
-        errores_encontrados = 0
-        hojas_verificadas = 0
+            print(f"🔍 Iniciando verificación de errores en {len(config.MAPA_RANGOS_ERRORES)} rangos...")
+            spreadsheet = await abrir_spreadsheet(sheets_instance, config.SPREADSHEET_ID_CASOS)
         
-        for sheet_range, channel_id in config.MAPA_RANGOS_ERRORES.items():
-            if not sheet_range or not channel_id:
-                continue
-                
-            hoja_nombre = None
-            sheet_range_puro = sheet_range
-            if '!' in sheet_range:
-                partes = sheet_range.split('!')
-                if len(partes) == 2:
-                    hoja_nombre = partes[0].strip("'")
-                    sheet_range_puro = partes[1]
-            
-            try:
-                if hoja_nombre:
-                    sheet = spreadsheet.worksheet(hoja_nombre)
-                else:
-                    sheet = spreadsheet.sheet1
-                    
-                hojas_verificadas += 1
-                print(f"📊 Verificando hoja: {hoja_nombre or '[default]'} (Rango: {sheet_range})")
-                
-                from utils.google_sheets import check_sheet_for_errors
-                await check_sheet_for_errors(
-                    bot,
-                    sheet,
-                    sheet_range,
-                    int(channel_id),
-                    int(config.GUILD_ID)
-                )
-                
-            except Exception as sheet_error:
-                print(f"❌ Error al verificar hoja {hoja_nombre or '[default]'}: {sheet_error}")
-                errores_encontrados += 1
-                continue
+            resumen = await escanear_errores(bot, spreadsheet, config.MAPA_RANGOS_ERRORES, int(config.GUILD_ID))
         
-        print(f"✅ Verificación completada: {hojas_verificadas} hojas verificadas, {errores_encontrados} errores")
+            print(f"✅ Verificación completada: {resumen['rangos']} hojas verificadas, {resumen['notificaciones']} notificaciones, {resumen['errores']} errores")
+            print(f"Uso de cuota de Google:\n{resumen_metricas()}")
         
-    except Exception as error:
-        print(f"❌ Error crítico en la verificación periódica: {error}")
-        # No enviar este error a Discord para evitar spam
+        except Exception as error:
+            print(f"❌ Error crítico en la verificación periódica: {error}")
+            # No enviar este error a Discord para evitar spam
 
 @check_errors.before_loop
 async def before_check_errors():
@@ -240,7 +224,9 @@ async def load_extensions():
         'events.links_panel',
         'interactions.modals',
         'interactions.select_menus',
-        'tasks.panel'
+        'tasks.panel',
+        'tasks.tracking_watcher',
+        'tasks.manual_refresher'
     ]
     
     for extension in extensions:
@@ -294,6 +280,10 @@ async def main():
         await bot.start(config.TOKEN)
     finally:
         print("Paso 4: Apagando bot de forma inmediata...")
+        try:
+            await cerrar_sesion_andreani()
+        except Exception as e:
+            print(f"Error al cerrar la sesión HTTP de Andreani: {e}")
         # Limpiar sistema de logging si existe
         try:
             if 'console_redirector' in globals():
@@ -0,0 +1,47 @@
+# Este módulo requiere 'discord.py' instalado en el entorno.
+"""
+Refresco del manual sin reiniciar el bot.
+Cada MANUAL_REFRESH_MIN minutos se consulta solo la metadata del archivo en Drive
+(modifiedTime, md5Checksum); si cambió, utils/manual_processor.py lo descarga, lo vuelve a
+indexar y reemplaza la versión en memoria de una sola vez. El primer ciclo corre apenas el
+bot está listo, así una copia local cargada al arrancar se valida enseguida.
+"""
+from discord.ext import commands, tasks
+import config
+from utils.google_client_manager import get_drive_client
+from utils.manual_processor import refrescar_manual
+from utils.quota_governor import prioridad, FONDO
+
+class ManualRefresher(commands.Cog):
+    def __init__(self, bot):
+        self.bot = bot
+        if config.MANUAL_DRIVE_FILE_ID and config.MANUAL_REFRESH_MIN > 0:
+            self.refrescar.change_interval(minutes=config.MANUAL_REFRESH_MIN)
+            self.refrescar.start()
+        else:
+            print("Refresco del manual desactivado: falta MANUAL_DRIVE_FILE_ID o MANUAL_REFRESH_MIN es 0.")
+
+    def cog_unload(self):
+        self.refrescar.cancel()
+
+    @tasks.loop(minutes=10)
+    async def refrescar(self):
+        # Tarea de fondo: cede la cuota de Google a las acciones de los usuarios
+        with prioridad(FONDO):
+            try:
+                drive = getattr(self.bot, 'drive_instance', None) or get_drive_client()
+                if not drive:
+                    return
+                if await refrescar_manual(drive, config.MANUAL_DRIVE_FILE_ID):
+                    print("Manual actualizado desde Drive.")
+            except Exception as error:
+                # Se mantiene la versión cargada hasta el próximo ciclo
+                print(f"❌ Error al refrescar el manual: {error}")
+
+    @refrescar.before_loop
+    async def antes_de_refrescar(self):
+        """Esperar hasta que el bot esté listo antes de iniciar la tarea"""
+        await self.bot.wait_until_ready()
+
+async def setup(bot):
+    await bot.add_cog(ManualRefresher(bot))
@@ -6,16 +6,20 @@ import os
 import config
 import json
 from pathlib import Path
+from utils import persistence
 from datetime import datetime
-from utils.google_sheets import (
-    COLUMNAS_TAREAS_ACTIVAS, COLUMNAS_HISTORIAL, registrar_tarea_activa, agregar_evento_historial,
-    obtener_tarea_por_id, pausar_tarea_por_id, reanudar_tarea_por_id, obtener_tarea_activa_por_usuario
+from utils.google_sheets import COLUMNAS_TAREAS_ACTIVAS, COLUMNAS_HISTORIAL
+from utils.tareas_mirror import (
+    registrar_tarea_activa, agregar_evento_historial,
+    obtener_tarea_por_id, pausar_tarea_por_id, reanudar_tarea_por_id, obtener_tarea_activa_por_usuario,
+    invalidar_espejo
 )
 import asyncio
 import pytz
 import re
 import time
 from utils.google_client_manager import get_sheets_client, get_drive_client
+from utils.google_async import ejecutar_google, abrir_spreadsheet, obtener_worksheet, listar_worksheets
 
 # Obtener el ID del canal desde la variable de entorno
 target_channel_id = int(getattr(config, 'TARGET_CHANNEL_ID_TAREAS', '0') or '0')
@@ -23,35 +27,35 @@ guild_id = int(getattr(config, 'GUILD_ID', 0))
 print(f'[DEBUG] GUILD_ID usado para comandos slash: {guild_id}')
 print(f'[DEBUG] TARGET_CHANNEL_ID_TAREAS: {target_channel_id}')
 
-TAREAS_JSON_PATH = Path('data/tareas_activas.json')
-print(f'[DEBUG] Ruta absoluta del JSON de tareas activas: {TAREAS_JSON_PATH.resolve()}')
-TAREAS_JSON_PATH.parent.mkdir(parents=True, exist_ok=True)
-
+# Las tareas activas se guardan localmente en SQLite (utils/persistence.py)
 def cargar_tareas_activas():
-    if not TAREAS_JSON_PATH.exists():
-        print('[DEBUG] El archivo JSON no existe, creando vacío.')
-        try:
-            with open(TAREAS_JSON_PATH, 'w', encoding='utf-8') as f:
-                json.dump({}, f)
-        except Exception as e:
-            print(f'[ERROR] No se pudo crear el JSON: {e}')
-        return {}
-    with open(TAREAS_JSON_PATH, 'r', encoding='utf-8') as f:
-        try:
-            return json.load(f)
-        except Exception as e:
-            print(f'[ERROR] No se pudo leer el JSON: {e}')
-            return {}
+    return {t.user_id: t.datos for t in persistence.listar_tareas()}
 
 def guardar_tarea_activa(user_id, data):
-    tareas = cargar_tareas_activas()
-    tareas[user_id] = data
     try:
-        with open(TAREAS_JSON_PATH, 'w', encoding='utf-8') as f:
-            json.dump(tareas, f, ensure_ascii=False, indent=2)
+        persistence.guardar_tarea(persistence.TareaActiva(
+            user_id=str(user_id),
+            tarea_id=data.get('tarea_id'),
+            estado=data.get('estado'),
+            pausada_desde=data.get('pausada_desde'),
+            datos=data
+        ))
         print(f'[DEBUG] Tarea guardada para usuario {user_id}')
     except Exception as e:
-        print(f'[ERROR] No se pudo guardar el JSON: {e}')
+        print(f'[ERROR] No se pudo guardar la tarea activa: {e}')
+
+def actualizar_estado_tarea_local(user_id, estado):
+    """Refleja en la copia local una pausa o reanudación (pausada_desde permite consultar pausas largas)."""
+    try:
+        tarea = persistence.obtener_tarea(str(user_id))
+        if tarea is None:
+            return
+        tarea.estado = estado
+        tarea.pausada_desde = time.time() if estado == 'Pausada' else None
+        tarea.datos.update({'estado': estado, 'pausada_desde': tarea.pausada_desde})
+        persistence.guardar_tarea(tarea)
+    except Exception as e:
+        print(f'[ERROR] No se pudo actualizar la tarea activa local: {e}')
 
 def guilds_decorator():
     if guild_id:
@@ -161,11 +165,11 @@ class TaskPanel(commands.Cog):
             
             # Abrir spreadsheet
             await interaction.followup.send('🔄 Abriendo spreadsheet...', ephemeral=True)
-            spreadsheet = client.open_by_key(config.GOOGLE_SHEET_ID_TAREAS)
+            spreadsheet = await abrir_spreadsheet(client, config.GOOGLE_SHEET_ID_TAREAS)
             
             # Obtener lista de hojas existentes
             await interaction.followup.send('🔄 Verificando hojas existentes...', ephemeral=True)
-            hojas_existentes = [worksheet.title for worksheet in spreadsheet.worksheets()]
+            hojas_existentes = [worksheet.title for worksheet in await listar_worksheets(spreadsheet)]
             
             await interaction.followup.send(f'📋 **Hojas existentes:**\n{", ".join(hojas_existentes)}', ephemeral=True)
             
@@ -179,13 +183,16 @@ class TaskPanel(commands.Cog):
                 # Crear hojas faltantes
                 for hoja in hojas_faltantes:
                     await interaction.followup.send(f'🔄 Creando hoja "{hoja}"...', ephemeral=True)
-                    nueva_hoja = spreadsheet.add_worksheet(title=hoja, rows=1000, cols=20)
+                    nueva_hoja = await ejecutar_google(spreadsheet.add_worksheet, title=hoja, rows=1000, cols=20, timeout=None)
                     
                     # Agregar headers según el tipo de hoja
                     if hoja == 'Tareas Activas':
-                        nueva_hoja.append_row(COLUMNAS_TAREAS_ACTIVAS)
+                        await ejecutar_google(nueva_hoja.append_row, COLUMNAS_TAREAS_ACTIVAS, timeout=None)
                     elif hoja == 'Historial':
-                        nueva_hoja.append_row(COLUMNAS_HISTORIAL)
+                        await ejecutar_google(nueva_hoja.append_row, COLUMNAS_HISTORIAL, timeout=None)
+                
+                # Las hojas nuevas se releen en la próxima consulta del panel
+                invalidar_espejo()
                 
                 await interaction.followup.send('✅ **¡Hojas creadas exitosamente!**\n\nAhora puedes usar el panel de tareas.', ephemeral=True)
             else:
@@ -273,10 +280,10 @@ class TaskStartButton(discord.ui.Button):
         try:
             # --- Google Sheets ---
             client = get_sheets_client()
-            spreadsheet = client.open_by_key(config.GOOGLE_SHEET_ID_TAREAS)
+            spreadsheet = await abrir_spreadsheet(client, config.GOOGLE_SHEET_ID_TAREAS)
             
             # Verificar qué hojas existen
-            hojas_existentes = [worksheet.title for worksheet in spreadsheet.worksheets()]
+            hojas_existentes = [worksheet.title for worksheet in await listar_worksheets(spreadsheet)]
             
             # Verificar si existen las hojas requeridas
             if 'Tareas Activas' not in hojas_existentes:
@@ -286,8 +293,8 @@ class TaskStartButton(discord.ui.Button):
                 await interaction.followup.send(f'❌ **Error:** No existe la hoja "Historial" en el spreadsheet', ephemeral=True)
                 return
             
-            sheet_activas = spreadsheet.worksheet('Tareas Activas')
-            sheet_historial = spreadsheet.worksheet('Historial')
+            sheet_activas = await obtener_worksheet(spreadsheet, 'Tareas Activas')
+            sheet_historial = await obtener_worksheet(spreadsheet, 'Historial')
             
             usuario = str(interaction.user)
             tarea = self.tarea
@@ -297,10 +304,18 @@ class TaskStartButton(discord.ui.Button):
             inicio = now.strftime('%d/%m/%Y %H:%M:%S')
             
             # Registrar tarea activa
-            tarea_id = registrar_tarea_activa(sheet_activas, user_id, usuario, tarea, observaciones, inicio)
+            tarea_id = await ejecutar_google(registrar_tarea_activa, sheet_activas, user_id, usuario, tarea, observaciones, inicio)
+            guardar_tarea_activa(user_id, {
+                'tarea_id': tarea_id,
+                'tarea': tarea,
+                'observaciones': observaciones,
+                'inicio': inicio,
+                'estado': 'En proceso'
+            })
             
             # Agregar evento al historial
-            agregar_evento_historial(
+            await ejecutar_google(
+                agregar_evento_historial,
                 sheet_historial,
                 user_id,
                 tarea_id,
@@ -329,6 +344,9 @@ class TaskStartButton(discord.ui.Button):
                         'type': 'tarea',
                         'timestamp': time.time()
                     }, "tarea")
+                    persistence.guardar_vinculo(persistence.VinculoMensaje(
+                        str(user_id), 'tarea', str(msg.id), str(canal_registro.id), str(tarea_id)
+                    ))
             
             # Enviar mensaje de confirmación ephemeral
             await interaction.followup.send(f'✅ **¡Tarea "{tarea}" iniciada y registrada exitosamente!**', ephemeral=True)
@@ -359,9 +377,9 @@ class TaskObservacionesModal(discord.ui.Modal, title='Registrar Observaciones'):
         try:
             # --- Google Sheets ---
             client = get_sheets_client()
-            spreadsheet = client.open_by_key(config.GOOGLE_SHEET_ID_TAREAS)
-            sheet_activas = spreadsheet.worksheet('Tareas Activas')
-            sheet_historial = spreadsheet.worksheet('Historial')
+            spreadsheet = await abrir_spreadsheet(client, config.GOOGLE_SHEET_ID_TAREAS)
+            sheet_activas = await obtener_worksheet(spreadsheet, 'Tareas Activas')
+            sheet_historial = await obtener_worksheet(spreadsheet, 'Historial')
             
             usuario = str(interaction.user)
             tarea = 'Otra'
@@ -370,9 +388,17 @@ class TaskObservacionesModal(discord.ui.Modal, title='Registrar Observaciones'):
             now = datetime.now(tz)
             inicio = now.strftime('%d/%m/%Y %H:%M:%S')
             
-            tarea_id = registrar_tarea_activa(sheet_activas, user_id, usuario, tarea, obs, inicio)
+            tarea_id = await ejecutar_google(registrar_tarea_activa, sheet_activas, user_id, usuario, tarea, obs, inicio)
+            guardar_tarea_activa(user_id, {
+                'tarea_id': tarea_id,
+                'tarea': tarea,
+                'observaciones': obs,
+                'inicio': inicio,
+                'estado': 'En proceso'
+            })
             
-            agregar_evento_historial(
+            await ejecutar_google(
+                agregar_evento_historial,
                 sheet_historial,
                 user_id,
                 tarea_id,
@@ -401,6 +427,9 @@ class TaskObservacionesModal(discord.ui.Modal, title='Registrar Observaciones'):
                         'type': 'tarea',
                         'timestamp': time.time()
                     }, "tarea")
+                    persistence.guardar_vinculo(persistence.VinculoMensaje(
+                        str(user_id), 'tarea', str(msg.id), str(canal_registro.id), str(tarea_id)
+                    ))
             
             # Enviar confirmación al usuario
             await interaction.response.send_message(
@@ -536,10 +565,10 @@ class PausarReanudarButton(discord.ui.Button):
         
         try:
             client = get_sheets_client()
-            spreadsheet = client.open_by_key(config.GOOGLE_SHEET_ID_TAREAS)
-            sheet_activas = spreadsheet.worksheet('Tareas Activas')
-            sheet_historial = spreadsheet.worksheet('Historial')
-            datos_tarea = obtener_tarea_por_id(sheet_activas, self.tarea_id)
+            spreadsheet = await abrir_spreadsheet(client, config.GOOGLE_SHEET_ID_TAREAS)
+            sheet_activas = await obtener_worksheet(spreadsheet, 'Tareas Activas')
+            sheet_historial = await obtener_worksheet(spreadsheet, 'Historial')
+            datos_tarea = await ejecutar_google(obtener_tarea_por_id, sheet_activas, self.tarea_id)
             if not datos_tarea:
                 await interaction.followup.send('❌ No se encontró la tarea especificada.', ephemeral=True)
                 return
@@ -550,10 +579,11 @@ class PausarReanudarButton(discord.ui.Button):
             
             if datos_tarea['estado'].lower() == 'en proceso':
                 # Pausar la tarea
-                pausar_tarea_por_id(sheet_activas, sheet_historial, self.tarea_id, str(interaction.user), fecha_actual)
+                await ejecutar_google(pausar_tarea_por_id, sheet_activas, sheet_historial, self.tarea_id, str(interaction.user), fecha_actual)
+                actualizar_estado_tarea_local(self.user_id, 'Pausada')
                 
                 # Volver a obtener los datos actualizados
-                datos_tarea_actualizados = obtener_tarea_por_id(sheet_activas, self.tarea_id)
+                datos_tarea_actualizados = await ejecutar_google(obtener_tarea_por_id, sheet_activas, self.tarea_id)
                 if not datos_tarea_actualizados:
                     await interaction.followup.send('❌ Error al obtener los datos actualizados de la tarea.', ephemeral=True)
                     return
@@ -580,10 +610,11 @@ class PausarReanudarButton(discord.ui.Button):
                 
             elif datos_tarea['estado'].lower() == 'pausada':
                 # Reanudar la tarea
-                reanudar_tarea_por_id(sheet_activas, sheet_historial, self.tarea_id, str(interaction.user), fecha_actual)
+                await ejecutar_google(reanudar_tarea_por_id, sheet_activas, sheet_historial, self.tarea_id, str(interaction.user), fecha_actual)
+                actualizar_estado_tarea_local(self.user_id, 'En proceso')
                 
                 # Volver a obtener los datos actualizados
-                datos_tarea_actualizados = obtener_tarea_por_id(sheet_activas, self.tarea_id)
+                datos_tarea_actualizados = await ejecutar_google(obtener_tarea_por_id, sheet_activas, self.tarea_id)
                 if not datos_tarea_actualizados:
                     await interaction.followup.send('❌ Error al obtener los datos actualizados de la tarea.', ephemeral=True)
                     return
@@ -717,10 +748,10 @@ class PausarReanudarButtonPersistent(discord.ui.Button):
                 import config
                 
                 client = get_sheets_client()
-                spreadsheet = client.open_by_key(config.GOOGLE_SHEET_ID_TAREAS)
-                sheet_activas = spreadsheet.worksheet('Tareas Activas')
+                spreadsheet = await abrir_spreadsheet(client, config.GOOGLE_SHEET_ID_TAREAS)
+                sheet_activas = await obtener_worksheet(spreadsheet, 'Tareas Activas')
                 
-                datos_tarea = obtener_tarea_activa_por_usuario(sheet_activas, user_id)
+                datos_tarea = await ejecutar_google(obtener_tarea_activa_por_usuario, sheet_activas, user_id)
                 if datos_tarea:
                     tarea_id = datos_tarea['tarea_id']
                 else:
@@ -734,10 +765,10 @@ class PausarReanudarButtonPersistent(discord.ui.Button):
                 import config
                 
                 client = get_sheets_client()
-                spreadsheet = client.open_by_key(config.GOOGLE_SHEET_ID_TAREAS)
-                sheet_activas = spreadsheet.worksheet('Tareas Activas')
+                spreadsheet = await abrir_spreadsheet(client, config.GOOGLE_SHEET_ID_TAREAS)
+                sheet_activas = await obtener_worksheet(spreadsheet, 'Tareas Activas')
                 
-                datos_tarea = obtener_tarea_activa_por_usuario(sheet_activas, user_id)
+                datos_tarea = await ejecutar_google(obtener_tarea_activa_por_usuario, sheet_activas, user_id)
                 if datos_tarea:
                     tarea_id = datos_tarea['tarea_id']
                 else:
@@ -751,11 +782,11 @@ class PausarReanudarButtonPersistent(discord.ui.Button):
             
             # Ahora proceder con la lógica de pausar/reanudar
             client = get_sheets_client()
-            spreadsheet = client.open_by_key(config.GOOGLE_SHEET_ID_TAREAS)
-            sheet_activas = spreadsheet.worksheet('Tareas Activas')
-            sheet_historial = spreadsheet.worksheet('Historial')
+            spreadsheet = await abrir_spreadsheet(client, config.GOOGLE_SHEET_ID_TAREAS)
+            sheet_activas = await obtener_worksheet(spreadsheet, 'Tareas Activas')
+            sheet_historial = await obtener_worksheet(spreadsheet, 'Historial')
             
-            datos_tarea = obtener_tarea_por_id(sheet_activas, tarea_id)
+            datos_tarea = await ejecutar_google(obtener_tarea_por_id, sheet_activas, tarea_id)
             if not datos_tarea:
                 await interaction.followup.send('❌ No se encontró la tarea especificada.', ephemeral=True)
                 return
@@ -766,10 +797,11 @@ class PausarReanudarButtonPersistent(discord.ui.Button):
             
             if datos_tarea['estado'].lower() == 'en proceso':
                 # Pausar la tarea
-                pausar_tarea_por_id(sheet_activas, sheet_historial, tarea_id, str(interaction.user), fecha_actual)
+                await ejecutar_google(pausar_tarea_por_id, sheet_activas, sheet_historial, tarea_id, str(interaction.user), fecha_actual)
+                actualizar_estado_tarea_local(user_id, 'Pausada')
                 
                 # Volver a obtener los datos actualizados
-                datos_tarea_actualizados = obtener_tarea_por_id(sheet_activas, tarea_id)
+                datos_tarea_actualizados = await ejecutar_google(obtener_tarea_por_id, sheet_activas, tarea_id)
                 if not datos_tarea_actualizados:
                     await interaction.followup.send('❌ Error al obtener los datos actualizados de la tarea.', ephemeral=True)
                     return
@@ -795,10 +827,11 @@ class PausarReanudarButtonPersistent(discord.ui.Button):
                 
             elif datos_tarea['estado'].lower() == 'pausada':
                 # Reanudar la tarea
-                reanudar_tarea_por_id(sheet_activas, sheet_historial, tarea_id, str(interaction.user), fecha_actual)
+                await ejecutar_google(reanudar_tarea_por_id, sheet_activas, sheet_historial, tarea_id, str(interaction.user), fecha_actual)
+                actualizar_estado_tarea_local(user_id, 'En proceso')
                 
                 # Volver a obtener los datos actualizados
-                datos_tarea_actualizados = obtener_tarea_por_id(sheet_activas, tarea_id)
+                datos_tarea_actualizados = await ejecutar_google(obtener_tarea_por_id, sheet_activas, tarea_id)
                 if not datos_tarea_actualizados:
                     await interaction.followup.send('❌ Error al obtener los datos actualizados de la tarea.', ephemeral=True)
                     return
@@ -844,10 +877,10 @@ class FinalizarButtonPersistent(discord.ui.Button):
             import config
             
             client = get_sheets_client()
-            spreadsheet = client.open_by_key(config.GOOGLE_SHEET_ID_TAREAS)
-            sheet_activas = spreadsheet.worksheet('Tareas Activas')
+            spreadsheet = await abrir_spreadsheet(client, config.GOOGLE_SHEET_ID_TAREAS)
+            sheet_activas = await obtener_worksheet(spreadsheet, 'Tareas Activas')
             
-            datos_tarea = obtener_tarea_activa_por_usuario(sheet_activas, user_id)
+            datos_tarea = await ejecutar_google(obtener_tarea_activa_por_usuario, sheet_activas, user_id)
             if not datos_tarea:
                 await interaction.response.send_message('❌ No se encontró una tarea activa para finalizar.', ephemeral=True)
                 return
@@ -1278,8 +1311,9 @@ class IniciarReembolsosButton(discord.ui.Button):
             if str(interaction.user.id) != str(self.user_id):
                 await interaction.response.send_message('Solo el usuario mencionado puede iniciar este flujo.', ephemeral=True)
                 return
-            from utils.state_manager import set_user_state
-            set_user_state(str(interaction.user.id), {"type": "reembolsos", "paso": 1}, "reembolsos")
+            from utils.state_manager import set_user_state, generar_solicitud_id
+            user_id = str(interaction.user.id)
+            set_user_state(user_id, {"type": "reembolsos", "paso": 1, "solicitud_id": generar_solicitud_id(user_id)}, "reembolsos")
             from interactions.select_menus import build_tipo_reembolso_menu
             view = build_tipo_reembolso_menu()
             await interaction.response.send_message('Por favor, selecciona el tipo de reembolso:', view=view, ephemeral=True)
@@ -1334,8 +1368,9 @@ class IniciarCancelacionesButton(discord.ui.Button):
             if str(interaction.user.id) != str(self.user_id):
                 await interaction.response.send_message('Solo el usuario mencionado puede iniciar este flujo.', ephemeral=True)
                 return
-            from utils.state_manager import set_user_state
-            set_user_state(str(interaction.user.id), {"type": "cancelaciones", "paso": 1}, "cancelaciones")
+            from utils.state_manager import set_user_state, generar_solicitud_id
+            user_id = str(interaction.user.id)
+            set_user_state(user_id, {"type": "cancelaciones", "paso": 1, "solicitud_id": generar_solicitud_id(user_id)}, "cancelaciones")
             from interactions.modals import CancelacionModal
             modal = CancelacionModal()
             await interaction.response.send_modal(modal)
@@ -0,0 +1,208 @@
+# Este módulo requiere 'discord.py' instalado en el entorno.
+"""
+Seguimiento automático de los envíos abiertos de la hoja de envíos (GOOGLE_SHEET_RANGE_ENVIOS).
+Cada TRACKING_WATCHER_TICK_MIN minutos se consultan en Andreani los trackings cuya próxima
+consulta venció, sin pasar el presupuesto de TRACKING_WATCHER_REQUESTS_POR_HORA consultas por hora.
+El intervalo de cada envío se adapta: corto cuando la entrega está cerca y cada vez más largo
+mientras el envío no cambie. El último estado visto se guarda en SQLite (utils/persistence.py)
+y solo se publican en TARGET_CHANNEL_ID_CASOS_ENVIOS los cambios respecto de esa foto.
+"""
+import re
+import time
+from collections import deque
+import discord
+from discord.ext import commands, tasks
+import config
+from utils import persistence
+from utils.andreani import consultar_tracking, eventos_timeline
+from utils.error_scanner import separar_rango, rango_citado
+from utils.google_async import ejecutar_google, abrir_spreadsheet
+from utils.quota_governor import prioridad, FONDO
+from utils.google_client_manager import get_sheets_client
+from utils.sheet_schema import compilar
+from utils.tracking_masivo import fila_inicial
+
+NUMERO_ANDREANI = re.compile(r'\b\d{10,20}\b')
+# Estados en los que el envío está por entregarse y conviene mirarlo más seguido
+ESTADOS_CERCANOS = ('distribución', 'distribucion', 'en camino al domicilio', 'visita', 'sucursal de destino')
+# Estados finales: el envío deja de consultarse
+ESTADOS_FINALES = ('entregado', 'devuelto', 'siniestrado', 'cancelado')
+VALORES_RESUELTO = ('si', 'sí', 'yes', 'true', 'resuelto')
+MAX_EVENTOS_AVISO = 5
+
+class PresupuestoHorario:
+    """Ventana deslizante de una hora con las consultas hechas, para no pasar el límite por hora."""
+
+    def __init__(self, limite: int):
+        self.limite = limite
+        self._consultas = deque()
+
+    def disponibles(self, ahora: float = None) -> int:
+        ahora = time.time() if ahora is None else ahora
+        while self._consultas and self._consultas[0] <= ahora - 3600:
+            self._consultas.popleft()
+        return max(0, self.limite - len(self._consultas))
+
+    def consumir(self, ahora: float = None):
+        self._consultas.append(time.time() if ahora is None else ahora)
+
+def envios_abiertos(rows: list, fila_inicio: int = 2) -> dict:
+    """
+    Trackings de las filas no resueltas de la hoja de envíos.
+    :return: número -> (pedido, fila). Si un número aparece en varias filas se queda la última.
+    """
+    if not rows:
+        return {}
+    mapa = compilar(rows[0])
+    idx_tracking = mapa.indice('tracking')
+    if idx_tracking is None:
+        idx_tracking = mapa.indice_que_contiene('andreani')
+    if idx_tracking is None:
+        return {}
+    extraer = mapa.extractor(['pedido', 'resuelto'])
+    abiertos = {}
+    for fila, row in enumerate(rows[1:], start=fila_inicio):
+        celda = str(row[idx_tracking]) if idx_tracking < len(row) else ''
+        pedido, resuelto = extraer(row)
+        if not celda or resuelto.strip().lower() in VALORES_RESUELTO:
+            continue
+        for numero in NUMERO_ANDREANI.findall(celda):
+            abiertos[numero] = (pedido.strip(), fila)
+    return abiertos
+
+def claves_eventos(info: dict) -> list:
+    """Claves estables de los eventos del historial, del más reciente al más antiguo."""
+    return [f"{fecha}|{desc}|{suc}" for fecha, desc, suc in eventos_timeline(info or {})]
+
+def proximo_intervalo_sec(estado: str, consultas_sin_cambio: int):
+    """
+    Segundos hasta la próxima consulta de un envío, o None si el envío llegó a un estado final.
+    Cerca de la entrega se usa el intervalo corto; si no, el base duplicado por cada consulta
+    sin cambios, con tope en el máximo.
+    """
+    estado = (estado or '').lower()
+    if any(final in estado for final in ESTADOS_FINALES):
+        return None
+    if any(cercano in estado for cercano in ESTADOS_CERCANOS):
+        return config.TRACKING_WATCHER_INTERVALO_MIN * 60
+    minutos = config.TRACKING_WATCHER_INTERVALO_BASE_MIN * 2 ** min(consultas_sin_cambio, 6)
+    return min(minutos, config.TRACKING_WATCHER_INTERVALO_MAX_MIN) * 60
+
+def aplicar_consulta(seguimiento: persistence.SeguimientoEnvio, info: dict, ahora: float = None):
+    """
+    Compara la respuesta con la última foto guardada y actualiza el seguimiento.
+    :return: dict con 'estado_anterior', 'estado' y 'eventos_nuevos' si hubo un cambio que avisar,
+        o None si no hubo cambios o es la primera consulta (solo se guarda la foto).
+    """
+    ahora = time.time() if ahora is None else ahora
+    estado = ((info or {}).get('procesoActual') or {}).get('titulo', '')
+    claves = claves_eventos(info)
+    primera_vez = seguimiento.eventos is None
+    vistos = set(seguimiento.eventos or [])
+    eventos_nuevos = [clave for clave in claves if clave not in vistos]
+    cambio = None
+    if primera_vez:
+        seguimiento.consultas_sin_cambio = 0
+    elif estado != (seguimiento.estado or '') or eventos_nuevos:
+        cambio = {'estado_anterior': seguimiento.estado or '', 'estado': estado, 'eventos_nuevos': eventos_nuevos}
+        seguimiento.consultas_sin_cambio = 0
+    else:
+        seguimiento.consultas_sin_cambio += 1
+    seguimiento.estado = estado
+    seguimiento.eventos = claves
+    intervalo = proximo_intervalo_sec(estado, seguimiento.consultas_sin_cambio)
+    seguimiento.proxima_consulta = None if intervalo is None else ahora + intervalo
+    return cambio
+
+def construir_embed_cambio(seguimiento: persistence.SeguimientoEnvio, cambio: dict) -> discord.Embed:
+    embed = discord.Embed(
+        title=f"📦 Novedades del envío {seguimiento.numero}",
+        url=f"https://www.andreani.com/envio/{seguimiento.numero}",
+        color=discord.Color.blue(),
+        timestamp=discord.utils.utcnow()
+    )
+    if seguimiento.pedido:
+        embed.add_field(name="N° de Pedido", value=seguimiento.pedido, inline=True)
+    if cambio['estado'] != cambio['estado_anterior']:
+        embed.add_field(name="Estado", value=f"{cambio['estado_anterior'] or 'Sin datos'} → **{cambio['estado'] or 'Sin datos'}**", inline=False)
+    if cambio['eventos_nuevos']:
+        lineas = []
+        for clave in cambio['eventos_nuevos'][:MAX_EVENTOS_AVISO]:
+            fecha, desc, suc = clave.split('|', 2)
+            lineas.append(f"{fecha}: {desc}" + (f" ({suc})" if suc else ''))
+        embed.add_field(name="Nuevos eventos", value='\n'.join(lineas)[:1024], inline=False)
+    return embed
+
+class TrackingWatcher(commands.Cog):
+    def __init__(self, bot):
+        self.bot = bot
+        self.presupuesto = PresupuestoHorario(config.TRACKING_WATCHER_REQUESTS_POR_HORA)
+        self._ultima_lectura_hoja = 0.0
+        if config.TRACKING_WATCHER_REQUESTS_POR_HORA > 0 and config.ANDREANI_AUTH_HEADER:
+            self.revisar_envios.change_interval(minutes=config.TRACKING_WATCHER_TICK_MIN)
+            self.revisar_envios.start()
+        else:
+            print("Seguimiento de envíos desactivado: falta ANDREANI_API_AUTH o TRACKING_WATCHER_REQUESTS_POR_HORA es 0.")
+
+    def cog_unload(self):
+        self.revisar_envios.cancel()
+
+    async def _refrescar_abiertos(self):
+        """Relee la hoja de envíos y sincroniza la lista de trackings abiertos."""
+        client = get_sheets_client()
+        if not client or not config.SPREADSHEET_ID_CASOS:
+            return
+        hoja_nombre, rango_puro = separar_rango(config.GOOGLE_SHEET_RANGE_ENVIOS)
+        spreadsheet = await abrir_spreadsheet(client, config.SPREADSHEET_ID_CASOS)
+        respuesta = await ejecutar_google(spreadsheet.values_get, rango_citado(hoja_nombre, rango_puro))
+        abiertos = envios_abiertos(respuesta.get('values', []), fila_inicial(rango_puro) + 1)
+        persistence.sincronizar_seguimientos(abiertos)
+        self._ultima_lectura_hoja = time.monotonic()
+        print(f"Seguimiento de envíos: {len(abiertos)} trackings abiertos en la hoja.")
+
+    @tasks.loop(minutes=5)
+    async def revisar_envios(self):
+        # Tarea de fondo: cede la cuota de Google a las acciones de los usuarios
+        with prioridad(FONDO):
+            try:
+                if time.monotonic() - self._ultima_lectura_hoja >= config.TRACKING_WATCHER_REFRESCO_HOJA_MIN * 60:
+                    await self._refrescar_abiertos()
+                disponibles = self.presupuesto.disponibles()
+                if not disponibles:
+                    return
+                vencidos = persistence.seguimientos_vencidos(disponibles)
+                if not vencidos:
+                    return
+                canal = self.bot.get_channel(int(config.TARGET_CHANNEL_ID_CASOS_ENVIOS))
+                avisos = 0
+                for seguimiento in vencidos:
+                    # Un solo pedido HTTP por consulta, así cada una gasta exactamente una del presupuesto;
+                    # si falla se vuelve a intentar en el próximo intervalo
+                    self.presupuesto.consumir()
+                    try:
+                        info = await consultar_tracking(seguimiento.numero, config.ANDREANI_AUTH_HEADER, intentos=1)
+                    except Exception as error:
+                        print(f"Seguimiento de envíos: error al consultar {seguimiento.numero}: {error}")
+                        # Se reintenta en el próximo intervalo base sin contar como consulta sin cambios
+                        seguimiento.proxima_consulta = time.time() + config.TRACKING_WATCHER_INTERVALO_BASE_MIN * 60
+                        persistence.guardar_seguimiento(seguimiento)
+                        continue
+                    cambio = aplicar_consulta(seguimiento, info)
+                    if cambio and canal:
+                        try:
+                            await canal.send(embed=construir_embed_cambio(seguimiento, cambio))
+                            avisos += 1
+                        except Exception as error:
+                            print(f"Seguimiento de envíos: no se pudo publicar el cambio de {seguimiento.numero}: {error}")
+                    persistence.guardar_seguimiento(seguimiento)
+                print(f"Seguimiento de envíos: {len(vencidos)} consultas, {avisos} avisos publicados.")
+            except Exception as error:
+                print(f"❌ Error en el seguimiento de envíos: {error}")
+
+    @revisar_envios.before_loop
+    async def antes_de_revisar(self):
+        """Esperar hasta que el bot esté listo antes de iniciar la tarea"""
+        await self.bot.wait_until_ready()
+
+async def setup(bot):
+    await bot.add_cog(TrackingWatcher(bot))
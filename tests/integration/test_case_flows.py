@@ -1,6 +1,12 @@
 import unittest
 from unittest.mock import Mock, AsyncMock, patch
 from interactions.modals import CasoModal
+from tests.persistencia_temporal import PersistenciaTemporal
+
+# Los modals guardan estados: que no toquen la base ni los JSON del árbol de trabajo
+_persistencia = PersistenciaTemporal()
+setUpModule = _persistencia.iniciar
+tearDownModule = _persistencia.detener
 
 class TestCaseFlows(unittest.IsolatedAsyncioTestCase):
     @patch('utils.google_sheets.initialize_google_sheets')
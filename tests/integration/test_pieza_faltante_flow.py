@@ -1,6 +1,12 @@
 import unittest
 from unittest.mock import Mock, AsyncMock, patch, PropertyMock
 from interactions.modals import PiezaFaltanteModal
+from tests.persistencia_temporal import PersistenciaTemporal
+
+# Los modals guardan estados: que no toquen la base ni los JSON del árbol de trabajo
+_persistencia = PersistenciaTemporal()
+setUpModule = _persistencia.iniciar
+tearDownModule = _persistencia.detener
 
 class TestPiezaFaltanteFlow(unittest.IsolatedAsyncioTestCase):
     @patch('utils.google_sheets.initialize_google_sheets')
@@ -17,6 +23,7 @@ class TestPiezaFaltanteFlow(unittest.IsolatedAsyncioTestCase):
         interaction.user.display_name = "TestUser"
         interaction.user.id = 202
         interaction.response.send_message = AsyncMock()
+        interaction.response.is_done = Mock(return_value=True)
         # Mock de Google Sheets
         mock_sheet = Mock()
         mock_sheet.get.return_value = [
@@ -30,4 +37,6 @@ class TestPiezaFaltanteFlow(unittest.IsolatedAsyncioTestCase):
         mock_init.return_value = mock_client
         # Ejecutar
         await modal.on_submit(interaction)
-        interaction.response.send_message.assert_called() 
\ No newline at end of file
+        # Se difiere la respuesta antes de escribir en la hoja y se contesta con un followup
+        interaction.response.defer.assert_awaited_once_with(ephemeral=True)
+        interaction.followup.send.assert_called() 
\ No newline at end of file
@@ -1,6 +1,12 @@
 import unittest
 from unittest.mock import Mock, AsyncMock, patch, PropertyMock
 from interactions.modals import ReclamosMLModal
+from tests.persistencia_temporal import PersistenciaTemporal
+
+# Los modals guardan estados: que no toquen la base ni los JSON del árbol de trabajo
+_persistencia = PersistenciaTemporal()
+setUpModule = _persistencia.iniciar
+tearDownModule = _persistencia.detener
 
 class TestReclamosMLFlow(unittest.IsolatedAsyncioTestCase):
     @patch('utils.google_sheets.initialize_google_sheets')
@@ -0,0 +1,56 @@
+"""
+Aísla a los tests de la base SQLite y de los JSON anteriores del directorio de trabajo.
+Sin esto, un test que toca state_manager o persistence crea data/bot.db y la migración
+renombra temp/pendingData.json del árbol de trabajo.
+
+Uso por clase:      PersistenciaTemporal().aislar(self)   (en setUp)
+Uso por módulo:     _persistencia = PersistenciaTemporal()
+                    setUpModule = _persistencia.iniciar
+                    tearDownModule = _persistencia.detener
+"""
+import os
+import tempfile
+from pathlib import Path
+from unittest.mock import patch
+from utils import persistence, state_manager
+
+class PersistenciaTemporal:
+    def __init__(self):
+        self.tmpdir = None
+        self.patchers = []
+
+    def iniciar(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        ruta = Path(self.tmpdir.name)
+        persistence.cerrar()
+        self.patchers = [
+            # También en el entorno, por los tests que recargan config
+            patch.dict(os.environ, {'SQLITE_DB_PATH': str(ruta / 'bot.db')}),
+            patch('config.SQLITE_DB_PATH', str(ruta / 'bot.db')),
+            patch.multiple(
+                persistence,
+                LEGACY_ESTADOS_JSON=ruta / 'pendingData.json',
+                LEGACY_TAREAS_JSON=ruta / 'tareas_activas.json',
+            ),
+            patch.multiple(
+                state_manager, _estados={}, _vencimientos={}, _heap_vencimientos=[], _sucios=set(),
+                _cargado=False, _locks_usuario={}, _timer_flush=None,
+            ),
+        ]
+        for patcher in self.patchers:
+            patcher.start()
+
+    def detener(self):
+        # Un flush diferido que corriera después escribiría en la base real
+        if state_manager._timer_flush is not None:
+            state_manager._timer_flush.cancel()
+        persistence.cerrar()
+        for patcher in reversed(self.patchers):
+            patcher.stop()
+        self.patchers = []
+        self.tmpdir.cleanup()
+
+    def aislar(self, test):
+        """Inicia el aislamiento y lo deshace al terminar el test."""
+        self.iniciar()
+        test.addCleanup(self.detener)
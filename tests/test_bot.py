@@ -27,6 +27,12 @@ import asyncio
 from datetime import datetime
 import pytz
 from importlib import reload
+from tests.persistencia_temporal import PersistenciaTemporal
+
+# Los tests de estados y modals no deben tocar la base ni los JSON del árbol de trabajo
+_persistencia = PersistenciaTemporal()
+setUpModule = _persistencia.iniciar
+tearDownModule = _persistencia.detener
 
 # Agregar el directorio raíz al path para importar módulos
 sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
@@ -188,6 +194,7 @@ class TestGoogleSheetsIntegration(unittest.TestCase):
     def test_initialize_google_sheets(self, mock_credentials, mock_gspread):
         """Test: Inicializar cliente de Google Sheets"""
         from utils.google_sheets import initialize_google_sheets
+        from utils.quota_governor import HTTPClientGobernado
         
         # Mock de las credenciales
         mock_creds_instance = Mock()
@@ -201,7 +208,7 @@ class TestGoogleSheetsIntegration(unittest.TestCase):
         
         self.assertEqual(client, mock_client)
         mock_credentials.from_service_account_info.assert_called_once()
-        mock_gspread.authorize.assert_called_once_with(mock_creds_instance)
+        mock_gspread.authorize.assert_called_once_with(mock_creds_instance, http_client=HTTPClientGobernado)
     
     def test_check_if_pedido_exists(self):
         """Test: Verificar si existe un pedido"""
@@ -1,7 +1,116 @@
+import asyncio
+import time
 import unittest
+from unittest.mock import patch
 from utils import andreani
 
 class TestAndreani(unittest.TestCase):
     def test_dummy(self):
         # Reemplaza este test por tests reales si hay funciones de lógica pura
-        self.assertTrue(True) 
\ No newline at end of file
+        self.assertTrue(True)
+
+class _RespuestaFalsa:
+    def __init__(self, status, datos=None):
+        self.status = status
+        self.reason = 'X'
+        self._datos = datos
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *args):
+        return False
+
+    async def json(self, content_type=None):
+        return self._datos
+
+class _SesionFalsa:
+    def __init__(self, respuestas):
+        self.respuestas = list(respuestas)
+        self.llamadas = 0
+
+    def get(self, url, headers=None):
+        self.llamadas += 1
+        return self.respuestas.pop(0)
+
+class TestConsultarTracking(unittest.TestCase):
+    def setUp(self):
+        andreani.invalidar_cache()
+        andreani._en_curso.clear()
+
+    def test_cache_y_single_flight(self):
+        llamadas = []
+
+        async def pedir_falso(numero, auth, intentos=None):
+            llamadas.append(numero)
+            await asyncio.sleep(0.01)
+            return {'numero': numero}
+
+        async def escenario():
+            with patch.object(andreani, '_pedir', pedir_falso):
+                a, b = await asyncio.gather(
+                    andreani.consultar_tracking('123', 'Bearer x'),
+                    andreani.consultar_tracking('123', 'Bearer x'),
+                )
+                c = await andreani.consultar_tracking('123', 'Bearer x')
+                await andreani.consultar_tracking('123', 'Bearer x', usar_cache=False)
+            return a, b, c
+
+        a, b, c = asyncio.run(escenario())
+        self.assertEqual(a, {'numero': '123'})
+        self.assertEqual(a, b)
+        self.assertEqual(c, a)
+        self.assertEqual(llamadas, ['123', '123'])
+
+    def test_reintenta_errores_temporales(self):
+        sesion = _SesionFalsa([_RespuestaFalsa(503), _RespuestaFalsa(200, {'ok': True})])
+
+        async def escenario():
+            with patch.object(andreani, '_obtener_sesion', return_value=sesion), \
+                 patch.object(andreani, 'ESPERA_BASE_SEC', 0):
+                return await andreani.consultar_tracking('456', 'Bearer x')
+
+        self.assertEqual(asyncio.run(escenario()), {'ok': True})
+        self.assertEqual(sesion.llamadas, 2)
+
+    def test_un_solo_intento(self):
+        # El watcher de trackings pide un único pedido HTTP por consulta de su presupuesto
+        sesion = _SesionFalsa([_RespuestaFalsa(503), _RespuestaFalsa(200, {'ok': True})])
+
+        async def escenario():
+            with patch.object(andreani, '_obtener_sesion', return_value=sesion):
+                return await andreani.consultar_tracking('457', 'Bearer x', intentos=1)
+
+        with self.assertRaises(andreani.ErrorAndreani):
+            asyncio.run(escenario())
+        self.assertEqual(sesion.llamadas, 1)
+
+    def test_no_reintenta_404(self):
+        sesion = _SesionFalsa([_RespuestaFalsa(404)])
+
+        async def escenario():
+            with patch.object(andreani, '_obtener_sesion', return_value=sesion):
+                return await andreani.consultar_tracking('789', 'Bearer x')
+
+        with self.assertRaises(andreani.ErrorAndreani):
+            asyncio.run(escenario())
+        self.assertEqual(sesion.llamadas, 1)
+        self.assertNotIn('789', andreani._cache)
+
+    def test_cache_descarta_vencidas_y_tiene_tope(self):
+        with patch.object(andreani, 'MAX_ENTRADAS_CACHE', 2), patch('config.ANDREANI_CACHE_TTL_SEC', 300):
+            andreani._guardar_en_cache('1', {})
+            andreani._guardar_en_cache('2', {})
+            andreani._guardar_en_cache('3', {})
+            self.assertEqual(list(andreani._cache), ['2', '3'])
+            # Al guardar una nueva se descartan las que ya vencieron
+            with patch.object(andreani.time, 'monotonic', return_value=time.monotonic() + 600):
+                andreani._guardar_en_cache('4', {})
+            self.assertEqual(list(andreani._cache), ['4'])
+
+    def test_parametros_incompletos(self):
+        with self.assertRaises(ValueError):
+            asyncio.run(andreani.consultar_tracking('', 'Bearer x'))
+
+if __name__ == '__main__':
+    unittest.main()
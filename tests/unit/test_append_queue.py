@@ -0,0 +1,136 @@
+import asyncio
+import time
+import unittest
+from unittest.mock import MagicMock, patch
+from utils import append_queue, google_client_manager, persistence
+from tests.persistencia_temporal import PersistenciaTemporal
+
+def _hoja(titulo='Casos'):
+    sheet = MagicMock()
+    sheet.title = titulo
+    sheet.spreadsheet.id = 'sp1'
+    return sheet
+
+class _ErrorApi(Exception):
+    def __init__(self, status_code):
+        super().__init__(f'HTTP {status_code}')
+        self.response = MagicMock(status_code=status_code)
+
+class TestAppendQueue(unittest.TestCase):
+    def setUp(self):
+        PersistenciaTemporal().aislar(self)
+        self.patchers = [
+            patch('config.APPEND_BATCH_DELAY_MS', 50),
+            patch('config.APPEND_BATCH_MAX_ROWS', 50),
+            patch.object(append_queue, '_reanudado', False),
+        ]
+        for patcher in self.patchers:
+            patcher.start()
+
+    def tearDown(self):
+        append_queue.vaciar()
+        for patcher in reversed(self.patchers):
+            patcher.stop()
+
+    def test_agrupa_filas_en_un_append_rows(self):
+        sheet = _hoja()
+        sheet.append_rows.return_value = {'updates': {'updatedRange': "'Casos'!A10:C12"}}
+        futures = [append_queue.encolar_fila(sheet, [str(i), 'x']) for i in range(3)]
+        self.assertEqual([f.result(timeout=5) for f in futures], [10, 11, 12])
+        sheet.append_rows.assert_called_once_with([['0', 'x'], ['1', 'x'], ['2', 'x']])
+        self.assertEqual(persistence.listar_filas_pendientes(), [])
+
+    def test_reintenta_5xx_y_429_y_no_reintenta_400(self):
+        sheet = _hoja()
+        sheet.append_rows.side_effect = [_ErrorApi(503), _ErrorApi(429), {'updates': {'updatedRange': "'Casos'!A2:B2"}}]
+        with patch.object(append_queue, 'ESPERA_BASE_SEG', 0.01):
+            self.assertEqual(append_queue.encolar_fila(sheet, ['a']).result(timeout=5), 2)
+        self.assertEqual(sheet.append_rows.call_count, 3)
+
+        otra = _hoja('Otra')
+        otra.append_rows.side_effect = _ErrorApi(400)
+        with self.assertRaises(_ErrorApi):
+            append_queue.encolar_fila(otra, ['b']).result(timeout=5)
+        self.assertEqual(otra.append_rows.call_count, 1)
+        # Un 4xx permanente es lo único que descarta la fila guardada
+        self.assertEqual(persistence.listar_filas_pendientes(), [])
+
+    def test_no_descarta_filas_mientras_sigue_fallando(self):
+        sheet = _hoja()
+        sheet.append_rows.side_effect = _ErrorApi(503)
+        with patch.object(append_queue, 'ESPERA_BASE_SEG', 0.001), patch.object(append_queue, 'ESPERA_MAX_SEG', 0.01):
+            futuro = append_queue.encolar_fila(sheet, ['a'])
+            for _ in range(200):
+                if sheet.append_rows.call_count >= 8:
+                    break
+                time.sleep(0.01)
+            self.assertGreaterEqual(sheet.append_rows.call_count, 8)
+            self.assertFalse(futuro.done())
+            self.assertEqual([p.fila for p in persistence.listar_filas_pendientes()], [['a']])
+
+            sheet.append_rows.side_effect = None
+            sheet.append_rows.return_value = {'updates': {'updatedRange': "'Casos'!A9:A9"}}
+            self.assertEqual(futuro.result(timeout=5), 9)
+        self.assertEqual(persistence.listar_filas_pendientes(), [])
+
+    def test_reintento_de_una_hoja_no_frena_a_las_demas(self):
+        lenta = _hoja('Lenta')
+        lenta.append_rows.side_effect = [_ErrorApi(503), {'updates': {'updatedRange': "'Lenta'!A2:A3"}}]
+        rapida = _hoja('Rapida')
+        rapida.append_rows.return_value = {'updates': {'updatedRange': "'Rapida'!A7:A7"}}
+        with patch.object(append_queue, 'ESPERA_BASE_SEG', 30):
+            futuro_lento = append_queue.encolar_fila(lenta, ['a'])
+            for _ in range(100):
+                if lenta.append_rows.call_count:
+                    break
+                time.sleep(0.01)
+            self.assertEqual(append_queue.encolar_fila(rapida, ['b']).result(timeout=2), 7)
+            self.assertFalse(futuro_lento.done())
+            # Lo que se encola durante la espera va detrás de la fila que falló
+            futuro_siguiente = append_queue.encolar_fila(lenta, ['c'])
+            append_queue.vaciar()
+        self.assertEqual((futuro_lento.result(timeout=1), futuro_siguiente.result(timeout=1)), (2, 3))
+        lenta.append_rows.assert_called_with([['a'], ['c']])
+
+    def test_confirmacion_asincronica(self):
+        sheet = _hoja()
+        sheet.append_rows.return_value = {'updates': {'updatedRange': "'Casos'!A5:B5"}}
+        fila = asyncio.run(append_queue.agregar_fila_confirmada(sheet, ['a', 'b']))
+        self.assertEqual(fila, 5)
+
+    def test_future_cancelado_no_frena_el_hilo(self):
+        sheet = _hoja()
+        sheet.append_rows.return_value = {'updates': {'updatedRange': "'Casos'!A4:A5"}}
+        with patch('config.APPEND_BATCH_DELAY_MS', 60000):
+            # Quien encoló dejó de esperar (timeout de agregar_fila_confirmada) antes del lote
+            cancelado = append_queue.encolar_fila(sheet, ['a'])
+            cancelado.cancel()
+            vigente = append_queue.encolar_fila(sheet, ['b'])
+            append_queue.vaciar()
+        self.assertEqual(vigente.result(timeout=1), 5)
+        self.assertTrue(cancelado.cancelled())
+
+        sheet.append_rows.return_value = {'updates': {'updatedRange': "'Casos'!A6:A6"}}
+        self.assertEqual(append_queue.encolar_fila(sheet, ['c']).result(timeout=5), 6)
+
+    def test_reanuda_filas_pendientes(self):
+        persistence.guardar_fila_pendiente('sp1', 'Casos', ['p1'])
+        sheet = _hoja()
+        sheet.append_rows.return_value = {'updates': {'updatedRange': "'Casos'!A3:A3"}}
+        sheet.title = 'Casos'
+        client = MagicMock()
+        client.open_by_key.return_value.id = 'sp1'
+        client.open_by_key.return_value.worksheets.return_value = [sheet]
+        google_client_manager.invalidar_handles()
+        with patch('config.APPEND_BATCH_DELAY_MS', 60000):
+            self.assertEqual(append_queue.reanudar_pendientes(client), 1)
+            append_queue.vaciar()
+        sheet.append_rows.assert_called_once_with([['p1']])
+        self.assertEqual(persistence.listar_filas_pendientes(), [])
+
+        # on_ready de una reconexión: no vuelve a encolar lo que ya está en la cola
+        persistence.guardar_fila_pendiente('sp1', 'Casos', ['p2'])
+        self.assertEqual(append_queue.reanudar_pendientes(client), 0)
+
+if __name__ == '__main__':
+    unittest.main()
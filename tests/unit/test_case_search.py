@@ -0,0 +1,69 @@
+import unittest
+from unittest.mock import AsyncMock, Mock, patch
+from utils import google_sheets
+from utils import case_search
+
+class TestCaseSearch(unittest.IsolatedAsyncioTestCase):
+    def setUp(self):
+        google_sheets.invalidar_cache_hojas()
+        self.spreadsheet = Mock()
+        self.spreadsheet.id = 'sheet_id'
+        self.spreadsheet.values_batch_get.return_value = {'valueRanges': [
+            {'values': [['Número de pedido', 'Caso'], ['PED001', 'C1']]},
+            {'values': [['Otra columna'], ['x']]},
+            {'values': [['Número de pedido'], ['ped001'], ['PED002']]},
+        ]}
+        self.pestanas = ['Uno', 'Dos', 'Tres']
+
+    async def buscar(self, pedido):
+        return [r async for r in case_search.buscar_pedido_en_pestanas(self.spreadsheet, pedido, self.pestanas)]
+
+    async def test_busqueda_en_lote(self):
+        resultados = await self.buscar('PED001')
+        self.spreadsheet.values_batch_get.assert_called_once_with(["'Uno'!A:Z", "'Dos'!A:Z", "'Tres'!A:Z"])
+        matches = [(m['sheet'], m['row_number']) for r in resultados for m in r['matches']]
+        self.assertEqual(matches, [('Uno', 2), ('Tres', 2)])
+        self.assertIsNotNone(resultados[1]['error'])
+
+    async def test_segunda_busqueda_usa_cache(self):
+        await self.buscar('PED001')
+        resultados = await self.buscar('PED002')
+        self.assertEqual(self.spreadsheet.values_batch_get.call_count, 1)
+        self.assertEqual(resultados[2]['matches'][0]['row_number'], 3)
+
+    async def test_fallback_lectura_por_pestana(self):
+        self.spreadsheet.values_batch_get.side_effect = Exception('fallo')
+        hoja = Mock()
+        hoja.get.return_value = [['Número de pedido'], ['PED001']]
+        self.spreadsheet.worksheet.return_value = hoja
+        resultados = await self.buscar('PED001')
+        self.assertEqual(len(resultados), 3)
+        self.assertTrue(all(len(r['matches']) == 1 for r in resultados))
+
+    async def responder(self):
+        interaction = Mock()
+        interaction.edit_original_response = AsyncMock()
+        interaction.followup.send = AsyncMock()
+        with patch('config.SHEETS_TO_SEARCH', self.pestanas):
+            await case_search.responder_busqueda_caso(interaction, self.spreadsheet, 'PED001')
+        return interaction
+
+    async def test_lote_responde_con_un_solo_mensaje(self):
+        interaction = await self.responder()
+        interaction.edit_original_response.assert_not_called()
+        interaction.followup.send.assert_awaited_once()
+        self.assertIn('**2** coincidencias', interaction.followup.send.call_args.args[0])
+
+    async def test_lectura_por_pestana_edita_a_medida_que_llega(self):
+        self.spreadsheet.values_batch_get.side_effect = Exception('fallo')
+        hoja = Mock()
+        hoja.get.return_value = [['Número de pedido'], ['PED001']]
+        self.spreadsheet.worksheet.return_value = hoja
+        interaction = await self.responder()
+        # Dos ediciones parciales y la final
+        self.assertEqual(interaction.edit_original_response.await_count, 3)
+        interaction.followup.send.assert_not_called()
+
+    def test_formatear_sin_resultados(self):
+        mensaje = case_search.formatear_resultados_busqueda('PED9', [{'sheet': 'Uno', 'matches': [], 'error': None}])
+        self.assertIn('No se encontraron coincidencias', mensaje)
@@ -0,0 +1,123 @@
+import os
+import tempfile
+import unittest
+from unittest.mock import Mock, AsyncMock, patch
+import config
+from utils import error_scanner
+
+HEADER = ['Número de pedido', 'Agente', 'ERROR', 'ErrorEnvioCheck']
+
+class TestExtraerNotificaciones(unittest.TestCase):
+    def test_filtra_filas_con_error_sin_notificar(self):
+        rows = [
+            HEADER,
+            ['PED1', 'Ana', 'Falta dato', ''],
+            ['PED2', 'Ana', 'Otro', '01-01-2025 10:00:00'],
+            ['PED3', 'Ana', '', ''],
+        ]
+        resultado = error_scanner.extraer_notificaciones(rows)
+        self.assertEqual(resultado['idx_notificado'], 3)
+        self.assertEqual([p['fila'] for p in resultado['pendientes']], [2])
+        self.assertEqual(resultado['pendientes'][0]['agente'], 'Ana')
+
+    def test_sin_columna_error(self):
+        resultado = error_scanner.extraer_notificaciones([['Número de pedido'], ['PED1']])
+        self.assertEqual(resultado['pendientes'], [])
+
+    def test_rango_citado(self):
+        self.assertEqual(error_scanner.rango_citado("Casos 2025", 'A:M'), "'Casos 2025'!A:M")
+
+class TestEscanearErrores(unittest.IsolatedAsyncioTestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        ruta = os.path.join(self.tmpdir.name, 'estado.json')
+        self.patcher = patch.multiple(config, ERROR_SCAN_STATE_PATH=ruta,
+                                      ERROR_SCAN_RELEER_FILAS=2, ERROR_SCAN_COMPLETO_CADA=12)
+        self.patcher.start()
+        self.channel = Mock()
+        self.channel.send = AsyncMock()
+        guild = Mock()
+        guild.fetch_members = Mock(side_effect=Exception('sin intents'))
+        guild.members = []
+        self.bot = Mock()
+        self.bot.get_guild.return_value = guild
+        self.bot.get_channel.return_value = self.channel
+
+    def tearDown(self):
+        self.patcher.stop()
+        self.tmpdir.cleanup()
+
+    async def test_una_lectura_y_una_escritura_por_ciclo(self):
+        spreadsheet = Mock()
+        spreadsheet.values_batch_get.return_value = {'valueRanges': [
+            {'values': [HEADER, ['PED1', 'Ana', 'Error A', '']]},
+            {'values': [HEADER, ['PED2', 'Luis', 'Error B', ''], ['PED3', 'Luis', 'Error C', '']]},
+        ]}
+        channel = self.channel
+        bot = self.bot
+        mapa = {'Envios!A:D': '1', 'Reembolsos!A:D': '2'}
+
+        resumen = await error_scanner.escanear_errores(bot, spreadsheet, mapa, 123)
+
+        spreadsheet.values_batch_get.assert_called_once_with(["'Envios'!A:D", "'Reembolsos'!A:D"])
+        self.assertEqual(channel.send.await_count, 3)
+        spreadsheet.values_batch_update.assert_called_once()
+        body = spreadsheet.values_batch_update.call_args[0][0]
+        self.assertEqual([d['range'] for d in body['data']], ["'Envios'!D2", "'Reembolsos'!D2", "'Reembolsos'!D3"])
+        self.assertEqual(resumen['notificaciones'], 3)
+
+    async def test_segundo_ciclo_lee_solo_la_cola(self):
+        filas = [HEADER] + [[f'PED{i}', 'Ana', '', 'x'] for i in range(2, 11)]
+        spreadsheet = Mock()
+        spreadsheet.values_batch_get.return_value = {'valueRanges': [{'values': filas}]}
+        mapa = {'Envios!A:D': '1'}
+        await error_scanner.escanear_errores(self.bot, spreadsheet, mapa, 123)
+
+        spreadsheet.values_batch_get.return_value = {'valueRanges': [
+            {'values': [HEADER]},
+            {'values': [['PED8', 'Ana', '', 'x'], ['PED9', 'Ana', '', 'x'], ['PED10', 'Ana', 'Nuevo', '']]},
+            {'values': []},
+            {'values': [['x']] * 7},
+        ]}
+        resumen = await error_scanner.escanear_errores(self.bot, spreadsheet, mapa, 123)
+
+        spreadsheet.values_batch_get.assert_called_with(["'Envios'!A1:D1", "'Envios'!A9:D", "'Envios'!C2:C8", "'Envios'!D2:D8"])
+        self.assertEqual(resumen['filas'], 3)
+        body = spreadsheet.values_batch_update.call_args[0][0]
+        self.assertEqual([d['range'] for d in body['data']], ["'Envios'!D11"])
+
+    async def test_error_en_fila_vieja_se_notifica_en_el_ciclo_siguiente(self):
+        filas = [HEADER] + [[f'PED{i}', 'Ana', '', 'x'] for i in range(2, 11)]
+        spreadsheet = Mock()
+        spreadsheet.values_batch_get.return_value = {'valueRanges': [{'values': filas}]}
+        mapa = {'Envios!A:D': '1'}
+        await error_scanner.escanear_errores(self.bot, spreadsheet, mapa, 123)
+
+        # Alguien cargó un ERROR en la fila 4, fuera de la ventana de relectura
+        spreadsheet.values_batch_get.side_effect = [
+            {'valueRanges': [
+                {'values': [HEADER]},
+                {'values': [['PED9', 'Ana', '', 'x'], ['PED10', 'Ana', '', 'x']]},
+                {'values': [[], [], ['Viejo']]},
+                {'values': [['x'], ['x'], [], ['x'], ['x'], ['x'], ['x']]},
+            ]},
+            {'valueRanges': [{'values': [['PED4', 'Ana', 'Viejo', '']]}]},
+        ]
+        resumen = await error_scanner.escanear_errores(self.bot, spreadsheet, mapa, 123)
+
+        spreadsheet.values_batch_get.assert_called_with(["'Envios'!A4:D4"])
+        self.assertEqual(resumen['notificaciones'], 1)
+        body = spreadsheet.values_batch_update.call_args[0][0]
+        self.assertEqual([d['range'] for d in body['data']], ["'Envios'!D4"])
+
+    async def test_no_renotifica_si_fallo_la_marca(self):
+        spreadsheet = Mock()
+        spreadsheet.values_batch_get.return_value = {'valueRanges': [{'values': [HEADER, ['PED1', 'Ana', 'Error', '']]}]}
+        spreadsheet.values_batch_update.side_effect = Exception('429')
+        mapa = {'Envios!A:D': '1'}
+        await error_scanner.escanear_errores(self.bot, spreadsheet, mapa, 123)
+        spreadsheet.values_batch_get.return_value = {'valueRanges': [{'values': [HEADER]}, {'values': [['PED1', 'Ana', 'Error', '']]}]}
+        await error_scanner.escanear_errores(self.bot, spreadsheet, mapa, 123)
+
+        self.assertEqual(self.channel.send.await_count, 1)
+        self.assertEqual(spreadsheet.values_batch_update.call_count, 2)
@@ -0,0 +1,80 @@
+import asyncio
+import threading
+import time
+import unittest
+from types import SimpleNamespace
+from unittest.mock import Mock, patch
+from utils import google_async, google_client_manager
+
+class TestGoogleAsync(unittest.IsolatedAsyncioTestCase):
+    async def test_ejecuta_fuera_del_event_loop(self):
+        hilo_loop = threading.get_ident()
+        hilo_llamada = await google_async.ejecutar_google(threading.get_ident)
+        self.assertNotEqual(hilo_loop, hilo_llamada)
+
+    async def test_timeout(self):
+        with self.assertRaises(asyncio.TimeoutError):
+            await google_async.ejecutar_google(time.sleep, 0.5, timeout=0.05)
+
+    async def test_escrituras_sin_timeout_esperan_el_resultado(self):
+        with patch('config.GOOGLE_API_TIMEOUT_SEC', 0.05):
+            with self.assertRaises(asyncio.TimeoutError):
+                await google_async.ejecutar_google(time.sleep, 0.2)
+            self.assertIsNone(await google_async.ejecutar_google(time.sleep, 0.2, timeout=None))
+            sheet = Mock()
+            sheet.update_cell.side_effect = lambda *a: time.sleep(0.2) or 'ok'
+            self.assertEqual(await google_async.actualizar_celda(sheet, 2, 3, 'x'), 'ok')
+
+    async def test_propaga_excepciones(self):
+        def falla():
+            raise ValueError('boom')
+        with self.assertRaises(ValueError):
+            await google_async.ejecutar_google(falla)
+
+    async def test_wrappers_de_sheets(self):
+        google_client_manager.invalidar_handles()
+        hoja = Mock()
+        hoja.title = 'Hoja'
+        spreadsheet = Mock(id='id')
+        spreadsheet.worksheets.return_value = [Mock(title='Otra'), hoja]
+        client = Mock()
+        client.open_by_key.return_value = spreadsheet
+        resultado = await google_async.abrir_spreadsheet(client, 'id')
+        self.assertIs(resultado, spreadsheet)
+        self.assertIs(await google_async.obtener_worksheet(spreadsheet, 'Hoja'), hoja)
+        # La planilla y la lista de pestañas salen de la caché de handles
+        self.assertIs(await google_async.abrir_spreadsheet(client, 'id'), spreadsheet)
+        self.assertIs(await google_async.obtener_worksheet(spreadsheet), spreadsheet.worksheets.return_value[0])
+        client.open_by_key.assert_called_once_with('id')
+        spreadsheet.worksheets.assert_called_once()
+        google_client_manager.invalidar_handles()
+
+    async def test_subir_archivos_en_paralelo_acotado(self):
+        activos = {'ahora': 0, 'max': 0}
+        lock = threading.Lock()
+
+        def subir_falso(drive, folder_id, attachment):
+            with lock:
+                activos['ahora'] += 1
+                activos['max'] = max(activos['max'], activos['ahora'])
+            time.sleep(0.02)
+            with lock:
+                activos['ahora'] -= 1
+            if attachment.filename == 'roto.jpg':
+                raise Exception('403')
+            return {'id': attachment.filename, 'name': attachment.filename}
+
+        progreso = []
+
+        async def al_terminar(completados, total):
+            progreso.append((completados, total))
+
+        adjuntos = [SimpleNamespace(filename=f'{i}.jpg') for i in range(5)] + [SimpleNamespace(filename='roto.jpg')]
+        with patch('utils.google_drive.upload_file_to_drive', subir_falso), \
+             patch('config.DRIVE_UPLOAD_CONCURRENCIA', 2, create=True):
+            resultados = await google_async.subir_archivos(Mock(), 'carpeta', adjuntos, al_terminar)
+        self.assertEqual([a.filename for a, _ in resultados], [a.filename for a in adjuntos])
+        self.assertIsInstance(resultados[-1][1], Exception)
+        self.assertLessEqual(activos['max'], 2)
+        self.assertEqual(progreso[-1], (6, 6))
+
@@ -0,0 +1,71 @@
+import unittest
+from unittest.mock import MagicMock, patch
+from gspread.exceptions import APIError, WorksheetNotFound
+from utils import google_client_manager
+
+def _planilla(*titulos):
+    spreadsheet = MagicMock()
+    spreadsheet.id = 'sp1'
+    pestanas = []
+    for titulo in titulos:
+        pestana = MagicMock()
+        pestana.title = titulo
+        pestanas.append(pestana)
+    spreadsheet.worksheets.return_value = pestanas
+    return spreadsheet, pestanas
+
+class TestHandlesCacheados(unittest.TestCase):
+    def setUp(self):
+        google_client_manager.invalidar_handles()
+
+    def tearDown(self):
+        google_client_manager.invalidar_handles()
+
+    def test_reutiliza_planilla_y_pestanas(self):
+        spreadsheet, pestanas = _planilla('Casos', 'REEMBOLSOS')
+        client = MagicMock()
+        client.open_by_key.return_value = spreadsheet
+        self.assertIs(google_client_manager.abrir_spreadsheet_cacheado(client, 'sp1'), spreadsheet)
+        self.assertIs(google_client_manager.abrir_spreadsheet_cacheado(client, 'sp1'), spreadsheet)
+        self.assertIs(google_client_manager.obtener_worksheet_cacheado(spreadsheet, 'REEMBOLSOS'), pestanas[1])
+        self.assertIs(google_client_manager.obtener_worksheet_cacheado(spreadsheet), pestanas[0])
+        client.open_by_key.assert_called_once_with('sp1')
+        spreadsheet.worksheets.assert_called_once()
+
+    def test_vencimiento_e_invalidacion(self):
+        spreadsheet, _ = _planilla('Casos')
+        client = MagicMock()
+        client.open_by_key.return_value = spreadsheet
+        with patch('config.GOOGLE_HANDLE_TTL_SEC', 0):
+            google_client_manager.abrir_spreadsheet_cacheado(client, 'sp1')
+            google_client_manager.abrir_spreadsheet_cacheado(client, 'sp1')
+        self.assertEqual(client.open_by_key.call_count, 2)
+        google_client_manager.invalidar_handles('sp1')
+        google_client_manager.abrir_spreadsheet_cacheado(client, 'sp1')
+        self.assertEqual(client.open_by_key.call_count, 3)
+
+    def test_pestana_nueva_refresca_una_vez(self):
+        spreadsheet, pestanas = _planilla('Casos')
+        google_client_manager.obtener_worksheet_cacheado(spreadsheet, 'Casos')
+        nueva = MagicMock()
+        nueva.title = 'Nueva'
+        spreadsheet.worksheets.return_value = pestanas + [nueva]
+        self.assertIs(google_client_manager.obtener_worksheet_cacheado(spreadsheet, 'Nueva'), nueva)
+        with self.assertRaises(WorksheetNotFound):
+            google_client_manager.obtener_worksheet_cacheado(spreadsheet, 'Inexistente')
+        self.assertEqual(spreadsheet.worksheets.call_count, 3)
+
+    def test_errores_que_invalidan(self):
+        def error_api(codigo, mensaje='x'):
+            respuesta = MagicMock()
+            respuesta.json.return_value = {'error': {'code': codigo, 'message': mensaje, 'status': ''}}
+            return APIError(respuesta)
+
+        self.assertTrue(google_client_manager.es_handle_invalido(WorksheetNotFound('Casos')))
+        self.assertTrue(google_client_manager.es_handle_invalido(error_api(404)))
+        self.assertTrue(google_client_manager.es_handle_invalido(error_api(400, 'Unable to parse range: Casos!A:K')))
+        self.assertFalse(google_client_manager.es_handle_invalido(error_api(429)))
+        self.assertFalse(google_client_manager.es_handle_invalido(ValueError('otro')))
+
+if __name__ == '__main__':
+    unittest.main()
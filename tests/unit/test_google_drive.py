@@ -1,7 +1,168 @@
+import tempfile
+import threading
+import time
 import unittest
-from utils import google_drive
+from pathlib import Path
+from types import SimpleNamespace
+from unittest.mock import MagicMock, patch
+from utils import google_drive, persistence
 
 class TestGoogleDrive(unittest.TestCase):
     def test_dummy(self):
         # Reemplaza este test por tests reales si hay funciones de lógica pura
-        self.assertTrue(True) 
\ No newline at end of file
+        self.assertTrue(True)
+
+class _DescargaFalsa:
+    """Respuesta de requests con stream=True que entrega el contenido en bloques."""
+    def __init__(self, contenido: bytes, bloque: int = 3, headers=None):
+        self.contenido = contenido
+        self.bloque = bloque
+        self.headers = headers or {'content-type': 'application/pdf'}
+        self.ok = True
+        self.leidos = 0
+
+    def iter_content(self, chunk_size=1):
+        for i in range(0, len(self.contenido), self.bloque):
+            self.leidos = i + self.bloque
+            yield self.contenido[i:i + self.bloque]
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        return False
+
+class TestSubidaEnStreaming(unittest.TestCase):
+    def test_getbytes_lee_por_partes(self):
+        descarga = _DescargaFalsa(b'0123456789')
+        media = google_drive.MediaDesdeDescarga(descarga, 'application/pdf', size=10, chunksize=4)
+        self.assertEqual(media.getbytes(0, 4), b'0123')
+        # Solo se leyó lo necesario para la primera parte
+        self.assertLess(descarga.leidos, 10)
+        # Drive confirmó solo 2 bytes: se reenvía desde el buffer
+        self.assertEqual(media.getbytes(2, 4), b'2345')
+        self.assertEqual(media.getbytes(6, 4), b'6789')
+        self.assertEqual(media.getbytes(10, 4), b'')
+        with self.assertRaises(google_drive.ErrorDescarga):
+            media.getbytes(0, 4)
+
+    def test_corte_de_la_descarga_no_se_reintenta(self):
+        class _DescargaCortada(_DescargaFalsa):
+            def iter_content(self, chunk_size=1):
+                yield b'012'
+                raise google_drive.requests.ConnectionError('Connection reset by peer')
+
+        descarga = _DescargaCortada(b'')
+        drive = MagicMock()
+        request = drive.files.return_value.create.return_value
+
+        def siguiente_parte(http=None):
+            # Como googleapiclient: lee la parte del media antes de enviarla
+            drive.files.return_value.create.call_args.kwargs['media_body'].getbytes(0, 8)
+            return None, None
+        request.next_chunk.side_effect = siguiente_parte
+        attachment = SimpleNamespace(url='https://cdn/a.jpg', filename='a.jpg', size=8)
+        with patch('utils.google_drive.requests.get', return_value=descarga), \
+             patch('utils.google_drive.time.sleep') as dormir:
+            with self.assertRaises(google_drive.ErrorDescarga):
+                google_drive.upload_file_to_drive(drive, 'carpeta', attachment)
+        self.assertEqual(request.next_chunk.call_count, 1)
+        dormir.assert_not_called()
+        self.assertFalse(google_drive.es_limite_drive(google_drive.ErrorDescarga('corte')))
+
+    def test_upload_file_to_drive_usa_subida_reanudable(self):
+        descarga = _DescargaFalsa(b'x' * 10)
+        drive = MagicMock()
+        request = drive.files.return_value.create.return_value
+        request.next_chunk.side_effect = [(None, None), (None, {'id': 'f1', 'name': 'factura.pdf'})]
+        attachment = SimpleNamespace(url='https://cdn/factura.pdf', filename='factura.pdf', size=10)
+        with patch('utils.google_drive.requests.get', return_value=descarga):
+            subido = google_drive.upload_file_to_drive(drive, 'carpeta', attachment)
+        self.assertEqual(subido['id'], 'f1')
+        kwargs = drive.files.return_value.create.call_args.kwargs
+        media = kwargs['media_body']
+        self.assertTrue(media.resumable())
+        self.assertEqual(media.size(), 10)
+        self.assertEqual(request.next_chunk.call_count, 2)
+
+    def test_reintenta_limite_de_tasa(self):
+        limite = google_drive.HttpError(SimpleNamespace(status=403, reason='Forbidden', get=lambda *a: ''),
+                                        b'{"error": {"message": "User rate limit exceeded", "errors": [{"reason": "userRateLimitExceeded"}]}}')
+        descarga = _DescargaFalsa(b'x' * 4)
+        drive = MagicMock()
+        request = drive.files.return_value.create.return_value
+        request.next_chunk.side_effect = [limite, (None, {'id': 'f1', 'name': 'a.jpg'})]
+        attachment = SimpleNamespace(url='https://cdn/a.jpg', filename='a.jpg', size=4)
+        with patch('utils.google_drive.requests.get', return_value=descarga), \
+             patch('utils.google_drive.time.sleep') as dormir:
+            self.assertEqual(google_drive.upload_file_to_drive(drive, 'carpeta', attachment)['id'], 'f1')
+        dormir.assert_called_once()
+        # Un 403 de permisos no se reintenta
+        sin_permiso = google_drive.HttpError(SimpleNamespace(status=403, reason='Forbidden', get=lambda *a: ''),
+                                             b'{"error": {"message": "Insufficient permissions"}}')
+        self.assertFalse(google_drive.es_limite_drive(sin_permiso))
+
+    def test_tamano_descarga(self):
+        sin_tamano = SimpleNamespace()
+        self.assertEqual(google_drive._tamano_descarga(sin_tamano, _DescargaFalsa(b'', headers={'content-length': '42'})), 42)
+        comprimida = _DescargaFalsa(b'', headers={'content-length': '42', 'content-encoding': 'gzip'})
+        self.assertIsNone(google_drive._tamano_descarga(sin_tamano, comprimida))
+
+class TestCarpetasDrive(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        persistence.cerrar()
+        self.patchers = [
+            patch('config.SQLITE_DB_PATH', str(Path(self.tmpdir.name) / 'bot.db')),
+            patch.multiple(persistence, LEGACY_ESTADOS_JSON=Path(self.tmpdir.name) / 'no.json',
+                           LEGACY_TAREAS_JSON=Path(self.tmpdir.name) / 'no2.json'),
+        ]
+        for patcher in self.patchers:
+            patcher.start()
+        google_drive._drives_compartidos.clear()
+
+    def tearDown(self):
+        persistence.cerrar()
+        for patcher in reversed(self.patchers):
+            patcher.stop()
+        self.tmpdir.cleanup()
+
+    def _drive(self):
+        drive = MagicMock()
+        drive.files.return_value.get.return_value.execute.return_value = {'driveId': 'sd1'}
+        drive.files.return_value.list.return_value.execute.return_value = {'files': []}
+
+        def crear():
+            time.sleep(0.05)
+            return {'id': 'nueva'}
+        drive.files.return_value.create.return_value.execute.side_effect = crear
+        return drive
+
+    def test_cache_y_creacion_unica(self):
+        drive = self._drive()
+        resultados = []
+        hilos = [threading.Thread(target=lambda: resultados.append(
+            google_drive.find_or_create_drive_folder(drive, 'padre', 'FacturaA_1'))) for _ in range(3)]
+        for hilo in hilos:
+            hilo.start()
+        for hilo in hilos:
+            hilo.join()
+        self.assertEqual(resultados, ['nueva'] * 3)
+        self.assertEqual(drive.files.return_value.create.call_count, 1)
+        # La búsqueda incluye la Shared Drive del padre
+        self.assertEqual(drive.files.return_value.list.call_args.kwargs['driveId'], 'sd1')
+
+        # Otra carpeta bajo el mismo padre no vuelve a buscar la Shared Drive
+        google_drive.find_or_create_drive_folder(drive, 'padre', 'FacturaA_2')
+        self.assertEqual(drive.files.return_value.get.call_count, 1)
+
+        # Repetir el mismo pedido no hace ninguna llamada a Drive
+        drive.reset_mock()
+        self.assertEqual(google_drive.find_or_create_drive_folder(drive, 'padre', 'FacturaA_1'), 'nueva')
+        drive.files.assert_not_called()
+
+        google_drive.olvidar_carpeta_drive('padre', 'FacturaA_1')
+        self.assertIsNone(persistence.obtener_carpeta_drive('padre', 'FacturaA_1'))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,62 @@
+import asyncio
+import unittest
+from unittest.mock import patch
+from utils import idempotency
+
+class TestIdempotencia(unittest.TestCase):
+    def setUp(self):
+        idempotency.limpiar()
+
+    def tearDown(self):
+        idempotency.limpiar()
+
+    def test_clave_normaliza_el_pedido(self):
+        self.assertEqual(idempotency.clave_envio('reembolso', 's1', ' AB12 '), idempotency.clave_envio('reembolso', 's1', 'ab12'))
+        self.assertNotEqual(idempotency.clave_envio('reembolso', 's1', '1'), idempotency.clave_envio('reembolso', 's2', '1'))
+
+    def test_envios_simultaneos_comparten_una_operacion(self):
+        llamadas = []
+
+        async def registrar():
+            llamadas.append(1)
+            await asyncio.sleep(0.01)
+            return 'registrado'
+
+        async def escenario():
+            return await asyncio.gather(*(idempotency.ejecutar_una_vez('k', registrar) for _ in range(3)))
+
+        resultados = asyncio.run(escenario())
+        self.assertEqual(len(llamadas), 1)
+        self.assertEqual(sorted(repetido for _, repetido in resultados), [False, True, True])
+        self.assertTrue(all(resultado == 'registrado' for resultado, _ in resultados))
+        # Un reintento tardío recibe el resultado guardado
+        self.assertEqual(asyncio.run(idempotency.ejecutar_una_vez('k', registrar)), ('registrado', True))
+        self.assertEqual(len(llamadas), 1)
+
+    def test_errores_y_vencimiento_no_se_recuerdan(self):
+        intentos = []
+
+        async def fallar():
+            intentos.append(1)
+            await asyncio.sleep(0.01)
+            raise RuntimeError('sin cuota')
+
+        async def escenario():
+            return await asyncio.gather(
+                idempotency.ejecutar_una_vez('k', fallar), idempotency.ejecutar_una_vez('k', fallar),
+                return_exceptions=True
+            )
+
+        errores = asyncio.run(escenario())
+        self.assertTrue(all(isinstance(error, RuntimeError) for error in errores))
+        self.assertEqual(len(intentos), 1)
+
+        async def registrar():
+            return 'registrado'
+
+        self.assertEqual(asyncio.run(idempotency.ejecutar_una_vez('k', registrar)), ('registrado', False))
+        with patch('config.IDEMPOTENCIA_TTL_SEC', 0):
+            self.assertEqual(asyncio.run(idempotency.ejecutar_una_vez('k', registrar)), ('registrado', False))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,37 @@
+import unittest
+from utils import manual_index
+
+MANUAL = """Reembolsos
+
+Para pedir un reembolso se carga la solicitud con el número de pedido y el CBU del cliente.
+El reembolso se acredita en 10 días hábiles.
+
+Cambios de dirección
+
+Si el cliente quiere cambiar la dirección de envío hay que avisar a Andreani antes del despacho.
+
+Factura A
+
+Las facturas A se piden con el CUIT y la razón social del cliente."""
+
+class TestManualIndex(unittest.TestCase):
+    def test_tokenizar(self):
+        self.assertEqual(manual_index.tokenizar('¿Cómo pido las Facturas A?'), ['pido', 'factura'])
+
+    def test_dividir_en_secciones(self):
+        secciones = manual_index.dividir_en_secciones(MANUAL, max_chars=200)
+        self.assertGreater(len(secciones), 1)
+        self.assertTrue(all(len(s) <= 200 for s in secciones))
+        self.assertEqual(manual_index.dividir_en_secciones('x' * 450, max_chars=200), ['x' * 200, 'x' * 200, 'x' * 50])
+
+    def test_buscar_devuelve_la_seccion_relevante(self):
+        indice = manual_index.IndiceManual.desde_texto(MANUAL, max_chars=200)
+        resultados = indice.buscar('¿En cuántos días se acredita un reembolso?', k=1)
+        self.assertEqual(len(resultados), 1)
+        self.assertIn('10 días hábiles', indice.secciones[resultados[0][1]])
+        self.assertIn('CUIT', indice.contexto('factura con cuit', k=1))
+        self.assertEqual(indice.contexto('zzzz'), '')
+        self.assertEqual(indice.contexto_inicial(k=1), indice.secciones[0])
+
+if __name__ == '__main__':
+    unittest.main()
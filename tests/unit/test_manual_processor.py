@@ -1,7 +1,76 @@
+import asyncio
+import tempfile
 import unittest
+from unittest.mock import MagicMock, patch
 from utils import manual_processor
 
 class TestManualProcessor(unittest.TestCase):
     def test_dummy(self):
         # Reemplaza este test por tests reales si hay funciones de lógica pura
-        self.assertTrue(True) 
\ No newline at end of file
+        self.assertTrue(True)
+
+def _drive(md5='a1', modificado='2025-01-01T00:00:00Z'):
+    drive = MagicMock()
+    drive.files.return_value.get.return_value.execute.return_value = {
+        'name': 'Manual', 'modifiedTime': modificado, 'md5Checksum': md5
+    }
+    return drive
+
+class TestRefrescoDelManual(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.patcher = patch('config.MANUAL_SNAPSHOT_DIR', self.tmpdir.name)
+        self.patcher.start()
+        manual_processor.clear_manual_cache()
+        manual_processor._lock_carga = None
+
+    def tearDown(self):
+        manual_processor.clear_manual_cache()
+        manual_processor._lock_carga = None
+        self.patcher.stop()
+        self.tmpdir.cleanup()
+
+    def test_solo_descarga_si_cambio(self):
+        descargas = []
+
+        def descargar(drive, file_id):
+            descargas.append(file_id)
+            return 'Versión {}\n\nReembolsos en 10 días.'.format(len(descargas)).encode('utf-8')
+
+        async def escenario():
+            with patch.object(manual_processor, 'download_file_from_drive', descargar):
+                await manual_processor.load_and_cache_manual(_drive(), 'f1')
+                sin_cambios = await manual_processor.refrescar_manual(_drive(), 'f1')
+                con_cambios = await manual_processor.refrescar_manual(_drive(md5='b2'), 'f1')
+            return sin_cambios, con_cambios
+
+        sin_cambios, con_cambios = asyncio.run(escenario())
+        self.assertFalse(sin_cambios)
+        self.assertTrue(con_cambios)
+        self.assertEqual(len(descargas), 2)
+        self.assertTrue(manual_processor.get_manual_text().startswith('Versión 2'))
+        self.assertEqual(manual_processor.get_manual_metadata()['md5'], 'b2')
+        self.assertIn('Versión 2', manual_processor.get_manual_index().secciones[0])
+
+    def test_falla_de_descarga_mantiene_la_version_anterior(self):
+        async def escenario():
+            with patch.object(manual_processor, 'download_file_from_drive', return_value=b'Original'):
+                await manual_processor.load_and_cache_manual(_drive(), 'f1')
+            with patch.object(manual_processor, 'download_file_from_drive', side_effect=IOError('sin red')):
+                with self.assertRaises(IOError):
+                    await manual_processor.refrescar_manual(_drive(md5='b2'), 'f1')
+
+        asyncio.run(escenario())
+        self.assertEqual(manual_processor.get_manual_text(), 'Original')
+
+    def test_arranque_desde_la_copia_local(self):
+        with patch.object(manual_processor, 'download_file_from_drive', return_value='Café'.encode('utf-8')):
+            asyncio.run(manual_processor.load_and_cache_manual(_drive(), 'f1'))
+        manual_processor.clear_manual_cache()
+        self.assertFalse(manual_processor.cargar_snapshot('otro'))
+        self.assertTrue(manual_processor.cargar_snapshot('f1'))
+        self.assertEqual(manual_processor.get_manual_text(), 'Café')
+        self.assertFalse(manual_processor.manual_cambio({'md5Checksum': 'a1'}, 'f1'))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,46 @@
+import unittest
+from unittest.mock import Mock
+from utils import member_index
+
+def crear_miembro(member_id, display_name, name, guild):
+    member = Mock()
+    member.id = member_id
+    member.display_name = display_name
+    member.name = name
+    member.guild = guild
+    return member
+
+class TestMemberIndex(unittest.TestCase):
+    def setUp(self):
+        member_index.limpiar_indice()
+        self.guild = Mock()
+        self.guild.id = 1
+        self.ana = crear_miembro(10, 'Ana Pérez', 'ana.p', self.guild)
+        self.guild.members = [self.ana]
+
+    def test_busca_por_display_name_y_usuario(self):
+        self.assertIs(member_index.buscar_miembro(self.guild, 'Ana Pérez'), self.ana)
+        self.assertIs(member_index.buscar_miembro(self.guild, 'ana.p'), self.ana)
+        self.assertIsNone(member_index.buscar_miembro(self.guild, 'Nadie'))
+
+    def test_eventos_actualizan_indice(self):
+        member_index.construir_indice(self.guild)
+        luis = crear_miembro(11, 'Luis', 'luis', self.guild)
+        member_index.registrar_miembro(luis)
+        self.assertIs(member_index.buscar_miembro(self.guild, 'Luis'), luis)
+
+        # discord.py modifica el Member de la caché en el lugar antes de on_member_update
+        self.ana.display_name = 'Ana (BO)'
+        member_index.registrar_miembro(self.ana)
+        self.assertIsNone(member_index.buscar_miembro(self.guild, 'Ana Pérez'))
+        self.assertIs(member_index.buscar_miembro(self.guild, 'Ana (BO)'), self.ana)
+
+        # on_user_update: cambia el nombre de usuario del mismo objeto
+        self.ana.name = 'ana.bo'
+        self.guild.get_member.return_value = self.ana
+        member_index.refrescar_usuario(10, [self.guild])
+        self.assertIsNone(member_index.buscar_miembro(self.guild, 'ana.p'))
+        self.assertIs(member_index.buscar_miembro(self.guild, 'ana.bo'), self.ana)
+
+        member_index.quitar_miembro(luis)
+        self.assertIsNone(member_index.buscar_miembro(self.guild, 'Luis'))
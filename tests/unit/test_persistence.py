@@ -0,0 +1,87 @@
+import json
+import tempfile
+import unittest
+from pathlib import Path
+from unittest.mock import patch
+from utils import persistence
+
+class TestPersistence(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.dir = Path(self.tmpdir.name)
+        persistence.cerrar()
+        self.patchers = [
+            patch('config.SQLITE_DB_PATH', str(self.dir / 'bot.db')),
+            patch.multiple(
+                persistence,
+                LEGACY_ESTADOS_JSON=self.dir / 'pendingData.json',
+                LEGACY_TAREAS_JSON=self.dir / 'tareas_activas.json',
+            ),
+        ]
+        for patcher in self.patchers:
+            patcher.start()
+
+    def tearDown(self):
+        persistence.cerrar()
+        for patcher in reversed(self.patchers):
+            patcher.stop()
+        self.tmpdir.cleanup()
+
+    def test_modo_wal(self):
+        modo = persistence._consultar('PRAGMA journal_mode')[0][0]
+        self.assertEqual(modo.lower(), 'wal')
+
+    def test_estados_lote_y_vencidos(self):
+        persistence.guardar_estados([
+            persistence.EstadoFlujo('1', 'a', {'x': 1}, expira_en=100.0),
+            persistence.EstadoFlujo('1', 'b', {'y': 2}),
+        ])
+        self.assertEqual(persistence.obtener_estado('1', 'a').datos, {'x': 1})
+        self.assertEqual(persistence.estados_vencidos(ahora=150.0), [('1', 'a')])
+        persistence.guardar_estados([], [('1', 'a')])
+        self.assertIsNone(persistence.obtener_estado('1', 'a'))
+        self.assertEqual(len(persistence.cargar_estados()), 1)
+
+    def test_tareas_pausadas_desde(self):
+        persistence.guardar_tarea(persistence.TareaActiva('1', 't1', 'Pausada', pausada_desde=1000.0))
+        persistence.guardar_tarea(persistence.TareaActiva('2', 't2', 'Pausada', pausada_desde=9000.0))
+        persistence.guardar_tarea(persistence.TareaActiva('3', 't3', 'En proceso'))
+        pausadas = persistence.tareas_pausadas_desde(2 * 3600, ahora=10000.0)
+        self.assertEqual([t.user_id for t in pausadas], ['1'])
+        self.assertEqual(persistence.obtener_tarea_por_tarea_id('t3').user_id, '3')
+        persistence.borrar_tarea('3')
+        self.assertIsNone(persistence.obtener_tarea('3'))
+
+    def test_vinculos_mensaje(self):
+        persistence.guardar_vinculo(persistence.VinculoMensaje('1', 'tarea', 555, 777, 't1'))
+        vinculo = persistence.obtener_vinculo_por_mensaje(555)
+        self.assertEqual((vinculo.user_id, vinculo.channel_id, vinculo.referencia), ('1', '777', 't1'))
+        persistence.borrar_vinculo('1', 'tarea')
+        self.assertIsNone(persistence.obtener_vinculo('1', 'tarea'))
+
+    def test_seguimientos_envio(self):
+        persistence.sincronizar_seguimientos({'111': ('P1', 2), '222': ('P2', 3)}, ahora=100.0)
+        seguimiento = persistence.obtener_seguimiento('111')
+        self.assertIsNone(seguimiento.eventos)
+        seguimiento.eventos, seguimiento.proxima_consulta = ['e1'], 500.0
+        persistence.guardar_seguimiento(seguimiento)
+        self.assertEqual([s.numero for s in persistence.seguimientos_vencidos(10, ahora=200.0)], ['222'])
+        # Al resincronizar se conserva la foto y se borran los que ya no están abiertos
+        persistence.sincronizar_seguimientos({'111': ('P1', 4)}, ahora=300.0)
+        seguimiento = persistence.obtener_seguimiento('111')
+        self.assertEqual((seguimiento.fila, seguimiento.eventos), (4, ['e1']))
+        self.assertIsNone(persistence.obtener_seguimiento('222'))
+
+    def test_migra_json_anteriores(self):
+        with open(self.dir / 'pendingData.json', 'w', encoding='utf-8') as f:
+            json.dump({'1': {'flujo': {'paso': 2}}, '__vencimientos__': {'1|flujo': 123.0}}, f)
+        with open(self.dir / 'tareas_activas.json', 'w', encoding='utf-8') as f:
+            json.dump({'9': {'tarea_id': 't9', 'estado': 'En proceso'}}, f)
+        estado = persistence.obtener_estado('1', 'flujo')
+        self.assertEqual((estado.datos, estado.expira_en), ({'paso': 2}, 123.0))
+        self.assertEqual(persistence.obtener_tarea('9').tarea_id, 't9')
+        self.assertFalse((self.dir / 'pendingData.json').exists())
+        self.assertTrue((self.dir / 'pendingData.json.migrado').exists())
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,67 @@
+import asyncio
+import time
+import unittest
+from types import SimpleNamespace
+from unittest.mock import patch
+from utils import qa_service
+
+MANUAL = "Reembolsos\n\nEl reembolso se acredita en 10 días hábiles.\n\nFactura A\n\nSe pide con el CUIT del cliente."
+
+class _ModeloFalso:
+    def __init__(self, demora=0.0):
+        self.demora = demora
+        self.prompts = []
+
+    def generate_content(self, prompt):
+        self.prompts.append(prompt)
+        time.sleep(self.demora)
+        return SimpleNamespace(text='En 10 días hábiles.')
+
+class TestQaService(unittest.TestCase):
+    def setUp(self):
+        qa_service.limpiar_cache_respuestas()
+        qa_service._semaforo = None
+
+    def tearDown(self):
+        qa_service.usar_modelo(None)
+        qa_service.limpiar_cache_respuestas()
+        qa_service._semaforo = None
+
+    def test_normalizar_pregunta(self):
+        self.assertEqual(qa_service.normalizar_pregunta('  ¿Cuándo se ACREDITA el reembolso?? '),
+                         'cuando se acredita el reembolso')
+
+    def test_respuesta_cacheada_por_pregunta_normalizada(self):
+        modelo = _ModeloFalso()
+        qa_service.usar_modelo(modelo)
+        primera = asyncio.run(qa_service.get_answer_from_manual(MANUAL, '¿Cuándo se acredita el reembolso?', 'clave'))
+        segunda = asyncio.run(qa_service.get_answer_from_manual(MANUAL, 'cuando se acredita el reembolso', 'clave'))
+        self.assertEqual(primera, 'En 10 días hábiles.')
+        self.assertEqual(segunda, primera)
+        self.assertEqual(len(modelo.prompts), 1)
+        self.assertIn('10 días hábiles', modelo.prompts[0])
+
+    def test_sin_secciones_relevantes_usa_las_primeras(self):
+        modelo = _ModeloFalso()
+        qa_service.usar_modelo(modelo)
+        # Sin términos en común con el manual: el modelo recibe las primeras secciones
+        respuesta = asyncio.run(qa_service.get_answer_from_manual(MANUAL, '¿Cuánto tarda la plata?', 'clave'))
+        self.assertEqual(respuesta, 'En 10 días hábiles.')
+        self.assertEqual(len(modelo.prompts), 1)
+        self.assertIn('Reembolsos', modelo.prompts[0])
+
+    def test_manual_vacio_no_llama_al_modelo(self):
+        modelo = _ModeloFalso()
+        qa_service.usar_modelo(modelo)
+        respuesta = asyncio.run(qa_service.get_answer_from_manual('', 'zzzz', 'clave'))
+        self.assertEqual(respuesta, qa_service.SIN_RESPUESTA)
+        self.assertEqual(modelo.prompts, [])
+
+    def test_timeout(self):
+        qa_service.usar_modelo(_ModeloFalso(demora=0.2))
+        with patch('config.GEMINI_TIMEOUT_SEC', 0.05):
+            with self.assertRaises(RuntimeError):
+                asyncio.run(qa_service.get_answer_from_manual(MANUAL, 'reembolso', 'clave'))
+
+if __name__ == '__main__':
+    unittest.main()
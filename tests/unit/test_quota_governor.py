@@ -0,0 +1,87 @@
+import threading
+import time
+import unittest
+from types import SimpleNamespace
+from unittest.mock import MagicMock, patch
+from gspread.exceptions import APIError
+from utils import quota_governor
+
+def _respuesta(estado, headers=None):
+    respuesta = MagicMock()
+    respuesta.status_code = estado
+    respuesta.ok = estado < 400
+    respuesta.headers = headers or {}
+    respuesta.content = b''
+    respuesta.json.return_value = {'error': {'code': estado, 'message': 'Quota exceeded', 'status': 'RESOURCE_EXHAUSTED'}}
+    return respuesta
+
+class TestBalde(unittest.TestCase):
+    def test_rafaga_y_recarga(self):
+        balde = quota_governor.Balde('p/sheets/lectura', por_minuto=600)  # 10 por segundo, ráfaga de 100
+        for _ in range(int(balde.capacidad)):
+            self.assertLess(balde.tomar(), 0.05)
+        self.assertGreater(balde.tomar(), 0.05)
+        self.assertEqual(balde.resumen()['interactiva']['pedidos'], int(balde.capacidad) + 1)
+
+    @patch.object(quota_governor, 'RESERVA_INTERACTIVA', 0)
+    def test_fondo_cede_ante_interactivos(self):
+        balde = quota_governor.Balde('p/sheets/lectura', por_minuto=600)
+        balde.tokens = 0.0
+        orden = []
+
+        def pedir(nivel):
+            balde.tomar(nivel)
+            orden.append(nivel)
+
+        fondo = threading.Thread(target=pedir, args=(quota_governor.FONDO,))
+        fondo.start()
+        time.sleep(0.02)
+        interactivo = threading.Thread(target=pedir, args=(quota_governor.INTERACTIVA,))
+        interactivo.start()
+        fondo.join(5)
+        interactivo.join(5)
+        self.assertEqual(orden, [quota_governor.INTERACTIVA, quota_governor.FONDO])
+
+    def test_retry_after_pausa_el_balde(self):
+        balde = quota_governor.Balde('p/drive/escritura', por_minuto=6000)
+        self.assertEqual(balde.limitar(0.2), 0.2)
+        self.assertGreaterEqual(balde.tomar(), 0.15)
+        self.assertEqual(balde.resumen()['limites'], 1)
+
+@patch.object(quota_governor, 'RESERVA_INTERACTIVA', 0)
+@patch('config.GOOGLE_SHEETS_LECTURAS_POR_MIN', 60000)
+@patch('config.GOOGLE_SHEETS_ESCRITURAS_POR_MIN', 60000)
+class TestClientesGobernados(unittest.TestCase):
+    def setUp(self):
+        quota_governor.reiniciar()
+
+    def tearDown(self):
+        quota_governor.reiniciar()
+
+    def test_sheets_reintenta_429_y_clasifica_lectura_escritura(self):
+        cliente = quota_governor.HTTPClientGobernado(SimpleNamespace(project_id='proyecto'), session=MagicMock())
+        cliente.session.request.side_effect = [_respuesta(429, {'Retry-After': '0'}), _respuesta(200), _respuesta(200)]
+        self.assertEqual(cliente.request('get', 'https://sheets/values/A:B').status_code, 200)
+        cliente.request('post', 'https://sheets/values/A:B:append')
+        metricas = quota_governor.metricas()
+        self.assertEqual(metricas['proyecto/sheets/lectura']['interactiva']['pedidos'], 2)
+        self.assertEqual(metricas['proyecto/sheets/lectura']['limites'], 1)
+        self.assertEqual(metricas['proyecto/sheets/escritura']['interactiva']['pedidos'], 1)
+
+    def test_sheets_no_reintenta_otros_errores_y_respeta_el_limite(self):
+        cliente = quota_governor.HTTPClientGobernado(SimpleNamespace(project_id='proyecto'), session=MagicMock())
+        cliente.session.request.return_value = _respuesta(400)
+        with self.assertRaises(APIError):
+            cliente.request('get', 'https://sheets/values/A:B')
+        self.assertEqual(cliente.session.request.call_count, 1)
+
+        cliente.session.request.return_value = _respuesta(429, {'Retry-After': '0'})
+        with patch('config.GOOGLE_QUOTA_REINTENTOS', 2), quota_governor.prioridad(quota_governor.FONDO):
+            with self.assertRaises(APIError):
+                cliente.request('get', 'https://sheets/values/A:B')
+        self.assertEqual(cliente.session.request.call_count, 4)
+        self.assertEqual(quota_governor.metricas()['proyecto/sheets/lectura']['fondo']['pedidos'], 3)
+        self.assertIn('proyecto/sheets/lectura', quota_governor.resumen_metricas())
+
+if __name__ == '__main__':
+    unittest.main()
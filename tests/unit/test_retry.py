@@ -0,0 +1,54 @@
+import asyncio
+import unittest
+from types import SimpleNamespace
+from unittest.mock import AsyncMock, MagicMock, patch
+from googleapiclient.errors import HttpError
+from utils import retry
+
+def _error(estado, contenido=b'{}', retry_after=''):
+    return HttpError(SimpleNamespace(status=estado, reason='', get=lambda clave, defecto=None: retry_after), contenido)
+
+class TestClasificacion(unittest.TestCase):
+    def test_categorias(self):
+        self.assertEqual(retry.clasificar_error_drive(_error(429)), retry.LIMITE)
+        self.assertEqual(retry.clasificar_error_drive(_error(403, b'{"reason": "userRateLimitExceeded"}')), retry.LIMITE)
+        self.assertEqual(retry.clasificar_error_drive(_error(503)), retry.TEMPORAL)
+        self.assertEqual(retry.clasificar_error_drive(ConnectionResetError()), retry.TEMPORAL)
+        self.assertEqual(retry.clasificar_error_drive(_error(403, b'{"message": "Insufficient permissions"}')), retry.PERMISO)
+        self.assertEqual(retry.clasificar_error_drive(_error(404)), retry.NO_ENCONTRADO)
+        self.assertEqual(retry.clasificar_error_drive(ValueError('x')), retry.PERMANENTE)
+
+    def test_espera(self):
+        self.assertEqual(retry.calcular_espera(3, retry.retry_after(_error(429, retry_after='7'))), 7.0)
+        for intento in range(10):
+            self.assertLessEqual(retry.calcular_espera(intento), retry.ESPERA_MAXIMA_SEG)
+
+class TestReintentos(unittest.TestCase):
+    def test_sin_espera_en_el_camino_feliz(self):
+        with patch('utils.retry.time.sleep') as dormir:
+            self.assertEqual(retry.reintentar(lambda: 'ok'), 'ok')
+        dormir.assert_not_called()
+
+    def test_reintenta_temporales_y_no_permisos(self):
+        llamada = MagicMock(side_effect=[_error(500), _error(429, retry_after='1'), 'ok'])
+        with patch('utils.retry.time.sleep') as dormir:
+            self.assertEqual(retry.reintentar(llamada), 'ok')
+        self.assertEqual(dormir.call_count, 2)
+        self.assertEqual(dormir.call_args.args[0], 1.0)
+
+        sin_permiso = MagicMock(side_effect=_error(403))
+        with patch('utils.retry.time.sleep') as dormir, self.assertRaises(HttpError):
+            retry.reintentar(sin_permiso)
+        self.assertEqual(sin_permiso.call_count, 1)
+        dormir.assert_not_called()
+
+    def test_async_agota_los_intentos(self):
+        fabrica = AsyncMock(side_effect=_error(503))
+        with patch('utils.retry.asyncio.sleep', new=AsyncMock()) as dormir:
+            with self.assertRaises(HttpError):
+                asyncio.run(retry.reintentar_async(fabrica, intentos=3))
+        self.assertEqual(fabrica.call_count, 3)
+        self.assertEqual(dormir.await_count, 2)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,51 @@
+import unittest
+from unittest.mock import MagicMock
+from utils import sheet_schema
+from utils.google_sheets import get_col_index, extractor_tarea
+
+class TestSheetSchema(unittest.TestCase):
+    def setUp(self):
+        sheet_schema.invalidar_mapas()
+
+    def test_normalizar_encabezado(self):
+        self.assertEqual(sheet_schema.normalizar_encabezado(' Fecha/Hora\u200b '), 'fechahora')
+        self.assertEqual(sheet_schema.normalizar_encabezado('Número_de-pedido'), 'númerodepedido')
+        self.assertEqual(sheet_schema.normalizar_encabezado(None), '')
+
+    def test_alias_y_nombres(self):
+        mapa = sheet_schema.compilar(['Numero de pedido', 'ID WISE', 'Agente Back', 'Observaciones extra'])
+        self.assertEqual(mapa.indice('pedido'), 0)
+        self.assertEqual(mapa.indice('caso'), 1)
+        self.assertEqual(mapa.indice('AGENTE BACK'), 2)
+        self.assertIsNone(mapa.indice('Resuelto'))
+        self.assertEqual(mapa.indice('Resuelto', 7), 7)
+        self.assertEqual(mapa.indice_que_contiene('observaciones'), 3)
+
+    def test_compilar_reutiliza_mapa(self):
+        header = ['Tarea ID', 'Usuario ID']
+        self.assertIs(sheet_schema.compilar(header), sheet_schema.compilar(list(header)))
+        self.assertEqual(get_col_index(header, 'Usuario ID'), 1)
+
+    def test_extractor(self):
+        extraer = sheet_schema.compilar(['A', 'B']).extractor(['B', 'C', 'A'])
+        self.assertEqual(extraer(['1']), ('', '', '1'))
+        self.assertEqual(extraer(['1', '2']), ('2', '', '1'))
+
+    def test_extractor_tarea(self):
+        header = ['Usuario ID', 'Tarea ID', 'Estado (En proceso, Pausada)']
+        datos = extractor_tarea(header)(['u1', 't1', 'Pausada'], 5)
+        self.assertEqual(datos['tarea_id'], 't1')
+        self.assertEqual(datos['estado'], 'Pausada')
+        self.assertEqual(datos['tiempo_pausado'], '00:00:00')
+        self.assertEqual(datos['fila_idx'], 5)
+
+    def test_mapa_de_hoja_recompila_si_cambia_el_encabezado(self):
+        sheet = MagicMock(title='Hoja')
+        sheet.spreadsheet.id = 'sid'
+        primero = sheet_schema.mapa_de_hoja(sheet, ['Caso', 'Email'])
+        self.assertIs(sheet_schema.mapa_de_hoja(sheet, ['Caso', 'Email']), primero)
+        segundo = sheet_schema.mapa_de_hoja(sheet, ['Email', 'Caso'])
+        self.assertEqual(segundo.indice('Caso'), 1)
+
+if __name__ == '__main__':
+    unittest.main()
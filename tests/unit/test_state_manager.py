@@ -1,7 +1,11 @@
 import unittest
 from utils import state_manager
+from tests.persistencia_temporal import PersistenciaTemporal
 
 class TestStateManager(unittest.TestCase):
+    def setUp(self):
+        PersistenciaTemporal().aislar(self)
+
     def test_set_and_get_user_state(self):
         user_id = "123"
         state_manager.set_user_state(user_id, {"foo": "bar"}, "test")
@@ -13,4 +17,82 @@ class TestStateManager(unittest.TestCase):
         state_manager.set_user_state(user_id, {"baz": "qux"}, "test")
         state_manager.delete_user_state(user_id, "test")
         state = state_manager.get_user_state(user_id, "test")
-        self.assertIsNone(state) 
\ No newline at end of file
+        self.assertIsNone(state) 
+
+class TestStateManagerMemoria(unittest.TestCase):
+    def setUp(self):
+        import tempfile
+        from pathlib import Path
+        from unittest.mock import patch
+        from utils import persistence
+        self.persistence = persistence
+        self.tmpdir = tempfile.TemporaryDirectory()
+        persistence.cerrar()
+        self.patchers = [
+            patch('config.SQLITE_DB_PATH', str(Path(self.tmpdir.name) / 'bot.db')),
+            patch.multiple(
+                persistence,
+                LEGACY_ESTADOS_JSON=Path(self.tmpdir.name) / 'pendingData.json',
+                LEGACY_TAREAS_JSON=Path(self.tmpdir.name) / 'tareas_activas.json',
+            ),
+            patch.multiple(
+                state_manager, _estados={}, _vencimientos={}, _heap_vencimientos=[], _sucios=set(),
+                _cargado=False, _locks_usuario={}, _timer_flush=None, FLUSH_DELAY_SEC=60,
+            ),
+        ]
+        for patcher in self.patchers:
+            patcher.start()
+
+    def tearDown(self):
+        if state_manager._timer_flush is not None:
+            state_manager._timer_flush.cancel()
+        for patcher in reversed(self.patchers):
+            patcher.stop()
+        self.persistence.cerrar()
+        self.tmpdir.cleanup()
+
+    def _recargar(self):
+        state_manager._estados.clear()
+        state_manager._vencimientos.clear()
+        state_manager._heap_vencimientos.clear()
+        state_manager._cargado = False
+
+    def test_persiste_solo_en_el_flush(self):
+        for i in range(5):
+            state_manager.set_user_state("1", {"paso": i}, "flujo")
+        self.assertIsNone(self.persistence.obtener_estado("1", "flujo"))
+        state_manager.flush_states()
+        self.assertEqual(self.persistence.obtener_estado("1", "flujo").datos, {"paso": 4})
+
+    def test_flush_aplica_borrados(self):
+        state_manager.set_user_state("1", {"a": 1}, "flujo")
+        state_manager.flush_states()
+        state_manager.delete_user_state("1", "flujo")
+        state_manager.flush_states()
+        self.assertIsNone(self.persistence.obtener_estado("1", "flujo"))
+
+    def test_ttl_vence_con_cleanup(self):
+        from unittest.mock import patch
+        state_manager.set_user_state("1", {"a": 1}, "corto", ttl=10)
+        state_manager.set_user_state("1", {"b": 2}, "largo")
+        ahora = state_manager.time.time()
+        with patch.object(state_manager.time, 'time', return_value=ahora + 11):
+            state_manager.cleanup_expired_states()
+            self.assertIsNone(state_manager.get_user_state("1", "corto"))
+            self.assertEqual(state_manager.get_user_state("1", "largo"), {"b": 2})
+
+    def test_set_sin_ttl_anula_vencimiento_previo(self):
+        from unittest.mock import patch
+        state_manager.set_user_state("1", {"a": 1}, "flujo", ttl=10)
+        state_manager.set_user_state("1", {"a": 2}, "flujo")
+        ahora = state_manager.time.time()
+        with patch.object(state_manager.time, 'time', return_value=ahora + 11):
+            state_manager.cleanup_expired_states()
+            self.assertEqual(state_manager.get_user_state("1", "flujo"), {"a": 2})
+
+    def test_recarga_conserva_vencimientos(self):
+        state_manager.set_user_state("1", {"a": 1}, "flujo", ttl=100)
+        state_manager.flush_states()
+        self._recargar()
+        self.assertEqual(state_manager.get_user_state("1", "flujo"), {"a": 1})
+        self.assertIn(("1", "flujo"), state_manager._vencimientos)
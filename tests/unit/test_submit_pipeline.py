@@ -0,0 +1,73 @@
+import asyncio
+import unittest
+from types import SimpleNamespace
+from unittest.mock import MagicMock, patch
+from utils import google_client_manager, google_sheets, submit_pipeline
+
+FILAS = [['Número de pedido', 'Fecha', 'Agente'], ['1001', '01-01-2025', 'Ana'], ['1002', '02-01-2025', 'Luis']]
+
+def _cliente(filas=FILAS):
+    sheet = MagicMock()
+    sheet.title = 'REEMBOLSOS'
+    sheet.spreadsheet = SimpleNamespace(id='planilla')
+    sheet.get.return_value = filas
+    spreadsheet = MagicMock()
+    spreadsheet.id = 'planilla'
+    spreadsheet.worksheets.return_value = [sheet]
+    client = MagicMock()
+    client.open_by_key.return_value = spreadsheet
+    return client, spreadsheet, sheet
+
+class TestSubmitPipeline(unittest.TestCase):
+    def setUp(self):
+        google_sheets.invalidar_cache_hojas()
+        google_client_manager.invalidar_handles()
+
+    def tearDown(self):
+        google_sheets.invalidar_cache_hojas()
+        google_client_manager.invalidar_handles()
+
+    def test_una_sola_lectura_para_encabezado_y_duplicado(self):
+        client, spreadsheet, sheet = _cliente()
+        envio = submit_pipeline.EnvioCaso('ReembolsoModal', 'planilla', 'REEMBOLSOS!A:L')
+        duplicado = asyncio.run(envio.preparar(client, ' 1002 '))
+        self.assertTrue(duplicado)
+        self.assertEqual(envio.filas_pedido, [3])
+        self.assertEqual(envio.header, FILAS[0])
+        self.assertEqual(envio.columnas.indice('pedido'), 0)
+        spreadsheet.worksheets.assert_called_once()
+        sheet.get.assert_called_once_with('A:L')
+        self.assertEqual(set(envio.tiempos), {'abrir', 'hoja', 'lectura'})
+
+        # El segundo envío sale de la caché sin volver a leer la pestaña
+        otro = submit_pipeline.EnvioCaso('ReembolsoModal', 'planilla', 'REEMBOLSOS!A:L')
+        self.assertFalse(asyncio.run(otro.preparar(client, '2000')))
+        self.assertTrue(otro.desde_cache)
+        sheet.get.assert_called_once()
+
+    def test_agregar_y_ajustar_fila(self):
+        client, _, sheet = _cliente()
+        envio = submit_pipeline.EnvioCaso('CasoModal', 'planilla', 'A:K')
+        asyncio.run(envio.preparar(client))
+        self.assertEqual(envio.fila_vacia(), ['', '', ''])
+        self.assertEqual(envio.ajustar_al_encabezado(['a']), ['a', '', ''])
+        self.assertEqual(envio.ajustar_al_encabezado(['a', 'b', 'c', 'd']), ['a', 'b', 'c'])
+
+        async def agregar_falso(hoja, fila):
+            return {'updates': {}}
+
+        with patch.object(submit_pipeline, 'agregar_fila', agregar_falso):
+            asyncio.run(envio.agregar(['1003', 'x', 'y']))
+        self.assertIn('escritura', envio.informe())
+
+    def test_error_de_etapa(self):
+        client = MagicMock()
+        client.open_by_key.side_effect = Exception('sin permiso')
+        envio = submit_pipeline.EnvioCaso('CasoModal', 'planilla', 'A:K')
+        with self.assertRaises(submit_pipeline.ErrorEnvio) as contexto:
+            asyncio.run(envio.preparar(client, '1'))
+        self.assertEqual(contexto.exception.etapa, 'abrir')
+        self.assertIn('Error al abrir la hoja de Google Sheets: sin permiso', str(contexto.exception))
+
+if __name__ == '__main__':
+    unittest.main()
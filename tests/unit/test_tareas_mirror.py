@@ -0,0 +1,161 @@
+import unittest
+from unittest.mock import MagicMock, call, patch
+from utils import tareas_mirror, append_queue, persistence
+from tests.persistencia_temporal import PersistenciaTemporal
+
+HEADER = [
+    'Usuario ID', 'Tarea ID', 'Usuario', 'Tarea', 'Observaciones', 'Estado (En proceso, Pausada)',
+    'Fecha/hora de inicio', 'Fecha/hora de finalización', 'Tiempo pausada acumulado', 'Cantidad de casos'
+]
+
+def _hoja(titulo, rows):
+    sheet = MagicMock()
+    sheet.title = titulo
+    sheet.spreadsheet.id = 'sp1'
+    sheet.get_all_values.return_value = rows
+    sheet.row_values.return_value = HEADER
+    return sheet
+
+class TestTareasMirror(unittest.TestCase):
+    def setUp(self):
+        tareas_mirror.invalidar_espejo()
+        tareas_mirror._ultimas_pausas.clear()
+        tareas_mirror._encabezados_historial.clear()
+        tareas_mirror._filas_inicio_historial.clear()
+        tareas_mirror._fallidas.clear()
+        tareas_mirror._reanudado = False
+        self.activas = _hoja('Tareas Activas', [
+            list(HEADER),
+            ['1', 'T1', 'ana', 'Mail', '', 'Finalizada', '01/01/2024 09:00:00', '', '00:00:00', '3'],
+            ['2', 'T2', 'beto', 'Chat', 'obs', 'En proceso', '01/01/2024 10:00:00', '', '00:05:00', '0'],
+        ])
+        self.historial = _hoja('Historial', [list(HEADER)])
+        PersistenciaTemporal().aislar(self)
+
+    def tearDown(self):
+        tareas_mirror.esperar_escrituras()
+        append_queue.vaciar()
+        tareas_mirror.invalidar_espejo()
+
+    def test_lecturas_salen_de_memoria(self):
+        self.assertEqual(tareas_mirror.obtener_tarea_por_id(self.activas, 'T2')['fila_idx'], 3)
+        self.assertIsNone(tareas_mirror.obtener_tarea_activa_por_usuario(self.activas, '1'))
+        self.assertEqual(tareas_mirror.obtener_tarea_activa_por_usuario(self.activas, '2')['tarea_id'], 'T2')
+        self.assertEqual(self.activas.get_all_values.call_count, 1)
+
+    def test_pausar_escribe_una_celda_sin_releer(self):
+        tareas_mirror.obtener_tarea_por_id(self.activas, 'T2')
+        tareas_mirror.pausar_tarea_por_id(self.activas, self.historial, 'T2', 'beto', '01/01/2024 11:00:00')
+        self.assertEqual(tareas_mirror.obtener_tarea_por_id(self.activas, 'T2')['estado'], 'Pausada')
+        tareas_mirror.esperar_escrituras()
+        append_queue.vaciar()
+        self.activas.batch_update.assert_called_once_with([{'range': 'F3', 'values': [['Pausada']]}])
+        self.assertEqual(self.activas.get_all_values.call_count, 1)
+        self.historial.get_all_values.assert_not_called()
+        evento = self.historial.append_rows.call_args[0][0][0]
+        self.assertEqual((evento[1], evento[7]), ('T2', 'Pausa'))
+
+    def test_reanudar_suma_tiempo_pausado(self):
+        tareas_mirror.pausar_tarea_por_id(self.activas, self.historial, 'T2', 'beto', '01/01/2024 11:00:00')
+        tareas_mirror.reanudar_tarea_por_id(self.activas, self.historial, 'T2', 'beto', '01/01/2024 11:10:00')
+        datos = tareas_mirror.obtener_tarea_por_id(self.activas, 'T2')
+        self.assertEqual((datos['estado'], datos['tiempo_pausado']), ('En proceso', '00:15:00'))
+        tareas_mirror.esperar_escrituras()
+        self.assertEqual(
+            self.activas.batch_update.call_args[0][0],
+            [{'range': 'I3', 'values': [['00:15:00']]}, {'range': 'F3', 'values': [['En proceso']]}]
+        )
+        self.historial.get_all_values.assert_not_called()
+
+    def test_registrar_rechaza_tarea_duplicada_y_agrega_fila(self):
+        with self.assertRaises(Exception):
+            tareas_mirror.registrar_tarea_activa(self.activas, '2', 'beto', 'Otra', '', '01/01/2024 12:00:00')
+        self.activas.append_rows.return_value = {'updates': {'updatedRange': "'Tareas Activas'!A4:J4"}}
+        tarea_id = tareas_mirror.registrar_tarea_activa(self.activas, '1', 'ana', 'Otra', '', '01/01/2024 12:00:00')
+        self.assertEqual(tareas_mirror.obtener_tarea_activa_por_usuario(self.activas, '1')['tarea_id'], tarea_id)
+        tareas_mirror.esperar_escrituras()
+        self.assertEqual(self.activas.append_rows.call_args[0][0][0][1], tarea_id)
+        self.assertEqual(tareas_mirror.obtener_tarea_por_id(self.activas, tarea_id)['fila_idx'], 4)
+        self.assertEqual(self.activas.get_all_values.call_count, 1)
+
+    def test_finalizar_escribe_la_cantidad_en_la_fila_del_inicio(self):
+        self.historial.append_rows.return_value = {'updates': {'updatedRange': "'Historial'!A5:J5"}}
+        tareas_mirror.agregar_evento_historial(
+            self.historial, '2', 'T2', 'beto', 'Chat', 'obs', '01/01/2024 10:00:00', 'En proceso', 'Inicio'
+        )
+        with patch('config.APPEND_BATCH_DELAY_MS', 60000):
+            tareas_mirror.finalizar_tarea_por_id_con_cantidad(self.activas, self.historial, 'T2', 'beto', '01/01/2024 12:00:00', '7')
+            # El escritor no queda bloqueado esperando que se escriba el evento Inicio
+            tareas_mirror.esperar_escrituras()
+            self.historial.batch_update.assert_not_called()
+            append_queue.vaciar()
+        tareas_mirror.esperar_escrituras()
+        self.historial.batch_update.assert_called_once_with([{'range': 'J5', 'values': [['7']]}])
+        self.historial.get_all_values.assert_not_called()
+
+    def test_finalizar_sin_inicio_conocido_busca_la_fila(self):
+        self.historial.get_all_values.return_value = [
+            list(HEADER), ['2', 'T2', 'beto', 'Chat', 'obs', 'En proceso', '01/01/2024 10:00:00', 'Inicio', '', '0']
+        ]
+        tareas_mirror.finalizar_tarea_por_id_con_cantidad(self.activas, self.historial, 'T2', 'beto', '01/01/2024 12:00:00', '7')
+        tareas_mirror.esperar_escrituras()
+        self.historial.batch_update.assert_called_once_with([{'range': 'J2', 'values': [['7']]}])
+
+    def test_fallo_de_escritura_queda_pendiente_y_se_reintenta(self):
+        self.activas.batch_update.side_effect = Exception('500')
+        with patch.object(tareas_mirror.time, 'sleep'):
+            tareas_mirror.pausar_tarea_por_id(self.activas, self.historial, 'T2', 'beto', '01/01/2024 11:00:00')
+            tareas_mirror.esperar_escrituras()
+            tareas_mirror.reanudar_tarea_por_id(self.activas, self.historial, 'T2', 'beto', '01/01/2024 11:10:00')
+            tareas_mirror.esperar_escrituras()
+        # La reanudación espera detrás de la pausa que falló, sin intentar escribirse antes
+        self.assertEqual(self.activas.batch_update.call_count, tareas_mirror.MAX_INTENTOS_ESCRITURA)
+        self.assertEqual(tareas_mirror.obtener_tarea_por_id(self.activas, 'T2')['estado'], 'En proceso')
+        self.assertEqual(self.activas.get_all_values.call_count, 1)
+        self.assertEqual([e.datos['fila'] for e in persistence.listar_escrituras_pendientes()], [3, 3])
+
+        self.activas.batch_update.side_effect = None
+        tareas_mirror._reintentar_fallidas()
+        self.assertEqual(self.activas.batch_update.call_args_list[-2:], [
+            call([{'range': 'F3', 'values': [['Pausada']]}]),
+            call([{'range': 'I3', 'values': [['00:15:00']]}, {'range': 'F3', 'values': [['En proceso']]}]),
+        ])
+        self.assertEqual(persistence.listar_escrituras_pendientes(), [])
+        self.assertEqual(tareas_mirror._fallidas, {})
+
+    def test_fila_nueva_sin_confirmar_no_se_encola_de_nuevo(self):
+        self.activas.append_rows.side_effect = Exception('503')
+        with patch('config.APPEND_BATCH_DELAY_MS', 10), \
+                patch.object(append_queue, 'ESPERA_BASE_SEG', 60), \
+                patch.object(append_queue, 'TIMEOUT_CONFIRMACION_SEC', 0.2):
+            tarea_id = tareas_mirror.registrar_tarea_activa(self.activas, '1', 'ana', 'Otra', '', '01/01/2024 12:00:00')
+            tareas_mirror.pausar_tarea_por_id(self.activas, self.historial, tarea_id, 'ana', '01/01/2024 12:30:00')
+            tareas_mirror.esperar_escrituras()
+            tareas_mirror._reintentar_fallidas()
+        # append_queue guarda y reintenta la fila; el espejo solo espera, y la pausa queda detrás
+        self.assertEqual(self.activas.append_rows.call_count, 1)
+        self.assertEqual([p.fila[1] for p in persistence.listar_filas_pendientes() if p.hoja == 'Tareas Activas'], [tarea_id])
+        self.assertEqual([e.tipo for e in persistence.listar_escrituras_pendientes()], ['celdas'])
+        self.activas.batch_update.assert_not_called()
+
+        self.activas.append_rows.side_effect = None
+        self.activas.append_rows.return_value = {'updates': {'updatedRange': "'Tareas Activas'!A4:J4"}}
+        append_queue.vaciar()
+        tareas_mirror._reintentar_fallidas()
+        self.activas.batch_update.assert_called_once_with([{'range': 'F4', 'values': [['Pausada']]}])
+        self.assertEqual(persistence.listar_filas_pendientes(), [])
+        self.assertEqual(persistence.listar_escrituras_pendientes(), [])
+
+    def test_reanudar_escrituras_guardadas(self):
+        persistence.guardar_escritura_pendiente('sp1', 'Tareas Activas', 'celdas', {'fila': 3, 'cambios': [[5, 'Pausada']]})
+        with patch.object(tareas_mirror, 'abrir_spreadsheet_cacheado'), \
+                patch.object(tareas_mirror, 'obtener_worksheet_cacheado', return_value=self.activas):
+            self.assertEqual(tareas_mirror.reanudar_escrituras(MagicMock()), 1)
+            # Un on_ready posterior (reconexión) no las encola otra vez
+            self.assertEqual(tareas_mirror.reanudar_escrituras(MagicMock()), 0)
+        tareas_mirror.esperar_escrituras()
+        self.activas.batch_update.assert_called_once_with([{'range': 'F3', 'values': [['Pausada']]}])
+        self.assertEqual(persistence.listar_escrituras_pendientes(), [])
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,61 @@
+import asyncio
+import unittest
+from unittest.mock import patch
+from utils import tracking_masivo
+
+INFO = {
+    'procesoActual': {'titulo': 'En tránsito'},
+    'fechaEstimadaDeEntrega': '<b>15/01</b>',
+    'timelines': [
+        {'orden': 1, 'traducciones': [{'fechaEvento': '2024-01-10T10:00:00', 'traduccion': 'Recibido', 'sucursal': {'nombre': 'Central'}}]},
+        {'orden': 2, 'traducciones': [{'fechaEvento': '2024-01-11T09:30:00', 'traduccion': 'En camino', 'sucursal': {'nombre': 'Norte'}}]},
+    ],
+}
+
+class TestTrackingMasivo(unittest.TestCase):
+    def test_extraer_numeros(self):
+        self.assertEqual(tracking_masivo.extraer_numeros('123, 456\n789;123  '), ['123', '456', '789'])
+        self.assertEqual(tracking_masivo.extraer_numeros(''), [])
+
+    def test_numeros_de_filas(self):
+        rows = [['Pedido', 'ANDREANI', 'ESTADO ANDREANI'], ['1', '111'], ['2', ''], ['3', '333', 'x']]
+        idx, filas = tracking_masivo.numeros_de_filas(rows, tracking_masivo.fila_inicial('A:M') + 1)
+        self.assertEqual(idx, 1)
+        self.assertEqual(filas, [(2, '111'), (4, '333')])
+        self.assertEqual(tracking_masivo.numeros_de_filas([['Pedido']]), (None, []))
+
+    def test_resumir(self):
+        resumen = tracking_masivo.resumir('111', INFO)
+        self.assertEqual(resumen['estado'], 'En tránsito')
+        self.assertEqual(resumen['entrega'], '15/01')
+        self.assertEqual(resumen['ultimo_evento'], '11/01/2024, 09:30: En camino')
+
+    def test_consultar_varios_respeta_concurrencia(self):
+        activos = {'ahora': 0, 'max': 0}
+
+        async def consultar_falso(numero, auth):
+            activos['ahora'] += 1
+            activos['max'] = max(activos['max'], activos['ahora'])
+            await asyncio.sleep(0.01)
+            activos['ahora'] -= 1
+            if numero == 'malo':
+                raise Exception('404')
+            return INFO
+
+        with patch.object(tracking_masivo, 'consultar_tracking', consultar_falso):
+            resultados = asyncio.run(tracking_masivo.consultar_varios(['a', 'b', 'malo', 'c'], 'Bearer x', concurrencia=2))
+        self.assertEqual([r['numero'] for r in resultados], ['a', 'b', 'malo', 'c'])
+        self.assertEqual(resultados[2]['error'], '404')
+        self.assertLessEqual(activos['max'], 2)
+
+    def test_tabla_csv_y_actualizaciones(self):
+        resultados = [tracking_masivo.resumir('111', INFO),
+                      {'numero': '333', 'estado': '', 'entrega': '', 'ultimo_evento': '', 'error': 'timeout'}]
+        self.assertIn('En tránsito', tracking_masivo.tabla_resumen(resultados))
+        self.assertIsNone(tracking_masivo.tabla_resumen(resultados * 100))
+        self.assertTrue(tracking_masivo.generar_csv(resultados).decode('utf-8-sig').startswith('Número,Estado'))
+        actualizaciones = tracking_masivo.actualizaciones_estado('CAMBIO DE DIRECCIÓN 2025', 2, [(2, '111'), (4, '333')], resultados)
+        self.assertEqual(actualizaciones, [{'range': "'CAMBIO DE DIRECCIÓN 2025'!C2", 'values': [['En tránsito']]}])
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,62 @@
+import unittest
+from tasks import tracking_watcher
+from utils.persistence import SeguimientoEnvio
+
+def _info(titulo, *eventos):
+    return {
+        'procesoActual': {'titulo': titulo},
+        'timelines': [
+            {'orden': i, 'traducciones': [{'fechaEvento': fecha, 'traduccion': desc, 'sucursal': {'nombre': 'Central'}}]}
+            for i, (fecha, desc) in enumerate(eventos, start=1)
+        ],
+    }
+
+class TestTrackingWatcher(unittest.TestCase):
+    def test_envios_abiertos(self):
+        rows = [
+            ['Número de pedido', 'ZECO (ENTREGAR) / ANDRENAI OBLIGATORIO', 'Resuelto'],
+            ['P1', '360000012345678', 'No'],
+            ['P2', 'ZECO', 'No'],
+            ['P3', '360000099999999', 'Sí'],
+            ['P4', 'ver 360000055555555'],
+        ]
+        self.assertEqual(tracking_watcher.envios_abiertos(rows), {
+            '360000012345678': ('P1', 2),
+            '360000055555555': ('P4', 5),
+        })
+
+    def test_proximo_intervalo(self):
+        self.assertIsNone(tracking_watcher.proximo_intervalo_sec('Entregado', 0))
+        cercano = tracking_watcher.proximo_intervalo_sec('En distribución', 5)
+        base = tracking_watcher.proximo_intervalo_sec('En tránsito', 0)
+        self.assertLess(cercano, base)
+        self.assertEqual(tracking_watcher.proximo_intervalo_sec('En tránsito', 1), 2 * base)
+        self.assertLessEqual(tracking_watcher.proximo_intervalo_sec('En tránsito', 50),
+                             tracking_watcher.config.TRACKING_WATCHER_INTERVALO_MAX_MIN * 60)
+
+    def test_aplicar_consulta_solo_avisa_cambios(self):
+        seguimiento = SeguimientoEnvio('111', pedido='P1')
+        info = _info('En tránsito', ('2024-01-10T10:00:00', 'Recibido'))
+        # Primera consulta: solo se guarda la foto
+        self.assertIsNone(tracking_watcher.aplicar_consulta(seguimiento, info, ahora=0))
+        self.assertIsNone(tracking_watcher.aplicar_consulta(seguimiento, info, ahora=10))
+        self.assertEqual(seguimiento.consultas_sin_cambio, 1)
+        nuevo = _info('En distribución', ('2024-01-10T10:00:00', 'Recibido'), ('2024-01-11T08:00:00', 'En distribución'))
+        cambio = tracking_watcher.aplicar_consulta(seguimiento, nuevo, ahora=20)
+        self.assertEqual(cambio['estado_anterior'], 'En tránsito')
+        self.assertEqual(len(cambio['eventos_nuevos']), 1)
+        self.assertEqual(seguimiento.consultas_sin_cambio, 0)
+        embed = tracking_watcher.construir_embed_cambio(seguimiento, cambio)
+        self.assertIn('111', embed.title)
+        tracking_watcher.aplicar_consulta(seguimiento, _info('Entregado'), ahora=30)
+        self.assertIsNone(seguimiento.proxima_consulta)
+
+    def test_presupuesto_horario(self):
+        presupuesto = tracking_watcher.PresupuestoHorario(2)
+        presupuesto.consumir(ahora=0)
+        presupuesto.consumir(ahora=100)
+        self.assertEqual(presupuesto.disponibles(ahora=200), 0)
+        self.assertEqual(presupuesto.disponibles(ahora=3601), 1)
+
+if __name__ == '__main__':
+    unittest.main()
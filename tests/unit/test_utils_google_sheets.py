@@ -30,4 +30,40 @@ class TestGoogleSheetsUtils(unittest.TestCase):
         self.assertIsNone(idx)
 
     def test_normaliza_columna(self):
-        self.assertEqual(google_sheets.normaliza_columna('  Col Á  '), 'colá') 
\ No newline at end of file
+        self.assertEqual(google_sheets.normaliza_columna('  Col Á  '), 'colá') 
+
+class TestCacheHojas(unittest.TestCase):
+    def setUp(self):
+        google_sheets.invalidar_cache_hojas()
+        self.mock_sheet = Mock()
+        self.mock_sheet.get.return_value = [
+            ['Número de pedido', 'Fecha'],
+            ['PED001', '01/01/2024'],
+            [' ped002 ', '02/01/2024'],
+        ]
+
+    def test_check_if_pedido_exists_usa_cache(self):
+        self.assertTrue(google_sheets.check_if_pedido_exists(self.mock_sheet, 'A:B', 'ped001'))
+        self.assertTrue(google_sheets.check_if_pedido_exists(self.mock_sheet, 'A:B', 'PED002'))
+        self.assertFalse(google_sheets.check_if_pedido_exists(self.mock_sheet, 'A:B', 'PED999'))
+        self.assertEqual(self.mock_sheet.get.call_count, 1)
+
+    def test_cache_vencida_relee_hoja(self):
+        google_sheets.obtener_snapshot_hoja(self.mock_sheet, 'A:B')
+        google_sheets.obtener_snapshot_hoja(self.mock_sheet, 'A:B', max_age=0)
+        self.assertEqual(self.mock_sheet.get.call_count, 2)
+
+    def test_append_row_con_cache_actualiza_indice(self):
+        google_sheets.obtener_snapshot_hoja(self.mock_sheet, 'A:B')
+        self.mock_sheet.append_row.return_value = {'updates': {'updatedRange': "'Hoja'!A4:B4"}}
+        google_sheets.append_row_con_cache(self.mock_sheet, ['PED003', '03/01/2024'])
+        filas = google_sheets.buscar_filas_por_pedido(self.mock_sheet, 'A:B', 'ped003')
+        self.assertEqual(filas, [(4, ['PED003', '03/01/2024'])])
+        self.assertEqual(self.mock_sheet.get.call_count, 1)
+
+    def test_append_row_con_cache_sin_rango_invalida(self):
+        google_sheets.obtener_snapshot_hoja(self.mock_sheet, 'A:B')
+        self.mock_sheet.append_row.return_value = None
+        google_sheets.append_row_con_cache(self.mock_sheet, ['PED003', '03/01/2024'])
+        google_sheets.obtener_snapshot_hoja(self.mock_sheet, 'A:B')
+        self.assertEqual(self.mock_sheet.get.call_count, 2)
@@ -1,4 +1,44 @@
+"""
+Consultas de tracking a la API de Andreani.
+get_andreani_tracking es la versión síncrona original; consultar_tracking es la versión
+async que usan los comandos: comparte una sesión aiohttp con pool de conexiones, reintenta
+con espera exponencial y jitter, guarda cada respuesta config.ANDREANI_CACHE_TTL_SEC segundos
+y une las consultas simultáneas de un mismo número en una sola petición.
+"""
+import asyncio
+import random
+import re
+import time
+from collections import OrderedDict
+from datetime import datetime
+import aiohttp
 import requests
+import config
+
+ANDREANI_API_URL = (
+    "https://tracking-api.andreani.com/api/v1/Tracking?idReceptor=1&idSistema=1"
+    "&userData=%7B%22mail%22:%22%22%7D&numeroAndreani={numero}"
+)
+ESTADOS_REINTENTABLES = (429, 500, 502, 503, 504)
+ESPERA_BASE_SEC = 0.5
+
+def _headers(auth_header: str) -> dict:
+    return {
+        'Accept': 'application/json, text/plain, */*',
+        'Authorization': auth_header,
+        'Origin': 'https://www.andreani.com',
+        'Referer': 'https://www.andreani.com/',
+        'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/135.0.0.0 Safari/537.36',
+        'Accept-Encoding': 'gzip, deflate, br, zstd',
+        'Accept-Language': 'es-419,es;q=0.9',
+        'Connection': 'keep-alive',
+        'Sec-Fetch-Dest': 'empty',
+        'Sec-Fetch-Mode': 'cors',
+        'Sec-Fetch-Site': 'same-site',
+        'sec-ch-ua': '"Google Chrome";v="135", "Not-A.Brand";v="8", "Chromium";v="135"',
+        'sec-ch-ua-mobile': '?0',
+        'sec-ch-ua-platform': '"Windows"',
+    }
 
 def get_andreani_tracking(tracking_number: str, auth_header: str) -> dict:
     """
@@ -15,30 +55,14 @@ def get_andreani_tracking(tracking_number: str, auth_header: str) -> dict:
     if not tracking_number or not auth_header:
         raise ValueError("get_andreani_tracking: Número de tracking o encabezado de autorización incompletos.")
 
-    andreani_api_url = (
-        f"https://tracking-api.andreani.com/api/v1/Tracking?idReceptor=1&idSistema=1&userData=%7B%22mail%22:%22%22%7D&numeroAndreani={tracking_number}"
-    )
+    andreani_api_url = ANDREANI_API_URL.format(numero=tracking_number)
     print(f"Consultando API JSON: {andreani_api_url}")
 
-    headers = {
-        'Accept': 'application/json, text/plain, */*',
-        'Authorization': auth_header,
-        'Origin': 'https://www.andreani.com',
-        'Referer': 'https://www.andreani.com/',
-        'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/135.0.0.0 Safari/537.36',
-        'Accept-Encoding': 'gzip, deflate, br, zstd',
-        'Accept-Language': 'es-419,es;q=0.9',
-        'Connection': 'keep-alive',
-        'Sec-Fetch-Dest': 'empty',
-        'Sec-Fetch-Mode': 'cors',
-        'Sec-Fetch-Site': 'same-site',
-        'sec-ch-ua': '"Google Chrome";v="135", "Not-A.Brand";v="8", "Chromium";v="135"',
-        'sec-ch-ua-mobile': '?0',
-        'sec-ch-ua-platform': '"Windows"',
-    }
+    headers = _headers(auth_header)
 
     try:
-        response = requests.get(andreani_api_url, headers=headers)
+        response = requests.get(andreani_api_url, headers=headers,
+                                timeout=(config.ANDREANI_TIMEOUT_CONEXION_SEC, config.ANDREANI_TIMEOUT_LECTURA_SEC))
         if not response.ok:
             raise Exception(f"Error HTTP al consultar la API de Andreani: {response.status_code} {response.reason}")
         tracking_data = response.json()
@@ -49,5 +73,149 @@ def get_andreani_tracking(tracking_number: str, auth_header: str) -> dict:
         print('Error en get_andreani_tracking:', error)
         raise
 
+# --- Cliente async ---
+
+class ErrorAndreani(Exception):
+    """Respuesta HTTP no exitosa de la API de Andreani."""
+    def __init__(self, status: int, reason: str = ''):
+        super().__init__(f"Error HTTP al consultar la API de Andreani: {status} {reason}".strip())
+        self.status = status
+
+_sesion = None
+# Tope de números en la caché; el watcher de trackings agrega números continuamente
+MAX_ENTRADAS_CACHE = 1000
+# tracking_number -> (expira_en, datos), del que vence antes al que vence después
+_cache = OrderedDict()
+# tracking_number -> Task de la consulta en curso
+_en_curso = {}
+
+def _obtener_sesion() -> aiohttp.ClientSession:
+    """Sesión compartida; se vuelve a crear si se cerró o pertenece a otro event loop."""
+    global _sesion
+    loop = asyncio.get_running_loop()
+    if _sesion is None or _sesion.closed or getattr(_sesion, '_loop', loop) is not loop:
+        _sesion = aiohttp.ClientSession(
+            connector=aiohttp.TCPConnector(limit=config.ANDREANI_MAX_CONEXIONES, ttl_dns_cache=300),
+            timeout=aiohttp.ClientTimeout(
+                connect=config.ANDREANI_TIMEOUT_CONEXION_SEC,
+                sock_read=config.ANDREANI_TIMEOUT_LECTURA_SEC,
+            ),
+        )
+    return _sesion
+
+async def cerrar_sesion():
+    """Cierra la sesión HTTP compartida (al apagar el bot)."""
+    global _sesion
+    if _sesion is not None and not _sesion.closed:
+        await _sesion.close()
+    _sesion = None
+
+def _es_reintentable(error) -> bool:
+    if isinstance(error, ErrorAndreani):
+        return error.status in ESTADOS_REINTENTABLES
+    return isinstance(error, (aiohttp.ClientError, asyncio.TimeoutError))
+
+async def _pedir(tracking_number: str, auth_header: str, intentos: int = None):
+    url = ANDREANI_API_URL.format(numero=tracking_number)
+    intentos = max(1, intentos or config.ANDREANI_MAX_INTENTOS)
+    for intento in range(intentos):
+        try:
+            async with _obtener_sesion().get(url, headers=_headers(auth_header)) as response:
+                if response.status >= 400:
+                    raise ErrorAndreani(response.status, response.reason or '')
+                return await response.json(content_type=None)
+        except Exception as error:
+            if not _es_reintentable(error) or intento == intentos - 1:
+                raise
+            # Espera exponencial con jitter completo para no reintentar todos a la vez
+            espera = random.uniform(0, ESPERA_BASE_SEC * 2 ** intento)
+            print(f'Andreani: error reintentable para {tracking_number} ({error!r}); nuevo intento en {espera:.2f} s')
+            await asyncio.sleep(espera)
+
+async def consultar_tracking(tracking_number: str, auth_header: str, usar_cache: bool = True, intentos: int = None) -> dict:
+    """
+    Versión async de get_andreani_tracking.
+    :param usar_cache: si es False se ignora la caché (la respuesta nueva igual se guarda).
+    :param intentos: pedidos HTTP como máximo (por defecto config.ANDREANI_MAX_INTENTOS). Si ya
+        hay una consulta en curso para el número se espera esa, con sus propios intentos.
+    :return: diccionario con los datos del tracking.
+    :raises ValueError: si faltan el número o el encabezado de autorización.
+    :raises ErrorAndreani: si la API responde con error después de los reintentos.
+    """
+    if not tracking_number or not auth_header:
+        raise ValueError("consultar_tracking: Número de tracking o encabezado de autorización incompletos.")
+    tracking_number = tracking_number.strip()
+    ahora = time.monotonic()
+    if usar_cache:
+        guardado = _cache.get(tracking_number)
+        if guardado and guardado[0] > ahora:
+            return guardado[1]
+        if guardado:
+            _cache.pop(tracking_number, None)
+    # Single-flight: las consultas simultáneas de un mismo número esperan la misma tarea
+    tarea = _en_curso.get(tracking_number)
+    if tarea is None or tarea.get_loop() is not asyncio.get_running_loop():
+        tarea = asyncio.ensure_future(_consultar_y_guardar(tracking_number, auth_header, intentos))
+        _en_curso[tracking_number] = tarea
+        tarea.add_done_callback(lambda t, n=tracking_number: _fin_consulta(n, t))
+    # shield: si quien espera se cancela, la consulta sigue para los demás
+    return await asyncio.shield(tarea)
+
+def _fin_consulta(tracking_number, tarea):
+    if _en_curso.get(tracking_number) is tarea:
+        del _en_curso[tracking_number]
+    if not tarea.cancelled():
+        # Marca el error como leído aunque todos los que esperaban se hayan cancelado
+        tarea.exception()
+
+async def _consultar_y_guardar(tracking_number: str, auth_header: str, intentos: int = None):
+    datos = await _pedir(tracking_number, auth_header, intentos)
+    _guardar_en_cache(tracking_number, datos)
+    return datos
+
+def _guardar_en_cache(tracking_number: str, datos: dict):
+    """Guarda la respuesta y descarta las vencidas y, si hace falta, las más viejas hasta MAX_ENTRADAS_CACHE."""
+    ahora = time.monotonic()
+    _cache[tracking_number] = (ahora + config.ANDREANI_CACHE_TTL_SEC, datos)
+    # Con el TTL fijo, la última guardada es la que vence más tarde
+    _cache.move_to_end(tracking_number)
+    while _cache:
+        numero, (expira_en, _) = next(iter(_cache.items()))
+        if expira_en > ahora and len(_cache) <= MAX_ENTRADAS_CACHE:
+            break
+        del _cache[numero]
+
+def invalidar_cache(tracking_number: str = None):
+    """Descarta la caché de un número (o toda)."""
+    if tracking_number is None:
+        _cache.clear()
+    else:
+        _cache.pop(tracking_number.strip(), None)
+
+# --- Formato de la respuesta ---
+
+def limpiar_html(raw_html):
+    """Quita etiquetas y entidades HTML comunes de un texto de la API."""
+    texto = re.sub(re.compile('<.*?>'), '', raw_html or '')
+    return texto.replace('&nbsp;', ' ').replace('&aacute;', 'á').replace('&eacute;', 'é').replace('&iacute;', 'í').replace('&oacute;', 'ó').replace('&uacute;', 'ú').replace('&ntilde;', 'ñ')
+
+def eventos_timeline(info: dict) -> list:
+    """
+    Eventos del historial de un tracking, del más reciente al más antiguo.
+    :return: lista de tuplas (fecha 'dd/mm/yyyy, HH:MM', descripción, sucursal).
+    """
+    eventos = []
+    for tl in sorted(info.get('timelines', []) or [], key=lambda x: x.get('orden', 0), reverse=True):
+        for traduccion in tl.get('traducciones', []):
+            fecha_iso = traduccion.get('fechaEvento', '')
+            try:
+                fecha_fmt = datetime.fromisoformat(fecha_iso).strftime('%d/%m/%Y, %H:%M')
+            except Exception:
+                fecha_fmt = fecha_iso
+            desc = limpiar_html(traduccion.get('traduccion', ''))
+            suc = (traduccion.get('sucursal') or {}).get('nombre', '')
+            eventos.append((fecha_fmt, desc, suc))
+    return eventos
+
 def funcion_andreani():
     pass
\ No newline at end of file
@@ -0,0 +1,208 @@
+"""
+Cola de escritura para las filas que se agregan a Google Sheets.
+Las filas de cada pestaña se agrupan y se escriben con un único append_rows cada
+config.APPEND_BATCH_DELAY_MS milisegundos o al juntar config.APPEND_BATCH_MAX_ROWS filas.
+Cada fila se guarda en SQLite (tabla filas_pendientes) antes de encolarse y se borra
+cuando la escritura se confirma, así un reinicio no pierde filas: reanudar_pendientes()
+las vuelve a encolar. Quien encola recibe un Future que se resuelve con el número de
+fila escrita recién cuando el append_rows se confirmó.
+Un error 5xx, 429 o de red no frena al hilo: el lote vuelve al buffer de su pestaña con
+una hora "no antes de" (espera exponencial, hasta ESPERA_MAX_SEG) y las demás pestañas se
+siguen escribiendo. Esas filas se reintentan sin límite y siguen guardadas en disco; solo
+se descartan al confirmarse la escritura o ante un error 4xx permanente (p. ej. 400 o 404).
+"""
+import asyncio
+import threading
+import time
+from concurrent.futures import Future
+import requests
+import config
+from utils import persistence
+from utils.google_client_manager import abrir_spreadsheet_cacheado, obtener_worksheet_cacheado
+from utils.google_sheets import append_rows_con_cache, _fila_desde_respuesta_append
+
+# 4xx que se reintentan igual: timeout y cuota (el control de cuota ya agotó sus reintentos)
+ESTADOS_4XX_REINTENTABLES = (408, 429)
+ESPERA_BASE_SEG = 1.0
+ESPERA_MAX_SEG = 300.0
+TIMEOUT_CONFIRMACION_SEC = 120
+
+# (spreadsheet_id, título) -> {'sheet', 'items': [(fila, future, id_pendiente)], 'desde', 'no_antes', 'intento'}
+_buffers = {}
+_condicion = threading.Condition()
+_hilo = None
+# on_ready vuelve a dispararse tras una reconexión: las filas guardadas se reencolan una sola vez
+_reanudado = False
+
+def _clave(sheet):
+    spreadsheet = getattr(sheet, 'spreadsheet', None)
+    return (getattr(spreadsheet, 'id', None), getattr(sheet, 'title', None))
+
+def es_permanente(error) -> bool:
+    """
+    True solo para un 4xx de la API de Google que no se arregla reintentando (400, 403, 404...).
+    Los 5xx, 408, 429, errores de red y cualquier otro error se reintentan.
+    """
+    if isinstance(error, (requests.exceptions.ConnectionError, requests.exceptions.Timeout)):
+        return False
+    respuesta = getattr(error, 'response', None)
+    codigo = getattr(respuesta, 'status_code', None) or getattr(error, 'code', None)
+    return isinstance(codigo, int) and 400 <= codigo < 500 and codigo not in ESTADOS_4XX_REINTENTABLES
+
+def _asegurar_hilo():
+    global _hilo
+    if _hilo is None or not _hilo.is_alive():
+        _hilo = threading.Thread(target=_bucle, name='append-queue', daemon=True)
+        _hilo.start()
+
+def encolar_fila(sheet, fila, persistir: bool = True, id_pendiente: int = None) -> Future:
+    """
+    Encola una fila para la pestaña dada.
+    :return: concurrent.futures.Future con el número de fila escrita (o None si la API no lo informa).
+    """
+    clave = _clave(sheet)
+    if persistir and id_pendiente is None:
+        try:
+            id_pendiente = persistence.guardar_fila_pendiente(str(clave[0]), str(clave[1]), list(fila))
+        except Exception as error:
+            print(f'append_queue: No se pudo guardar la fila pendiente en disco: {error}')
+    future = Future()
+    with _condicion:
+        buffer = _buffers.get(clave)
+        if buffer is None:
+            buffer = _buffers[clave] = {'sheet': sheet, 'items': [], 'desde': time.monotonic(), 'no_antes': 0.0, 'intento': 0}
+        buffer['items'].append((list(fila), future, id_pendiente))
+        _asegurar_hilo()
+        _condicion.notify()
+    return future
+
+async def agregar_fila_confirmada(sheet, fila, timeout: float = TIMEOUT_CONFIRMACION_SEC):
+    """Encola la fila y espera a que el lote que la contiene quede escrito en la hoja."""
+    return await asyncio.wait_for(asyncio.wrap_future(encolar_fila(sheet, fila)), timeout)
+
+def _lotes_listos(ahora, forzar=False):
+    """Extrae los buffers que vencieron o se llenaron y no esperan un reintento (llamar con _condicion tomada)."""
+    demora = config.APPEND_BATCH_DELAY_MS / 1000
+    listos = []
+    for clave in list(_buffers):
+        buffer = _buffers[clave]
+        if forzar or (ahora >= buffer['no_antes'] and (
+            len(buffer['items']) >= config.APPEND_BATCH_MAX_ROWS or ahora - buffer['desde'] >= demora
+        )):
+            listos.append(_buffers.pop(clave))
+    return listos
+
+def _proxima_espera(ahora):
+    if not _buffers:
+        return None
+    demora = config.APPEND_BATCH_DELAY_MS / 1000
+    return max(0.0, min(max(b['desde'] + demora, b['no_antes']) for b in _buffers.values()) - ahora)
+
+def _bucle():
+    while True:
+        with _condicion:
+            listos = _lotes_listos(time.monotonic())
+            while not listos:
+                _condicion.wait(_proxima_espera(time.monotonic()))
+                listos = _lotes_listos(time.monotonic())
+        for buffer in listos:
+            _escribir_lote(buffer)
+
+def _reencolar(buffer, items, error):
+    """Devuelve items al frente del buffer de su pestaña para reintentarlos más tarde, sin bloquear el hilo."""
+    intento = buffer['intento'] + 1
+    espera = min(ESPERA_MAX_SEG, ESPERA_BASE_SEG * 2 ** min(intento - 1, 20))
+    print(f'append_queue: Error reintentable en "{getattr(buffer["sheet"], "title", "?")}" ({error}); nuevo intento en {espera:.0f} s')
+    clave = _clave(buffer['sheet'])
+    with _condicion:
+        actual = _buffers.get(clave)
+        # Las filas encoladas mientras tanto van detrás de las que fallaron
+        _buffers[clave] = {
+            'sheet': buffer['sheet'], 'items': items + (actual['items'] if actual else []),
+            'desde': buffer['desde'], 'no_antes': time.monotonic() + espera, 'intento': intento
+        }
+        _asegurar_hilo()
+        _condicion.notify()
+
+def _escribir_lote(buffer):
+    sheet, items = buffer['sheet'], buffer['items']
+    maximo = max(1, config.APPEND_BATCH_MAX_ROWS)
+    for inicio in range(0, len(items), maximo):
+        parte = items[inicio:inicio + maximo]
+        filas = [fila for fila, _, _ in parte]
+        ids = [id_pendiente for _, _, id_pendiente in parte]
+        try:
+            respuesta = append_rows_con_cache(sheet, filas)
+        except Exception as error:
+            if not es_permanente(error):
+                # Las filas siguen guardadas en disco; quien espera el Future decide cuánto esperar
+                _reencolar(buffer, items[inicio:], error)
+                return
+            print(f'[ERROR] append_queue: Error permanente al escribir en "{getattr(sheet, "title", "?")}"; se descartan {len(filas)} filas: {filas} ({error})')
+            # Quien encoló recibe el error; reintentar la misma fila volvería a fallar
+            _borrar_pendientes(ids)
+            for _, future, _ in parte:
+                _resolver(future, error=error)
+            continue
+        _borrar_pendientes(ids)
+        fila_inicio = _fila_desde_respuesta_append(respuesta)
+        for i, (_, future, _) in enumerate(parte):
+            _resolver(future, fila_inicio + i if fila_inicio is not None else None)
+
+def _resolver(future, resultado=None, error=None):
+    """
+    Entrega el resultado a quien encoló. Si ya dejó de esperar (agregar_fila_confirmada
+    cancela el Future al vencer su timeout) no hay a quién avisar, y un Future en un
+    estado inesperado no debe tirar abajo al hilo de la cola.
+    """
+    try:
+        if not future.set_running_or_notify_cancel():
+            return
+        if error is not None:
+            future.set_exception(error)
+        else:
+            future.set_result(resultado)
+    except Exception as e:
+        print(f'append_queue: No se pudo resolver el Future de una fila: {e}')
+
+def _borrar_pendientes(ids):
+    try:
+        persistence.borrar_filas_pendientes(ids)
+    except Exception as error:
+        print(f'append_queue: No se pudieron borrar filas pendientes {ids}: {error}')
+
+def vaciar():
+    """Escribe ya todo lo encolado, sin esperar la demora del lote."""
+    with _condicion:
+        listos = _lotes_listos(time.monotonic(), forzar=True)
+    for buffer in listos:
+        _escribir_lote(buffer)
+
+def reanudar_pendientes(client) -> int:
+    """
+    Vuelve a encolar las filas que quedaron guardadas sin confirmar (p. ej. tras un reinicio).
+    Se llama en on_ready; las llamadas siguientes (reconexiones) no hacen nada, porque esas
+    filas ya están en la cola y reencolarlas las escribiría dos veces.
+    """
+    global _reanudado
+    with _condicion:
+        if _reanudado:
+            return 0
+        pendientes = persistence.listar_filas_pendientes()
+        _reanudado = True
+    hojas = {}
+    for pendiente in pendientes:
+        clave = (pendiente.spreadsheet_id, pendiente.hoja)
+        try:
+            if clave not in hojas:
+                hojas[clave] = obtener_worksheet_cacheado(
+                    abrir_spreadsheet_cacheado(client, pendiente.spreadsheet_id), pendiente.hoja
+                )
+        except Exception as error:
+            print(f'append_queue: No se pudo abrir {clave} para reanudar filas pendientes: {error}')
+            hojas[clave] = None
+        if hojas[clave] is not None:
+            encolar_fila(hojas[clave], pendiente.fila, id_pendiente=pendiente.id)
+    if pendientes:
+        print(f'append_queue: {len(pendientes)} filas pendientes reencoladas.')
+    return len(pendientes)
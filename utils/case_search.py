@@ -0,0 +1,141 @@
+"""
+Búsqueda de casos por número de pedido en todas las pestañas de SHEETS_TO_SEARCH.
+Las pestañas vigentes en la caché se resuelven al instante y el resto se lee con un
+único values_batch_get; los resultados se entregan por pestaña a medida que están listos.
+Solo si la lectura en lote falla se lee pestaña por pestaña, y esos resultados llegan
+marcados con 'progresivo' para que la respuesta se vaya editando mientras llegan.
+"""
+import asyncio
+import config
+from utils.google_async import ejecutar_google
+from utils.google_sheets import (
+    obtener_snapshot_cacheado, guardar_snapshot_hoja, normalizar_pedido
+)
+
+RANGO_BUSQUEDA = 'A:Z'
+LIMITE_MENSAJE = 2000
+
+def _rango_a1(nombre_pestana: str) -> str:
+    nombre = nombre_pestana.replace("'", "''")
+    return f"'{nombre}'!{RANGO_BUSQUEDA}"
+
+def _leer_pestanas_batch(spreadsheet, pestanas: list) -> dict:
+    """Lee todas las pestañas en una sola llamada. Devuelve {pestaña: filas}."""
+    respuesta = spreadsheet.values_batch_get([_rango_a1(p) for p in pestanas])
+    value_ranges = respuesta.get('valueRanges', []) if isinstance(respuesta, dict) else []
+    if len(value_ranges) != len(pestanas):
+        raise ValueError(f'values_batch_get devolvió {len(value_ranges)} rangos para {len(pestanas)} pestañas')
+    return {p: vr.get('values', []) for p, vr in zip(pestanas, value_ranges)}
+
+def _leer_pestana(spreadsheet, nombre_pestana: str) -> list:
+    return spreadsheet.worksheet(nombre_pestana).get(RANGO_BUSQUEDA)
+
+def _resultado_pestana(nombre_pestana: str, entrada: dict, pedido: str) -> dict:
+    resultado = {'sheet': nombre_pestana, 'matches': [], 'error': None}
+    rows = entrada['rows']
+    if len(rows) <= 1:
+        return resultado
+    if entrada['pedido_col'] == -1:
+        resultado['error'] = f"⚠️ No se encontró la columna \"Número de pedido\" en la pestaña \"{nombre_pestana}\"."
+        return resultado
+    resultado['matches'] = [
+        {'sheet': nombre_pestana, 'row_number': i, 'data': rows[i - 1]}
+        for i in entrada['indice'].get(normalizar_pedido(pedido), [])
+    ]
+    return resultado
+
+async def buscar_pedido_en_pestanas(spreadsheet, pedido: str, pestanas: list = None):
+    """
+    Generador asíncrono que busca un pedido en varias pestañas.
+    Entrega un dict por pestaña con 'sheet', 'matches' (lista de filas encontradas) y 'error'.
+    :param spreadsheet: Instancia de gspread.Spreadsheet
+    :param pedido: Número de pedido a buscar
+    :param pestanas: Pestañas a recorrer (por defecto config.SHEETS_TO_SEARCH)
+    """
+    pestanas = list(pestanas if pestanas is not None else config.SHEETS_TO_SEARCH)
+    spreadsheet_id = getattr(spreadsheet, 'id', None)
+    pendientes = []
+    for nombre in pestanas:
+        entrada = obtener_snapshot_cacheado(spreadsheet_id, nombre, RANGO_BUSQUEDA)
+        if entrada:
+            yield _resultado_pestana(nombre, entrada, pedido)
+        else:
+            pendientes.append(nombre)
+    if not pendientes:
+        return
+
+    try:
+        filas_por_pestana = await ejecutar_google(_leer_pestanas_batch, spreadsheet, pendientes)
+    except Exception as batch_error:
+        print(f'buscar_pedido_en_pestanas: Falló la lectura en lote, se leen las pestañas en paralelo: {batch_error}')
+        filas_por_pestana = None
+
+    if filas_por_pestana is not None:
+        for nombre in pendientes:
+            entrada = guardar_snapshot_hoja(spreadsheet_id, nombre, RANGO_BUSQUEDA, filas_por_pestana.get(nombre))
+            yield _resultado_pestana(nombre, entrada, pedido)
+        return
+
+    async def leer(nombre):
+        try:
+            return nombre, await ejecutar_google(_leer_pestana, spreadsheet, nombre), None
+        except Exception as sheet_error:
+            return nombre, None, sheet_error
+
+    for tarea in asyncio.as_completed([leer(nombre) for nombre in pendientes]):
+        nombre, rows, sheet_error = await tarea
+        if sheet_error is not None:
+            print(f'buscar_pedido_en_pestanas: Error al leer la pestaña {nombre}: {sheet_error}')
+            yield {'sheet': nombre, 'matches': [], 'error': f"⚠️ Error al leer la pestaña \"{nombre}\".", 'progresivo': True}
+            continue
+        entrada = guardar_snapshot_hoja(spreadsheet_id, nombre, RANGO_BUSQUEDA, rows)
+        yield _resultado_pestana(nombre, entrada, pedido) | {'progresivo': True}
+
+def formatear_resultados_busqueda(pedido: str, resultados: list, pendientes: int = 0) -> str:
+    """
+    Arma el mensaje de resultados de la búsqueda.
+    :param resultados: Resultados por pestaña recibidos hasta el momento.
+    :param pendientes: Pestañas que todavía no respondieron (0 = mensaje final).
+    """
+    search_summary = f"Resultados de la búsqueda para el pedido **{pedido}**:\n\n"
+    found_rows = []
+    for resultado in resultados:
+        if resultado['error']:
+            search_summary += resultado['error'] + "\n"
+        found_rows.extend(resultado['matches'])
+    if found_rows:
+        search_summary += f"✅ Se encontraron **{len(found_rows)}** coincidencias:\n\n"
+        detailed_results = ''
+        for found in found_rows:
+            detailed_results += f"**Pestaña:** \"{found['sheet']}\", **Fila:** {found['row_number']}\n"
+            display_columns = ' | '.join(str(c) for c in found['data'][:6])
+            detailed_results += f"`{display_columns}`\n\n"
+        pie = f"⏳ Buscando en {pendientes} pestañas más..." if pendientes else ''
+        full_message = search_summary + detailed_results + pie
+        if len(full_message) > LIMITE_MENSAJE:
+            return search_summary + "Los resultados completos son demasiado largos para mostrar aquí. Por favor, revisa la hoja de Google Sheets directamente." + (f"\n{pie}" if pie else '')
+        return full_message
+    if pendientes:
+        return search_summary + f"⏳ Buscando en {pendientes} pestañas más..."
+    return search_summary + '😕 No se encontraron coincidencias en las pestañas configuradas.'
+
+async def responder_busqueda_caso(interaction, spreadsheet, pedido: str):
+    """
+    Ejecuta la búsqueda y responde la interacción (ya diferida) con un solo mensaje.
+    Solo en la lectura pestaña por pestaña se va editando la respuesta con los resultados
+    parciales; la caché y el lote ya traen todo junto y no gastan ediciones de Discord.
+    """
+    pestanas = list(config.SHEETS_TO_SEARCH)
+    resultados = []
+    hubo_parciales = False
+    async for resultado in buscar_pedido_en_pestanas(spreadsheet, pedido, pestanas):
+        resultados.append(resultado)
+        pendientes = len(pestanas) - len(resultados)
+        if pendientes and resultado['matches'] and resultado.get('progresivo'):
+            hubo_parciales = True
+            await interaction.edit_original_response(content=formatear_resultados_busqueda(pedido, resultados, pendientes))
+    mensaje = formatear_resultados_busqueda(pedido, resultados)
+    if hubo_parciales:
+        await interaction.edit_original_response(content=mensaje)
+    else:
+        await interaction.followup.send(mensaje, ephemeral=False)
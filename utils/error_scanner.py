@@ -0,0 +1,357 @@
+"""
+Escáner de errores en las hojas de casos.
+Lee todos los rangos de MAPA_RANGOS_ERRORES con un único values_batch_get por ciclo
+(solo la cola no vista de cada pestaña más una ventana de filas recientes), notifica en
+Discord las filas con ERROR sin marcar y escribe todas las marcas de "ErrorEnvioCheck"
+con un único values_batch_update.
+En el mismo lote se leen solo las columnas ERROR y ErrorEnvioCheck de las filas anteriores
+a la ventana: un ERROR cargado en una fila vieja se detecta en el ciclo siguiente y esa
+fila se lee completa en un segundo lote, sin esperar la lectura completa periódica.
+"""
+from datetime import datetime
+from pathlib import Path
+import json
+import os
+import re
+import zlib
+import discord
+import pytz
+from gspread.utils import a1_to_rowcol, rowcol_to_a1
+import config
+from utils.google_async import ejecutar_google
+from utils.member_index import buscar_miembro
+from utils.sheet_schema import CAMPOS_ERRORES, compilar
+
+def separar_rango(sheet_range: str):
+    """Devuelve (nombre de pestaña o None, rango A1 sin pestaña)."""
+    if '!' in sheet_range:
+        hoja_nombre, rango_puro = sheet_range.split('!', 1)
+        return hoja_nombre.strip("'"), rango_puro
+    return None, sheet_range
+
+def rango_citado(hoja_nombre: str, rango_puro: str) -> str:
+    """Arma un rango A1 con el nombre de pestaña entre comillas simples."""
+    if not hoja_nombre:
+        return rango_puro
+    return "'" + hoja_nombre.replace("'", "''") + "'!" + rango_puro
+
+def extraer_notificaciones(rows: list, fila_inicio: int = 2) -> dict:
+    """
+    Calcula las notificaciones pendientes de un rango (encabezado en rows[0]).
+    :param fila_inicio: Número de fila en la hoja de rows[1].
+    :return: dict con 'idx_notificado' (None si falta ERROR o ErrorEnvioCheck) y 'pendientes',
+             lista de dicts con 'fila', 'campos', 'error', 'observaciones' y 'agente'.
+    """
+    resultado = {'idx_notificado': None, 'pendientes': []}
+    if not rows or len(rows) <= 1:
+        return resultado
+    header_row = rows[0]
+    mapa = compilar(header_row)
+    idx = {campo: mapa.indice(campo) for campo in CAMPOS_ERRORES}
+    if idx['error'] is None or idx['notificado'] is None:
+        return resultado
+    resultado['idx_notificado'] = idx['notificado']
+
+    def valor(row, campo):
+        i = idx[campo]
+        return row[i] if (i is not None and i < len(row)) else None
+
+    for i, row in enumerate(rows[1:], start=fila_inicio):
+        error_value = str(valor(row, 'error') or '').strip()
+        notified_value = str(valor(row, 'notificado') or '').strip()
+        if not error_value or notified_value:
+            continue
+        # Solo agregar campos si existen en la hoja
+        campos = []
+        for campo, titulo, inline in (('pedido', "N° de Pedido", True), ('caso', "N° de Caso", True),
+                                      ('tipo', "Tipo de Solicitud", False), ('datos', "Datos de Contacto", False)):
+            if idx[campo] is not None and idx[campo] < len(row):
+                campos.append((titulo, row[idx[campo]], inline))
+        resultado['pendientes'].append({
+            'fila': i,
+            'huella': _huella(error_value, notified_value),
+            'campos': campos,
+            'error': error_value,
+            'observaciones': valor(row, 'observaciones'),
+            'agente': valor(row, 'agente') if valor(row, 'agente') is not None else 'N/A',
+        })
+    return resultado
+
+def construir_embed_error(notificacion: dict) -> discord.Embed:
+    """Crea el embed profesional para un error detectado."""
+    embed = discord.Embed(
+        title="🚨 Error detectado en la hoja de Casos",
+        description=f"Hay un error marcado en un caso que cargaste:",
+        color=discord.Color.red()
+    )
+    embed.add_field(name="Fila en Sheet", value=str(notificacion['fila']), inline=True)
+    for nombre, valor, inline in notificacion['campos']:
+        embed.add_field(name=nombre, value=valor, inline=inline)
+    embed.add_field(name="Error", value=notificacion['error'], inline=False)
+    if notificacion['observaciones']:
+        embed.add_field(name="Observaciones", value=notificacion['observaciones'], inline=False)
+    embed.set_footer(text="Por favor, revisa la hoja para más detalles.")
+    return embed
+
+def mencion_agente(guild, agente_name) -> str:
+    found_member = buscar_miembro(guild, agente_name)
+    return f'<@{found_member.id}>' if found_member else agente_name
+
+def timestamp_notificacion() -> str:
+    tz = pytz.timezone('America/Argentina/Buenos_Aires')
+    return datetime.now(tz).strftime('%d-%m-%Y %H:%M:%S')
+
+async def notificar_pendientes(channel, guild, pendientes: list) -> list:
+    """
+    Envía al canal las notificaciones pendientes de un rango.
+    :return: Notificaciones enviadas con éxito.
+    """
+    enviadas = []
+    for notificacion in pendientes:
+        try:
+            await channel.send(content=mencion_agente(guild, notificacion['agente']),
+                               embed=construir_embed_error(notificacion))
+            enviadas.append(notificacion)
+        except Exception as e:
+            print(f"Error al enviar notificación: {e}")
+    return enviadas
+
+def actualizaciones_marca(hoja_nombre, idx_notificado: int, notificaciones: list) -> list:
+    """Arma las actualizaciones {'range', 'values'} de ErrorEnvioCheck para values_batch_update."""
+    marca = timestamp_notificacion()
+    return [
+        {'range': rango_citado(hoja_nombre, rowcol_to_a1(n['fila'], idx_notificado + 1)), 'values': [[marca]]}
+        for n in notificaciones
+    ]
+
+async def marcar_notificados(spreadsheet, actualizaciones: list) -> bool:
+    """Escribe todas las marcas de notificación con un único values_batch_update."""
+    if not actualizaciones:
+        return True
+    body = {'valueInputOption': 'USER_ENTERED', 'data': actualizaciones}
+    try:
+        await ejecutar_google(spreadsheet.values_batch_update, body)
+        print(f"Columna de notificación marcada en {len(actualizaciones)} celdas")
+        return True
+    except Exception as update_error:
+        print(f"Error al marcar columna de notificación: {update_error}")
+        return False
+
+async def _leer_rangos(spreadsheet, rangos: list) -> dict:
+    """Lee los rangos en lote; si el lote falla, los lee uno por uno para aislar el rango con problemas."""
+    try:
+        respuesta = await ejecutar_google(spreadsheet.values_batch_get, rangos)
+        value_ranges = respuesta.get('valueRanges', [])
+        if len(value_ranges) == len(rangos):
+            return {r: vr.get('values', []) for r, vr in zip(rangos, value_ranges)}
+        print(f"escanear_errores: values_batch_get devolvió {len(value_ranges)} rangos para {len(rangos)}")
+    except Exception as batch_error:
+        print(f"escanear_errores: Falló la lectura en lote, se leen los rangos por separado: {batch_error}")
+    filas = {}
+    for rango in rangos:
+        try:
+            respuesta = await ejecutar_google(spreadsheet.values_get, rango)
+            filas[rango] = respuesta.get('values', [])
+        except Exception as range_error:
+            print(f"❌ Error al leer {rango}: {range_error}")
+            filas[rango] = None
+    return filas
+
+# --- Estado del escaneo incremental ---
+# Por rango se guarda la marca de agua (última fila leída), la huella del encabezado,
+# el contador de ciclos y las huellas de filas ya notificadas cuya marca todavía no se vio
+# escrita en la hoja (evita notificar dos veces si falla la escritura de ErrorEnvioCheck).
+
+def _cargar_estado() -> dict:
+    ruta = Path(config.ERROR_SCAN_STATE_PATH)
+    try:
+        with open(ruta, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return {}
+    except Exception as e:
+        print(f"escanear_errores: No se pudo leer el estado del escaneo, se hará una lectura completa: {e}")
+        return {}
+
+def _guardar_estado(estado: dict):
+    ruta = Path(config.ERROR_SCAN_STATE_PATH)
+    try:
+        ruta.parent.mkdir(parents=True, exist_ok=True)
+        tmp = ruta.with_suffix(ruta.suffix + '.tmp')
+        with open(tmp, 'w', encoding='utf-8') as f:
+            json.dump(estado, f, ensure_ascii=False)
+        os.replace(tmp, ruta)
+    except Exception as e:
+        print(f"escanear_errores: No se pudo guardar el estado del escaneo: {e}")
+
+def _huella(*valores) -> int:
+    return zlib.crc32('\x1f'.join(str(v) for v in valores).encode('utf-8'))
+
+def _columnas_rango(rango_puro: str):
+    """'A:M' -> ('A', 'M'). Devuelve None si el rango no es de columnas."""
+    match = re.match(r'^([A-Za-z]+)\d*:([A-Za-z]+)\d*$', rango_puro)
+    return (match.group(1).upper(), match.group(2).upper()) if match else None
+
+def _plan_lectura(hoja_nombre, rango_puro: str, est: dict):
+    """
+    Decide qué leer de un rango: el encabezado y la cola desde la marca de agua menos la
+    ventana de relectura, o todo el rango cada ERROR_SCAN_COMPLETO_CADA ciclos.
+    :return: (rango del encabezado o None, rango de datos, fila inicial de los datos)
+    """
+    columnas = _columnas_rango(rango_puro)
+    completo = (columnas is None or est['watermark'] <= 1
+                or est['ciclos'] % max(config.ERROR_SCAN_COMPLETO_CADA, 1) == 0)
+    if completo:
+        return None, rango_citado(hoja_nombre, rango_puro), 1
+    col_ini, col_fin = columnas
+    inicio = max(2, est['watermark'] - config.ERROR_SCAN_RELEER_FILAS + 1)
+    return (rango_citado(hoja_nombre, f"{col_ini}1:{col_fin}1"),
+            rango_citado(hoja_nombre, f"{col_ini}{inicio}:{col_fin}"),
+            inicio)
+
+# Tope de filas viejas con ERROR nuevo que se leen completas por rango y ciclo (el resto, en el siguiente)
+MAX_FILAS_VIEJAS = 50
+
+def _letra_columna(col_ini: str, desplazamiento: int) -> str:
+    """Letra de la columna que está desplazamiento columnas a la derecha de col_ini."""
+    numero = a1_to_rowcol(f"{col_ini}1")[1] + desplazamiento
+    return re.sub(r'\d', '', rowcol_to_a1(1, numero))
+
+def _rangos_sondeo(hoja_nombre, rango_puro: str, est: dict, inicio: int):
+    """
+    En un ciclo incremental, rangos de una columna con ERROR y ErrorEnvioCheck de las filas
+    2..inicio-1 (las que no entran en la ventana). None si no hay filas viejas o todavía no
+    se conocen las columnas.
+    """
+    columnas = _columnas_rango(rango_puro)
+    if columnas is None or not est.get('cols') or inicio <= 2:
+        return None
+    return tuple(
+        rango_citado(hoja_nombre, f"{letra}2:{letra}{inicio - 1}")
+        for letra in (_letra_columna(columnas[0], i) for i in est['cols'])
+    )
+
+def _filas_con_error_nuevo(errores: list, marcas: list, notificadas: dict) -> list:
+    """
+    Filas (desde la 2) con ERROR y sin marca que todavía no se notificaron, según las columnas
+    sondeadas. Poda de notificadas las huellas de esas filas que ya tienen la marca o cambiaron.
+    """
+    def celda(filas, i):
+        return str(filas[i][0]).strip() if i < len(filas) and filas[i] else ''
+
+    nuevas = []
+    for i in range(len(errores)):
+        fila = i + 2
+        error_value, marca = celda(errores, i), celda(marcas, i)
+        huella = _huella(error_value, marca)
+        if not error_value or marca:
+            notificadas.pop(str(fila), None)
+        elif notificadas.get(str(fila)) != huella:
+            notificadas.pop(str(fila), None)
+            nuevas.append(fila)
+    return nuevas[:MAX_FILAS_VIEJAS]
+
+async def escanear_errores(bot, spreadsheet, mapa_rangos: dict, guild_id: int) -> dict:
+    """
+    Ejecuta un ciclo de verificación de errores sobre todos los rangos configurados.
+    Solo lee la cola nueva de cada pestaña más una ventana de filas recientes, salvo en
+    los ciclos de lectura completa o si cambió el encabezado; de las filas anteriores lee
+    las columnas ERROR y ErrorEnvioCheck, y completas solo las que tienen un ERROR nuevo.
+    :return: Resumen con 'rangos' leídos, 'filas' leídas, 'notificaciones' enviadas y 'errores' de lectura.
+    """
+    resumen = {'rangos': 0, 'filas': 0, 'notificaciones': 0, 'errores': 0}
+    guild = bot.get_guild(guild_id)
+    if not guild:
+        return resumen
+    estado = _cargar_estado()
+    objetivos = []
+    for sheet_range, channel_id in mapa_rangos.items():
+        if not sheet_range or not channel_id:
+            continue
+        hoja_nombre, rango_puro = separar_rango(sheet_range)
+        if not rango_puro or ':' not in rango_puro:
+            continue
+        est = estado.setdefault(sheet_range, {'watermark': 1, 'ciclos': 0, 'header': None, 'notificadas': {}})
+        rango_header, rango_datos, inicio = _plan_lectura(hoja_nombre, rango_puro, est)
+        sondeo = _rangos_sondeo(hoja_nombre, rango_puro, est, inicio) if rango_header else None
+        objetivos.append((sheet_range, hoja_nombre, int(channel_id), rango_header, rango_datos, inicio, sondeo))
+    if not objetivos:
+        return resumen
+
+    rangos = []
+    for objetivo in objetivos:
+        rangos.extend(r for r in objetivo[3:5] if r)
+        rangos.extend(objetivo[6] or ())
+    filas_por_rango = await _leer_rangos(spreadsheet, rangos)
+
+    # Filas viejas con un ERROR nuevo: se leen completas en un segundo lote
+    viejas = {}
+    for sheet_range, hoja_nombre, _, _, _, _, sondeo in objetivos:
+        if not sondeo or filas_por_rango.get(sondeo[0]) is None or filas_por_rango.get(sondeo[1]) is None:
+            continue
+        filas = _filas_con_error_nuevo(filas_por_rango[sondeo[0]], filas_por_rango[sondeo[1]], estado[sheet_range]['notificadas'])
+        col_ini, col_fin = _columnas_rango(separar_rango(sheet_range)[1])
+        viejas[sheet_range] = {fila: rango_citado(hoja_nombre, f"{col_ini}{fila}:{col_fin}{fila}") for fila in filas}
+    rangos_viejas = [r for filas in viejas.values() for r in filas.values()]
+    filas_viejas = await _leer_rangos(spreadsheet, rangos_viejas) if rangos_viejas else {}
+
+    actualizaciones = []
+    for sheet_range, hoja_nombre, channel_id, rango_header, rango_datos, inicio, _ in objetivos:
+        est = estado[sheet_range]
+        datos = filas_por_rango.get(rango_datos)
+        header = filas_por_rango.get(rango_header) if rango_header else (datos[:1] if datos else [])
+        if datos is None or header is None:
+            resumen['errores'] += 1
+            continue
+        if inicio == 1:
+            datos, inicio = datos[1:], 2
+        header_row = header[0] if header else []
+        huella_header = _huella(*header_row)
+        header_cambiado = rango_header is not None and est['header'] != huella_header
+        est['header'] = huella_header
+        est['ciclos'] += 1
+        resumen['rangos'] += 1
+        resumen['filas'] += len(datos)
+        fin = inicio + len(datos) - 1
+        est['watermark'] = fin if datos else min(est['watermark'], inicio - 1)
+        if header_cambiado:
+            # Pudo aparecer o moverse la columna ERROR: la próxima lectura será completa
+            print(f"escanear_errores: Cambió el encabezado de {sheet_range}, se releerá completo en el próximo ciclo.")
+            est['watermark'] = 1
+
+        mapa = compilar(header_row)
+        cols = [mapa.indice('error'), mapa.indice('notificado')]
+        est['cols'] = cols if None not in cols else None
+
+        resultado = extraer_notificaciones([header_row] + datos, fila_inicio=inicio)
+        pendientes = {p['fila']: p for p in resultado['pendientes']}
+        if not header_cambiado:
+            for fila, rango_fila in viejas.get(sheet_range, {}).items():
+                contenido = filas_viejas.get(rango_fila)
+                if contenido:
+                    pendientes.update((p['fila'], p) for p in extraer_notificaciones([header_row, contenido[0]], fila)['pendientes'])
+        notificadas = est['notificadas']
+        # Podar huellas de filas releídas que ya tienen la marca escrita o cambiaron
+        for fila in list(notificadas):
+            p = pendientes.get(int(fila))
+            if inicio <= int(fila) <= fin and (p is None or p['huella'] != notificadas[fila]):
+                del notificadas[fila]
+        ya_enviadas = [p for p in pendientes.values() if notificadas.get(str(p['fila'])) == p['huella']]
+        nuevas = [p for p in pendientes.values() if notificadas.get(str(p['fila'])) != p['huella']]
+        enviadas = []
+        if nuevas:
+            cases_channel = bot.get_channel(channel_id)
+            if cases_channel:
+                enviadas = await notificar_pendientes(cases_channel, guild, nuevas)
+            # Las filas viejas que fallan se vuelven a detectar con el sondeo del próximo ciclo
+            fallidas = [p['fila'] for p in nuevas if p not in enviadas and p['fila'] >= inicio]
+            if fallidas:
+                # Releer desde la primera fila que no se pudo notificar
+                est['watermark'] = min(est['watermark'], min(fallidas) - 1)
+        for p in enviadas:
+            notificadas[str(p['fila'])] = p['huella']
+        resumen['notificaciones'] += len(enviadas)
+        actualizaciones.extend(actualizaciones_marca(hoja_nombre, resultado['idx_notificado'], enviadas + ya_enviadas))
+    await marcar_notificados(spreadsheet, actualizaciones)
+    _guardar_estado(estado)
+    return resumen
@@ -0,0 +1,129 @@
+"""
+Fachada asíncrona para las llamadas bloqueantes a Google Sheets y Google Drive.
+Las llamadas se ejecutan en un pool de hilos acotado (config.GOOGLE_API_MAX_WORKERS)
+con un timeout por llamada, para que una respuesta lenta de Google no congele el event loop.
+"""
+import asyncio
+import contextvars
+import functools
+from concurrent.futures import ThreadPoolExecutor
+import config
+from utils import google_sheets
+from utils import google_drive
+from utils import append_queue
+from utils import google_client_manager
+from utils import retry
+
+_executor = None
+
+def _get_executor() -> ThreadPoolExecutor:
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(
+            max_workers=getattr(config, 'GOOGLE_API_MAX_WORKERS', 8),
+            thread_name_prefix='google-api'
+        )
+    return _executor
+
+async def ejecutar_google(func, *args, timeout: float = ..., **kwargs):
+    """
+    Ejecuta func(*args, **kwargs) en el pool de Google y espera el resultado.
+    :param timeout: Segundos máximos de espera (por defecto config.GOOGLE_API_TIMEOUT_SEC;
+        None espera sin límite). Las escrituras que no se pueden repetir sin duplicar
+        (agregar filas, crear carpetas, subir archivos) pasan timeout=None.
+    :raises asyncio.TimeoutError: Si la llamada no responde a tiempo. El hilo no se puede
+        interrumpir: el handler deja de esperar, pero la operación puede terminar igual.
+    """
+    if timeout is ...:
+        timeout = getattr(config, 'GOOGLE_API_TIMEOUT_SEC', 30)
+    loop = asyncio.get_running_loop()
+    ctx = contextvars.copy_context()
+    llamada = functools.partial(ctx.run, func, *args, **kwargs)
+    try:
+        return await asyncio.wait_for(loop.run_in_executor(_get_executor(), llamada), timeout)
+    except asyncio.TimeoutError:
+        nombre = getattr(func, '__qualname__', None) or getattr(func, '__name__', repr(func))
+        print(f'ejecutar_google: {nombre} superó el timeout de {timeout} s; '
+              'puede terminar igual en segundo plano, no reintentar sin verificar el resultado')
+        raise
+    except Exception as error:
+        # Una pestaña renombrada o borrada invalida los handles guardados: se vuelven a pedir
+        if google_client_manager.es_handle_invalido(error):
+            google_client_manager.invalidar_handles()
+        raise
+
+def cerrar_pool_google():
+    """Libera el pool de hilos (se recrea en la próxima llamada)."""
+    global _executor
+    if _executor is not None:
+        _executor.shutdown(wait=False)
+        _executor = None
+
+# --- Google Sheets ---
+
+async def abrir_spreadsheet(client, spreadsheet_id: str):
+    """Planilla desde la caché de handles de google_client_manager (open_by_key solo si no está)."""
+    return await ejecutar_google(google_client_manager.abrir_spreadsheet_cacheado, client, spreadsheet_id)
+
+async def obtener_worksheet(spreadsheet, hoja_nombre: str = None):
+    """Devuelve la pestaña indicada o la primera si no se indica nombre, desde la caché de handles."""
+    return await ejecutar_google(google_client_manager.obtener_worksheet_cacheado, spreadsheet, hoja_nombre or None)
+
+async def listar_worksheets(spreadsheet) -> list:
+    return await ejecutar_google(google_client_manager.listar_worksheets_cacheado, spreadsheet)
+
+async def leer_filas(sheet, sheet_range: str):
+    return await ejecutar_google(google_sheets.obtener_filas_hoja, sheet, sheet_range)
+
+async def pedido_existe(sheet, sheet_range: str, pedido_number: str) -> bool:
+    return await ejecutar_google(google_sheets.check_if_pedido_exists, sheet, sheet_range, pedido_number)
+
+async def agregar_fila(sheet, row_data):
+    """Agrega la fila mediante la cola de escritura y espera a que el lote quede escrito."""
+    return await append_queue.agregar_fila_confirmada(sheet, row_data)
+
+async def actualizar_celda(sheet, fila: int, columna: int, valor):
+    return await ejecutar_google(sheet.update_cell, fila, columna, valor, timeout=None)
+
+# --- Google Drive ---
+
+async def buscar_o_crear_carpeta(drive_service, parent_id: str, folder_name: str):
+    """
+    Busca o crea la carpeta reintentando los errores temporales de Drive. Cada intento vuelve a
+    buscar antes de crear, y la espera entre intentos corre en el event loop, no en el pool.
+    """
+    return await retry.reintentar_async(
+        lambda: ejecutar_google(google_drive.find_or_create_drive_folder, drive_service, parent_id, folder_name, timeout=None),
+        descripcion=f"Carpeta de Drive '{folder_name}'"
+    )
+
+async def subir_archivo(drive_service, folder_id: str, attachment):
+    # Sin timeout: si el handler dejara de esperar, la subida seguiría y un reintento duplicaría el archivo
+    return await ejecutar_google(google_drive.upload_file_to_drive, drive_service, folder_id, attachment, timeout=None)
+
+async def subir_archivos(drive_service, folder_id: str, attachments: list, al_terminar=None) -> list:
+    """
+    Sube varios adjuntos en paralelo, como máximo config.DRIVE_UPLOAD_CONCURRENCIA a la vez.
+    Un archivo que falla no corta los demás.
+    :param al_terminar: corrutina opcional (completados, total) que se llama al terminar cada archivo.
+    :return: lista de (attachment, metadatos del archivo subido o la excepción) en el orden original.
+    """
+    semaforo = asyncio.Semaphore(max(1, getattr(config, 'DRIVE_UPLOAD_CONCURRENCIA', 4)))
+    completados = 0
+
+    async def subir(attachment):
+        nonlocal completados
+        async with semaforo:
+            try:
+                resultado = await subir_archivo(drive_service, folder_id, attachment)
+            except Exception as error:
+                resultado = error
+        completados += 1
+        if al_terminar is not None:
+            try:
+                await al_terminar(completados, len(attachments))
+            except Exception as error:
+                print(f"subir_archivos: no se pudo informar el progreso: {error}")
+        return attachment, resultado
+
+    return list(await asyncio.gather(*(subir(a) for a in attachments)))
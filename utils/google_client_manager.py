@@ -1,13 +1,25 @@
 """
 Módulo para gestionar el acceso centralizado a las instancias de Google Sheets y Drive.
 Este módulo evita la inicialización repetida de clientes en cada comando.
+También guarda los handles de gspread (Spreadsheet y Worksheet): abrir una planilla con
+open_by_key y buscar una pestaña son pedidos de metadata a la API, así que se reutilizan
+por ID de planilla y título de pestaña durante config.GOOGLE_HANDLE_TTL_SEC segundos y se
+descartan si una llamada indica que la pestaña o la planilla ya no existen.
 """
+import threading
+import time
 
 # Variables globales para las instancias
 _sheets_instance = None
 _drive_instance = None
 _initialized = False
 
+# spreadsheet_id -> (Spreadsheet, momento de carga)
+_handles_spreadsheet = {}
+# spreadsheet_id -> (lista de Worksheet en el orden de la planilla, momento de carga)
+_handles_pestanas = {}
+_handles_lock = threading.Lock()
+
 def initialize_google_clients():
     """Inicializar los clientes de Google"""
     global _sheets_instance, _drive_instance, _initialized
@@ -71,7 +83,77 @@ def reset_google_clients():
     """Reinicializar los clientes de Google"""
     global _sheets_instance, _drive_instance, _initialized
     
+    invalidar_handles()
     _sheets_instance = None
     _drive_instance = None
     _initialized = False
-    initialize_google_clients() 
\ No newline at end of file
+    initialize_google_clients() 
+
+# --- Caché de handles de gspread ---
+# Funciones bloqueantes: desde el event loop usar utils.google_async.abrir_spreadsheet / obtener_worksheet.
+
+def _vigente(cargado: float) -> bool:
+    import config
+    return time.monotonic() - cargado < getattr(config, 'GOOGLE_HANDLE_TTL_SEC', 1800)
+
+def abrir_spreadsheet_cacheado(client, spreadsheet_id: str):
+    """Spreadsheet de la caché, o client.open_by_key si no está o venció."""
+    with _handles_lock:
+        entrada = _handles_spreadsheet.get(spreadsheet_id)
+    if entrada and _vigente(entrada[1]):
+        return entrada[0]
+    spreadsheet = client.open_by_key(spreadsheet_id)
+    with _handles_lock:
+        _handles_spreadsheet[spreadsheet_id] = (spreadsheet, time.monotonic())
+    return spreadsheet
+
+def listar_worksheets_cacheado(spreadsheet, forzar: bool = False) -> list:
+    """Todas las pestañas de la planilla con un único pedido de metadata, reutilizado mientras esté vigente."""
+    with _handles_lock:
+        entrada = _handles_pestanas.get(spreadsheet.id)
+    if entrada and not forzar and _vigente(entrada[1]):
+        return entrada[0]
+    pestanas = spreadsheet.worksheets()
+    with _handles_lock:
+        _handles_pestanas[spreadsheet.id] = (pestanas, time.monotonic())
+    return pestanas
+
+def obtener_worksheet_cacheado(spreadsheet, titulo: str = None):
+    """
+    Worksheet por título (la primera pestaña si no se indica). Si el título no está en la
+    caché se vuelve a leer la lista una vez, por si la pestaña se creó después.
+    :raises gspread.exceptions.WorksheetNotFound: Si la pestaña no existe.
+    """
+    for forzar in (False, True):
+        pestanas = listar_worksheets_cacheado(spreadsheet, forzar=forzar)
+        if titulo is None:
+            if pestanas:
+                return pestanas[0]
+        else:
+            for pestana in pestanas:
+                if pestana.title == titulo:
+                    return pestana
+    from gspread.exceptions import WorksheetNotFound
+    raise WorksheetNotFound(titulo)
+
+def invalidar_handles(spreadsheet_id: str = None):
+    """Descarta los handles de una planilla o de todas."""
+    with _handles_lock:
+        if spreadsheet_id is None:
+            _handles_spreadsheet.clear()
+            _handles_pestanas.clear()
+        else:
+            _handles_spreadsheet.pop(spreadsheet_id, None)
+            _handles_pestanas.pop(spreadsheet_id, None)
+
+def es_handle_invalido(error) -> bool:
+    """True si el error indica que una planilla o pestaña cacheada ya no es válida (borrada, renombrada, sin acceso)."""
+    from gspread.exceptions import WorksheetNotFound, SpreadsheetNotFound
+    if isinstance(error, (WorksheetNotFound, SpreadsheetNotFound)):
+        return True
+    codigo = getattr(error, 'code', None)
+    if codigo is None:
+        codigo = getattr(getattr(error, 'response', None), 'status_code', None)
+    if codigo in (403, 404):
+        return True
+    return codigo == 400 and 'parse range' in str(error).lower()
@@ -1,10 +1,30 @@
 from google.oauth2.service_account import Credentials
 from googleapiclient.discovery import build
-from googleapiclient.http import MediaIoBaseUpload
+from googleapiclient.errors import HttpError
+from googleapiclient.http import MediaUpload
+import google_auth_httplib2
+import httplib2
 import requests
 import io
 import json
+import threading
 import time
+import config
+from utils import persistence, retry
+from utils.quota_governor import HttpRequestGobernado
+
+# Timeouts (conexión, lectura) de la descarga desde el CDN de Discord, en segundos
+TIMEOUT_DESCARGA = (10, 60)
+# Tamaño de cada lectura de la descarga
+BLOQUE_DESCARGA = 64 * 1024
+# Reintentos ante límites de tasa (429, 403 rateLimitExceeded), errores 5xx y cortes de red (utils/retry.py)
+MAX_INTENTOS_DRIVE = 5
+
+_hilos = threading.local()
+# Shared Drive de cada carpeta padre y locks por (padre, nombre) para no crear carpetas duplicadas
+_drives_compartidos = {}
+_locks_carpeta = {}
+_lock_carpetas = threading.Lock()
 
 def initialize_google_drive(credentials_json: str):
     """Inicializar cliente de Google Drive"""
@@ -18,16 +38,49 @@ def initialize_google_drive(credentials_json: str):
             creds_dict = credentials_json
         
         credentials = Credentials.from_service_account_info(creds_dict, scopes=scopes)
-        drive_service = build('drive', 'v3', credentials=credentials)
+        # Cada pedido pasa por los baldes de cuota compartidos (utils/quota_governor.py)
+        drive_service = build('drive', 'v3', credentials=credentials, requestBuilder=HttpRequestGobernado)
         print("Instancia de Google Drive inicializada.")
         return drive_service
     except Exception as error:
         print("Error al inicializar Google Drive:", error)
         raise
 
+def drive_compartido(drive_service, parent_id: str) -> str | None:
+    """
+    ID de la Shared Drive que contiene a parent_id (None si está en "Mi unidad").
+    Se calcula una sola vez por carpeta padre y queda memorizado mientras corre el bot.
+    """
+    if not parent_id:
+        return None
+    with _lock_carpetas:
+        if parent_id in _drives_compartidos:
+            return _drives_compartidos[parent_id]
+    try:
+        parent_info = drive_service.files().get(fileId=parent_id, fields='driveId', supportsAllDrives=True).execute()
+    except Exception as error:
+        # No se memoriza: se vuelve a intentar en la próxima carpeta
+        print(f"⚠️ No se pudo obtener el driveId de '{parent_id}': {error}")
+        return None
+    drive_id = parent_info.get('driveId') or find_shared_drive_recursive(drive_service, parent_id, max_depth=5)
+    with _lock_carpetas:
+        _drives_compartidos[parent_id] = drive_id
+    return drive_id
+
+def _lock_de_carpeta(parent_id: str, folder_name: str) -> threading.Lock:
+    with _lock_carpetas:
+        return _locks_carpeta.setdefault((parent_id or '', folder_name), threading.Lock())
+
+def olvidar_carpeta_drive(parent_id: str, folder_name: str):
+    """Quita una carpeta del caché (p. ej. si la borraron en Drive y la subida dio 404)."""
+    persistence.borrar_carpeta_drive(parent_id, folder_name)
+
 def find_or_create_drive_folder(drive_service, parent_id: str, folder_name: str) -> str:
     """
     Busca una carpeta por nombre y padre, o la crea si no existe.
+    El ID queda guardado en SQLite (tabla carpetas_drive), así que las siguientes llamadas para
+    la misma carpeta no consultan a Drive. La búsqueda y creación de cada carpeta se hace de a
+    un hilo por vez para que dos mensajes simultáneos no creen carpetas duplicadas.
     :param drive_service: Instancia de Google Drive API
     :param parent_id: ID de la carpeta padre (o None para raíz)
     :param folder_name: Nombre de la carpeta
@@ -35,114 +88,135 @@ def find_or_create_drive_folder(drive_service, parent_id: str, folder_name: str)
     """
     if not drive_service or not folder_name:
         raise ValueError("find_or_create_drive_folder: Parámetros incompletos.")
-    
-    print(f"🔍 DEBUG - Buscando carpeta: '{folder_name}'")
-    print(f"🔍 DEBUG - Parent ID: '{parent_id}'")
-    
-    try:
-        query = f"name='{folder_name.replace("'", "\\'")}' and mimeType='application/vnd.google-apps.folder' and trashed=false"
-        if parent_id:
-            query += f" and '{parent_id}' in parents"
-        else:
-            query += " and 'root' in parents"
-        
-        print(f"🔍 DEBUG - Query de búsqueda: '{query}'")
-        
-        response = drive_service.files().list(q=query, fields='files(id, name, parents)', spaces='drive').execute()
-        files = response.get('files', [])
-        
-        print(f"🔍 DEBUG - Archivos encontrados: {len(files)}")
-        for i, file in enumerate(files):
-            print(f"🔍 DEBUG - Archivo {i+1}: ID={file.get('id')}, Name={file.get('name')}, Parents={file.get('parents')}")
-        
-        if files:
-            print(f"✅ Carpeta de Drive '{folder_name}' encontrada con ID: {files[0]['id']}")
-            return files[0]['id']
-        else:
-            print(f"❌ Carpeta de Drive '{folder_name}' no encontrada. Creando...")
-            print(f"🔍 DEBUG - Parent ID para crear: '{parent_id}'")
-            
-            # Delay antes de crear carpeta para evitar rate limiting
-            time.sleep(1)
-            file_metadata: dict = {
-                'name': folder_name,
-                'mimeType': 'application/vnd.google-apps.folder',
-            }
-            if parent_id:
-                file_metadata['parents'] = [parent_id]
-                print(f"🔍 DEBUG - Metadata con parent: {file_metadata}")
-                # Forzar creación en Shared Drive especificando el driveId
-                try:
-                    # Obtener el driveId del parent
-                    parent_info = drive_service.files().get(fileId=parent_id, fields='driveId,parents').execute()
-                    parent_drive_id = parent_info.get('driveId')
-                    
-                    # Si no tiene driveId, buscar en los parents recursivamente
-                    if not parent_drive_id:
-                        print("🔍 DEBUG - Parent no es Shared Drive, buscando Shared Drive en parents...")
-                        parent_drive_id = find_shared_drive_recursive(drive_service, parent_id, max_depth=5)
-                        if parent_drive_id:
-                            print(f"🔍 DEBUG - Encontrada Shared Drive recursivamente: {parent_drive_id}")
-                        else:
-                            print("🔍 DEBUG - No se encontró Shared Drive en la jerarquía")
-                    
-                    if parent_drive_id:
-                        print(f"🔍 DEBUG - Forzando creación en Shared Drive ID: {parent_drive_id}")
-                        # Usar supportsAllDrives para forzar creación en Shared Drive
-                        file = drive_service.files().create(
-                            body=file_metadata, 
-                            fields='id, name, parents, driveId',
-                            supportsAllDrives=True
-                        ).execute()
-                    else:
-                        print("⚠️ No se pudo obtener driveId del parent ni de sus parents, creando normalmente")
-                        file = drive_service.files().create(body=file_metadata, fields='id, name, parents, driveId').execute()
-                except Exception as drive_error:
-                    print(f"⚠️ Error obteniendo driveId, creando normalmente: {drive_error}")
-                    file = drive_service.files().create(body=file_metadata, fields='id, name, parents, driveId').execute()
+
+    folder_id = persistence.obtener_carpeta_drive(parent_id, folder_name)
+    if folder_id:
+        return folder_id
+
+    with _lock_de_carpeta(parent_id, folder_name):
+        # Otro hilo pudo haberla creado mientras se esperaba el lock
+        folder_id = persistence.obtener_carpeta_drive(parent_id, folder_name)
+        if folder_id:
+            return folder_id
+        try:
+            query = f"name='{folder_name.replace("'", "\\'")}' and mimeType='application/vnd.google-apps.folder' and trashed=false"
+            query += f" and '{parent_id}' in parents" if parent_id else " and 'root' in parents"
+            drive_id = drive_compartido(drive_service, parent_id)
+            # Sin includeItemsFromAllDrives la búsqueda no ve las carpetas de una Shared Drive
+            if drive_id:
+                alcance = {'corpora': 'drive', 'driveId': drive_id, 'includeItemsFromAllDrives': True}
             else:
-                print(f"🔍 DEBUG - Metadata sin parent: {file_metadata}")
-                file = drive_service.files().create(body=file_metadata, fields='id, name, parents, driveId').execute()
-            print(f"✅ Carpeta de Drive '{folder_name}' creada con ID: {file['id']}")
-            print(f"🔍 DEBUG - Carpeta creada - ID: {file.get('id')}, Name: {file.get('name')}, Parents: {file.get('parents')}")
-            
-            # Verificar permisos de la carpeta recién creada
+                alcance = {'spaces': 'drive'}
+            response = drive_service.files().list(
+                q=query, fields='files(id, name)', supportsAllDrives=True, **alcance
+            ).execute()
+            files = response.get('files', [])
+
+            if files:
+                folder_id = files[0]['id']
+                print(f"✅ Carpeta de Drive '{folder_name}' encontrada con ID: {folder_id}")
+            else:
+                file_metadata: dict = {
+                    'name': folder_name,
+                    'mimeType': 'application/vnd.google-apps.folder',
+                }
+                if parent_id:
+                    file_metadata['parents'] = [parent_id]
+                file = drive_service.files().create(body=file_metadata, fields='id', supportsAllDrives=True).execute()
+                folder_id = file['id']
+                print(f"✅ Carpeta de Drive '{folder_name}' creada con ID: {folder_id}")
+        except Exception as error:
+            print(f"❌ Error al buscar o crear la carpeta '{folder_name}' en Drive:", error)
+            raise
+        persistence.guardar_carpeta_drive(parent_id, folder_name, folder_id)
+        return folder_id
+
+class ErrorDescarga(IOError):
+    """
+    Falló la lectura del adjunto desde el CDN de Discord durante una subida. No es un error de
+    Drive y no se reintenta: la descarga en streaming no se puede retomar.
+    """
+
+class MediaDesdeDescarga(MediaUpload):
+    """
+    Cuerpo de una subida reanudable que se lee de una descarga HTTP en curso (requests con stream=True).
+    Solo guarda en memoria la parte que se está subiendo, así un adjunto grande no se carga entero.
+    La descarga no se puede rebobinar: si Drive confirma menos bytes de los enviados se reenvía
+    desde lo que queda en el buffer de la parte actual.
+    """
+
+    def __init__(self, respuesta, mimetype: str, size: int = None, chunksize: int = 1024 * 1024):
+        super().__init__()
+        self._bloques = respuesta.iter_content(chunk_size=BLOQUE_DESCARGA)
+        self._mimetype = mimetype
+        self._size = size
+        self._chunksize = chunksize
+        self._buffer = bytearray()
+        # Posición en el archivo del primer byte de _buffer
+        self._inicio_buffer = 0
+
+    def chunksize(self):
+        return self._chunksize
+
+    def mimetype(self):
+        return self._mimetype
+
+    def size(self):
+        return self._size
+
+    def resumable(self):
+        return True
+
+    def has_stream(self):
+        return False
+
+    def getbytes(self, begin, length):
+        descartar = begin - self._inicio_buffer
+        if descartar < 0 or descartar > len(self._buffer):
+            raise ErrorDescarga(f"MediaDesdeDescarga: no se puede volver a leer desde el byte {begin}")
+        del self._buffer[:descartar]
+        self._inicio_buffer = begin
+        while len(self._buffer) < length:
             try:
-                folder_permissions = drive_service.files().get(fileId=file['id'], fields='permissions,driveId').execute()
-                permissions = folder_permissions.get('permissions', [])
-                drive_id = folder_permissions.get('driveId')
-                print(f"🔍 DEBUG - Permisos de carpeta creada: {len(permissions)} encontrados")
-                print(f"🔍 DEBUG - Drive ID de la carpeta: {drive_id}")
-                for perm in permissions:
-                    email = perm.get('emailAddress', 'Sin email')
-                    role = perm.get('role', 'Sin rol')
-                    print(f"🔍 DEBUG - Permiso: {email} -> {role}")
-            except Exception as perm_error:
-                print(f"❌ Error verificando permisos de carpeta creada: {perm_error}")
-            
-            # Verificar que la carpeta está en la Shared Drive correcta
-            if parent_id and drive_id:
-                print(f"🔍 DEBUG - Verificando ubicación: Parent ID={parent_id}, Drive ID={drive_id}")
-                # Obtener información del parent para comparar
-                try:
-                    parent_info = drive_service.files().get(fileId=parent_id, fields='driveId').execute()
-                    parent_drive_id = parent_info.get('driveId')
-                    print(f"🔍 DEBUG - Parent Drive ID: {parent_drive_id}")
-                    if drive_id == parent_drive_id:
-                        print("✅ Carpeta creada en la misma Shared Drive que el parent")
-                    else:
-                        print("❌ ERROR: Carpeta creada en Drive diferente al parent")
-                except Exception as parent_error:
-                    print(f"❌ Error verificando parent: {parent_error}")
-            
-            return file['id']
-    except Exception as error:
-        print(f"❌ Error al buscar o crear la carpeta '{folder_name}' en Drive:", error)
-        raise
+                bloque = next(self._bloques, None)
+            except Exception as error:
+                # Tras un error el generador de requests queda agotado: seguir subiría el archivo truncado
+                raise ErrorDescarga(f"MediaDesdeDescarga: se cortó la descarga en el byte {begin + len(self._buffer)}: {error}") from error
+            if bloque is None:
+                break
+            self._buffer += bloque
+        return bytes(self._buffer[:length])
 
-import time
+def es_limite_drive(error) -> bool:
+    """True si Drive pide bajar el ritmo (429 o 403 por límite de tasa) o tuvo un error temporal (5xx o de red)."""
+    return retry.clasificar_error_drive(error) in retry.REINTENTABLES
 
-# Delays implementados para evitar rate limiting en Google Drive API
+def espera_reintento_drive(error, intento: int) -> float:
+    """Segundos a esperar: Retry-After si Drive lo indica; si no, espera exponencial con jitter."""
+    return retry.calcular_espera(intento, retry.retry_after(error))
+
+def _http_del_hilo(drive_service):
+    """
+    httplib2 no es thread-safe: cada hilo del pool de Google usa su propio AuthorizedHttp
+    con las credenciales del servicio, para poder subir varios archivos a la vez.
+    """
+    credenciales = getattr(getattr(drive_service, '_http', None), 'credentials', None)
+    if credenciales is None:
+        return None
+    http = getattr(_hilos, 'http', None)
+    if http is None or http.credentials is not credenciales:
+        http = google_auth_httplib2.AuthorizedHttp(credenciales, http=httplib2.Http(timeout=TIMEOUT_DESCARGA[1]))
+        _hilos.http = http
+    return http
+
+def _tamano_descarga(attachment, respuesta):
+    """Tamaño exacto del archivo: el que informa Discord o, si la respuesta no viene comprimida, Content-Length."""
+    tamano = getattr(attachment, 'size', None)
+    if isinstance(tamano, int) and tamano >= 0:
+        return tamano
+    if 'content-encoding' not in respuesta.headers and respuesta.headers.get('content-length', '').isdigit():
+        return int(respuesta.headers['content-length'])
+    return None
 
 def upload_file_to_drive(drive_service, folder_id: str, attachment) -> dict:
     """
@@ -155,50 +229,40 @@ def upload_file_to_drive(drive_service, folder_id: str, attachment) -> dict:
     if not drive_service or not folder_id or not attachment or not getattr(attachment, 'url', None) or not getattr(attachment, 'filename', None):
         raise ValueError("upload_file_to_drive: Parámetros incompletos.")
     try:
-        # Delay de 1 segundo para evitar rate limiting 
-        time.sleep(1)
-        # Verificar que la carpeta existe y tenemos permisos
-        try:
-            folder_info = drive_service.files().get(fileId=folder_id, fields='id,name,permissions').execute()
-            folder_name = folder_info.get('name', 'Sin nombre')
-            permissions = folder_info.get('permissions', [])
-            
-            # Crear mensaje de debug para mostrar en Discord
-            debug_info = f"🔍 **DEBUG - Información de carpeta:**\n"
-            debug_info += f"📁 **Carpeta:** {folder_name} (ID: {folder_id})\n"
-            debug_info += f"👥 **Permisos:** {len(permissions)} encontrados\n"
+        print(f"Intentando descargar archivo: {attachment.filename} desde {attachment.url}")
+        with requests.get(attachment.url, stream=True, timeout=TIMEOUT_DESCARGA) as file_response:
+            if not file_response.ok:
+                raise Exception(f"Error al descargar el archivo {attachment.filename}: HTTP status {file_response.status_code}, {file_response.reason}")
             
-            for perm in permissions:
-                email = perm.get('emailAddress', 'Sin email')
-                role = perm.get('role', 'Sin rol')
-                debug_info += f"   • {email}: {role}\n"
+            media = MediaDesdeDescarga(
+                file_response,
+                mimetype=file_response.headers.get('content-type', 'application/octet-stream'),
+                size=_tamano_descarga(attachment, file_response),
+                chunksize=config.DRIVE_UPLOAD_CHUNK_KB * 1024
+            )
+            print(f"Tamaño del archivo: {media.size() if media.size() is not None else 'desconocido'} bytes")
             
-            # Guardar debug_info en una variable global simple
-            upload_file_to_drive.debug_info = debug_info
-                
-        except Exception as folder_error:
-            error_msg = f"❌ **Error verificando carpeta:** {folder_error}"
-            upload_file_to_drive.debug_info = error_msg
-            raise Exception(f"No se puede acceder a la carpeta {folder_id}: {folder_error}")
-        
-        print(f"Intentando descargar archivo: {attachment.filename} desde {attachment.url}")
-        file_response = requests.get(attachment.url, stream=True)
-        if not file_response.ok:
-            raise Exception(f"Error al descargar el archivo {attachment.filename}: HTTP status {file_response.status_code}, {file_response.reason}")
-        
-        file_size = len(file_response.content)
-        print(f"Tamaño del archivo: {file_size} bytes")
-        
-        file_metadata = {
-            'name': attachment.filename,
-            'parents': [folder_id],
-        }
-        print(f"🔍 DEBUG - Metadata para subir archivo: {file_metadata}")
-        print(f"🔍 DEBUG - Folder ID donde se subirá: '{folder_id}'")
-        
-        media = MediaIoBaseUpload(io.BytesIO(file_response.content), mimetype=file_response.headers.get('content-type', 'application/octet-stream'))
-        print(f"🔍 DEBUG - Subiendo archivo {attachment.filename} a Drive en la carpeta {folder_id}...")
-        uploaded_file = drive_service.files().create(body=file_metadata, media_body=media, fields='id, name').execute()
+            file_metadata = {
+                'name': attachment.filename,
+                'parents': [folder_id],
+            }
+            print(f"🔍 DEBUG - Subiendo archivo {attachment.filename} a Drive en la carpeta {folder_id}...")
+            request = drive_service.files().create(body=file_metadata, media_body=media, fields='id, name', supportsAllDrives=True)
+            http = _http_del_hilo(drive_service)
+            uploaded_file = None
+            intento = 0
+            while uploaded_file is None:
+                try:
+                    _, uploaded_file = request.next_chunk(http=http)
+                except Exception as error_parte:
+                    # Al reintentar, next_chunk reenvía la misma parte (o reinicia la sesión si no llegó a crearse).
+                    # Corre en un hilo del pool de Google: la espera no frena el event loop.
+                    if not es_limite_drive(error_parte) or intento >= MAX_INTENTOS_DRIVE - 1:
+                        raise
+                    espera = espera_reintento_drive(error_parte, intento)
+                    print(f"⚠️ Drive falló subiendo {attachment.filename} ({retry.clasificar_error_drive(error_parte)}: {error_parte}); nuevo intento en {espera:.1f} s")
+                    time.sleep(espera)
+                    intento += 1
         print(f"Archivo '{uploaded_file['name']}' subido con éxito. ID de Drive: {uploaded_file['id']}")
         return uploaded_file
     except Exception as error:
@@ -224,7 +288,7 @@ def download_file_from_drive(drive_service, file_id: str) -> bytes:
         downloader = MediaIoBaseDownload(fh, request)
         done = False
         while not done:
-            status, done = downloader.next_chunk()
+            status, done = retry.reintentar(downloader.next_chunk, intentos=MAX_INTENTOS_DRIVE, descripcion=f"Descarga de {file_id}")
             if status:
                 print(f"Descargado {int(status.progress() * 100)}%")
         
@@ -4,6 +4,13 @@ from datetime import datetime
 import pytz
 import discord
 import json
+import re
+import threading
+import time
+import config
+from utils import sheet_schema
+from utils.google_client_manager import abrir_spreadsheet_cacheado, obtener_worksheet_cacheado
+from utils.quota_governor import HTTPClientGobernado
 
 def initialize_google_sheets(credentials_json: str):
     """Inicializar cliente de Google Sheets"""
@@ -20,39 +27,196 @@ def initialize_google_sheets(credentials_json: str):
             creds_dict = credentials_json
         
         credentials = Credentials.from_service_account_info(creds_dict, scopes=scopes)
-        client = gspread.authorize(credentials)
+        # Cada pedido pasa por los baldes de cuota compartidos (utils/quota_governor.py)
+        client = gspread.authorize(credentials, http_client=HTTPClientGobernado)
         print("Instancia de Google Sheets inicializada.")
         return client
     except Exception as error:
         print("Error al inicializar Google Sheets:", error)
         raise
 
+# --- Caché en memoria de hojas de casos ---
+# Cada entrada guarda las filas leídas de un rango junto con un índice hash
+# {pedido_normalizado: [números de fila]} para resolver duplicados y búsquedas
+# sin volver a descargar la pestaña completa en cada modal.
+_cache_hojas = {}
+_cache_lock = threading.Lock()
+
+def normalizar_pedido(valor) -> str:
+    """Normaliza un número de pedido para usarlo como clave del índice."""
+    return str(valor).strip().lower() if valor else ''
+
+def _clave_cache(sheet, sheet_range: str):
+    spreadsheet = getattr(sheet, 'spreadsheet', None)
+    spreadsheet_id = getattr(spreadsheet, 'id', None) if spreadsheet is not None else None
+    return (spreadsheet_id, getattr(sheet, 'title', None), sheet_range)
+
+def _construir_entrada(rows):
+    rows = rows or []
+    header_row = rows[0] if rows else []
+    pedido_column_index = sheet_schema.compilar(header_row).indice('pedido', -1)
+    indice = {}
+    if pedido_column_index != -1:
+        for i, row in enumerate(rows[1:], start=2):
+            if len(row) <= pedido_column_index:
+                continue
+            clave = normalizar_pedido(row[pedido_column_index])
+            if clave:
+                indice.setdefault(clave, []).append(i)
+    return {
+        'rows': rows,
+        'pedido_col': pedido_column_index,
+        'indice': indice,
+        'cargado': time.monotonic(),
+    }
+
+def obtener_snapshot_hoja(sheet, sheet_range: str, max_age: int = None, forzar: bool = False) -> dict:
+    """
+    Devuelve la entrada en caché de un rango, leyéndolo de Google Sheets si no existe,
+    si venció el TTL (config.SHEET_CACHE_TTL_SEC) o si se pide forzar la recarga.
+    :return: dict con 'rows', 'pedido_col' (-1 si no existe la columna), 'indice' y 'cargado'.
+    """
+    if max_age is None:
+        max_age = getattr(config, 'SHEET_CACHE_TTL_SEC', 120)
+    clave = _clave_cache(sheet, sheet_range)
+    with _cache_lock:
+        entrada = _cache_hojas.get(clave)
+    if entrada and not forzar and time.monotonic() - entrada['cargado'] < max_age:
+        return entrada
+    entrada = _construir_entrada(sheet.get(sheet_range))
+    with _cache_lock:
+        _cache_hojas[clave] = entrada
+    return entrada
+
+def obtener_snapshot_cacheado(spreadsheet_id, titulo: str, sheet_range: str, max_age: int = None):
+    """Devuelve la entrada vigente de la caché para una pestaña por id/título, o None si no hay."""
+    if max_age is None:
+        max_age = getattr(config, 'SHEET_CACHE_TTL_SEC', 120)
+    with _cache_lock:
+        entrada = _cache_hojas.get((spreadsheet_id, titulo, sheet_range))
+    if entrada and time.monotonic() - entrada['cargado'] < max_age:
+        return entrada
+    return None
+
+def guardar_snapshot_hoja(spreadsheet_id, titulo: str, sheet_range: str, rows) -> dict:
+    """Indexa y guarda en la caché filas leídas por fuera de un Worksheet (ej: values_batch_get)."""
+    entrada = _construir_entrada(rows)
+    with _cache_lock:
+        _cache_hojas[(spreadsheet_id, titulo, sheet_range)] = entrada
+    return entrada
+
+def obtener_filas_hoja(sheet, sheet_range: str, max_age: int = None) -> list:
+    """Filas del rango (encabezado incluido) servidas desde la caché cuando es posible."""
+    return obtener_snapshot_hoja(sheet, sheet_range, max_age=max_age)['rows']
+
+def buscar_filas_por_pedido(sheet, sheet_range: str, pedido_number: str, max_age: int = None) -> list:
+    """
+    Busca un pedido usando el índice de la caché.
+    :return: Lista de tuplas (número de fila, fila). Vacía si no hay coincidencias.
+    """
+    entrada = obtener_snapshot_hoja(sheet, sheet_range, max_age=max_age)
+    rows = entrada['rows']
+    return [(i, rows[i - 1]) for i in entrada['indice'].get(normalizar_pedido(pedido_number), [])]
+
+def invalidar_cache_hojas(sheet=None):
+    """Descarta la caché de una hoja (todas sus entradas de rango) o la caché completa."""
+    with _cache_lock:
+        if sheet is None:
+            _cache_hojas.clear()
+            return
+        clave_hoja = _clave_cache(sheet, None)[:2]
+        for clave in [c for c in _cache_hojas if c[:2] == clave_hoja]:
+            del _cache_hojas[clave]
+
+def _fila_desde_respuesta_append(respuesta):
+    """Extrae el número de fila escrita del 'updatedRange' que devuelve append_row."""
+    if not isinstance(respuesta, dict):
+        return None
+    updated_range = (respuesta.get('updates') or {}).get('updatedRange') or ''
+    match = re.search(r'![A-Z]+(\d+)', updated_range)
+    return int(match.group(1)) if match else None
+
+def _registrar_filas_en_cache(sheet, fila_inicio, filas):
+    """
+    Agrega a las entradas en caché de la hoja las filas escritas a partir de fila_inicio.
+    Si no se puede ubicar dónde quedaron, la caché de la hoja se invalida.
+    """
+    clave_hoja = _clave_cache(sheet, None)[:2]
+    with _cache_lock:
+        for clave in [c for c in _cache_hojas if c[:2] == clave_hoja]:
+            entrada = _cache_hojas[clave]
+            if fila_inicio is None or fila_inicio != len(entrada['rows']) + 1:
+                del _cache_hojas[clave]
+                continue
+            col = entrada['pedido_col']
+            for fila, row_data in enumerate(filas, start=fila_inicio):
+                entrada['rows'].append(list(row_data))
+                if col != -1 and len(row_data) > col:
+                    clave_pedido = normalizar_pedido(row_data[col])
+                    if clave_pedido:
+                        entrada['indice'].setdefault(clave_pedido, []).append(fila)
+
+def append_row_con_cache(sheet, row_data, **kwargs):
+    """
+    Ejecuta sheet.append_row y actualiza las entradas en caché de esa hoja con la fila nueva,
+    para que el próximo chequeo de duplicados la vea sin volver a leer la hoja.
+    Si no se puede ubicar la fila escrita, la caché de la hoja se invalida.
+    """
+    respuesta = sheet.append_row(row_data, **kwargs)
+    _registrar_filas_en_cache(sheet, _fila_desde_respuesta_append(respuesta), [row_data])
+    return respuesta
+
+def append_rows_con_cache(sheet, rows, **kwargs):
+    """Igual que append_row_con_cache pero para varias filas en una sola llamada (append_rows)."""
+    respuesta = sheet.append_rows(rows, **kwargs)
+    _registrar_filas_en_cache(sheet, _fila_desde_respuesta_append(respuesta), rows)
+    return respuesta
+
+def precargar_cache_hojas(client) -> int:
+    """
+    Precarga en la caché las pestañas configuradas en SHEETS_TO_SEARCH y MAPA_RANGOS_ERRORES.
+    :return: Cantidad de rangos cargados.
+    """
+    objetivos = [(config.SPREADSHEET_ID_BUSCAR_CASO, f"{nombre}!A:Z") for nombre in (config.SHEETS_TO_SEARCH or [])]
+    objetivos += [(config.SPREADSHEET_ID_CASOS, rango) for rango in (config.MAPA_RANGOS_ERRORES or {})]
+    cargados = 0
+    spreadsheets = {}
+    for spreadsheet_id, rango in objetivos:
+        if not spreadsheet_id or '!' not in rango:
+            continue
+        hoja_nombre, rango_puro = rango.split('!', 1)
+        try:
+            if spreadsheet_id not in spreadsheets:
+                spreadsheets[spreadsheet_id] = abrir_spreadsheet_cacheado(client, spreadsheet_id)
+            sheet = obtener_worksheet_cacheado(spreadsheets[spreadsheet_id], hoja_nombre.strip("'"))
+            obtener_snapshot_hoja(sheet, rango_puro, forzar=True)
+            cargados += 1
+        except Exception as error:
+            print(f"precargar_cache_hojas: No se pudo cargar {rango}: {error}")
+    print(f"Caché de hojas precargada: {cargados} rangos.")
+    return cargados
+
 def check_if_pedido_exists(sheet, sheet_range: str, pedido_number: str) -> bool:
     """
     Verifica si un número de pedido ya existe en la columna "Número de pedido" de una hoja específica.
+    Usa el índice de la caché de hojas, que se refresca por TTL o después de append_row_con_cache.
     :param sheet: Instancia de gspread.Worksheet
     :param sheet_range: Rango de la hoja a leer (ej: 'A:Z')
     :param pedido_number: El número de pedido a buscar.
     :return: True si el pedido existe, False si no.
     """
     try:
-        rows = sheet.get(sheet_range)
-        if not rows or len(rows) <= 1:
+        entrada = obtener_snapshot_hoja(sheet, sheet_range)
+        if len(entrada['rows']) <= 1:
             print(f"check_if_pedido_exists: No hay datos en {sheet_range}. Pedido {pedido_number} no encontrado.")
             return False
-        header_row = rows[0]
-        pedido_column_index = next((i for i, header in enumerate(header_row)
-                                    if header and str(header).strip().lower() == 'número de pedido'), -1)
-        if pedido_column_index == -1:
+        if entrada['pedido_col'] == -1:
             print(f'check_if_pedido_exists: No se encontró la columna "Número de pedido" en el rango {sheet_range}.' )
             return False
-        for i, row in enumerate(rows[1:], start=2):
-            if len(row) <= pedido_column_index:
-                continue
-            row_pedido_value = str(row[pedido_column_index]).strip() if row[pedido_column_index] else ''
-            if row_pedido_value.lower() == pedido_number.strip().lower():
-                print(f"check_if_pedido_exists: Pedido {pedido_number} encontrado como duplicado en la fila {i} de {sheet_range}.")
-                return True
+        filas = entrada['indice'].get(normalizar_pedido(pedido_number))
+        if filas:
+            print(f"check_if_pedido_exists: Pedido {pedido_number} encontrado como duplicado en la fila {filas[0]} de {sheet_range}.")
+            return True
         print(f"check_if_pedido_exists: Pedido {pedido_number} no encontrado en {sheet_range}.")
         return False
     except Exception as error:
@@ -62,32 +226,24 @@ def check_if_pedido_exists(sheet, sheet_range: str, pedido_number: str) -> bool:
 # Verificar errores y notificar en Discord
 async def check_sheet_for_errors(bot, sheet, sheet_range: str, target_channel_id: int, guild_id: int):
     """
-    Verifica errores en la hoja de Google Sheets y notifica en Discord.
+    Verifica errores en un rango de la hoja de Google Sheets y notifica en Discord.
+    La verificación periódica de todos los rangos usa utils.error_scanner.escanear_errores.
     """
     print('Iniciando verificación de errores en Google Sheets...')
+    from utils.google_async import ejecutar_google
+    from utils import error_scanner
     try:
-        hoja_nombre = None
-        sheet_range_puro = sheet_range
-        if '!' in sheet_range:
-            parts = sheet_range.split('!')
-            if len(parts) == 2:
-                hoja_nombre = parts[0].strip("'")
-                sheet_range_puro = parts[1]
-                try:
-                    spreadsheet = sheet.spreadsheet
-                    sheet = spreadsheet.worksheet(hoja_nombre)
-                except Exception as e:
-                    return
-        if not sheet_range_puro or ':' not in sheet_range_puro:
-            return
-        rows = sheet.get(sheet_range_puro)
-        if not rows:
+        hoja_nombre, sheet_range_puro = error_scanner.separar_rango(sheet_range)
+        if hoja_nombre:
             try:
-                test_rows = sheet.get('A1:Z10')
+                sheet = await ejecutar_google(sheet.spreadsheet.worksheet, hoja_nombre)
             except Exception as e:
-                pass
+                return
+        if not sheet_range_puro or ':' not in sheet_range_puro:
             return
-        if len(rows) <= 1:
+        rows = await ejecutar_google(sheet.get, sheet_range_puro)
+        resultado = error_scanner.extraer_notificaciones(rows)
+        if not resultado['pendientes']:
             return
         cases_channel = bot.get_channel(target_channel_id)
         if not cases_channel:
@@ -95,91 +251,12 @@ async def check_sheet_for_errors(bot, sheet, sheet_range: str, target_channel_id
         guild = bot.get_guild(guild_id)
         if not guild:
             return
-        try:
-            members = [member async for member in guild.fetch_members()]
-        except Exception:
-            members = guild.members
-        header_row = rows[0]
-        def normaliza_columna(nombre):
-            return str(nombre).strip().replace(' ', '').replace('\u200b', '').replace('\ufeff', '').lower()
-        def buscar_columna(header, posibles_nombres):
-            for nombre in posibles_nombres:
-                for i, h in enumerate(header):
-                    if normaliza_columna(h) == normaliza_columna(nombre):
-                        return i
-            return None
-        # Mapeo flexible de nombres de columna para cada campo
-        idx_pedido = buscar_columna(header_row, ["Número de pedido"])
-        idx_caso = buscar_columna(header_row, ["CASO ID WISE", "ID WISE"])
-        idx_tipo = buscar_columna(header_row, ["Solicitud", "Motivo de reembolso", "SOLICITUD", "Pieza faltante"])
-        idx_datos = buscar_columna(header_row, ["Dirección/Teléfono/Datos (Gestión Front)", "Dirección/Datos", "Correo del cliente"])
-        idx_agente = buscar_columna(header_row, ["Agente carga", "Agente (Front)", "Agente que carga", "Agente", "Agente (Back/TL)"])
-        idx_error = buscar_columna(header_row, ["ERROR"])
-        idx_notificado = buscar_columna(header_row, ["ErrorEnvioCheck", "ErrorEnvioCheck", "notificado"])
-        idx_observaciones = buscar_columna(header_row, ["Observaciones", "Observación adicional"])
-        error_column_index = idx_error
-        notified_column_index = idx_notificado
-        if error_column_index is None or notified_column_index is None:
-            return
-        for i, row in enumerate(rows[1:], start=2):
-            if error_column_index is None or notified_column_index is None:
-                continue
-            error_idx = error_column_index  # type: int
-            notified_idx = notified_column_index  # type: int
-            error_value = str(row[error_idx]).strip() if len(row) > error_idx and row[error_idx] else ''
-            notified_value = str(row[notified_idx]).strip() if len(row) > notified_idx and row[notified_idx] else ''
-            if error_value and not notified_value:
-                # Solo agregar campos si existen en la hoja
-                fields = []
-                if idx_pedido is not None and idx_pedido < len(row):
-                    pedido = row[idx_pedido]
-                    fields.append(("N° de Pedido", pedido, True))
-                if idx_caso is not None and idx_caso < len(row):
-                    numero_caso = row[idx_caso]
-                    fields.append(("N° de Caso", numero_caso, True))
-                if idx_tipo is not None and idx_tipo < len(row):
-                    tipo_solicitud = row[idx_tipo]
-                    fields.append(("Tipo de Solicitud", tipo_solicitud, False))
-                if idx_datos is not None and idx_datos < len(row):
-                    datos_contacto = row[idx_datos]
-                    fields.append(("Datos de Contacto", datos_contacto, False))
-                if idx_observaciones is not None and idx_observaciones < len(row):
-                    observaciones = row[idx_observaciones]
-                else:
-                    observaciones = None
-                agente_name = row[idx_agente] if (idx_agente is not None and idx_agente < len(row)) else 'N/A'
-                mention = agente_name
-                found_member = next((m for m in members if m.display_name == agente_name or m.name == agente_name), None)
-                if found_member:
-                    mention = f'<@{found_member.id}>'
-                # Crear embed profesional para el error
-                embed = discord.Embed(
-                    title="🚨 Error detectado en la hoja de Casos",
-                    description=f"Hay un error marcado en un caso que cargaste:",
-                    color=discord.Color.red()
-                )
-                embed.add_field(name="Fila en Sheet", value=str(i), inline=True)
-                for nombre, valor, inline in fields:
-                    embed.add_field(name=nombre, value=valor, inline=inline)
-                embed.add_field(name="Error", value=error_value, inline=False)
-                if observaciones is not None and observaciones:
-                    embed.add_field(name="Observaciones", value=observaciones, inline=False)
-                embed.set_footer(text="Por favor, revisa la hoja para más detalles.")
-                try:
-                    await cases_channel.send(content=f"{mention}", embed=embed)
-                    tz = pytz.timezone('America/Argentina/Buenos_Aires')
-                    now = datetime.now(tz)
-                    notification_timestamp = now.strftime('%d-%m-%Y %H:%M:%S')
-                    # Marcar la columna de notificación para evitar duplicados
-                    try:
-                        col_letter = chr(ord('A') + notified_idx)
-                        cell_address = f"{col_letter}{i}"
-                        sheet.update_acell(cell_address, notification_timestamp)
-                        print(f"Columna de notificación marcada en {cell_address} con timestamp {notification_timestamp}")
-                    except Exception as update_error:
-                        print(f"Error al marcar columna de notificación: {update_error}")
-                except Exception as e:
-                    print(f"Error al enviar notificación: {e}")
+        enviadas = await error_scanner.notificar_pendientes(cases_channel, guild, resultado['pendientes'])
+        actualizaciones = error_scanner.actualizaciones_marca(
+            hoja_nombre or sheet.title, resultado['idx_notificado'], enviadas
+        )
+        # Marcar la columna de notificación para evitar duplicados
+        await error_scanner.marcar_notificados(sheet.spreadsheet, actualizaciones)
     except Exception as error:
         pass
     print('Verificación de errores en Google Sheets completada.')
@@ -188,7 +265,7 @@ def funcion_google_sheets():
     pass 
 
 def normaliza_columna(nombre):
-    return str(nombre).strip().replace(' ', '').lower()
+    return sheet_schema.normalizar_encabezado(nombre)
 
 # Columnas para Tareas Activas
 COLUMNAS_TAREAS_ACTIVAS = [
@@ -202,11 +279,31 @@ COLUMNAS_HISTORIAL = [
 ]
 
 def get_col_index(header, col_name):
-    col_norm = normaliza_columna(col_name)
-    for i, h in enumerate(header):
-        if normaliza_columna(h) == col_norm:
-            return i
-    return None
+    return sheet_schema.compilar(header).indice(col_name)
+
+# Campos que devuelven los helpers obtener_* y columna de la que salen
+CAMPOS_TAREA = (
+    ('user_id', 'Usuario ID'),
+    ('tarea_id', 'Tarea ID'),
+    ('usuario', 'Usuario'),
+    ('tarea', 'Tarea'),
+    ('observaciones', 'Observaciones'),
+    ('estado', 'Estado (En proceso, Pausada)'),
+    ('inicio', 'Fecha/hora de inicio'),
+    ('tiempo_pausado', 'Tiempo pausada acumulado'),
+)
+
+def extractor_tarea(header):
+    """Devuelve una función (row, fila_idx) -> dict de la tarea, con las columnas resueltas una sola vez."""
+    extraer = sheet_schema.compilar(header).extractor([col for _, col in CAMPOS_TAREA])
+    claves = [clave for clave, _ in CAMPOS_TAREA]
+
+    def datos_tarea(row, fila_idx):
+        datos = dict(zip(claves, extraer(row)))
+        datos['tiempo_pausado'] = datos['tiempo_pausado'] or '00:00:00'
+        datos['fila_idx'] = fila_idx
+        return datos
+    return datos_tarea
 
 def generar_tarea_id(user_id):
     """
@@ -301,16 +398,11 @@ def obtener_datos_tarea_activa(sheet, user_id):
         if user_col is None:
             return None
         
-        for row in rows[1:]:
+        datos_tarea = extractor_tarea(header)
+        for i, row in enumerate(rows[1:], start=2):
             if len(row) > user_col and row[user_col] == user_id:
-                return {
-                    'usuario': row[get_col_index(header, 'Usuario')] if get_col_index(header, 'Usuario') is not None and len(row) > get_col_index(header, 'Usuario') else '',
-                    'tarea': row[get_col_index(header, 'Tarea')] if get_col_index(header, 'Tarea') is not None and len(row) > get_col_index(header, 'Tarea') else '',
-                    'observaciones': row[get_col_index(header, 'Observaciones')] if get_col_index(header, 'Observaciones') is not None and len(row) > get_col_index(header, 'Observaciones') else '',
-                    'estado': row[get_col_index(header, 'Estado (En proceso, Pausada)')] if get_col_index(header, 'Estado (En proceso, Pausada)') is not None and len(row) > get_col_index(header, 'Estado (En proceso, Pausada)') else '',
-                    'inicio': row[get_col_index(header, 'Fecha/hora de inicio')] if get_col_index(header, 'Fecha/hora de inicio') is not None and len(row) > get_col_index(header, 'Fecha/hora de inicio') else '',
-                    'tiempo_pausado': row[get_col_index(header, 'Tiempo pausada acumulado')] if get_col_index(header, 'Tiempo pausada acumulado') is not None and len(row) > get_col_index(header, 'Tiempo pausada acumulado') else '00:00:00'
-                }
+                datos = datos_tarea(row, i)
+                return {clave: datos[clave] for clave in ('usuario', 'tarea', 'observaciones', 'estado', 'inicio', 'tiempo_pausado')}
         
         return None
     except Exception as e:
@@ -613,26 +705,10 @@ def obtener_tarea_por_id(sheet, tarea_id):
         if tarea_id_col is None:
             return None
         
-        for row in rows[1:]:
+        for i, row in enumerate(rows[1:], start=2):
             if len(row) > tarea_id_col and row[tarea_id_col] == tarea_id:
-                user_id_col = get_col_index(header, 'Usuario ID')
-                usuario_col = get_col_index(header, 'Usuario')
-                tarea_col = get_col_index(header, 'Tarea')
-                observaciones_col = get_col_index(header, 'Observaciones')
-                estado_col = get_col_index(header, 'Estado (En proceso, Pausada)')
-                inicio_col = get_col_index(header, 'Fecha/hora de inicio')
-                tiempo_pausado_col = get_col_index(header, 'Tiempo pausada acumulado')
-                
-                return {
-                    'user_id': row[user_id_col] if user_id_col is not None and len(row) > user_id_col else '',
-                    'usuario': row[usuario_col] if usuario_col is not None and len(row) > usuario_col else '',
-                    'tarea': row[tarea_col] if tarea_col is not None and len(row) > tarea_col else '',
-                    'observaciones': row[observaciones_col] if observaciones_col is not None and len(row) > observaciones_col else '',
-                    'estado': row[estado_col] if estado_col is not None and len(row) > estado_col else '',
-                    'inicio': row[inicio_col] if inicio_col is not None and len(row) > inicio_col else '',
-                    'tiempo_pausado': row[tiempo_pausado_col] if tiempo_pausado_col is not None and len(row) > tiempo_pausado_col else '00:00:00',
-                    'fila_idx': rows.index(row) + 1  # Índice de la fila para actualizaciones
-                }
+                # fila_idx: índice de la fila para actualizaciones
+                return extractor_tarea(header)(row, i)
         
         return None
     except Exception as e:
@@ -654,24 +730,15 @@ def obtener_tarea_activa_por_usuario(sheet, user_id):
         if user_col is None:
             return None
         
-        for row in rows[1:]:
+        datos_tarea = extractor_tarea(header)
+        for i, row in enumerate(rows[1:], start=2):
             if len(row) > user_col and row[user_col] == user_id:
-                estado_col_idx = get_col_index(header, 'Estado (En proceso, Pausada)')
-                estado = row[estado_col_idx] if estado_col_idx is not None and len(row) > estado_col_idx else ''
-                if estado.lower() in ['en proceso', 'pausada']:
-                    return {
-                        'user_id': user_id,
-                        'tarea_id': row[get_col_index(header, 'Tarea ID')] if get_col_index(header, 'Tarea ID') is not None and len(row) > get_col_index(header, 'Tarea ID') else '',
-                        'usuario': row[get_col_index(header, 'Usuario')] if get_col_index(header, 'Usuario') is not None and len(row) > get_col_index(header, 'Usuario') else '',
-                        'tarea': row[get_col_index(header, 'Tarea')] if get_col_index(header, 'Tarea') is not None and len(row) > get_col_index(header, 'Tarea') else '',
-                        'observaciones': row[get_col_index(header, 'Observaciones')] if get_col_index(header, 'Observaciones') is not None and len(row) > get_col_index(header, 'Observaciones') else '',
-                        'estado': estado,
-                        'inicio': row[get_col_index(header, 'Fecha/hora de inicio')] if get_col_index(header, 'Fecha/hora de inicio') is not None and len(row) > get_col_index(header, 'Fecha/hora de inicio') else '',
-                        'tiempo_pausado': row[get_col_index(header, 'Tiempo pausada acumulado')] if get_col_index(header, 'Tiempo pausada acumulado') is not None and len(row) > get_col_index(header, 'Tiempo pausada acumulado') else '00:00:00',
-                        'fila_idx': rows.index(row) + 1
-                    }
+                datos = datos_tarea(row, i)
+                if datos['estado'].lower() in ['en proceso', 'pausada']:
+                    datos['user_id'] = user_id
+                    return datos
         
         return None
     except Exception as e:
         print(f'[ERROR] obtener_tarea_activa_por_usuario: {e}')
-        return None 
\ No newline at end of file
+        return None
@@ -0,0 +1,71 @@
+"""
+Claves de idempotencia para los envíos de modals.
+Un doble clic o un reintento de Discord puede mandar el mismo modal dos veces; las dos
+ejecuciones harían la lectura, la verificación de duplicados y el append en paralelo y
+terminarían en dos filas. Con ejecutar_una_vez las ejecuciones con la misma clave
+(solicitud_id + número de pedido) comparten una sola operación en curso, y el resultado
+queda guardado config.IDEMPOTENCIA_TTL_SEC segundos para responder igual a un reintento
+tardío. Los errores no se guardan: el siguiente intento vuelve a ejecutar la operación.
+Todo corre en el event loop del bot, así que no hace falta un lock de hilos.
+"""
+import asyncio
+import time
+import config
+from utils.google_sheets import normalizar_pedido
+
+# clave -> Future de la operación en curso
+_en_curso = {}
+# clave -> (resultado, momento en que terminó)
+_resultados = {}
+
+def clave_envio(tipo: str, solicitud_id: str, pedido: str) -> str:
+    """Clave de un envío: tipo de modal, solicitud_id del flujo y pedido normalizado."""
+    return f"{tipo}:{solicitud_id}:{normalizar_pedido(pedido)}"
+
+def _purgar_vencidos(ahora: float):
+    ttl = config.IDEMPOTENCIA_TTL_SEC
+    for clave in [c for c, (_, terminado) in _resultados.items() if ahora - terminado >= ttl]:
+        del _resultados[clave]
+
+def resultado_guardado(clave: str):
+    """Resultado vigente de una operación ya terminada, o None."""
+    _purgar_vencidos(time.monotonic())
+    entrada = _resultados.get(clave)
+    return entrada[0] if entrada else None
+
+async def ejecutar_una_vez(clave: str, operacion):
+    """
+    Ejecuta operacion() (una corrutina sin argumentos) una sola vez por clave.
+    Si ya hay una en curso con la misma clave se espera su resultado; si terminó hace menos
+    de config.IDEMPOTENCIA_TTL_SEC se devuelve el resultado guardado.
+    :return: (resultado, repetido) donde repetido es True si no se ejecutó la operación.
+    """
+    guardado = resultado_guardado(clave)
+    if guardado is not None:
+        return guardado, True
+    futuro = _en_curso.get(clave)
+    if futuro is not None:
+        return await asyncio.shield(futuro), True
+    futuro = asyncio.get_running_loop().create_future()
+    _en_curso[clave] = futuro
+    try:
+        resultado = await operacion()
+    except asyncio.CancelledError:
+        futuro.cancel()
+        raise
+    except Exception as error:
+        futuro.set_exception(error)
+        # Marca la excepción como leída aunque nadie más esté esperando
+        futuro.exception()
+        raise
+    else:
+        futuro.set_result(resultado)
+        if resultado is not None:
+            _resultados[clave] = (resultado, time.monotonic())
+        return resultado, False
+    finally:
+        _en_curso.pop(clave, None)
+
+def limpiar():
+    """Olvida los resultados guardados (para tests)."""
+    _resultados.clear()
@@ -0,0 +1,113 @@
+"""
+Índice de búsqueda del manual para el comando /manual.
+El texto se divide una sola vez en secciones de hasta config.MANUAL_CHUNK_CHARS caracteres
+(respetando párrafos) y se indexa con BM25 en Python puro. A Gemini solo se le envían las
+config.MANUAL_TOP_K secciones más relevantes para la pregunta, así el costo y la latencia
+de cada consulta no crecen con el tamaño del manual.
+"""
+import math
+import re
+import unicodedata
+from collections import Counter, defaultdict
+import config
+
+# Parámetros estándar de BM25
+K1 = 1.5
+B = 0.75
+
+PALABRAS_VACIAS = frozenset((
+    'a', 'al', 'como', 'con', 'cual', 'cuando', 'de', 'del', 'donde', 'el', 'ella', 'en', 'es',
+    'esta', 'este', 'esto', 'hay', 'la', 'las', 'le', 'lo', 'los', 'mas', 'me', 'mi', 'no', 'o',
+    'para', 'pero', 'por', 'que', 'se', 'si', 'sin', 'son', 'su', 'sus', 'tu', 'un', 'una', 'uno',
+    'y', 'ya', 'yo', 'debo', 'hago', 'puedo', 'hacer', 'tengo',
+))
+
+def tokenizar(texto: str) -> list:
+    """Palabras en minúscula y sin acentos, sin palabras vacías y con el plural simple recortado."""
+    texto = unicodedata.normalize('NFKD', (texto or '').lower())
+    texto = ''.join(c for c in texto if not unicodedata.combining(c))
+    tokens = []
+    for palabra in re.findall(r'\w+', texto):
+        if palabra in PALABRAS_VACIAS or (len(palabra) < 2 and not palabra.isdigit()):
+            continue
+        if len(palabra) > 3 and palabra.endswith('s'):
+            palabra = palabra[:-1]
+        tokens.append(palabra)
+    return tokens
+
+def dividir_en_secciones(texto: str, max_chars: int = None) -> list:
+    """
+    Agrupa párrafos consecutivos en secciones de hasta `max_chars` caracteres.
+    Un párrafo más largo que el límite se corta por oraciones (o en seco si no tiene puntos).
+    """
+    max_chars = max(200, max_chars or config.MANUAL_CHUNK_CHARS)
+    piezas = []
+    for parrafo in re.split(r'\n\s*\n', texto or ''):
+        parrafo = parrafo.strip()
+        if not parrafo:
+            continue
+        if len(parrafo) <= max_chars:
+            piezas.append(parrafo)
+            continue
+        for oracion in re.split(r'(?<=[.!?])\s+', parrafo):
+            while len(oracion) > max_chars:
+                piezas.append(oracion[:max_chars])
+                oracion = oracion[max_chars:]
+            if oracion:
+                piezas.append(oracion)
+    secciones, actual = [], ''
+    for pieza in piezas:
+        if actual and len(actual) + len(pieza) + 2 > max_chars:
+            secciones.append(actual)
+            actual = pieza
+        else:
+            actual = f"{actual}\n\n{pieza}" if actual else pieza
+    if actual:
+        secciones.append(actual)
+    return secciones
+
+class IndiceManual:
+    """Índice invertido BM25 sobre las secciones del manual."""
+
+    def __init__(self, secciones: list):
+        self.secciones = list(secciones)
+        self._postings = defaultdict(list)
+        self._largos = []
+        for i, seccion in enumerate(self.secciones):
+            frecuencias = Counter(tokenizar(seccion))
+            self._largos.append(sum(frecuencias.values()))
+            for termino, tf in frecuencias.items():
+                self._postings[termino].append((i, tf))
+        total = len(self.secciones)
+        self._largo_medio = (sum(self._largos) / total) if total else 0.0
+        self._idf = {
+            termino: math.log(1 + (total - len(docs) + 0.5) / (len(docs) + 0.5))
+            for termino, docs in self._postings.items()
+        }
+
+    @classmethod
+    def desde_texto(cls, texto: str, max_chars: int = None):
+        return cls(dividir_en_secciones(texto, max_chars))
+
+    def buscar(self, pregunta: str, k: int = None) -> list:
+        """:return: hasta `k` pares (puntaje, índice de sección) con puntaje > 0, del más relevante al menos."""
+        k = k or config.MANUAL_TOP_K
+        puntajes = defaultdict(float)
+        for termino in set(tokenizar(pregunta)):
+            idf = self._idf.get(termino)
+            if idf is None:
+                continue
+            for i, tf in self._postings[termino]:
+                norma = K1 * (1 - B + B * self._largos[i] / (self._largo_medio or 1))
+                puntajes[i] += idf * tf * (K1 + 1) / (tf + norma)
+        mejores = sorted(puntajes.items(), key=lambda item: (-item[1], item[0]))[:k]
+        return [(puntaje, i) for i, puntaje in mejores]
+
+    def contexto(self, pregunta: str, k: int = None) -> str:
+        """Las secciones más relevantes, en el orden en que aparecen en el manual ('' si ninguna coincide)."""
+        indices = sorted(i for _, i in self.buscar(pregunta, k))
+        return '\n\n---\n\n'.join(self.secciones[i] for i in indices)
+
+    def contexto_inicial(self, k: int = None) -> str:
+        """Las primeras `k` secciones del manual, para preguntas que no comparten términos con ninguna."""
+        return '\n\n---\n\n'.join(self.secciones[:k or config.MANUAL_TOP_K])
@@ -1,72 +1,182 @@
+"""
+Manual de procedimientos en memoria para el comando /manual.
+El texto, su índice de secciones (utils/manual_index.py) y la metadata se reemplazan juntos
+en un solo paso cuando termina una carga, así una consulta nunca ve un texto nuevo con un
+índice viejo y, si la descarga falla, sigue vigente la versión anterior.
+Cada carga deja una copia en config.MANUAL_SNAPSHOT_DIR para que al arrancar el bot se pueda
+usar la última versión buena sin esperar a Drive; tasks/manual_refresher.py consulta
+periódicamente solo la metadata del archivo (modifiedTime, md5Checksum) y vuelve a descargarlo
+únicamente si cambió.
+"""
 import asyncio
+import json
+import os
+from pathlib import Path
 from typing import Optional, Dict, Any
+import config
+from utils.google_async import ejecutar_google
 from utils.google_drive import download_file_from_drive
+from utils.manual_index import IndiceManual
 
 # Cache global para el manual
 _manual_cache: Optional[str] = None
 _manual_metadata: Optional[Dict[str, Any]] = None
+# Índice de secciones del manual, se arma una vez por carga
+_manual_index: Optional[IndiceManual] = None
+# Evita dos descargas simultáneas (arranque, recarga de admin y refresco periódico)
+_lock_carga: Optional[asyncio.Lock] = None
+
+CAMPOS_METADATA_DRIVE = 'name,modifiedTime,md5Checksum,size'
+
+def _decodificar(file_content: bytes) -> str:
+    # Intentar diferentes codificaciones
+    for encoding in ['utf-8', 'latin-1', 'cp1252', 'iso-8859-1']:
+        try:
+            texto = file_content.decode(encoding)
+            print(f"Manual decodificado exitosamente con {encoding}")
+            return texto
+        except UnicodeDecodeError:
+            continue
+    # Si ninguna codificación funciona, usar 'ignore' para saltar caracteres problemáticos
+    print("Manual decodificado con 'ignore' (algunos caracteres pueden haberse perdido)")
+    return file_content.decode('utf-8', errors='ignore')
+
+def _metadata_desde_drive(file_id: str, info: dict, texto: str) -> Dict[str, Any]:
+    return {
+        'file_id': file_id,
+        'title': info.get('name', 'Manual'),
+        'last_modified': info.get('modifiedTime'),
+        'md5': info.get('md5Checksum'),
+        'size': len(texto)
+    }
+
+def _instalar(texto: str, indice: IndiceManual, metadata: Dict[str, Any]) -> None:
+    """Reemplaza texto, índice y metadata juntos."""
+    global _manual_cache, _manual_metadata, _manual_index
+    _manual_cache, _manual_index, _manual_metadata = texto, indice, metadata
+
+def _rutas_snapshot():
+    carpeta = Path(config.MANUAL_SNAPSHOT_DIR)
+    return carpeta / 'manual.txt', carpeta / 'manual.json'
+
+def _guardar_snapshot(texto: str, metadata: Dict[str, Any]) -> None:
+    """Escribe la copia local en archivos temporales y los reemplaza, para no dejar una copia a medias."""
+    ruta_texto, ruta_meta = _rutas_snapshot()
+    ruta_texto.parent.mkdir(parents=True, exist_ok=True)
+    for ruta, contenido in ((ruta_texto, texto), (ruta_meta, json.dumps(metadata, ensure_ascii=False))):
+        temporal = ruta.with_suffix(ruta.suffix + '.tmp')
+        temporal.write_text(contenido, encoding='utf-8')
+        os.replace(temporal, ruta)
+
+def cargar_snapshot(file_id: str) -> bool:
+    """
+    Carga la última copia local del manual, si es del mismo archivo de Drive.
+    Returns:
+        True si se cargó la copia, False si no hay una válida
+    """
+    ruta_texto, ruta_meta = _rutas_snapshot()
+    try:
+        metadata = json.loads(ruta_meta.read_text(encoding='utf-8'))
+        if metadata.get('file_id') != file_id:
+            return False
+        texto = ruta_texto.read_text(encoding='utf-8')
+    except FileNotFoundError:
+        return False
+    except Exception as e:
+        print(f"No se pudo leer la copia local del manual: {e}")
+        return False
+    _instalar(texto, IndiceManual.desde_texto(texto), metadata)
+    print(f"Manual cargado desde la copia local: {metadata.get('title')} ({len(texto)} caracteres)")
+    return True
+
+def _obtener_lock() -> asyncio.Lock:
+    global _lock_carga
+    if _lock_carga is None:
+        _lock_carga = asyncio.Lock()
+    return _lock_carga
+
+def _leer_metadata_drive(drive_instance, file_id: str) -> dict:
+    return drive_instance.files().get(fileId=file_id, fields=CAMPOS_METADATA_DRIVE, supportsAllDrives=True).execute()
+
+def _preparar(file_content: bytes):
+    texto = _decodificar(file_content)
+    return texto, IndiceManual.desde_texto(texto)
+
+async def _descargar_e_instalar(drive_instance, file_id: str, info: dict) -> None:
+    file_content = await ejecutar_google(
+        download_file_from_drive, drive_instance, file_id, timeout=config.GOOGLE_API_UPLOAD_TIMEOUT_SEC
+    )
+    texto, indice = await asyncio.to_thread(_preparar, file_content)
+    metadata = _metadata_desde_drive(file_id, info, texto)
+    _instalar(texto, indice, metadata)
+    print(f"Manual cargado exitosamente: {metadata['title']} ({metadata['size']} caracteres, {len(indice.secciones)} secciones)")
+    try:
+        await asyncio.to_thread(_guardar_snapshot, texto, metadata)
+    except Exception as e:
+        print(f"No se pudo guardar la copia local del manual: {e}")
 
 async def load_and_cache_manual(drive_instance, file_id: str) -> None:
     """
     Carga y cachea el manual desde Google Drive
-    
+
     Args:
         drive_instance: Instancia de Google Drive
         file_id: ID del archivo en Google Drive
     """
-    global _manual_cache, _manual_metadata
-    
     try:
-        # Obtener el archivo desde Google Drive usando la API moderna
-        file_content = download_file_from_drive(drive_instance, file_id)
-        
-        # Intentar diferentes codificaciones
-        encodings = ['utf-8', 'latin-1', 'cp1252', 'iso-8859-1']
-        _manual_cache = None
-        
-        for encoding in encodings:
-            try:
-                _manual_cache = file_content.decode(encoding)
-                print(f"Manual decodificado exitosamente con {encoding}")
-                break
-            except UnicodeDecodeError:
-                continue
-        
-        if _manual_cache is None:
-            # Si ninguna codificación funciona, usar 'ignore' para saltar caracteres problemáticos
-            _manual_cache = file_content.decode('utf-8', errors='ignore')
-            print("Manual decodificado con 'ignore' (algunos caracteres pueden haberse perdido)")
-        
-        # Obtener metadata del archivo
-        file_metadata = drive_instance.files().get(fileId=file_id, fields='name,modifiedTime,size').execute()
-        
-        # Guardar metadata
-        _manual_metadata = {
-            'file_id': file_id,
-            'title': file_metadata.get('name', 'Manual'),
-            'last_modified': file_metadata.get('modifiedTime'),
-            'size': len(_manual_cache)
-        }
-        
-        print(f"Manual cargado exitosamente: {_manual_metadata['title']} ({_manual_metadata['size']} caracteres)")
-        
+        async with _obtener_lock():
+            info = await ejecutar_google(_leer_metadata_drive, drive_instance, file_id)
+            await _descargar_e_instalar(drive_instance, file_id, info)
     except Exception as e:
         print(f"Error al cargar el manual: {e}")
         raise
 
+def manual_cambio(info: dict, file_id: str) -> bool:
+    """Compara la metadata de Drive con la del manual cargado (md5Checksum si existe, si no modifiedTime)."""
+    actual = _manual_metadata
+    if not actual or actual.get('file_id') != file_id:
+        return True
+    if info.get('md5Checksum') and actual.get('md5'):
+        return info['md5Checksum'] != actual['md5']
+    return info.get('modifiedTime') != actual.get('last_modified')
+
+async def refrescar_manual(drive_instance, file_id: str) -> bool:
+    """
+    Consulta solo la metadata del archivo y vuelve a descargarlo si cambió.
+
+    Returns:
+        True si se cargó una versión nueva, False si no hubo cambios
+    """
+    async with _obtener_lock():
+        info = await ejecutar_google(_leer_metadata_drive, drive_instance, file_id)
+        if not manual_cambio(info, file_id):
+            return False
+        print(f"El manual cambió en Drive ({info.get('modifiedTime')}), recargando...")
+        await _descargar_e_instalar(drive_instance, file_id, info)
+        return True
+
 def get_manual_text() -> Optional[str]:
     """
     Obtiene el texto del manual desde el cache
-    
+
     Returns:
         El texto del manual o None si no está cargado
     """
     return _manual_cache
 
+def get_manual_index() -> Optional[IndiceManual]:
+    """
+    Obtiene el índice de secciones del manual
+
+    Returns:
+        El índice o None si el manual no está cargado
+    """
+    return _manual_index
+
 def get_manual_metadata() -> Optional[Dict[str, Any]]:
     """
     Obtiene la metadata del manual
-    
+
     Returns:
         Metadata del manual o None si no está cargado
     """
@@ -75,7 +185,7 @@ def get_manual_metadata() -> Optional[Dict[str, Any]]:
 def is_manual_loaded() -> bool:
     """
     Verifica si el manual está cargado en cache
-    
+
     Returns:
         True si el manual está cargado, False en caso contrario
     """
@@ -85,9 +195,7 @@ def clear_manual_cache() -> None:
     """
     Limpia el cache del manual
     """
-    global _manual_cache, _manual_metadata
-    _manual_cache = None
-    _manual_metadata = None
+    _instalar(None, None, None)
 
 def funcion_manual_processor():
-    pass  # Implementar lógica de manualProcessor.js aquí 
\ No newline at end of file
+    pass  # Implementar lógica de manualProcessor.js aquí
@@ -0,0 +1,91 @@
+"""
+Índice en memoria de los miembros del servidor por display_name y por nombre de usuario.
+Se construye desde la caché del gateway (Intents.all()) la primera vez que se consulta un
+servidor y se mantiene al día con los eventos de alta, actualización y baja de miembros.
+"""
+import threading
+
+# guild_id -> {'display': {nombre: {member_id: member}}, 'name': {...},
+#              'miembros': {member_id: (member, display_name, name)}}
+# Se guardan los nombres con los que se indexó cada miembro porque discord.py actualiza el
+# Member de la caché en el lugar: al llegar on_member_update ya tiene los nombres nuevos.
+_indices = {}
+_lock = threading.Lock()
+
+def _agregar(indice, member):
+    indice['miembros'][member.id] = (member, member.display_name, member.name)
+    indice['display'].setdefault(member.display_name, {})[member.id] = member
+    indice['name'].setdefault(member.name, {})[member.id] = member
+
+def _quitar(indice, member_id):
+    indexado = indice['miembros'].pop(member_id, None)
+    if indexado is None:
+        return
+    _, display_name, name = indexado
+    for clave, nombre in (('display', display_name), ('name', name)):
+        por_nombre = indice[clave].get(nombre)
+        if por_nombre is not None:
+            por_nombre.pop(member_id, None)
+            if not por_nombre:
+                del indice[clave][nombre]
+
+def construir_indice(guild) -> int:
+    """Indexa los miembros en caché de un servidor. Devuelve la cantidad indexada."""
+    indice = {'display': {}, 'name': {}, 'miembros': {}}
+    for member in guild.members:
+        _agregar(indice, member)
+    with _lock:
+        _indices[guild.id] = indice
+    print(f"Índice de miembros construido para {guild.id}: {len(indice['miembros'])} miembros.")
+    return len(indice['miembros'])
+
+def registrar_miembro(member):
+    """Agrega o refresca un miembro (on_member_join / on_member_update)."""
+    with _lock:
+        indice = _indices.get(member.guild.id)
+        if indice is None:
+            return
+        _quitar(indice, member.id)
+        _agregar(indice, member)
+
+def quitar_miembro(member):
+    """Quita un miembro que dejó el servidor (on_member_remove)."""
+    with _lock:
+        indice = _indices.get(member.guild.id)
+        if indice is not None:
+            _quitar(indice, member.id)
+
+def refrescar_usuario(user_id: int, guilds):
+    """Reindexa un usuario en los servidores indexados (on_user_update cambia el nombre de usuario)."""
+    for guild in guilds:
+        member = guild.get_member(user_id)
+        if member is not None:
+            registrar_miembro(member)
+
+def buscar_miembro(guild, nombre):
+    """
+    Busca un miembro por display_name o, si no hay coincidencia, por nombre de usuario.
+    :return: discord.Member o None
+    """
+    if not nombre:
+        return None
+    with _lock:
+        indice = _indices.get(guild.id)
+    if indice is None:
+        construir_indice(guild)
+        with _lock:
+            indice = _indices.get(guild.id)
+    with _lock:
+        for clave in ('display', 'name'):
+            por_nombre = indice[clave].get(nombre)
+            if por_nombre:
+                return next(iter(por_nombre.values()))
+    return None
+
+def limpiar_indice(guild_id: int = None):
+    """Descarta el índice de un servidor o de todos (se reconstruye en la próxima consulta)."""
+    with _lock:
+        if guild_id is None:
+            _indices.clear()
+        else:
+            _indices.pop(guild_id, None)
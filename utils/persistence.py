@@ -0,0 +1,497 @@
+"""
+Persistencia local en SQLite (modo WAL) para el estado del bot.
+Reemplaza a temp/pendingData.json y data/tareas_activas.json con tablas indexadas:
+- estados_flujo: estado de los flujos por usuario y tipo (state_manager).
+- tareas_activas: tareas del panel por usuario, con índice por fecha de pausa.
+- vinculos_mensaje: mensaje de Discord asociado a un usuario/tipo (p. ej. el embed de la tarea).
+- filas_pendientes: filas encoladas por utils/append_queue.py que todavía no llegaron a la hoja.
+- escrituras_pendientes: escrituras de utils/tareas_mirror.py que fallaron y se reintentan.
+- seguimientos_envio: último estado visto de cada tracking abierto (tasks/tracking_watcher.py).
+- carpetas_drive: ID de las carpetas de Drive ya encontradas o creadas, por padre y nombre (utils/google_drive.py).
+Todas las operaciones usan una única conexión protegida por un lock y cada escritura es
+una transacción, por lo que un corte a mitad de escritura no deja el archivo corrupto.
+"""
+import json
+import os
+import sqlite3
+import threading
+import time
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Optional
+import config
+
+# Archivos JSON anteriores; se importan una única vez si la base está vacía
+LEGACY_ESTADOS_JSON = Path.cwd() / 'temp' / 'pendingData.json'
+LEGACY_TAREAS_JSON = Path('data/tareas_activas.json')
+
+_conexion = None
+_lock = threading.RLock()
+
+_ESQUEMA = """
+CREATE TABLE IF NOT EXISTS estados_flujo (
+    user_id TEXT NOT NULL,
+    tipo TEXT NOT NULL,
+    datos TEXT NOT NULL,
+    expira_en REAL,
+    actualizado REAL NOT NULL,
+    PRIMARY KEY (user_id, tipo)
+);
+CREATE INDEX IF NOT EXISTS idx_estados_expira ON estados_flujo (expira_en) WHERE expira_en IS NOT NULL;
+
+CREATE TABLE IF NOT EXISTS tareas_activas (
+    user_id TEXT PRIMARY KEY,
+    tarea_id TEXT,
+    estado TEXT,
+    pausada_desde REAL,
+    datos TEXT NOT NULL,
+    actualizado REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_tareas_tarea_id ON tareas_activas (tarea_id);
+CREATE INDEX IF NOT EXISTS idx_tareas_pausada ON tareas_activas (pausada_desde) WHERE pausada_desde IS NOT NULL;
+
+CREATE TABLE IF NOT EXISTS vinculos_mensaje (
+    user_id TEXT NOT NULL,
+    tipo TEXT NOT NULL,
+    message_id TEXT NOT NULL,
+    channel_id TEXT NOT NULL,
+    referencia TEXT,
+    creado REAL NOT NULL,
+    PRIMARY KEY (user_id, tipo)
+);
+CREATE INDEX IF NOT EXISTS idx_vinculos_mensaje ON vinculos_mensaje (message_id);
+
+CREATE TABLE IF NOT EXISTS filas_pendientes (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    spreadsheet_id TEXT NOT NULL,
+    hoja TEXT NOT NULL,
+    fila TEXT NOT NULL,
+    creado REAL NOT NULL
+);
+
+CREATE TABLE IF NOT EXISTS escrituras_pendientes (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    spreadsheet_id TEXT NOT NULL,
+    hoja TEXT NOT NULL,
+    tipo TEXT NOT NULL,
+    datos TEXT NOT NULL,
+    creado REAL NOT NULL
+);
+
+CREATE TABLE IF NOT EXISTS seguimientos_envio (
+    numero TEXT PRIMARY KEY,
+    pedido TEXT,
+    fila INTEGER,
+    estado TEXT,
+    eventos TEXT NOT NULL,
+    proxima_consulta REAL,
+    consultas_sin_cambio INTEGER NOT NULL DEFAULT 0,
+    actualizado REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_seguimientos_proxima ON seguimientos_envio (proxima_consulta) WHERE proxima_consulta IS NOT NULL;
+
+CREATE TABLE IF NOT EXISTS carpetas_drive (
+    parent_id TEXT NOT NULL,
+    nombre TEXT NOT NULL,
+    folder_id TEXT NOT NULL,
+    creado REAL NOT NULL,
+    PRIMARY KEY (parent_id, nombre)
+);
+"""
+
+@dataclass
+class EstadoFlujo:
+    user_id: str
+    tipo: str
+    datos: dict
+    expira_en: Optional[float] = None
+
+@dataclass
+class TareaActiva:
+    user_id: str
+    tarea_id: Optional[str] = None
+    estado: Optional[str] = None
+    pausada_desde: Optional[float] = None
+    datos: dict = field(default_factory=dict)
+
+@dataclass
+class VinculoMensaje:
+    user_id: str
+    tipo: str
+    message_id: str
+    channel_id: str
+    referencia: Optional[str] = None
+
+def _conectar():
+    global _conexion
+    if _conexion is not None:
+        return _conexion
+    ruta = Path(config.SQLITE_DB_PATH)
+    ruta.parent.mkdir(parents=True, exist_ok=True)
+    con = sqlite3.connect(str(ruta), check_same_thread=False, isolation_level=None)
+    con.execute('PRAGMA journal_mode=WAL')
+    con.execute('PRAGMA synchronous=NORMAL')
+    con.execute('PRAGMA busy_timeout=5000')
+    con.executescript(_ESQUEMA)
+    _conexion = con
+    con.execute('BEGIN IMMEDIATE')
+    try:
+        _migrar_json(con)
+        con.execute('COMMIT')
+    except Exception as error:
+        con.execute('ROLLBACK')
+        print(f"persistence: Falló la migración de los JSON anteriores: {error}")
+    return con
+
+def _transaccion(operaciones):
+    """Ejecuta una lista de (sql, parámetros) dentro de una sola transacción."""
+    with _lock:
+        con = _conectar()
+        con.execute('BEGIN IMMEDIATE')
+        try:
+            for sql, params in operaciones:
+                con.execute(sql, params)
+            con.execute('COMMIT')
+        except Exception:
+            con.execute('ROLLBACK')
+            raise
+
+def _consultar(sql, params=()):
+    with _lock:
+        return _conectar().execute(sql, params).fetchall()
+
+def cerrar():
+    """Cierra la conexión (la próxima operación vuelve a abrirla)."""
+    global _conexion
+    with _lock:
+        if _conexion is not None:
+            _conexion.close()
+            _conexion = None
+
+# --- Estados de flujo ---
+
+_SQL_UPSERT_ESTADO = (
+    'INSERT INTO estados_flujo (user_id, tipo, datos, expira_en, actualizado) VALUES (?, ?, ?, ?, ?) '
+    'ON CONFLICT (user_id, tipo) DO UPDATE SET datos = excluded.datos, expira_en = excluded.expira_en, '
+    'actualizado = excluded.actualizado'
+)
+_SQL_BORRAR_ESTADO = 'DELETE FROM estados_flujo WHERE user_id = ? AND tipo = ?'
+
+def guardar_estado(estado: EstadoFlujo):
+    guardar_estados([estado], [])
+
+def guardar_estados(estados: list, borrados: list = ()):
+    """
+    Aplica en una sola transacción un lote de estados a guardar y de (user_id, tipo) a borrar.
+    Lo usa el write-behind de state_manager.
+    """
+    ahora = time.time()
+    operaciones = [
+        (_SQL_UPSERT_ESTADO, (e.user_id, e.tipo, json.dumps(e.datos, ensure_ascii=False), e.expira_en, ahora))
+        for e in estados
+    ]
+    operaciones += [(_SQL_BORRAR_ESTADO, (user_id, tipo)) for user_id, tipo in borrados]
+    if operaciones:
+        _transaccion(operaciones)
+
+def obtener_estado(user_id: str, tipo: str) -> Optional[EstadoFlujo]:
+    filas = _consultar(
+        'SELECT user_id, tipo, datos, expira_en FROM estados_flujo WHERE user_id = ? AND tipo = ?',
+        (user_id, tipo)
+    )
+    if not filas:
+        return None
+    u, t, datos, expira = filas[0]
+    return EstadoFlujo(u, t, json.loads(datos), expira)
+
+def borrar_estado(user_id: str, tipo: str):
+    _transaccion([(_SQL_BORRAR_ESTADO, (user_id, tipo))])
+
+def cargar_estados() -> list:
+    """Devuelve todos los estados guardados (se usa una vez al iniciar el proceso)."""
+    return [
+        EstadoFlujo(u, t, json.loads(datos), expira)
+        for u, t, datos, expira in _consultar('SELECT user_id, tipo, datos, expira_en FROM estados_flujo')
+    ]
+
+def estados_vencidos(ahora: float = None) -> list:
+    """(user_id, tipo) de los estados con vencimiento anterior a ahora (usa idx_estados_expira)."""
+    ahora = time.time() if ahora is None else ahora
+    return [
+        (u, t) for u, t in _consultar(
+            'SELECT user_id, tipo FROM estados_flujo WHERE expira_en IS NOT NULL AND expira_en <= ?', (ahora,)
+        )
+    ]
+
+# --- Tareas activas ---
+
+def guardar_tarea(tarea: TareaActiva):
+    _transaccion([(
+        'INSERT INTO tareas_activas (user_id, tarea_id, estado, pausada_desde, datos, actualizado) '
+        'VALUES (?, ?, ?, ?, ?, ?) ON CONFLICT (user_id) DO UPDATE SET tarea_id = excluded.tarea_id, '
+        'estado = excluded.estado, pausada_desde = excluded.pausada_desde, datos = excluded.datos, '
+        'actualizado = excluded.actualizado',
+        (tarea.user_id, tarea.tarea_id, tarea.estado, tarea.pausada_desde,
+         json.dumps(tarea.datos, ensure_ascii=False), time.time())
+    )])
+
+def _tarea_desde_fila(fila) -> TareaActiva:
+    user_id, tarea_id, estado, pausada_desde, datos = fila
+    return TareaActiva(user_id, tarea_id, estado, pausada_desde, json.loads(datos))
+
+_SQL_SELECT_TAREA = 'SELECT user_id, tarea_id, estado, pausada_desde, datos FROM tareas_activas'
+
+def obtener_tarea(user_id: str) -> Optional[TareaActiva]:
+    filas = _consultar(_SQL_SELECT_TAREA + ' WHERE user_id = ?', (user_id,))
+    return _tarea_desde_fila(filas[0]) if filas else None
+
+def obtener_tarea_por_tarea_id(tarea_id: str) -> Optional[TareaActiva]:
+    filas = _consultar(_SQL_SELECT_TAREA + ' WHERE tarea_id = ?', (tarea_id,))
+    return _tarea_desde_fila(filas[0]) if filas else None
+
+def listar_tareas() -> list:
+    return [_tarea_desde_fila(f) for f in _consultar(_SQL_SELECT_TAREA)]
+
+def borrar_tarea(user_id: str):
+    _transaccion([('DELETE FROM tareas_activas WHERE user_id = ?', (user_id,))])
+
+def tareas_pausadas_desde(segundos: float, ahora: float = None) -> list:
+    """Tareas pausadas hace más de `segundos` (p. ej. 2 * 3600), resuelto con idx_tareas_pausada."""
+    ahora = time.time() if ahora is None else ahora
+    filas = _consultar(
+        _SQL_SELECT_TAREA + ' WHERE pausada_desde IS NOT NULL AND pausada_desde <= ? ORDER BY pausada_desde',
+        (ahora - segundos,)
+    )
+    return [_tarea_desde_fila(f) for f in filas]
+
+# --- Vínculos de mensajes ---
+
+def guardar_vinculo(vinculo: VinculoMensaje):
+    _transaccion([(
+        'INSERT INTO vinculos_mensaje (user_id, tipo, message_id, channel_id, referencia, creado) '
+        'VALUES (?, ?, ?, ?, ?, ?) ON CONFLICT (user_id, tipo) DO UPDATE SET message_id = excluded.message_id, '
+        'channel_id = excluded.channel_id, referencia = excluded.referencia, creado = excluded.creado',
+        (vinculo.user_id, vinculo.tipo, str(vinculo.message_id), str(vinculo.channel_id),
+         vinculo.referencia, time.time())
+    )])
+
+def obtener_vinculo(user_id: str, tipo: str) -> Optional[VinculoMensaje]:
+    filas = _consultar(
+        'SELECT user_id, tipo, message_id, channel_id, referencia FROM vinculos_mensaje WHERE user_id = ? AND tipo = ?',
+        (user_id, tipo)
+    )
+    return VinculoMensaje(*filas[0]) if filas else None
+
+def obtener_vinculo_por_mensaje(message_id) -> Optional[VinculoMensaje]:
+    filas = _consultar(
+        'SELECT user_id, tipo, message_id, channel_id, referencia FROM vinculos_mensaje WHERE message_id = ?',
+        (str(message_id),)
+    )
+    return VinculoMensaje(*filas[0]) if filas else None
+
+def borrar_vinculo(user_id: str, tipo: str):
+    _transaccion([('DELETE FROM vinculos_mensaje WHERE user_id = ? AND tipo = ?', (user_id, tipo))])
+
+# --- Filas pendientes de append_queue ---
+
+@dataclass
+class FilaPendiente:
+    id: int
+    spreadsheet_id: str
+    hoja: str
+    fila: list
+
+def guardar_fila_pendiente(spreadsheet_id: str, hoja: str, fila: list) -> int:
+    with _lock:
+        con = _conectar()
+        cursor = con.execute(
+            'INSERT INTO filas_pendientes (spreadsheet_id, hoja, fila, creado) VALUES (?, ?, ?, ?)',
+            (spreadsheet_id, hoja, json.dumps(fila, ensure_ascii=False), time.time())
+        )
+        return cursor.lastrowid
+
+def borrar_filas_pendientes(ids: list):
+    ids = [i for i in ids if i is not None]
+    if ids:
+        _transaccion([('DELETE FROM filas_pendientes WHERE id = ?', (i,)) for i in ids])
+
+def listar_filas_pendientes() -> list:
+    """Filas pendientes en el orden en que se encolaron."""
+    return [
+        FilaPendiente(i, spreadsheet_id, hoja, json.loads(fila))
+        for i, spreadsheet_id, hoja, fila in _consultar(
+            'SELECT id, spreadsheet_id, hoja, fila FROM filas_pendientes ORDER BY id'
+        )
+    ]
+
+# --- Escrituras pendientes de tareas_mirror ---
+
+@dataclass
+class EscrituraPendiente:
+    id: int
+    spreadsheet_id: str
+    hoja: str
+    # 'celdas' ({'fila', 'cambios'}) o 'fila' ({'fila'})
+    tipo: str
+    datos: dict
+
+def guardar_escritura_pendiente(spreadsheet_id: str, hoja: str, tipo: str, datos: dict) -> int:
+    with _lock:
+        con = _conectar()
+        cursor = con.execute(
+            'INSERT INTO escrituras_pendientes (spreadsheet_id, hoja, tipo, datos, creado) VALUES (?, ?, ?, ?, ?)',
+            (spreadsheet_id, hoja, tipo, json.dumps(datos, ensure_ascii=False), time.time())
+        )
+        return cursor.lastrowid
+
+def borrar_escritura_pendiente(id_pendiente: int):
+    _transaccion([('DELETE FROM escrituras_pendientes WHERE id = ?', (id_pendiente,))])
+
+def listar_escrituras_pendientes() -> list:
+    """Escrituras pendientes en el orden en que fallaron."""
+    return [
+        EscrituraPendiente(i, spreadsheet_id, hoja, tipo, json.loads(datos))
+        for i, spreadsheet_id, hoja, tipo, datos in _consultar(
+            'SELECT id, spreadsheet_id, hoja, tipo, datos FROM escrituras_pendientes ORDER BY id'
+        )
+    ]
+
+# --- Seguimiento de envíos ---
+
+@dataclass
+class SeguimientoEnvio:
+    numero: str
+    pedido: Optional[str] = None
+    fila: Optional[int] = None
+    estado: Optional[str] = None
+    # Claves de los eventos ya vistos del historial (None si todavía no se consultó)
+    eventos: Optional[list] = None
+    # None: no se vuelve a consultar (p. ej. envío entregado)
+    proxima_consulta: Optional[float] = None
+    consultas_sin_cambio: int = 0
+
+_SQL_SELECT_SEGUIMIENTO = (
+    'SELECT numero, pedido, fila, estado, eventos, proxima_consulta, consultas_sin_cambio FROM seguimientos_envio'
+)
+
+def _seguimiento_desde_fila(fila) -> SeguimientoEnvio:
+    numero, pedido, nro_fila, estado, eventos, proxima, sin_cambio = fila
+    return SeguimientoEnvio(numero, pedido, nro_fila, estado, json.loads(eventos), proxima, sin_cambio)
+
+def _upsert_seguimiento(s: SeguimientoEnvio):
+    return (
+        'INSERT INTO seguimientos_envio (numero, pedido, fila, estado, eventos, proxima_consulta, '
+        'consultas_sin_cambio, actualizado) VALUES (?, ?, ?, ?, ?, ?, ?, ?) ON CONFLICT (numero) DO UPDATE SET '
+        'pedido = excluded.pedido, fila = excluded.fila, estado = excluded.estado, eventos = excluded.eventos, '
+        'proxima_consulta = excluded.proxima_consulta, consultas_sin_cambio = excluded.consultas_sin_cambio, '
+        'actualizado = excluded.actualizado',
+        (s.numero, s.pedido, s.fila, s.estado, json.dumps(s.eventos, ensure_ascii=False),
+         s.proxima_consulta, s.consultas_sin_cambio, time.time())
+    )
+
+def guardar_seguimiento(seguimiento: SeguimientoEnvio):
+    _transaccion([_upsert_seguimiento(seguimiento)])
+
+def obtener_seguimiento(numero: str) -> Optional[SeguimientoEnvio]:
+    filas = _consultar(_SQL_SELECT_SEGUIMIENTO + ' WHERE numero = ?', (numero,))
+    return _seguimiento_desde_fila(filas[0]) if filas else None
+
+def listar_seguimientos() -> list:
+    return [_seguimiento_desde_fila(f) for f in _consultar(_SQL_SELECT_SEGUIMIENTO + ' ORDER BY numero')]
+
+def seguimientos_vencidos(limite: int, ahora: float = None) -> list:
+    """Hasta `limite` seguimientos cuya próxima consulta ya venció, los más atrasados primero."""
+    ahora = time.time() if ahora is None else ahora
+    filas = _consultar(
+        _SQL_SELECT_SEGUIMIENTO + ' WHERE proxima_consulta IS NOT NULL AND proxima_consulta <= ? '
+        'ORDER BY proxima_consulta LIMIT ?',
+        (ahora, max(0, int(limite)))
+    )
+    return [_seguimiento_desde_fila(f) for f in filas]
+
+def sincronizar_seguimientos(abiertos: dict, ahora: float = None):
+    """
+    Ajusta la tabla al conjunto de envíos abiertos de la hoja en una sola transacción.
+    :param abiertos: número -> (pedido, fila). Los números nuevos quedan para consultar ya;
+        los que ya no están abiertos se borran.
+    """
+    ahora = time.time() if ahora is None else ahora
+    existentes = {s.numero: s for s in listar_seguimientos()}
+    operaciones = []
+    for numero, (pedido, fila) in abiertos.items():
+        seguimiento = existentes.get(numero)
+        if seguimiento is None:
+            seguimiento = SeguimientoEnvio(numero, proxima_consulta=ahora)
+        elif seguimiento.pedido == pedido and seguimiento.fila == fila:
+            continue
+        seguimiento.pedido, seguimiento.fila = pedido, fila
+        operaciones.append(_upsert_seguimiento(seguimiento))
+    for numero in existentes.keys() - abiertos.keys():
+        operaciones.append(('DELETE FROM seguimientos_envio WHERE numero = ?', (numero,)))
+    if operaciones:
+        _transaccion(operaciones)
+
+# --- Carpetas de Drive ---
+
+def guardar_carpeta_drive(parent_id: str, nombre: str, folder_id: str):
+    _transaccion([(
+        'INSERT INTO carpetas_drive (parent_id, nombre, folder_id, creado) VALUES (?, ?, ?, ?) '
+        'ON CONFLICT (parent_id, nombre) DO UPDATE SET folder_id = excluded.folder_id, creado = excluded.creado',
+        (parent_id or '', nombre, folder_id, time.time())
+    )])
+
+def obtener_carpeta_drive(parent_id: str, nombre: str) -> Optional[str]:
+    filas = _consultar(
+        'SELECT folder_id FROM carpetas_drive WHERE parent_id = ? AND nombre = ?', (parent_id or '', nombre)
+    )
+    return filas[0][0] if filas else None
+
+def borrar_carpeta_drive(parent_id: str, nombre: str):
+    _transaccion([('DELETE FROM carpetas_drive WHERE parent_id = ? AND nombre = ?', (parent_id or '', nombre))])
+
+# --- Migración de los JSON anteriores ---
+
+def _leer_json(ruta: Path) -> dict:
+    try:
+        with open(ruta, 'r', encoding='utf-8') as f:
+            data = json.load(f)
+        return data if isinstance(data, dict) else {}
+    except Exception as error:
+        print(f"persistence: No se pudo leer {ruta} para migrarlo: {error}")
+        return {}
+
+def _marcar_migrado(ruta: Path):
+    try:
+        os.replace(ruta, ruta.with_suffix(ruta.suffix + '.migrado'))
+    except Exception as error:
+        print(f"persistence: No se pudo renombrar {ruta} tras migrarlo: {error}")
+
+def _migrar_json(con):
+    """Importa pendingData.json y tareas_activas.json si existen y la tabla destino está vacía."""
+    ahora = time.time()
+    if LEGACY_ESTADOS_JSON.exists():
+        if con.execute('SELECT COUNT(*) FROM estados_flujo').fetchone()[0] == 0:
+            data = _leer_json(LEGACY_ESTADOS_JSON)
+            vencimientos = data.pop('__vencimientos__', {})
+            filas = [
+                (user_id, tipo, json.dumps(datos, ensure_ascii=False), vencimientos.get(f"{user_id}|{tipo}"), ahora)
+                for user_id, por_tipo in data.items() if isinstance(por_tipo, dict)
+                for tipo, datos in por_tipo.items()
+            ]
+            con.executemany(_SQL_UPSERT_ESTADO, filas)
+            print(f"persistence: {len(filas)} estados migrados desde {LEGACY_ESTADOS_JSON}.")
+        _marcar_migrado(LEGACY_ESTADOS_JSON)
+    if LEGACY_TAREAS_JSON.exists():
+        if con.execute('SELECT COUNT(*) FROM tareas_activas').fetchone()[0] == 0:
+            data = _leer_json(LEGACY_TAREAS_JSON)
+            con.executemany(
+                'INSERT OR REPLACE INTO tareas_activas (user_id, tarea_id, estado, pausada_desde, datos, actualizado) '
+                'VALUES (?, ?, ?, ?, ?, ?)',
+                [
+                    (str(user_id), datos.get('tarea_id'), datos.get('estado'), datos.get('pausada_desde'),
+                     json.dumps(datos, ensure_ascii=False), ahora)
+                    for user_id, datos in data.items() if isinstance(datos, dict)
+                ]
+            )
+            print(f"persistence: {len(data)} tareas migradas desde {LEGACY_TAREAS_JSON}.")
+        _marcar_migrado(LEGACY_TAREAS_JSON)
@@ -1,38 +1,149 @@
 # pyright: reportAttributeAccessIssue=false
-
+"""
+Respuestas del comando /manual con Gemini.
+El modelo se crea una sola vez por API key y cada generación corre fuera del event loop,
+con un timeout (config.GEMINI_TIMEOUT_SEC) y como máximo config.GEMINI_MAX_CONCURRENCIA a la vez.
+Las respuestas se cachean por pregunta normalizada y versión del manual (last_modified),
+así las preguntas frecuentes se responden al instante hasta que el manual cambie.
+En los tests se puede reemplazar el modelo con usar_modelo(); basta con un objeto que tenga
+generate_content(prompt) y devuelva algo con el atributo .text.
+"""
+import asyncio
+import re
+import time
+import unicodedata
+from collections import OrderedDict
 import google.generativeai as genai
+import config
+from utils import manual_processor
+from utils.manual_index import IndiceManual
+
+MODELO_GEMINI = "gemini-1.5-flash-latest"
+SIN_RESPUESTA = "Lo siento, no pude encontrar la respuesta a tu pregunta en el manual."
+
+_modelo = None
+_clave_modelo = None
+_semaforo = None
+# (pregunta normalizada, versión del manual) -> (respuesta, momento en que se guardó)
+_respuestas = OrderedDict()
+
+def contexto_relevante(manual_text: str, question: str) -> str:
+    """
+    Secciones del manual relevantes para la pregunta, usando el índice armado al cargar el manual.
+    Si ninguna comparte términos con la pregunta (sinónimos, otra forma de decirlo) se usan las
+    primeras secciones y el modelo decide si alcanzan para responder.
+    """
+    indice = manual_processor.get_manual_index()
+    if indice is None or manual_text is not manual_processor.get_manual_text():
+        indice = IndiceManual.desde_texto(manual_text)
+    return indice.contexto(question) or indice.contexto_inicial()
+
+def normalizar_pregunta(question: str) -> str:
+    """Minúsculas, sin acentos ni signos y con los espacios colapsados."""
+    texto = unicodedata.normalize('NFKD', (question or '').lower())
+    texto = ''.join(c for c in texto if not unicodedata.combining(c))
+    return ' '.join(re.findall(r'\w+', texto))
+
+def _version_manual(manual_text: str) -> str:
+    metadata = manual_processor.get_manual_metadata()
+    if metadata and manual_text is manual_processor.get_manual_text():
+        return str(metadata.get('last_modified'))
+    return f"texto-{hash(manual_text)}"
+
+def _respuesta_cacheada(clave):
+    entrada = _respuestas.get(clave)
+    if entrada is None:
+        return None
+    respuesta, guardada = entrada
+    if time.time() - guardada > config.GEMINI_CACHE_TTL_SEC:
+        del _respuestas[clave]
+        return None
+    _respuestas.move_to_end(clave)
+    return respuesta
+
+def _guardar_respuesta(clave, respuesta: str):
+    _respuestas[clave] = (respuesta, time.time())
+    _respuestas.move_to_end(clave)
+    while len(_respuestas) > config.GEMINI_CACHE_MAX_RESPUESTAS:
+        _respuestas.popitem(last=False)
+
+def limpiar_cache_respuestas():
+    _respuestas.clear()
 
-_genai_instance = None
+def usar_modelo(modelo):
+    """Reemplaza el modelo de Gemini (p. ej. por uno falso en los tests). None vuelve al real."""
+    global _modelo, _clave_modelo
+    _modelo = modelo
+    _clave_modelo = None if modelo is None else '*'
+
+def _obtener_modelo(gemini_api_key: str):
+    global _modelo, _clave_modelo
+    if _modelo is not None and _clave_modelo in ('*', gemini_api_key):
+        return _modelo
+    genai.configure(api_key=gemini_api_key)
+    _modelo = genai.GenerativeModel(MODELO_GEMINI)
+    _clave_modelo = gemini_api_key
+    return _modelo
+
+def _obtener_semaforo() -> asyncio.Semaphore:
+    global _semaforo
+    if _semaforo is None:
+        _semaforo = asyncio.Semaphore(max(1, config.GEMINI_MAX_CONCURRENCIA))
+    return _semaforo
 
 def initialize_gemini(gemini_api_key: str):
+    """Valida la API key y descarta el modelo y las respuestas cacheadas (se recrean en la próxima pregunta)."""
+    global _modelo, _clave_modelo
     if not gemini_api_key:
         raise ValueError("API Key de Gemini no proporcionada.")
+    if _clave_modelo != '*':
+        _modelo = None
+        _clave_modelo = None
+    limpiar_cache_respuestas()
 
-async def get_answer_from_manual(manual_text: str, question: str, gemini_api_key: str) -> str:
-    try:
-        initialize_gemini(gemini_api_key)
-        genai.configure(api_key=gemini_api_key)
-        model = genai.GenerativeModel("gemini-1.5-flash-latest")
-        prompt = f'''
+def _armar_prompt(contexto: str, question: str) -> str:
+    return f'''
             Eres un argentino experto en literatura y te vana cuestionar sobre la obra "El Martin Fierro".
 
             Directrices para la respuesta:
             1.  **Si la respuesta a la pregunta se encuentra de forma clara y explícita en el libro:** Proporciona la respuesta de manera concisa y directa. Intenta citar las frases o secciones relevantes del manual si es posible para mayor precisión.
-            2.  **Si la respuesta no se encuentra o no se puede inferir directamente del libro:** Responde "Lo siento, no pude encontrar la respuesta a tu pregunta en el manual."
+            2.  **Si la respuesta no se encuentra o no se puede inferir directamente del libro:** Responde "{SIN_RESPUESTA}"
             4.  **Si la pregunta es muy general y el libro ofrece múltiples puntos relacionados, sé lo más específico posible con la información que el manual contiene.**
 
-            --- Contenido del libro ---
-            {manual_text}
-            --- Fin del Contenido del libro ---
+            --- Secciones relevantes del libro ---
+            {contexto}
+            --- Fin de las secciones del libro ---
 
             Pregunta del usuario: "{question}"
         '''
-        result = model.generate_content(prompt)
-        response = result.text
-        return response
+
+async def get_answer_from_manual(manual_text: str, question: str, gemini_api_key: str) -> str:
+    if not gemini_api_key:
+        raise ValueError("API Key de Gemini no proporcionada.")
+    clave = (normalizar_pregunta(question), _version_manual(manual_text))
+    respuesta = _respuesta_cacheada(clave)
+    if respuesta is not None:
+        return respuesta
+    try:
+        contexto = contexto_relevante(manual_text, question)
+        if not contexto:
+            # El manual está vacío: no hay nada que consultarle al modelo
+            return SIN_RESPUESTA
+        model = _obtener_modelo(gemini_api_key)
+        async with _obtener_semaforo():
+            result = await asyncio.wait_for(
+                asyncio.to_thread(model.generate_content, _armar_prompt(contexto, question)),
+                config.GEMINI_TIMEOUT_SEC
+            )
+        respuesta = result.text
+    except asyncio.TimeoutError:
+        print(f"Gemini no respondió en {config.GEMINI_TIMEOUT_SEC} s")
+        raise RuntimeError("El servicio de IA tardó demasiado en responder. Intenta de nuevo en un momento.")
     except Exception as error:
         print("Error al generar respuesta con Gemini:", error)
         raise RuntimeError("Hubo un problema al contactar al servicio de IA.")
+    _guardar_respuesta(clave, respuesta)
+    return respuesta
 
 def funcion_qa_service():
-    pass
\ No newline at end of file
+    pass
@@ -0,0 +1,263 @@
+"""
+Control central de la cuota de las APIs de Google.
+Los modals, el panel de tareas, el escaneo de errores y las subidas a Drive comparten la
+cuota por minuto de un mismo proyecto de Google; sin coordinación, al cambio de turno se
+juntan y Google responde 429. Cada pedido HTTP toma antes un token de un balde por
+(proyecto, servicio, lectura/escritura) que se recarga al ritmo configurado en config.py.
+
+- Prioridades: por defecto los pedidos son INTERACTIVA (acciones de usuarios). Las tareas
+  de fondo se marcan con `with prioridad(FONDO):`; esperan mientras haya pedidos
+  interactivos en cola y dejan una reserva de tokens para ellos. La prioridad viaja en un
+  contextvar, que utils/google_async.ejecutar_google copia al hilo del pool.
+- 429: se pausa el balde el tiempo que indique Retry-After (o con espera exponencial con
+  jitter si no lo indica) y el pedido se reintenta hasta config.GOOGLE_QUOTA_REINTENTOS veces.
+- Métricas: pedidos, espera en cola (total y máxima) por prioridad y 429 recibidos por balde.
+
+Se engancha al crear los clientes (utils/google_sheets.initialize_google_sheets y
+utils/google_drive.initialize_google_drive, que usa google_client_manager) con
+HTTPClientGobernado para gspread y HttpRequestGobernado para la API de Drive.
+"""
+import contextvars
+import random
+import threading
+import time
+from contextlib import contextmanager
+import config
+from gspread.exceptions import APIError
+from gspread.http_client import HTTPClient
+from googleapiclient.errors import HttpError
+from googleapiclient.http import HttpRequest
+
+INTERACTIVA = 0
+FONDO = 1
+NOMBRES_PRIORIDAD = {INTERACTIVA: 'interactiva', FONDO: 'fondo'}
+# Parte del balde que las tareas de fondo no pueden usar
+RESERVA_INTERACTIVA = 0.25
+# Segundos de recarga que entran en el balde (ráfaga máxima)
+SEGUNDOS_RAFAGA = 10
+ESPERA_MAXIMA_429 = 64
+# Una espera mayor a esto se deja en el log
+AVISO_ESPERA_SEG = 2.0
+
+_prioridad = contextvars.ContextVar('prioridad_google', default=INTERACTIVA)
+_baldes = {}
+_baldes_lock = threading.Lock()
+
+@contextmanager
+def prioridad(nivel: int):
+    """Marca los pedidos a Google hechos dentro del bloque (y los que se lancen desde él) con la prioridad indicada."""
+    token = _prioridad.set(nivel)
+    try:
+        yield
+    finally:
+        _prioridad.reset(token)
+
+def prioridad_actual() -> int:
+    return _prioridad.get()
+
+class Balde:
+    """Token bucket con prioridades, pausa por 429 y métricas de espera."""
+
+    def __init__(self, nombre: str, por_minuto: float):
+        self.nombre = nombre
+        self.tasa = max(por_minuto, 1) / 60.0
+        self.capacidad = max(1.0, self.tasa * SEGUNDOS_RAFAGA)
+        self.tokens = self.capacidad
+        self.actualizado = time.monotonic()
+        self.pausa_hasta = 0.0
+        self.limites_seguidos = 0
+        self.esperando = {INTERACTIVA: 0, FONDO: 0}
+        self.metricas = {
+            'pedidos': {INTERACTIVA: 0, FONDO: 0},
+            'espera_total': {INTERACTIVA: 0.0, FONDO: 0.0},
+            'espera_maxima': {INTERACTIVA: 0.0, FONDO: 0.0},
+            'limites': 0,
+        }
+        self._cond = threading.Condition()
+
+    def _recargar(self, ahora: float):
+        self.tokens = min(self.capacidad, self.tokens + (ahora - self.actualizado) * self.tasa)
+        self.actualizado = ahora
+
+    def _minimo(self, nivel: int) -> float:
+        return 1.0 + (self.capacidad * RESERVA_INTERACTIVA if nivel == FONDO else 0.0)
+
+    def tomar(self, nivel: int = INTERACTIVA) -> float:
+        """Bloquea hasta conseguir un token. :return: segundos esperados."""
+        inicio = time.monotonic()
+        with self._cond:
+            self.esperando[nivel] += 1
+            try:
+                while True:
+                    ahora = time.monotonic()
+                    self._recargar(ahora)
+                    if ahora < self.pausa_hasta:
+                        espera = self.pausa_hasta - ahora
+                    elif nivel == FONDO and self.esperando[INTERACTIVA]:
+                        espera = 1.0 / self.tasa
+                    elif self.tokens >= self._minimo(nivel):
+                        self.tokens -= 1
+                        break
+                    else:
+                        espera = (self._minimo(nivel) - self.tokens) / self.tasa
+                    self._cond.wait(max(espera, 0.001))
+            finally:
+                self.esperando[nivel] -= 1
+                self._cond.notify_all()
+            esperado = time.monotonic() - inicio
+            self.metricas['pedidos'][nivel] += 1
+            self.metricas['espera_total'][nivel] += esperado
+            self.metricas['espera_maxima'][nivel] = max(self.metricas['espera_maxima'][nivel], esperado)
+        if esperado >= AVISO_ESPERA_SEG:
+            print(f"⏳ Cuota de Google: {self.nombre} esperó {esperado:.1f} s en cola ({NOMBRES_PRIORIDAD[nivel]})")
+        return esperado
+
+    def limitar(self, retry_after: float = None) -> float:
+        """Google respondió 429: pausa el balde. :return: segundos de pausa."""
+        with self._cond:
+            self.limites_seguidos += 1
+            self.metricas['limites'] += 1
+            if retry_after is None:
+                base = min(ESPERA_MAXIMA_429, 2 ** (self.limites_seguidos - 1))
+                retry_after = base + random.uniform(0, base / 2)
+            self.pausa_hasta = max(self.pausa_hasta, time.monotonic() + retry_after)
+            self.tokens = 0.0
+            self._cond.notify_all()
+        print(f"⚠️ Cuota de Google: {self.nombre} recibió 429, pausa de {retry_after:.1f} s")
+        return retry_after
+
+    def exito(self):
+        if self.limites_seguidos:
+            with self._cond:
+                self.limites_seguidos = 0
+
+    def resumen(self) -> dict:
+        with self._cond:
+            return {
+                NOMBRES_PRIORIDAD[nivel]: {
+                    'pedidos': self.metricas['pedidos'][nivel],
+                    'espera_media': self.metricas['espera_total'][nivel] / max(self.metricas['pedidos'][nivel], 1),
+                    'espera_maxima': self.metricas['espera_maxima'][nivel],
+                }
+                for nivel in (INTERACTIVA, FONDO)
+            } | {'limites': self.metricas['limites']}
+
+def _por_minuto(servicio: str, tipo: str) -> float:
+    return {
+        ('sheets', 'lectura'): config.GOOGLE_SHEETS_LECTURAS_POR_MIN,
+        ('sheets', 'escritura'): config.GOOGLE_SHEETS_ESCRITURAS_POR_MIN,
+        ('drive', 'lectura'): config.GOOGLE_DRIVE_LECTURAS_POR_MIN,
+        ('drive', 'escritura'): config.GOOGLE_DRIVE_ESCRITURAS_POR_MIN,
+    }[(servicio, tipo)]
+
+def balde(proyecto: str, servicio: str, tipo: str) -> Balde:
+    """Balde compartido de un proyecto de Google, servicio ('sheets'/'drive') y tipo ('lectura'/'escritura')."""
+    clave = (proyecto or 'default', servicio, tipo)
+    with _baldes_lock:
+        actual = _baldes.get(clave)
+        if actual is None:
+            actual = _baldes[clave] = Balde('/'.join(clave), _por_minuto(servicio, tipo))
+        return actual
+
+def metricas() -> dict:
+    """Métricas de todos los baldes: {'proyecto/servicio/tipo': {...}}."""
+    with _baldes_lock:
+        baldes = list(_baldes.values())
+    return {b.nombre: b.resumen() for b in baldes}
+
+def resumen_metricas() -> str:
+    """Una línea por balde con pedidos, espera media/máxima por prioridad y 429 recibidos."""
+    lineas = []
+    for nombre, datos in sorted(metricas().items()):
+        partes = [
+            f"{prioridad_nombre} {d['pedidos']} pedidos, espera media {d['espera_media']:.2f} s, máx {d['espera_maxima']:.1f} s"
+            for prioridad_nombre, d in datos.items() if prioridad_nombre != 'limites'
+        ]
+        lineas.append(f"{nombre}: {'; '.join(partes)}; {datos['limites']} respuestas 429")
+    return '\n'.join(lineas)
+
+def reiniciar():
+    """Descarta baldes y métricas (para tests o al cambiar la configuración)."""
+    with _baldes_lock:
+        _baldes.clear()
+
+def _segundos_retry_after(valor) -> float | None:
+    valor = str(valor or '').strip()
+    return float(valor) if valor.isdigit() else None
+
+def _es_limite(estado, contenido) -> bool:
+    if estado == 429:
+        return True
+    texto = contenido.decode('utf-8', 'ignore') if isinstance(contenido, bytes) else str(contenido or '')
+    return estado == 403 and 'ratelimitexceeded' in texto.lower()
+
+def gobernar(cubo: Balde, llamada, limite_de, reintentar: bool = True):
+    """
+    Ejecuta llamada() tomando antes un token de cubo. Si falla por 429, pausa el balde y
+    reintenta (si reintentar) hasta config.GOOGLE_QUOTA_REINTENTOS veces.
+    :param limite_de: función error -> (es_limite, segundos de Retry-After o None).
+    """
+    nivel = prioridad_actual()
+    intento = 0
+    while True:
+        cubo.tomar(nivel)
+        try:
+            resultado = llamada()
+        except Exception as error:
+            es_limite, retry_after = limite_de(error)
+            if not es_limite:
+                raise
+            cubo.limitar(retry_after)
+            if not reintentar or intento >= config.GOOGLE_QUOTA_REINTENTOS:
+                raise
+            intento += 1
+            continue
+        cubo.exito()
+        return resultado
+
+# --- gspread ---
+
+def _limite_sheets(error):
+    if not isinstance(error, APIError):
+        return False, None
+    respuesta = getattr(error, 'response', None)
+    contenido = getattr(respuesta, 'content', b'')
+    retry_after = _segundos_retry_after(getattr(respuesta, 'headers', {}).get('Retry-After'))
+    return _es_limite(error.code, contenido), retry_after
+
+class HTTPClientGobernado(HTTPClient):
+    """HTTPClient de gspread que pasa cada pedido por los baldes de Sheets del proyecto de las credenciales."""
+
+    def __init__(self, auth, session=None):
+        super().__init__(auth, session=session)
+        self.proyecto = getattr(auth, 'project_id', None)
+
+    def request(self, method, endpoint, *args, **kwargs):
+        # batchGetByDataFilter es un POST que solo lee
+        tipo = 'lectura' if method.lower() == 'get' or 'batchGetByDataFilter' in endpoint else 'escritura'
+        cubo = balde(self.proyecto, 'sheets', tipo)
+        return gobernar(cubo, lambda: super(HTTPClientGobernado, self).request(method, endpoint, *args, **kwargs), _limite_sheets)
+
+# --- Drive (googleapiclient) ---
+
+def _limite_drive(error):
+    if not isinstance(error, HttpError):
+        return False, None
+    return _es_limite(error.resp.status, error.content), _segundos_retry_after(error.resp.get('retry-after'))
+
+class HttpRequestGobernado(HttpRequest):
+    """HttpRequest de googleapiclient que pasa execute y next_chunk por los baldes de Drive."""
+
+    def _balde(self):
+        proyecto = getattr(getattr(self.http, 'credentials', None), 'project_id', None)
+        return balde(proyecto, 'drive', 'lectura' if self.method.upper() == 'GET' else 'escritura')
+
+    def execute(self, http=None, num_retries=0):
+        return gobernar(self._balde(), lambda: super(HttpRequestGobernado, self).execute(http=http, num_retries=num_retries), _limite_drive)
+
+    def next_chunk(self, http=None, num_retries=0):
+        # upload_file_to_drive ya reintenta cada parte: acá solo se toma el token y se pausa el balde ante un 429
+        return gobernar(
+            self._balde(), lambda: super(HttpRequestGobernado, self).next_chunk(http=http, num_retries=num_retries),
+            _limite_drive, reintentar=False
+        )
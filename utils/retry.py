@@ -0,0 +1,101 @@
+"""
+Reintentos con espera exponencial y jitter para las llamadas a Google Drive.
+Los errores se clasifican en límite de tasa, error temporal del backend o de red, permisos,
+no encontrado o permanente; solo los dos primeros se reintentan, y solo se espera cuando
+algo falló (el camino feliz no paga ninguna espera fija). La espera respeta Retry-After si
+Drive lo indica y si no es exponencial con jitter completo, para que varios hilos no
+reintenten todos a la vez.
+
+- reintentar: para código que ya corre en el pool de Google (espera con time.sleep en ese hilo).
+- reintentar_async: para el event loop; la espera es asyncio.sleep, así el bot sigue
+  respondiendo y el hilo del pool queda libre para otros pedidos mientras tanto.
+
+El control de cuota (utils/quota_governor.py) ya absorbe los 429 antes de que lleguen acá;
+este módulo cubre los 5xx, los cortes de red y los 429 que superaron esos reintentos.
+"""
+import asyncio
+import random
+import socket
+import time
+import requests
+from googleapiclient.errors import HttpError
+
+LIMITE = 'limite'
+TEMPORAL = 'temporal'
+PERMISO = 'permiso'
+NO_ENCONTRADO = 'no_encontrado'
+PERMANENTE = 'permanente'
+REINTENTABLES = (LIMITE, TEMPORAL)
+
+INTENTOS = 5
+ESPERA_BASE_SEG = 1.0
+ESPERA_MAXIMA_SEG = 32.0
+
+_ERRORES_DE_RED = (ConnectionError, TimeoutError, socket.timeout, requests.ConnectionError, requests.Timeout)
+_MOTIVOS_LIMITE = ('ratelimitexceeded', 'userratelimitexceeded', 'quotaexceeded')
+
+def clasificar_error_drive(error) -> str:
+    """Categoría de un error de Drive: LIMITE, TEMPORAL, PERMISO, NO_ENCONTRADO o PERMANENTE."""
+    if isinstance(error, HttpError):
+        estado = error.resp.status
+        contenido = (error.content or b'').lower()
+        if estado == 429 or (estado == 403 and any(m.encode() in contenido for m in _MOTIVOS_LIMITE)):
+            return LIMITE
+        if estado >= 500 or estado == 408:
+            return TEMPORAL
+        if estado in (401, 403):
+            return PERMISO
+        if estado == 404:
+            return NO_ENCONTRADO
+        return PERMANENTE
+    if isinstance(error, _ERRORES_DE_RED):
+        return TEMPORAL
+    return PERMANENTE
+
+def retry_after(error) -> float | None:
+    """Segundos de Retry-After de la respuesta, si Drive los indicó."""
+    if not isinstance(error, HttpError):
+        return None
+    valor = str(error.resp.get('retry-after', '') or '').strip()
+    return float(valor) if valor.isdigit() else None
+
+def calcular_espera(intento: int, retry_after: float = None, base: float = ESPERA_BASE_SEG, maximo: float = ESPERA_MAXIMA_SEG) -> float:
+    """Retry-After si existe; si no, jitter completo sobre base * 2^intento, con tope en maximo."""
+    if retry_after is not None:
+        return retry_after
+    return random.uniform(0, min(maximo, base * 2 ** intento))
+
+def _decidir(error, intento: int, intentos: int, clasificar, descripcion: str):
+    """Segundos a esperar antes del próximo intento, o None si el error no se reintenta."""
+    categoria = clasificar(error)
+    if categoria not in REINTENTABLES or intento >= intentos - 1:
+        return None
+    espera = calcular_espera(intento, retry_after(error))
+    print(f"⚠️ {descripcion}: error {categoria} ({error}); intento {intento + 2} de {intentos} en {espera:.1f} s")
+    return espera
+
+def reintentar(func, *args, clasificar=clasificar_error_drive, intentos: int = INTENTOS, descripcion: str = None, **kwargs):
+    """Ejecuta func(*args, **kwargs) reintentando los errores reintentables. Bloquea el hilo actual mientras espera."""
+    descripcion = descripcion or getattr(func, '__qualname__', 'Drive')
+    for intento in range(intentos):
+        try:
+            return func(*args, **kwargs)
+        except Exception as error:
+            espera = _decidir(error, intento, intentos, clasificar, descripcion)
+            if espera is None:
+                raise
+        time.sleep(espera)
+
+async def reintentar_async(fabrica, clasificar=clasificar_error_drive, intentos: int = INTENTOS, descripcion: str = 'Drive'):
+    """
+    Espera await fabrica() reintentando los errores reintentables con asyncio.sleep.
+    :param fabrica: función sin argumentos que devuelve una corrutina nueva en cada intento.
+    """
+    for intento in range(intentos):
+        try:
+            return await fabrica()
+        except Exception as error:
+            espera = _decidir(error, intento, intentos, clasificar, descripcion)
+            if espera is None:
+                raise
+        await asyncio.sleep(espera)
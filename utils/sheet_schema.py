@@ -0,0 +1,130 @@
+"""
+Resolución de columnas de las hojas de Google Sheets a partir del encabezado.
+Cada encabezado se compila una sola vez en un MapaColumnas (nombre normalizado -> índice)
+y los campos se resuelven contra ese mapa, incluidos los alias de ALIAS_COLUMNAS
+("CASO ID WISE"/"ID WISE", etc.). El mapa se guarda por pestaña y se vuelve a compilar
+solo cuando cambia el encabezado.
+"""
+import threading
+from functools import lru_cache
+
+# Campo lógico -> nombres posibles de la columna, en orden de preferencia.
+# Los campos con alias se piden por su clave; las demás columnas, por su nombre en la hoja.
+ALIAS_COLUMNAS = {
+    'pedido': ["Número de pedido", "Numero de pedido"],
+    'caso': ["CASO ID WISE", "ID WISE"],
+    'tipo': ["Solicitud", "Motivo de reembolso", "SOLICITUD", "Pieza faltante"],
+    'datos': ["Dirección/Teléfono/Datos (Gestión Front)", "Dirección/Datos", "Correo del cliente"],
+    'agente': ["Agente carga", "Agente (Front)", "Agente que carga", "Agente", "Agente (Back/TL)"],
+    'error': ["ERROR"],
+    'notificado': ["ErrorEnvioCheck", "notificado"],
+    'observaciones': ["Observaciones", "Observación adicional"],
+    'numero_hilo': ["Número de hilo", "Numero de hilo"],
+    'fecha_y_hora': ["Fecha y hora"],
+    'tracking': ["ANDREANI", "ZECO (ENTREGAR) / ANDREANI OBLIGATORIO", "ZECO (ENTREGAR) / ANDRENAI OBLIGATORIO",
+                 "Número de tracking", "Tracking"],
+    'resuelto': ["Resuelto"],
+}
+
+# Campos que usa el chequeo de errores (utils/error_scanner.py)
+CAMPOS_ERRORES = ('pedido', 'caso', 'tipo', 'datos', 'agente', 'error', 'notificado', 'observaciones')
+
+_CARACTERES_IGNORADOS = str.maketrans('', '', ' /-_\u200b\ufeff')
+
+def normalizar_encabezado(nombre) -> str:
+    """Normaliza un nombre de columna: sin espacios, '/', '-', '_' ni caracteres invisibles, en minúsculas."""
+    if not nombre:
+        return ''
+    return str(nombre).strip().lower().translate(_CARACTERES_IGNORADOS)
+
+class MapaColumnas:
+    """Encabezado compilado: resuelve nombres o campos con alias a índices de columna."""
+
+    def __init__(self, header):
+        self.header = tuple(header or ())
+        self._por_nombre = {}
+        for i, h in enumerate(self.header):
+            self._por_nombre.setdefault(normalizar_encabezado(h), i)
+        self._resueltos = {}
+
+    def indice(self, nombre, defecto=None):
+        """
+        Índice de la columna `nombre`. Si `nombre` es un campo de ALIAS_COLUMNAS se prueban sus alias.
+        :return: índice o `defecto` si no hay coincidencia.
+        """
+        if nombre not in self._resueltos:
+            encontrado = None
+            for alias in ALIAS_COLUMNAS.get(nombre, (nombre,)):
+                encontrado = self._por_nombre.get(normalizar_encabezado(alias))
+                if encontrado is not None:
+                    break
+            self._resueltos[nombre] = encontrado
+        encontrado = self._resueltos[nombre]
+        return defecto if encontrado is None else encontrado
+
+    def indice_que_contiene(self, fragmento, defecto=None):
+        """Índice de la primera columna cuyo nombre normalizado contiene `fragmento`."""
+        clave = ('contiene', fragmento)
+        if clave not in self._resueltos:
+            buscado = normalizar_encabezado(fragmento)
+            self._resueltos[clave] = next(
+                (i for i, h in enumerate(self.header) if buscado in normalizar_encabezado(h)), None
+            )
+        encontrado = self._resueltos[clave]
+        return defecto if encontrado is None else encontrado
+
+    def valor(self, row, nombre, defecto=''):
+        i = self.indice(nombre)
+        return row[i] if i is not None and i < len(row) else defecto
+
+    def extractor(self, nombres):
+        """
+        Devuelve una función row -> tuple con los valores de `nombres` ('' si falta la columna o la celda).
+        Los índices se resuelven una sola vez, al crear el extractor.
+        """
+        indices = tuple(self.indice(n) for n in nombres)
+
+        def extraer(row):
+            largo = len(row)
+            return tuple(row[i] if i is not None and i < largo else '' for i in indices)
+        return extraer
+
+@lru_cache(maxsize=128)
+def _compilar_tupla(header: tuple) -> MapaColumnas:
+    return MapaColumnas(header)
+
+def compilar(header) -> MapaColumnas:
+    """MapaColumnas de un encabezado; encabezados iguales comparten el mismo mapa compilado."""
+    return _compilar_tupla(tuple(header or ()))
+
+# (spreadsheet_id, título) -> MapaColumnas
+_mapas_hoja = {}
+_lock = threading.Lock()
+
+def _clave_hoja(sheet):
+    spreadsheet = getattr(sheet, 'spreadsheet', None)
+    return (getattr(spreadsheet, 'id', None), getattr(sheet, 'title', None))
+
+def mapa_de_hoja(sheet, header) -> MapaColumnas:
+    """
+    MapaColumnas de una pestaña. Se reutiliza mientras el encabezado leído no cambie;
+    si cambió (columnas agregadas, renombradas o movidas) se compila de nuevo.
+    """
+    header = tuple(header or ())
+    clave = _clave_hoja(sheet)
+    with _lock:
+        mapa = _mapas_hoja.get(clave)
+        if mapa is not None and mapa.header == header:
+            return mapa
+    mapa = compilar(header)
+    with _lock:
+        _mapas_hoja[clave] = mapa
+    return mapa
+
+def invalidar_mapas(sheet=None):
+    """Descarta los mapas guardados de una pestaña (o de todas)."""
+    with _lock:
+        if sheet is None:
+            _mapas_hoja.clear()
+        else:
+            _mapas_hoja.pop(_clave_hoja(sheet), None)
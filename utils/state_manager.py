@@ -1,58 +1,141 @@
-import json
-from pathlib import Path
+import atexit
+import copy
+import heapq
+import threading
 import time
 import uuid
+from utils import persistence
 
-# Define una ruta segura al archivo JSON
-temp_dir = Path.cwd() / 'temp'
-temp_dir.mkdir(parents=True, exist_ok=True)
-DATA_PATH = temp_dir / 'pendingData.json'
+# Los estados viven en memoria y se persisten en SQLite (utils/persistence.py) en segundo
+# plano (write-behind): los cambios ocurridos durante FLUSH_DELAY_SEC se escriben juntos,
+# en una sola transacción y solo para las claves modificadas.
+FLUSH_DELAY_SEC = 1.0
 
-# Lee y parsea el archivo JSON de datos pendientes
-# Si el archivo no existe, retorna un dict vacío
-def _read_pending_data():
-    try:
-        with open(DATA_PATH, 'r', encoding='utf-8') as f:
-            return json.load(f)
-    except FileNotFoundError:
-        return {}
-    except Exception as error:
-        print("Error leyendo el archivo de estado:", error)
-        raise
+_estados = {}          # user_id -> {tipo: datos}
+_vencimientos = {}     # (user_id, tipo) -> epoch de vencimiento
+_heap_vencimientos = []  # (epoch, user_id, tipo), con entradas obsoletas descartadas al salir
+_sucios = set()        # (user_id, tipo) modificados desde el último flush
+_cargado = False
+_lock_global = threading.RLock()
+_locks_usuario = {}
+_timer_flush = None
+
+def _asegurar_cargado():
+    global _cargado
+    if _cargado:
+        return
+    with _lock_global:
+        if _cargado:
+            return
+        try:
+            guardados = persistence.cargar_estados()
+        except Exception as error:
+            print("Error leyendo los estados guardados:", error)
+            raise
+        for estado in guardados:
+            _estados.setdefault(estado.user_id, {})[estado.tipo] = estado.datos
+            if estado.expira_en is not None:
+                _vencimientos[(estado.user_id, estado.tipo)] = estado.expira_en
+                heapq.heappush(_heap_vencimientos, (estado.expira_en, estado.user_id, estado.tipo))
+        _cargado = True
+
+def _lock_de(user_id: str):
+    with _lock_global:
+        lock = _locks_usuario.get(user_id)
+        if lock is None:
+            lock = _locks_usuario[user_id] = threading.Lock()
+        return lock
 
-# Escribe el objeto de datos pendientes en el archivo JSON
-def _write_pending_data(data):
+def _programar_flush(user_id: str, tipo: str):
+    global _timer_flush
+    with _lock_global:
+        _sucios.add((user_id, tipo))
+        if _timer_flush is not None:
+            return
+        _timer_flush = threading.Timer(FLUSH_DELAY_SEC, flush_states)
+        _timer_flush.daemon = True
+        _timer_flush.start()
+
+def flush_states():
+    """Persiste los estados modificados (lo usa el write-behind y el cierre del proceso)."""
+    global _timer_flush
+    with _lock_global:
+        _timer_flush = None
+        if not _sucios:
+            return
+        guardar, borrar = [], []
+        for user_id, tipo in _sucios:
+            por_tipo = _estados.get(user_id, {})
+            if tipo not in por_tipo:
+                borrar.append((user_id, tipo))
+            else:
+                guardar.append(persistence.EstadoFlujo(
+                    user_id, tipo, copy.deepcopy(por_tipo[tipo]), _vencimientos.get((user_id, tipo))
+                ))
+        _sucios.clear()
     try:
-        with open(DATA_PATH, 'w', encoding='utf-8') as f:
-            json.dump(data, f, ensure_ascii=False, indent=2)
+        persistence.guardar_estados(guardar, borrar)
     except Exception as error:
-        print("Error escribiendo en el archivo de estado:", error)
-        raise
+        print("Error escribiendo los estados:", error)
+        # Reintentar en el próximo flush
+        with _lock_global:
+            _sucios.update((e.user_id, e.tipo) for e in guardar)
+            _sucios.update(borrar)
+
+atexit.register(flush_states)
+
+def _quitar_estado(user_id: str, tipo: str) -> bool:
+    """Quita un estado (llamar con el lock del usuario tomado). Devuelve True si existía."""
+    with _lock_global:
+        datos_usuario = _estados.get(user_id)
+        _vencimientos.pop((user_id, tipo), None)
+        if not datos_usuario or tipo not in datos_usuario:
+            return False
+        nuevos = {k: v for k, v in datos_usuario.items() if k != tipo}
+        if nuevos:
+            _estados[user_id] = nuevos
+        else:
+            del _estados[user_id]
+        return True
 
 # Guarda los datos de un usuario específico y tipo
-# set_user_state(user_id, user_data, tipo)
-def set_user_state(user_id: str, user_data: dict, tipo: str):
-    all_data = _read_pending_data()
-    if user_id not in all_data:
-        all_data[user_id] = {}
-    all_data[user_id][tipo] = user_data
-    _write_pending_data(all_data)
+# set_user_state(user_id, user_data, tipo, ttl=None)
+# ttl: segundos hasta que el estado vence; None = no vence
+def set_user_state(user_id: str, user_data: dict, tipo: str, ttl: float = None):
+    _asegurar_cargado()
+    with _lock_de(user_id):
+        with _lock_global:
+            nuevos = dict(_estados.get(user_id, {}))
+            nuevos[tipo] = copy.deepcopy(user_data)
+            _estados[user_id] = nuevos
+            if ttl is not None:
+                expira = time.time() + ttl
+                _vencimientos[(user_id, tipo)] = expira
+                heapq.heappush(_heap_vencimientos, (expira, user_id, tipo))
+            else:
+                _vencimientos.pop((user_id, tipo), None)
+    _programar_flush(user_id, tipo)
 
 # Obtiene los datos de un usuario específico y tipo
 # get_user_state(user_id, tipo)
 def get_user_state(user_id: str, tipo: str):
-    all_data = _read_pending_data()
-    return all_data.get(user_id, {}).get(tipo, None)
+    _asegurar_cargado()
+    with _lock_de(user_id):
+        expira = _vencimientos.get((user_id, tipo))
+        if expira is not None and expira <= time.time():
+            _quitar_estado(user_id, tipo)
+            _programar_flush(user_id, tipo)
+            return None
+        return copy.deepcopy(_estados.get(user_id, {}).get(tipo, None))
 
 # Elimina los datos de un usuario específico y tipo
 # delete_user_state(user_id, tipo)
 def delete_user_state(user_id: str, tipo: str):
-    all_data = _read_pending_data()
-    if user_id in all_data and tipo in all_data[user_id]:
-        del all_data[user_id][tipo]
-        if not all_data[user_id]:
-            del all_data[user_id]
-        _write_pending_data(all_data)
+    _asegurar_cargado()
+    with _lock_de(user_id):
+        borrado = _quitar_estado(user_id, tipo)
+    if borrado:
+        _programar_flush(user_id, tipo)
 
 def funcion_state_manager():
     pass
@@ -62,28 +145,21 @@ def generar_solicitud_id(user_id=None):
     base = str(user_id) if user_id else ''
     return f"{base}_{uuid.uuid4().hex[:8]}_{int(time.time())}"
 
-# Limpia estados con timestamp mayor a timeout segundos (por defecto 10 minutos)
+# Limpia los estados vencidos. Solo vencen los estados guardados con ttl; el heap de
+# vencimientos permite hacerlo sin recorrer todos los estados en cada interacción.
+# timeout se conserva por compatibilidad con los llamadores existentes.
 def cleanup_expired_states(timeout=600):
-    all_data = _read_pending_data()
+    _asegurar_cargado()
     now = time.time()
-    expired = []
-    for user_id, data in all_data.items():
-        ts = data.get('timestamp')
-        if ts:
-            try:
-                # Soporta timestamp como float o string ISO
-                if isinstance(ts, (int, float)):
-                    ts_val = float(ts)
-                else:
-                    try:
-                        ts_val = float(ts)
-                    except Exception:
-                        from datetime import datetime
-                        ts_val = datetime.fromisoformat(ts).timestamp()
-                if now - ts_val > timeout:
-                    expired.append(user_id)
-            except Exception:
-                continue
-    for user_id in expired:
-        del all_data[user_id]
-    _write_pending_data(all_data)
\ No newline at end of file
+    vencidos = []
+    with _lock_global:
+        while _heap_vencimientos and _heap_vencimientos[0][0] <= now:
+            expira, user_id, tipo = heapq.heappop(_heap_vencimientos)
+            # Ignorar entradas reemplazadas por un set_user_state posterior
+            if _vencimientos.get((user_id, tipo)) == expira:
+                vencidos.append((user_id, tipo))
+    for user_id, tipo in vencidos:
+        with _lock_de(user_id):
+            if _vencimientos.get((user_id, tipo), now + 1) <= now:
+                _quitar_estado(user_id, tipo)
+                _programar_flush(user_id, tipo)
@@ -0,0 +1,119 @@
+"""
+Pipeline compartido para registrar casos desde los modals.
+Cada envío abre la planilla y la pestaña una sola vez, hace una única lectura del rango
+(o la toma de la caché de utils/google_sheets.py) de la que salen el encabezado y la
+verificación de duplicados por el índice de pedidos, y después agrega la fila por la cola
+de escritura. Se mide cada etapa (abrir, hoja, lectura, escritura) para ver en los logs
+dónde se va el tiempo de un envío.
+"""
+import time
+from contextlib import asynccontextmanager
+from utils import google_sheets
+from utils.error_scanner import separar_rango
+from utils.google_async import ejecutar_google, abrir_spreadsheet, obtener_worksheet, agregar_fila
+from utils.sheet_schema import MapaColumnas, mapa_de_hoja
+
+MENSAJES_ETAPA = {
+    'abrir': 'Error al abrir la hoja de Google Sheets',
+    'hoja': 'Error al acceder a la hoja',
+    'lectura': 'Error al leer datos de la hoja',
+    'escritura': 'Error al agregar datos a la hoja',
+}
+
+class ErrorEnvio(Exception):
+    """Falla de una etapa del envío; el texto ya está listo para mostrarle al usuario."""
+
+    def __init__(self, etapa: str, causa: Exception):
+        self.etapa = etapa
+        self.causa = causa
+        super().__init__(f"{MENSAJES_ETAPA.get(etapa, 'Error')}: {causa}")
+
+def leer_encabezado_y_pedido(sheet, sheet_range: str, pedido: str = None):
+    """
+    Una sola lectura (o acierto de caché) del rango.
+    :return: (filas, números de fila donde ya está el pedido, True si salió de la caché).
+    """
+    antes = time.monotonic()
+    entrada = google_sheets.obtener_snapshot_hoja(sheet, sheet_range)
+    filas_pedido = entrada['indice'].get(google_sheets.normalizar_pedido(pedido), []) if pedido else []
+    return entrada['rows'], list(filas_pedido), entrada['cargado'] < antes
+
+class EnvioCaso:
+    """
+    Estado de un envío de modal: planilla, pestaña, encabezado y tiempos de cada etapa.
+    Uso típico:
+        envio = EnvioCaso('ReembolsoModal', config.SPREADSHEET_ID_CASOS, config.SHEET_RANGE_REEMBOLSOS)
+        if await envio.preparar(client, pedido): ...  # duplicado
+        row_data = envio.fila_vacia(); ...
+        await envio.agregar(row_data)
+    """
+
+    def __init__(self, nombre: str, spreadsheet_id: str, sheet_range: str):
+        self.nombre = nombre
+        self.spreadsheet_id = spreadsheet_id
+        self.hoja_nombre, self.rango = separar_rango(sheet_range)
+        self.spreadsheet = None
+        self.sheet = None
+        self.rows = []
+        self.header = []
+        self.columnas = MapaColumnas([])
+        self.filas_pedido = []
+        self.desde_cache = False
+        self.tiempos = {}
+
+    @asynccontextmanager
+    async def _etapa(self, etapa: str):
+        inicio = time.perf_counter()
+        try:
+            yield
+        except Exception as error:
+            raise ErrorEnvio(etapa, error) from error
+        finally:
+            self.tiempos[etapa] = (time.perf_counter() - inicio) * 1000
+
+    async def abrir(self, client):
+        """Abre la planilla y la pestaña del rango (la primera si el rango no nombra una)."""
+        async with self._etapa('abrir'):
+            self.spreadsheet = await abrir_spreadsheet(client, self.spreadsheet_id)
+        async with self._etapa('hoja'):
+            self.sheet = await obtener_worksheet(self.spreadsheet, self.hoja_nombre)
+        return self.sheet
+
+    async def preparar(self, client, pedido: str = None) -> bool:
+        """
+        Abre la pestaña y lee encabezado y duplicados en una sola llamada.
+        :return: True si el pedido ya está registrado en el rango.
+        """
+        if self.sheet is None:
+            await self.abrir(client)
+        async with self._etapa('lectura'):
+            self.rows, self.filas_pedido, self.desde_cache = await ejecutar_google(
+                leer_encabezado_y_pedido, self.sheet, self.rango, pedido
+            )
+        self.header = self.rows[0] if self.rows else []
+        self.columnas = mapa_de_hoja(self.sheet, self.header)
+        return bool(self.filas_pedido)
+
+    def fila_vacia(self) -> list:
+        return [''] * len(self.header)
+
+    def ajustar_al_encabezado(self, row_data: list) -> list:
+        """Completa o recorta la fila al ancho del encabezado."""
+        if len(row_data) < len(self.header):
+            return row_data + [''] * (len(self.header) - len(row_data))
+        return row_data[:len(self.header)]
+
+    async def agregar(self, row_data: list):
+        """Agrega la fila por la cola de escritura y deja en el log los tiempos del envío."""
+        try:
+            async with self._etapa('escritura'):
+                return await agregar_fila(self.sheet, row_data)
+        finally:
+            print(self.informe())
+
+    def informe(self) -> str:
+        etapas = ', '.join(
+            f"{etapa} {ms:.0f} ms" + (' (caché)' if etapa == 'lectura' and self.desde_cache else '')
+            for etapa, ms in self.tiempos.items()
+        )
+        return f"envío {self.nombre}: {etapas}; total {sum(self.tiempos.values()):.0f} ms"
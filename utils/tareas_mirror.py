@@ -0,0 +1,554 @@
+"""
+Copia local de la hoja "Tareas Activas" para el panel de tareas.
+La hoja se lee una vez (y otra vez cada TAREAS_MIRROR_TTL_SEC si no hay escrituras
+pendientes) y se indexa por Tarea ID y Usuario ID. Las lecturas salen de memoria y las
+escrituras se aplican primero en la copia local y luego se envían a Google Sheets en
+segundo plano, en orden, desde un único hilo escritor.
+Si una escritura sigue fallando tras MAX_INTENTOS_ESCRITURA intentos no se descarta: se
+guarda en SQLite (tabla escrituras_pendientes) y las siguientes de la misma hoja esperan
+detrás de ella para no alterar el orden; se reintentan cada REINTENTO_FALLIDAS_SEC y,
+tras un reinicio, con reanudar_escrituras().
+Las filas nuevas se entregan una sola vez a utils/append_queue.py, que desde ahí las guarda
+y las reintenta; el escritor solo espera su confirmación antes de seguir con esa hoja.
+Las funciones replican la firma y el resultado de sus equivalentes en utils.google_sheets.
+"""
+import atexit
+import queue
+from concurrent import futures
+import threading
+import time
+from gspread.utils import rowcol_to_a1
+import config
+from utils.google_sheets import (
+    COLUMNAS_TAREAS_ACTIVAS, COLUMNAS_HISTORIAL, get_col_index, generar_tarea_id, extractor_tarea,
+    sumar_tiempo_pausado, calcular_diferencia_tiempo
+)
+from utils import append_queue, persistence
+from utils.google_client_manager import abrir_spreadsheet_cacheado, obtener_worksheet_cacheado
+
+COL_USUARIO_ID = 'Usuario ID'
+COL_TAREA_ID = 'Tarea ID'
+COL_ESTADO = 'Estado (En proceso, Pausada)'
+COL_FINALIZACION = 'Fecha/hora de finalización'
+COL_TIEMPO_PAUSADO = 'Tiempo pausada acumulado'
+COL_CANTIDAD = 'Cantidad de casos'
+ESTADOS_ACTIVOS = ('en proceso', 'pausada')
+MAX_INTENTOS_ESCRITURA = 3
+# Cada cuántos segundos se reintentan las escrituras que fallaron
+REINTENTO_FALLIDAS_SEC = 60
+
+# (spreadsheet_id, título) -> {'rows', 'por_tarea', 'por_usuario', 'pendientes', 'cargado'}
+_espejos = {}
+# tarea_id -> fecha de la última pausa registrada desde este proceso
+_ultimas_pausas = {}
+# Encabezado de cada hoja de historial, leído (o escrito) una vez
+_encabezados_historial = {}
+# tarea_id -> Future del append del evento Inicio, que se resuelve con su fila en el historial
+_filas_inicio_historial = {}
+# clave -> [(func, args, id_pendiente)] escrituras que fallaron y las que esperan detrás, en orden
+_fallidas = {}
+_proximo_reintento = 0.0
+_lock = threading.RLock()
+_cola = queue.Queue()
+_hilo_escritor = None
+# Como en append_queue: las escrituras guardadas se reencolan una sola vez aunque on_ready se repita
+_reanudado = False
+
+def _clave(sheet):
+    spreadsheet = getattr(sheet, 'spreadsheet', None)
+    return (getattr(spreadsheet, 'id', None), getattr(sheet, 'title', None))
+
+def _celda(row, col):
+    return row[col] if col is not None and len(row) > col else ''
+
+def _indexar(rows):
+    por_tarea, por_usuario = {}, {}
+    if rows:
+        header = rows[0]
+        tarea_col = get_col_index(header, COL_TAREA_ID)
+        user_col = get_col_index(header, COL_USUARIO_ID)
+        for idx, row in enumerate(rows[1:], start=1):
+            if tarea_col is not None and len(row) > tarea_col:
+                por_tarea.setdefault(row[tarea_col], idx)
+            if user_col is not None and len(row) > user_col:
+                por_usuario.setdefault(row[user_col], []).append(idx)
+    return por_tarea, por_usuario
+
+def _obtener_espejo(sheet):
+    """Devuelve la copia local de la hoja, leyéndola si no existe o venció sin escrituras pendientes."""
+    clave = _clave(sheet)
+    with _lock:
+        espejo = _espejos.get(clave)
+        if espejo is not None and (
+            espejo['pendientes'] or clave in _fallidas
+            or time.monotonic() - espejo['cargado'] < config.TAREAS_MIRROR_TTL_SEC
+        ):
+            return espejo
+    rows = [list(r) for r in (sheet.get_all_values() or [])]
+    por_tarea, por_usuario = _indexar(rows)
+    with _lock:
+        actual = _espejos.get(clave)
+        if actual is not None and (actual['pendientes'] or clave in _fallidas):
+            # Mientras se leía la hoja se encolaron escrituras: la copia local sigue siendo la vigente
+            return actual
+        espejo = {
+            'rows': rows, 'por_tarea': por_tarea, 'por_usuario': por_usuario,
+            'pendientes': 0, 'cargado': time.monotonic()
+        }
+        _espejos[clave] = espejo
+        return espejo
+
+def invalidar_espejo(sheet=None):
+    """Descarta la copia local de una hoja (o de todas); la próxima consulta la vuelve a leer."""
+    with _lock:
+        if sheet is None:
+            _espejos.clear()
+        else:
+            _espejos.pop(_clave(sheet), None)
+
+# --- Escritor en segundo plano ---
+
+def _escribir(func, args):
+    """Ejecuta la escritura con hasta MAX_INTENTOS_ESCRITURA intentos. :return: el último error, o None si se escribió."""
+    # Volver a esperar un append enseguida no sirve: append_queue ya reintenta la fila por su cuenta
+    intentos = 1 if func is _esperar_fila else MAX_INTENTOS_ESCRITURA
+    for intento in range(intentos):
+        try:
+            func(*args)
+            return None
+        except Exception as error:
+            if intento == intentos - 1:
+                return error
+            time.sleep(1 + intento)
+
+def _preparar(func, args, id_pendiente):
+    """
+    Entrega un _agregar_fila a append_queue, que desde ahí guarda la fila en disco y la
+    reintenta; lo que queda en el escritor es la espera de su confirmación (_esperar_fila).
+    Así un reintento no encola la fila otra vez ni la guarda en las dos tablas.
+    """
+    if func is not _agregar_fila:
+        return func, args, id_pendiente
+    sheet, nueva_fila, fila_esperada = args
+    futuro = append_queue.encolar_fila(sheet, nueva_fila)
+    _borrar_persistida(id_pendiente)
+    return _esperar_fila, (sheet, futuro, fila_esperada), None
+
+def _persistible(func, args):
+    """(tipo, datos) para guardar la escritura en SQLite, o (None, None) si no se puede guardar."""
+    if func is _escribir_celdas:
+        _, fila, cambios = args
+        return 'celdas', {'fila': fila, 'cambios': [list(cambio) for cambio in cambios]}
+    if func is _agregar_fila:
+        _, nueva_fila, fila_esperada = args
+        return 'fila', {'fila': list(nueva_fila), 'fila_esperada': fila_esperada}
+    return None, None
+
+def _desde_persistida(sheet, pendiente):
+    if pendiente.tipo == 'celdas':
+        return _escribir_celdas, (sheet, pendiente.datos['fila'], [tuple(c) for c in pendiente.datos['cambios']])
+    return _agregar_fila, (sheet, pendiente.datos['fila'], pendiente.datos['fila_esperada'])
+
+def _borrar_persistida(id_pendiente):
+    if id_pendiente is None:
+        return
+    try:
+        persistence.borrar_escritura_pendiente(id_pendiente)
+    except Exception as error:
+        print(f'[ERROR] tareas_mirror: No se pudo borrar la escritura pendiente {id_pendiente}: {error}')
+
+def _postergar(clave, func, args, id_pendiente):
+    """Deja la escritura detrás de las que fallaron en la misma hoja, guardándola en disco si se puede."""
+    global _proximo_reintento
+    tipo, datos = _persistible(func, args)
+    if id_pendiente is None and tipo is not None:
+        try:
+            id_pendiente = persistence.guardar_escritura_pendiente(str(clave[0]), str(clave[1]), tipo, datos)
+        except Exception as error:
+            print(f'[ERROR] tareas_mirror: No se pudo guardar la escritura pendiente en disco: {error}')
+    with _lock:
+        if not _fallidas:
+            _proximo_reintento = time.monotonic() + REINTENTO_FALLIDAS_SEC
+        _fallidas.setdefault(clave, []).append((func, args, id_pendiente))
+
+def _reintentar_fallidas():
+    """Reintenta en orden las escrituras postergadas de cada hoja, hasta la primera que vuelva a fallar."""
+    global _proximo_reintento
+    for clave in list(_fallidas):
+        pendientes = _fallidas[clave]
+        while pendientes:
+            pendientes[0] = _preparar(*pendientes[0])
+            func, args, id_pendiente = pendientes[0]
+            if func is _esperar_fila and not args[1].done():
+                # append_queue sigue reintentando la fila: lo demás de la hoja espera detrás
+                break
+            try:
+                func(*args)
+            except Exception as error:
+                print(f'[ERROR] tareas_mirror: Sigue fallando la escritura en "{clave[1]}" ({len(pendientes)} pendientes): {error}')
+                break
+            pendientes.pop(0)
+            _borrar_persistida(id_pendiente)
+        if not pendientes:
+            with _lock:
+                del _fallidas[clave]
+                espejo = _espejos.get(clave)
+                if espejo is not None:
+                    # La hoja ya tiene todos los cambios: vuelve a ser la referencia en la próxima lectura
+                    espejo['cargado'] = float('-inf')
+            print(f'tareas_mirror: Se escribieron las escrituras pendientes de "{clave[1]}".')
+    _proximo_reintento = time.monotonic() + REINTENTO_FALLIDAS_SEC
+
+def _escritor():
+    while True:
+        espera = max(0.0, _proximo_reintento - time.monotonic()) if _fallidas else None
+        try:
+            clave, func, args, id_pendiente = _cola.get(timeout=espera)
+        except queue.Empty:
+            _reintentar_fallidas()
+            continue
+        try:
+            if clave in _fallidas:
+                # Hay una escritura anterior de la misma hoja sin escribir: esta va detrás
+                _postergar(clave, func, args, id_pendiente)
+            else:
+                func, args, id_pendiente = _preparar(func, args, id_pendiente)
+                error = _escribir(func, args)
+                if error is None:
+                    _borrar_persistida(id_pendiente)
+                else:
+                    print(f'[ERROR] tareas_mirror: No se pudo escribir en "{clave[1]}" tras {MAX_INTENTOS_ESCRITURA} intentos: {error}; se reintentará cada {REINTENTO_FALLIDAS_SEC} s')
+                    # La copia local conserva el cambio; no se relee la hoja hasta que se escriba
+                    _postergar(clave, func, args, id_pendiente)
+        finally:
+            with _lock:
+                espejo = _espejos.get(clave)
+                if espejo is not None and espejo['pendientes']:
+                    espejo['pendientes'] -= 1
+            _cola.task_done()
+        if _fallidas and time.monotonic() >= _proximo_reintento:
+            _reintentar_fallidas()
+
+def _encolar(sheet, func, *args, id_pendiente=None):
+    global _hilo_escritor
+    clave = _clave(sheet)
+    with _lock:
+        espejo = _espejos.get(clave)
+        if espejo is not None:
+            espejo['pendientes'] += 1
+        if _hilo_escritor is None or not _hilo_escritor.is_alive():
+            _hilo_escritor = threading.Thread(target=_escritor, name='tareas-mirror-escritor', daemon=True)
+            _hilo_escritor.start()
+    _cola.put((clave, func, args, id_pendiente))
+
+def esperar_escrituras():
+    """Bloquea hasta que todas las escrituras encoladas se hayan enviado a la hoja."""
+    if _hilo_escritor is not None and _hilo_escritor.is_alive():
+        _cola.join()
+
+atexit.register(esperar_escrituras)
+
+def reanudar_escrituras(client) -> int:
+    """
+    Vuelve a encolar las escrituras que quedaron guardadas sin escribir (p. ej. tras un reinicio).
+    Se llama en on_ready y, como append_queue.reanudar_pendientes, solo actúa la primera vez.
+    """
+    global _reanudado
+    with _lock:
+        if _reanudado:
+            return 0
+        pendientes = persistence.listar_escrituras_pendientes()
+        _reanudado = True
+    hojas = {}
+    for pendiente in pendientes:
+        clave = (pendiente.spreadsheet_id, pendiente.hoja)
+        try:
+            if clave not in hojas:
+                hojas[clave] = obtener_worksheet_cacheado(
+                    abrir_spreadsheet_cacheado(client, pendiente.spreadsheet_id), pendiente.hoja
+                )
+        except Exception as error:
+            print(f'[ERROR] tareas_mirror: No se pudo abrir {clave} para reanudar escrituras pendientes: {error}')
+            hojas[clave] = None
+        if hojas[clave] is not None:
+            func, args = _desde_persistida(hojas[clave], pendiente)
+            _encolar(hojas[clave], func, *args, id_pendiente=pendiente.id)
+    if pendientes:
+        print(f'tareas_mirror: {len(pendientes)} escrituras pendientes reencoladas.')
+    return len(pendientes)
+
+def _escribir_celdas(sheet, fila, cambios):
+    sheet.batch_update([
+        {'range': rowcol_to_a1(fila, col + 1), 'values': [[valor]]} for col, valor in cambios
+    ])
+
+def _agregar_fila(sheet, nueva_fila, fila_esperada):
+    # El escritor no la llama directamente: la divide en dos pasos con _preparar
+    _esperar_fila(sheet, append_queue.encolar_fila(sheet, nueva_fila), fila_esperada)
+
+def _esperar_fila(sheet, futuro, fila_esperada):
+    """Espera a que append_queue confirme la fila; si no llega a tiempo lanza TimeoutError y se reintenta la espera."""
+    try:
+        fila = futuro.result(timeout=append_queue.TIMEOUT_CONFIRMACION_SEC)
+    except futures.TimeoutError:
+        raise
+    except Exception as error:
+        # append_queue la descartó por un error permanente: la copia local tiene una fila que la hoja no
+        print(f'[ERROR] tareas_mirror: No se escribió la fila {fila_esperada} en "{getattr(sheet, "title", "?")}" ({error}); se releerá la hoja.')
+        invalidar_espejo(sheet)
+        return
+    if fila is not None and fila != fila_esperada:
+        print(f'[DEBUG] tareas_mirror: La fila se escribió en {fila} y no en {fila_esperada}; se releerá la hoja.')
+        invalidar_espejo(sheet)
+
+def _actualizar_celdas(sheet, espejo, idx, valores: dict):
+    """Aplica {columna: valor} a la fila idx de la copia local y encola una única escritura."""
+    header = espejo['rows'][0]
+    row = espejo['rows'][idx]
+    cambios = []
+    for nombre, valor in valores.items():
+        col = get_col_index(header, nombre)
+        if col is None:
+            continue
+        if len(row) <= col:
+            row.extend([''] * (col + 1 - len(row)))
+        row[col] = valor
+        cambios.append((col, valor))
+    if cambios:
+        _encolar(sheet, _escribir_celdas, sheet, idx + 1, cambios)
+
+# --- Lecturas ---
+
+def _datos_tarea(header, row, idx):
+    return extractor_tarea(header)(row, idx + 1)
+
+def obtener_tarea_por_id(sheet, tarea_id):
+    """Datos de una tarea por su ID, desde la copia local."""
+    try:
+        espejo = _obtener_espejo(sheet)
+        with _lock:
+            idx = espejo['por_tarea'].get(tarea_id)
+            if idx is None:
+                return None
+            return _datos_tarea(espejo['rows'][0], espejo['rows'][idx], idx)
+    except Exception as e:
+        print(f'[ERROR] obtener_tarea_por_id: {e}')
+        return None
+
+def obtener_tarea_activa_por_usuario(sheet, user_id):
+    """Tarea activa (En proceso o Pausada) de un usuario, desde la copia local."""
+    try:
+        espejo = _obtener_espejo(sheet)
+        with _lock:
+            header = espejo['rows'][0] if espejo['rows'] else []
+            for idx in espejo['por_usuario'].get(user_id, []):
+                datos = _datos_tarea(header, espejo['rows'][idx], idx)
+                if datos['estado'].lower() in ESTADOS_ACTIVOS:
+                    return datos
+        return None
+    except Exception as e:
+        print(f'[ERROR] obtener_tarea_activa_por_usuario: {e}')
+        return None
+
+# --- Escrituras ---
+
+def registrar_tarea_activa(sheet, user_id, usuario, tarea, observaciones, inicio, estado='En proceso'):
+    """
+    Registra una nueva tarea activa. Si el usuario ya tiene una tarea activa, lanza una excepción.
+    Retorna el ID de tarea generado.
+    """
+    try:
+        espejo = _obtener_espejo(sheet)
+        with _lock:
+            if not espejo['rows']:
+                espejo['rows'].append(list(COLUMNAS_TAREAS_ACTIVAS))
+                _encolar(sheet, sheet.append_row, COLUMNAS_TAREAS_ACTIVAS)
+            header = espejo['rows'][0]
+            if get_col_index(header, COL_USUARIO_ID) is None:
+                raise Exception('No se encontró la columna Usuario ID en la hoja de Tareas Activas.')
+            for idx in espejo['por_usuario'].get(user_id, []):
+                estado_existente = _celda(espejo['rows'][idx], get_col_index(header, COL_ESTADO)).strip().lower()
+                if estado_existente in ESTADOS_ACTIVOS:
+                    raise Exception(f'El usuario ya tiene una tarea activa con estado "{estado_existente}". Debe finalizar la tarea actual antes de iniciar una nueva.')
+
+            tarea_id = generar_tarea_id(user_id)
+            nueva_fila = [user_id, tarea_id, usuario, tarea, observaciones, estado, inicio, '', '00:00:00', '0']
+            espejo['rows'].append(list(nueva_fila))
+            idx = len(espejo['rows']) - 1
+            espejo['por_tarea'][tarea_id] = idx
+            espejo['por_usuario'].setdefault(user_id, []).append(idx)
+            _encolar(sheet, _agregar_fila, sheet, nueva_fila, idx + 1)
+        return tarea_id
+    except Exception as e:
+        print(f'[ERROR] registrar_tarea_activa: {e}')
+        raise
+
+def _agregar_evento(sheet, nueva_fila):
+    # Solo corre en el hilo escritor, así que los diccionarios no necesitan lock
+    clave = _clave(sheet)
+    if clave not in _encabezados_historial:
+        header = sheet.row_values(1)
+        if not header:
+            sheet.append_row(COLUMNAS_HISTORIAL)
+            header = list(COLUMNAS_HISTORIAL)
+        _encabezados_historial[clave] = header
+    # El evento queda guardado en disco y se escribe junto con otros en el próximo lote
+    futuro = append_queue.encolar_fila(sheet, nueva_fila)
+    if nueva_fila[7] == 'Inicio':
+        # Al finalizar, la cantidad de casos se escribe en esta fila sin releer el historial
+        _filas_inicio_historial[nueva_fila[1]] = futuro
+
+def agregar_evento_historial(sheet, user_id, tarea_id, usuario, tarea, observaciones, fecha_evento, estado, tipo_evento, tiempo_pausada=''):
+    """Encola el evento en la hoja Historial (no se lee la hoja en el momento del clic)."""
+    nueva_fila = [user_id, tarea_id, usuario, tarea, observaciones, estado, fecha_evento, tipo_evento, tiempo_pausada, '0']
+    _encolar(sheet, _agregar_evento, sheet, nueva_fila)
+
+def _tarea_para_modificar(espejo, tarea_id):
+    idx = espejo['por_tarea'].get(tarea_id)
+    if idx is None:
+        raise Exception('No se encontró la tarea especificada.')
+    return espejo, idx, _datos_tarea(espejo['rows'][0], espejo['rows'][idx], idx)
+
+def pausar_tarea_por_id(sheet_activas, sheet_historial, tarea_id, usuario, fecha_pausa):
+    """Pausa una tarea: una escritura de celda en Tareas Activas y un evento en el historial."""
+    try:
+        espejo = _obtener_espejo(sheet_activas)
+        with _lock:
+            espejo, idx, datos_tarea = _tarea_para_modificar(espejo, tarea_id)
+            if datos_tarea['estado'].lower() == 'pausada':
+                raise Exception('La tarea ya está pausada.')
+            if datos_tarea['estado'].lower() != 'en proceso':
+                raise Exception('La tarea no está en proceso.')
+            _actualizar_celdas(sheet_activas, espejo, idx, {COL_ESTADO: 'Pausada'})
+            _ultimas_pausas[tarea_id] = fecha_pausa
+        agregar_evento_historial(
+            sheet_historial, datos_tarea['user_id'], tarea_id, usuario, datos_tarea['tarea'],
+            datos_tarea['observaciones'], fecha_pausa, 'Pausada', 'Pausa', datos_tarea['tiempo_pausado']
+        )
+        return True
+    except Exception as e:
+        print(f'[ERROR] pausar_tarea_por_id: {e}')
+        raise
+
+def _ultima_pausa_en_historial(sheet_historial, tarea_id):
+    """Solo se usa si la pausa se registró antes de iniciar este proceso."""
+    rows_historial = sheet_historial.get_all_values()
+    if not rows_historial:
+        return None
+    header_historial = rows_historial[0]
+    tarea_id_col = get_col_index(header_historial, 'Tarea ID')
+    tipo_evento_col = get_col_index(header_historial, 'Tipo de evento (Inicio, Pausa, Reanudación, Finalización)')
+    fecha_col = get_col_index(header_historial, 'Fecha/hora de inicio')
+    for row in reversed(rows_historial[1:]):
+        if _celda(row, tarea_id_col) == tarea_id and _celda(row, tipo_evento_col) == 'Pausa':
+            return _celda(row, fecha_col) or None
+    return None
+
+def reanudar_tarea_por_id(sheet_activas, sheet_historial, tarea_id, usuario, fecha_reanudacion):
+    """Reanuda una tarea sumando el tiempo pausado; estado y tiempo se escriben en una sola llamada."""
+    try:
+        espejo = _obtener_espejo(sheet_activas)
+        with _lock:
+            _, _, datos_tarea = _tarea_para_modificar(espejo, tarea_id)
+            ultima_pausa = _ultimas_pausas.get(tarea_id)
+        if datos_tarea['estado'].lower() == 'en proceso':
+            raise Exception('La tarea ya está en proceso.')
+        if datos_tarea['estado'].lower() != 'pausada':
+            raise Exception('La tarea no está pausada.')
+        if ultima_pausa is None:
+            ultima_pausa = _ultima_pausa_en_historial(sheet_historial, tarea_id)
+
+        tiempo_pausado_agregar = '00:00:00'
+        if ultima_pausa:
+            tiempo_pausado_agregar = calcular_diferencia_tiempo(ultima_pausa, fecha_reanudacion)
+
+        with _lock:
+            espejo, idx, datos_tarea = _tarea_para_modificar(espejo, tarea_id)
+            tiempo_pausado_nuevo = sumar_tiempo_pausado(datos_tarea['tiempo_pausado'], tiempo_pausado_agregar)
+            _actualizar_celdas(sheet_activas, espejo, idx, {
+                COL_TIEMPO_PAUSADO: tiempo_pausado_nuevo,
+                COL_ESTADO: 'En proceso'
+            })
+            _ultimas_pausas.pop(tarea_id, None)
+        agregar_evento_historial(
+            sheet_historial, datos_tarea['user_id'], tarea_id, usuario, datos_tarea['tarea'],
+            datos_tarea['observaciones'], fecha_reanudacion, 'En proceso', 'Reanudación', tiempo_pausado_nuevo
+        )
+        return True
+    except Exception as e:
+        print(f'[ERROR] reanudar_tarea_por_id: {e}')
+        raise
+
+def _buscar_fila_historial(sheet_historial, tarea_id):
+    """(fila, columna de la cantidad) del primer evento de la tarea, leyendo todo el historial."""
+    rows_historial = sheet_historial.get_all_values()
+    if not rows_historial:
+        return None, None
+    header_historial = rows_historial[0]
+    tarea_id_col_hist = get_col_index(header_historial, 'Tarea ID')
+    cantidad_col_hist = get_col_index(header_historial, 'Cantidad de casos')
+    if tarea_id_col_hist is None or cantidad_col_hist is None:
+        return None, None
+    for i, row in enumerate(rows_historial[1:], start=2):
+        if _celda(row, tarea_id_col_hist) == tarea_id:
+            return i, cantidad_col_hist
+    return None, None
+
+def _actualizar_cantidad_historial(sheet_historial, tarea_id, cantidad_casos):
+    # Solo corre en el hilo escritor, después de encolar el evento Inicio
+    futuro = _filas_inicio_historial.pop(tarea_id, None)
+    if futuro is None:
+        _escribir_cantidad_historial(sheet_historial, tarea_id, cantidad_casos, None)
+        return
+    # Sin bloquear al escritor: la cantidad se encola cuando append_queue confirma el evento Inicio
+    futuro.add_done_callback(
+        lambda f: _al_confirmar_inicio(sheet_historial, tarea_id, cantidad_casos, f)
+    )
+
+def _al_confirmar_inicio(sheet_historial, tarea_id, cantidad_casos, futuro):
+    # Corre en el hilo de append_queue: solo encola, la escritura la hace el hilo escritor
+    try:
+        fila = futuro.result()
+    except Exception as error:
+        print(f'[DEBUG] tareas_mirror: No se confirmó el evento Inicio de {tarea_id} ({error}); se buscará en el historial.')
+        fila = None
+    _encolar(sheet_historial, _escribir_cantidad_historial, sheet_historial, tarea_id, cantidad_casos, fila)
+
+def _escribir_cantidad_historial(sheet_historial, tarea_id, cantidad_casos, fila):
+    header = _encabezados_historial.get(_clave(sheet_historial))
+    cantidad_col = get_col_index(header, COL_CANTIDAD) if header else None
+    if fila is None or cantidad_col is None:
+        # La tarea empezó antes de iniciar este proceso: hay que buscar su fila
+        fila, cantidad_col = _buscar_fila_historial(sheet_historial, tarea_id)
+    if fila is not None:
+        # Como escritura aparte, para que se guarde y se reintente si falla
+        _encolar(sheet_historial, _escribir_celdas, sheet_historial, fila, [(cantidad_col, cantidad_casos)])
+
+def finalizar_tarea_por_id_con_cantidad(sheet_activas, sheet_historial, tarea_id, usuario, fecha_finalizacion, cantidad_casos):
+    """
+    Finaliza una tarea, guarda la cantidad de casos en ambas hojas y registra el evento en el historial.
+    La fila de inicio en el historial sale del append del evento Inicio; solo si no se
+    conoce (la tarea empezó antes de iniciar este proceso) se busca leyendo la hoja en el
+    hilo escritor.
+    """
+    try:
+        espejo = _obtener_espejo(sheet_activas)
+        with _lock:
+            espejo, idx, datos_tarea = _tarea_para_modificar(espejo, tarea_id)
+            if datos_tarea['estado'].lower() not in ESTADOS_ACTIVOS:
+                raise Exception('La tarea no está activa.')
+            _actualizar_celdas(sheet_activas, espejo, idx, {
+                COL_ESTADO: 'Finalizada',
+                COL_FINALIZACION: fecha_finalizacion,
+                COL_CANTIDAD: cantidad_casos
+            })
+            _ultimas_pausas.pop(tarea_id, None)
+        _encolar(sheet_historial, _actualizar_cantidad_historial, sheet_historial, tarea_id, cantidad_casos)
+        agregar_evento_historial(
+            sheet_historial, datos_tarea['user_id'], tarea_id, usuario, datos_tarea['tarea'],
+            datos_tarea['observaciones'], fecha_finalizacion, 'Finalizada', 'Finalización', datos_tarea['tiempo_pausado']
+        )
+        return True
+    except Exception as e:
+        print(f'[ERROR] finalizar_tarea_por_id_con_cantidad: {e}')
+        raise
@@ -0,0 +1,128 @@
+"""
+Consulta masiva de trackings de Andreani (/tracking-masivo).
+Los números salen de una lista escrita por el agente o de la columna "ANDREANI" de un rango
+de la hoja; se consultan en paralelo con un semáforo (config.TRACKING_MASIVO_CONCURRENCIA)
+sobre el cliente async de utils.andreani, que ya cachea y une consultas repetidas.
+El resultado se resume en una tabla o en un CSV y, si se pide, el estado actual se escribe
+en la hoja con un único values_batch_update.
+"""
+import asyncio
+import csv
+import io
+import re
+from gspread.utils import rowcol_to_a1
+import config
+from utils.andreani import consultar_tracking, eventos_timeline, limpiar_html
+from utils.error_scanner import rango_citado
+from utils.sheet_schema import compilar
+
+COLUMNA_TRACKING = 'ANDREANI'
+# Margen bajo el límite de 2000 caracteres de un mensaje de Discord
+LIMITE_MENSAJE = 1900
+
+def extraer_numeros(texto: str) -> list:
+    """Separa una lista de números escrita a mano (comas, espacios, punto y coma o saltos de línea), sin repetidos."""
+    numeros = []
+    for numero in re.split(r'[\s,;]+', texto or ''):
+        numero = numero.strip()
+        if numero and numero not in numeros:
+            numeros.append(numero)
+    return numeros
+
+def fila_inicial(rango_puro: str) -> int:
+    """Número de fila donde empieza un rango A1 ('A:M' -> 1, 'A5:M' -> 5)."""
+    coincidencia = re.match(r"^[A-Za-z]*(\d+)", rango_puro or '')
+    return int(coincidencia.group(1)) if coincidencia else 1
+
+def numeros_de_filas(rows: list, fila_inicio: int = 2):
+    """
+    Busca la columna ANDREANI en el encabezado y devuelve sus números con la fila de cada uno.
+    :return: (índice de la columna o None, lista de (fila, número)).
+    """
+    if not rows:
+        return None, []
+    mapa = compilar(rows[0])
+    idx = mapa.indice('tracking')
+    if idx is None:
+        idx = mapa.indice_que_contiene('andreani')
+    if idx is None:
+        return None, []
+    filas = []
+    for fila, row in enumerate(rows[1:], start=fila_inicio):
+        numero = str(row[idx]).strip() if idx < len(row) else ''
+        if numero:
+            filas.append((fila, numero))
+    return idx, filas
+
+def resumir(numero: str, info: dict) -> dict:
+    """Estado, entrega estimada y último evento de una respuesta de la API."""
+    info = info or {}
+    eventos = eventos_timeline(info)
+    ultimo = f"{eventos[0][0]}: {eventos[0][1]}" if eventos else ''
+    return {
+        'numero': numero,
+        'estado': (info.get('procesoActual') or {}).get('titulo', 'Sin datos') if info else 'Sin datos',
+        'entrega': limpiar_html(info.get('fechaEstimadaDeEntrega', '') or ''),
+        'ultimo_evento': ultimo,
+        'error': '',
+    }
+
+async def consultar_varios(numeros: list, auth_header: str, concurrencia: int = None) -> list:
+    """
+    Consulta todos los números en paralelo, como máximo `concurrencia` a la vez.
+    Un número que falla no corta el resto: su resultado lleva el error.
+    :return: lista de resúmenes en el mismo orden que `numeros`.
+    """
+    semaforo = asyncio.Semaphore(max(1, concurrencia or config.TRACKING_MASIVO_CONCURRENCIA))
+
+    async def consultar(numero):
+        async with semaforo:
+            try:
+                return resumir(numero, await consultar_tracking(numero, auth_header))
+            except Exception as error:
+                print(f'tracking masivo: error al consultar {numero}: {error}')
+                return {'numero': numero, 'estado': '', 'entrega': '', 'ultimo_evento': '', 'error': str(error)}
+
+    return list(await asyncio.gather(*(consultar(n) for n in numeros)))
+
+def _recortar(texto: str, ancho: int) -> str:
+    texto = str(texto or '')
+    return texto if len(texto) <= ancho else texto[:ancho - 1] + '…'
+
+def tabla_resumen(resultados: list) -> str:
+    """
+    Tabla de ancho fijo en un bloque de código.
+    :return: el texto, o None si no entra en un mensaje de Discord (usar el CSV).
+    """
+    ancho_numero = max([len('Número')] + [len(r['numero']) for r in resultados])
+    lineas = [f"{'Número'.ljust(ancho_numero)}  {'Estado'.ljust(22)}  Último evento"]
+    for r in resultados:
+        estado = f"⚠️ {r['error']}" if r['error'] else r['estado']
+        lineas.append(f"{r['numero'].ljust(ancho_numero)}  {_recortar(estado, 22).ljust(22)}  {_recortar(r['ultimo_evento'], 40)}")
+    texto = "```\n" + '\n'.join(lineas) + "\n```"
+    return texto if len(texto) <= LIMITE_MENSAJE else None
+
+def generar_csv(resultados: list) -> bytes:
+    """CSV con todas las columnas del resumen (UTF-8 con BOM para que Excel respete los acentos)."""
+    salida = io.StringIO()
+    writer = csv.writer(salida)
+    writer.writerow(['Número', 'Estado', 'Entrega estimada', 'Último evento', 'Error'])
+    for r in resultados:
+        writer.writerow([r['numero'], r['estado'], r['entrega'], r['ultimo_evento'], r['error']])
+    return salida.getvalue().encode('utf-8-sig')
+
+def actualizaciones_estado(hoja_nombre, idx_estado: int, filas: list, resultados: list) -> list:
+    """
+    Arma las actualizaciones {'range', 'values'} de la columna de estado para values_batch_update.
+    Las filas cuyo número dio error no se tocan.
+    """
+    por_numero = {r['numero']: r for r in resultados}
+    actualizaciones = []
+    for fila, numero in filas:
+        resultado = por_numero.get(numero)
+        if resultado and not resultado['error']:
+            actualizaciones.append({
+                'range': rango_citado(hoja_nombre, rowcol_to_a1(fila, idx_estado + 1)),
+                'values': [[resultado['estado']]],
+            })
+    return actualizaciones